@@ -10,11 +10,15 @@ path.append(dirname(__file__))
 # ================
 
 
+from .probe_scheduler import ProbeScheduler
+from .packet_in_dispatcher import PacketInDispatcher
 from .simple_arp import SimpleARP
 from .network_monitor import NetworkMonitor
 from .network_delay_detector import NetworkDelayDetector
 from .delay_monitor import DelayMonitor
 from .metrics import Metrics
+from .path_service import PathService
+from .forwarding import Forwarding
 
 from .flowmanager.flowmanager import FlowManager
 
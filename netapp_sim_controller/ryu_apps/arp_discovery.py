@@ -0,0 +1,113 @@
+'''
+    Helpers of the ARP discovery of SimpleARP: pools of IPv4 addresses kept
+    as integer ranges (instead of lists of address strings), and a token
+    bucket limiting the rate of ARP requests.
+'''
+
+
+from array import array
+from bisect import bisect_right
+from ipaddress import IPv4Address
+from re import sub
+from socket import inet_aton, inet_ntoa
+from struct import pack, unpack
+from time import time
+
+
+class IPPool:
+    '''
+        Pool of IPv4 addresses, as sorted, disjoint, inclusive ranges of
+        integers.
+
+        Attributes:
+        -----------
+        starts, ends: arrays of first and last address of each range.
+    '''
+
+    def __init__(self, ranges=()):
+        self.starts = array('I')
+        self.ends = array('I')
+        for start, end in sorted(ranges):
+            if self.ends and start <= self.ends[-1] + 1:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    @classmethod
+    def parse(cls, text):
+        '''
+            Returns pool of text (<range1>,<range2>, ... ,<value1>, ...,
+            range format <start_IP>:<end_IP>) and list of its invalid
+            values.
+        '''
+        ranges = []
+        invalid = []
+        for value in sub('[^0-9.:,]+', '', text).split(','):
+            if not value:
+                continue
+            try:
+                start, _, end = value.partition(':')
+                start = int(IPv4Address(start))
+                end = int(IPv4Address(end)) if end else start
+                if end < start:
+                    raise ValueError
+            except ValueError:
+                invalid.append(value)
+            else:
+                ranges.append((start, end))
+        return cls(ranges), invalid
+
+    def __len__(self):
+        return sum(end - start + 1
+                   for start, end in zip(self.starts, self.ends))
+
+    def __contains__(self, ip):
+        if isinstance(ip, str):
+            try:
+                ip, = unpack('!L', inet_aton(ip))
+            except OSError:
+                return False
+        i = bisect_right(self.starts, ip) - 1
+        return i >= 0 and ip <= self.ends[i]
+
+    def __iter__(self):
+        '''
+            Yields addresses of pool (as strings), in order.
+        '''
+        for start, end in zip(self.starts, self.ends):
+            for ip in range(start, end + 1):
+                yield inet_ntoa(pack('!L', ip))
+
+    def ints(self):
+        '''
+            Yields addresses of pool (as integers), in order.
+        '''
+        for start, end in zip(self.starts, self.ends):
+            yield from range(start, end + 1)
+
+
+class TokenBucket:
+    '''
+        Token bucket of rate tokens per second, holding at most burst
+        tokens. Tokens may be taken in advance (the bucket goes into debt),
+        the taker then waits for them to be refilled.
+    '''
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self._last = time()
+
+    def take(self, tokens=1, now=None):
+        '''
+            Takes tokens and returns time to wait in seconds before using
+            them (0 if they were available).
+        '''
+        now = time() if now is None else now
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self._last) * self.rate)
+        self._last = now
+        self.tokens -= tokens
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
@@ -13,11 +13,15 @@ import config
 
 SWITCHES = 'switches'
 OFP_HANDLER = 'ofp_handler'
+PROBE_SCHEDULER = 'probe_scheduler'
+PACKET_IN_DISPATCHER = 'packet_in_dispatcher'
 SIMPLE_ARP = 'simple_arp'
 NETWORK_MONITOR = 'network_monitor'
 NETWORK_DELAY_DETECTOR = 'network_delay_detector'
 DELAY_MONITOR = 'delay_monitor'
 METRICS = 'metrics'
+PATH_SERVICE = 'path_service'
+FORWARDING = 'forwarding'
 
 WSGI = 'wsgi'
 DPSET = 'dpset'
@@ -55,6 +59,16 @@ if not IP_POOL:
           'NETWORK:IP_POOL parameter missing from conf.yml. '
           'Defaulting to empty IP address pool.')
 
+try:
+    ARP_RATE = float(getenv('NETWORK_ARP_RATE', None))
+    if ARP_RATE <= 0:
+        raise ValueError
+except:
+    print(' *** WARNING in settings: '
+          'NETWORK:ARP_RATE parameter invalid or missing from conf.yml. '
+          'Defaulting to 200 requests per second.')
+    ARP_RATE = 200
+
 try:
     MONITOR_PERIOD = float(getenv('MONITOR_PERIOD', None))
 except:
@@ -77,6 +91,100 @@ except:
           'Defaulting to 5 samples.')
     MONITOR_SAMPLES = 5
 
+try:
+    MONITOR_MAX_IN_FLIGHT = int(getenv('MONITOR_MAX_IN_FLIGHT', None))
+    if MONITOR_MAX_IN_FLIGHT < 1:
+        raise ValueError
+except:
+    print(' *** WARNING in settings: '
+          'MONITOR:MAX_IN_FLIGHT parameter invalid or missing from conf.yml. '
+          'Defaulting to 2 requests.')
+    MONITOR_MAX_IN_FLIGHT = 2
+
+METRICS_SINK = getenv('METRICS_SINK', '')
+if METRICS_SINK not in ('gnocchi', 'prometheus', 'tsdb'):
+    print(' *** WARNING in settings: '
+          'METRICS:SINK parameter invalid or missing from conf.yml. '
+          'Defaulting to gnocchi.')
+    METRICS_SINK = 'gnocchi'
+
+try:
+    METRICS_TSDB_RETENTION = float(getenv('METRICS_TSDB_RETENTION', None))
+    if METRICS_TSDB_RETENTION <= 0:
+        raise ValueError
+except:
+    print(' *** WARNING in settings: '
+          'METRICS:TSDB_RETENTION parameter invalid or missing from conf.yml. '
+          'Defaulting to 30 days.')
+    METRICS_TSDB_RETENTION = 30
+
+try:
+    METRICS_QUEUE_SIZE = int(getenv('METRICS_QUEUE_SIZE', None))
+    if METRICS_QUEUE_SIZE < 1:
+        raise ValueError
+except:
+    print(' *** WARNING in settings: '
+          'METRICS:QUEUE_SIZE parameter invalid or missing from conf.yml. '
+          'Defaulting to 32 periods.')
+    METRICS_QUEUE_SIZE = 32
+
+try:
+    METRICS_WORKERS = int(getenv('METRICS_WORKERS', None))
+    if METRICS_WORKERS < 1:
+        raise ValueError
+except:
+    print(' *** WARNING in settings: '
+          'METRICS:WORKERS parameter invalid or missing from conf.yml. '
+          'Defaulting to 2 workers.')
+    METRICS_WORKERS = 2
+
+try:
+    METRICS_MAX_BATCH = int(getenv('METRICS_MAX_BATCH', None))
+    if METRICS_MAX_BATCH < 1:
+        raise ValueError
+except:
+    print(' *** WARNING in settings: '
+          'METRICS:MAX_BATCH parameter invalid or missing from conf.yml. '
+          'Defaulting to 8 periods.')
+    METRICS_MAX_BATCH = 8
+
+try:
+    METRICS_SPILL_MAX = int(getenv('METRICS_SPILL_MAX', None))
+    if METRICS_SPILL_MAX < 0:
+        raise ValueError
+except:
+    print(' *** WARNING in settings: '
+          'METRICS:SPILL_MAX parameter invalid or missing from conf.yml. '
+          'Defaulting to 1800 periods.')
+    METRICS_SPILL_MAX = 1800
+
+try:
+    PATH_THRESHOLD = float(getenv('PATH_THRESHOLD', None))
+    if PATH_THRESHOLD < 0:
+        raise ValueError
+except:
+    print(' *** WARNING in settings: '
+          'PATH:THRESHOLD parameter invalid or missing from conf.yml. '
+          'Defaulting to 0.1 (10%).')
+    PATH_THRESHOLD = 0.1
+
+try:
+    PATH_CACHE_SIZE = int(getenv('PATH_CACHE_SIZE', None))
+    if PATH_CACHE_SIZE < 0:
+        raise ValueError
+except:
+    print(' *** WARNING in settings: '
+          'PATH:CACHE_SIZE parameter invalid or missing from conf.yml. '
+          'Defaulting to 1024 paths.')
+    PATH_CACHE_SIZE = 1024
+
+FORWARDING_WEIGHT = getenv('FORWARDING_WEIGHT', '')
+if FORWARDING_WEIGHT not in ('hops', 'delay', 'jitter', 'loss'):
+    print(' *** WARNING in settings: '
+          'FORWARDING:WEIGHT parameter invalid or missing from conf.yml. '
+          'Defaulting to delay.')
+    FORWARDING_WEIGHT = 'delay'
+
 OS_VERIFY_CERT = getenv('OPENSTACK_VERIFY_CERT', False) == 'True'
 
 OS_URL = getenv('OPENSTACK_URL', '')
@@ -121,6 +229,13 @@ if not OS_PROJECT_ID:
 
 OS_ARCHIVE_POLICY = getenv('OPENSTACK_ARCHIVE_POLICY', '')
 
+# resources (and metrics) already provisioned in Gnocchi
+GNOCCHI_REGISTRY = config.ROOT_PATH + '/data/gnocchi_registry.json'
+# measures not exported yet, spilled from the export queue
+METRICS_SPILL = config.ROOT_PATH + '/data/metrics_spill.jsonl'
+# embedded time series store of tsdb sink
+METRICS_TSDB = config.ROOT_PATH + '/data/tsdb'
+
 SERVICE_LOOKUP_INTERVAL = 1
 
 
@@ -13,21 +13,23 @@
 # limitations under the License.
 
 
+from functools import partial
 from time import time
 
 from ryu.base.app_manager import RyuApp
-from ryu.controller.handler import set_ev_cls, MAIN_DISPATCHER
-from ryu.controller.ofp_event import EventOFPPacketIn
+from ryu.controller.handler import set_ev_cls
 from ryu.lib.packet.packet import Packet
 from ryu.lib.packet.ethernet import ethernet
 from ryu.lib.packet.ipv4 import ipv4
 from ryu.lib.packet.icmp import icmp, echo
 from ryu.lib.packet.ether_types import ETH_TYPE_IP
 from ryu.lib.packet.in_proto import IPPROTO_ICMP
-from ryu.lib.hub import spawn, sleep
 from ryu.topology.event import EventSwitchEnter
 
 from common import *
+from packet_in_dispatcher import ICMP_PACKET
+from sample_store import SampleStore
+from snapshot import SnapshotPublisher
 
 
 class DelayMonitor(RyuApp):
@@ -45,10 +47,20 @@ class DelayMonitor(RyuApp):
 
         NetworkDelayDetector app: for filtering switch-controller latency.
 
+        ProbeScheduler app: for sending pings.
+
+        PacketInDispatcher app: for receiving ICMP replies.
+
         Attributes:
         -----------
         delay: dict mapping host IP address to delay of link to switch 
         in seconds (two-way).
+
+        jitter: dict mapping host IP address to jitter of link to switch 
+        in seconds.
+
+        snapshots: SnapshotPublisher of delay and jitter, published at the 
+        end of each monitoring sweep.
     '''
 
     def __init__(self, *args, **kwargs):
@@ -63,33 +75,38 @@ class DelayMonitor(RyuApp):
         self.delay = {}
         self._mac_delay = {}
         self._ip_2_mac = {}
-        self._delay_history = {}
+        self._delay_history = SampleStore(('delay',), MONITOR_SAMPLES)
         self.jitter = {}
         self._mac_jitter = {}
-        spawn(self._monitor)
-
-    def _monitor(self):
-        while True:
-            for ip in list(self.delay):
-                if ip not in self._simple_arp.arp_table:
-                    self.delay.pop(ip, None)
-                    self._mac_delay.pop(self._ip_2_mac.get(ip, None), None)
-                    self._ip_2_mac.pop(ip, None)
-
-            for ip, mac in list(self._simple_arp.arp_table.items()):
-                dpid, port = self._simple_arp._in_ports.get(mac,
-                                                            (None, None))
-                datapath = self._switches.dps.get(dpid, None)
-                if datapath:
-                    self._send_icmp_packet(datapath, ip, mac, port)
-
-                # Important! Don't send pings together, because that will
-                # generate a lot of replies almost at the same time, which
-                # will generate a lot of delay of waiting in queue when
-                # handling them.
-                sleep(0.05)
-
-            sleep(MONITOR_PERIOD)
+        self.snapshots = SnapshotPublisher(delay={}, jitter={})
+
+        self._probe_scheduler = get_app(PROBE_SCHEDULER)
+        self._probe_scheduler.register(DELAY_MONITOR, self._icmp_probes,
+                                       on_sweep=self._publish)
+
+        get_app(PACKET_IN_DISPATCHER).register(
+            ICMP_PACKET, self._icmp_packet_in_handler)
+
+    def _icmp_probes(self):
+        hosts = {host.ip_address: host for host in self._simple_arp.hosts}
+        for ip in list(self.delay):
+            if ip not in hosts:
+                self.delay.pop(ip, None)
+                self._delay_history.pop(ip)
+                self._mac_delay.pop(self._ip_2_mac.get(ip, None), None)
+                self._ip_2_mac.pop(ip, None)
+
+        probes = []
+        for ip, host in hosts.items():
+            datapath = self._switches.dps.get(host.dpid, None)
+            if datapath:
+                probes.append((host.dpid, partial(
+                    self._send_icmp_packet, datapath, ip, host.mac_address,
+                    host.port_no), ip))
+        return probes
+
+    def _publish(self):
+        self.snapshots.publish(delay=self.delay, jitter=self.jitter)
 
     def _send_icmp_packet(self, datapath, dst_ip, dst_mac, out_port):
         pkt = Packet()
@@ -118,12 +135,6 @@ class DelayMonitor(RyuApp):
                 instructions=[parser.OFPInstructionActions(
                     datapath.ofproto.OFPIT_APPLY_ACTIONS, actions)]))
 
-    def _save_stats(self, _dict, key, value, length):
-        _dict.setdefault(key, [])
-        _dict[key].append(value)
-        if len(_dict[key]) > length:
-            _dict[key].pop(0)
-
     @set_ev_cls(EventSwitchEnter)
     def _switch_enter_handler(self, ev):
         datapath = ev.switch.dp
@@ -136,9 +147,7 @@ class DelayMonitor(RyuApp):
                             ipv4_dst=CONTROLLER_IP),
             [parser.OFPActionOutput(datapath.ofproto.OFPP_CONTROLLER)])
 
-    @set_ev_cls(EventOFPPacketIn, MAIN_DISPATCHER)
-    def _icmp_packet_in_handler(self, ev):
-        pkt = Packet(ev.msg.data)
+    def _icmp_packet_in_handler(self, ev, pkt):
         eth = pkt.get_protocol(ethernet)
         if eth.dst == CONTROLLER_MAC:
             icmp_pkt = pkt.get_protocol(icmp)
@@ -160,6 +169,8 @@ class DelayMonitor(RyuApp):
 
                 else:
                     ip_src = pkt.get_protocol(ipv4).src
+                    self._probe_scheduler.replied(DELAY_MONITOR, ip_src,
+                                                  s_timestamp)
                     delay = max(
                         0, (ev.timestamp
                             - s_timestamp
@@ -173,12 +184,10 @@ class DelayMonitor(RyuApp):
 
                     # =========================================================
                     # code for jitter calculations
-                    self._save_stats(self._delay_history, ip_src, delay, 
-                                     MONITOR_SAMPLES)
-                    if len(self._delay_history[ip_src]) > 1:
-                        jitter = abs(
-                            self._delay_history[ip_src][1]
-                            - self._delay_history[ip_src][0])
+                    self._delay_history.append(ip_src, delay)
+                    delays = self._delay_history.column(ip_src, 'delay', 2)
+                    if len(delays) > 1:
+                        jitter = abs(delays[1] - delays[0])
                         self.jitter[ip_src] = jitter
                         self._mac_jitter[eth_src] = jitter
                     # =========================================================
@@ -0,0 +1,205 @@
+'''
+    Asynchronous export of monitoring measures, decoupled from their
+    collection by a bounded queue, so that a slow or unreachable endpoint
+    does not stall collection.
+'''
+
+
+from json import dumps, loads
+from os import replace
+from random import random
+from time import time
+
+from ryu.lib.hub import spawn, sleep, Queue, QueueEmpty
+
+
+# in seconds, delay before first retry of a failed export (doubled on each
+# retry, up to BACKOFF_MAX)
+BACKOFF_MIN = 1
+BACKOFF_MAX = 60
+# attempts of a batch before it is spilled to disk
+RETRIES = 5
+# in seconds, how long an idle worker waits before checking spilled periods
+IDLE_TIMEOUT = 1
+
+
+def coalesce(periods):
+    '''
+        Merges periods (list of tuples of resources and measures) into a
+        single tuple of resources and measures, for a single batch request.
+    '''
+    if len(periods) == 1:
+        return periods[0]
+
+    resources = []
+    measures = {}
+    for period_resources, period_measures in periods:
+        resources.extend(period_resources)
+        for id, metrics in period_measures.items():
+            merged = measures.setdefault(id, {})
+            for name, points in metrics.items():
+                merged.setdefault(name, []).extend(points)
+    return resources, measures
+
+
+class ExportPipeline:
+    '''
+        Bounded queue of monitoring periods consumed by a pool of export
+        workers.
+
+        Each worker takes up to max_batch queued periods and exports them
+        in a single call of export(resources, measures), which must raise an
+        exception on failure. Failed exports are retried with exponential
+        backoff, then spilled to disk. Periods that do not fit in the queue
+        are spilled to disk too, and are exported again when the queue is
+        idle. Periods that do not fit on disk either (more than spill_max)
+        are dropped.
+
+        Attributes:
+        -----------
+        exported: number of periods exported.
+
+        dropped: number of periods dropped.
+
+        latency: in seconds, duration of last successful export call.
+    '''
+
+    def __init__(self, export, spill_path, capacity, workers, max_batch,
+                 spill_max):
+        self.exported = 0
+        self.dropped = 0
+        self.latency = 0.0
+
+        self._export = export
+        self._spill_path = spill_path
+        self._capacity = capacity
+        self._max_batch = max_batch
+        self._spill_max = spill_max
+        self._queue = Queue(capacity)
+        self._spilled = len(self._read_spill())
+        for _ in range(workers):
+            spawn(self._worker)
+
+    def put(self, resources, measures):
+        '''
+            Queues measures (dict as expected by Gnocchi's batch API) of a
+            period for export, along with the resources they belong to. Never
+            blocks: if the queue is full, the period is spilled to disk.
+        '''
+        if self._queue.qsize() >= self._capacity:
+            self._spill([(resources, measures)])
+        else:
+            self._queue.put((resources, measures))
+
+    def stats(self):
+        '''
+            Returns dict of pipeline metrics.
+        '''
+        return {
+            'queue.depth': self._queue.qsize(),
+            'export.latency': self.latency,
+            'spilled': self._spilled,
+            'dropped': self.dropped
+        }
+
+    def _worker(self):
+        while True:
+            try:
+                periods = [self._queue.get(timeout=IDLE_TIMEOUT)]
+
+            except QueueEmpty:
+                periods = self._unspill(self._max_batch)
+                if not periods:
+                    continue
+
+            while len(periods) < self._max_batch:
+                try:
+                    periods.append(self._queue.get_nowait())
+
+                except QueueEmpty:
+                    break
+
+            self._send(periods)
+
+    def _send(self, periods):
+        resources, measures = coalesce(periods)
+        delay = BACKOFF_MIN
+        for _ in range(RETRIES):
+            start = time()
+            try:
+                self._export(resources, measures)
+
+            except Exception as e:
+                print(' *** ERROR in export_pipeline._send:',
+                      e.__class__.__name__, e)
+                # jitter keeps workers from retrying in lockstep
+                sleep(delay * (0.5 + random()))
+                delay = min(delay * 2, BACKOFF_MAX)
+
+            else:
+                self.latency = time() - start
+                self.exported += len(periods)
+                return
+
+        self._spill(periods)
+
+    def _read_spill(self):
+        try:
+            with open(self._spill_path, 'r') as f:
+                return f.readlines()
+
+        except FileNotFoundError:
+            return []
+
+        except Exception as e:
+            print(' *** WARNING in export_pipeline: could not read',
+                  self._spill_path, e.__class__.__name__, e)
+            return []
+
+    def _spill(self, periods):
+        room = max(self._spill_max - self._spilled, 0)
+        self.dropped += max(len(periods) - room, 0)
+        periods = periods[:room]
+        if not periods:
+            return
+
+        try:
+            lines = [dumps(period) + '\n' for period in periods]
+            with open(self._spill_path, 'a') as f:
+                f.writelines(lines)
+
+        except Exception as e:
+            self.dropped += len(periods)
+            print(' *** ERROR in export_pipeline._spill:',
+                  e.__class__.__name__, e)
+
+        else:
+            self._spilled += len(lines)
+
+    def _unspill(self, n):
+        if not self._spilled:
+            return []
+
+        lines = self._read_spill()
+        try:
+            tmp = self._spill_path + '.tmp'
+            with open(tmp, 'w') as f:
+                f.writelines(lines[n:])
+            replace(tmp, self._spill_path)
+
+        except Exception as e:
+            print(' *** ERROR in export_pipeline._unspill:',
+                  e.__class__.__name__, e)
+            return []
+
+        self._spilled = max(len(lines) - n, 0)
+        periods = []
+        for line in lines[:n]:
+            try:
+                periods.append(tuple(loads(line)))
+
+            except ValueError as e:
+                self.dropped += 1
+                print(' *** ERROR in export_pipeline._unspill:',
+                      e.__class__.__name__, e)
+        return periods
@@ -0,0 +1,96 @@
+# Copyright (c) 2018-2022 Maen Artimy
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This module keeps the static files of the web interface in memory, with
+their gzip variant (for compressible types) and their cache validators
+(ETag, Last-Modified), so serving them never touches the disk.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+
+
+MIN_GZIP_SIZE = 256  # bytes under which files are not compressed
+
+
+class Asset():
+    """Static file content, variants and validators
+    """
+
+    __slots__ = ("body", "gzip", "content_type", "etag", "mtime")
+
+    def __init__(self, path):
+        with open(path, "rb") as asset_file:
+            self.body = asset_file.read()
+        content_type, _ = mimetypes.guess_type(path)
+        self.content_type = content_type or "application/octet-stream"
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.mtime = int(os.path.getmtime(path))
+        self.gzip = None
+        if len(self.body) >= MIN_GZIP_SIZE and (
+                self.content_type.startswith("text/") or
+                self.content_type in ("application/javascript",
+                                      "application/json",
+                                      "image/svg+xml")):
+            compressed = gzip.compress(self.body, mtime=0)
+            if len(compressed) < len(self.body):
+                self.gzip = compressed
+
+
+class AssetCache():
+    """Static files under root, loaded at startup (or when first requested)
+    """
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+        self.assets = {}  # path relative to root -> Asset
+
+    def preload(self):
+        """Loads all files under root
+        """
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                self.get(os.path.relpath(os.path.join(dirpath, filename),
+                                         self.root))
+
+    def resolve(self, filename):
+        """Returns path of filename relative to root, or None if it is
+        outside root
+        """
+        path = os.path.realpath(os.path.join(self.root, filename))
+        if os.path.commonpath([self.root, path]) != self.root:
+            return None
+        return os.path.relpath(path, self.root)
+
+    def get(self, filename):
+        """Returns Asset of filename (relative to root), or None if it does
+        not exist or is outside root
+        """
+        asset = self.assets.get(filename)
+        if asset is not None:
+            return asset
+        name = self.resolve(filename)
+        if name is None:
+            return None
+        asset = self.assets.get(name)
+        if asset is None:
+            path = os.path.join(self.root, name)
+            if not os.path.isfile(path):
+                return None
+            asset = self.assets[name] = Asset(path)
+        return asset
@@ -23,9 +23,15 @@ import logging
 
 from ryu.base import app_manager
 from ryu.lib import ofctl_v1_3
+from ryu.lib import ofctl_utils
 from ryu.lib import hub
-from ryu.topology.api import get_all_switch, get_all_link, get_all_host
 from flowtracker import Tracker
+from flowcompiler import (PORT_ID, freeze, compile_actions,
+                          compile_instructions, compile_flow,
+                          compile_match_fields)
+from flowmirror import FlowMirror, FLOWS, GROUPS, METERS
+from logtail import LogTail, LIMIT as LOG_LIMIT
+from topoview import TopologyView
 
 
 PYTHON3 = sys.version_info > (3, 0)
@@ -35,6 +41,9 @@ logger = logging.getLogger("flowmanager")
 class CtrlApi():
 
     MAGIC_COOKIE = 0x00007ab700000000
+    BULK_TIMEOUT = 30  # seconds to wait for the barrier reply of an upload
+    STATS_TIMEOUT = 2  # default seconds to wait for the stats of a switch
+    RECONCILE_PERIOD = 60  # seconds between reconciliations of the mirror
 
     def __init__(self, app):
         """Constructor
@@ -45,19 +54,14 @@ class CtrlApi():
         hub.spawn(self._get_services)
         self.ofctl = ofctl_v1_3
         self.waiters = {}
+        self.bulk_waiters = {}  # dpid -> barrier xid -> pending upload
         self.rpc_clients = []
         self.tracker = Tracker()
+        self.mirror = FlowMirror()
+        self.topology = TopologyView(app)
+        hub.spawn(self._reconcile_loop)
 
-        self.port_id = {
-            "IN_PORT": 0xfffffff8,
-            "TABLE": 0xfffffff9,
-            "NORMAL": 0xfffffffa,
-            "FLOOD": 0xfffffffb,
-            "ALL": 0xfffffffc,
-            "CONTROLLER": 0xfffffffd,
-            "LOCAL": 0xfffffffe,
-            "ANY": 0xffffffff
-        }
+        self.port_id = PORT_ID
 
         self.reqfunction = {
             "switchdesc": self.ofctl.get_desc_stats,
@@ -74,6 +78,7 @@ class CtrlApi():
         # Get log file path
         handler = logger.handlers[0]
         self.logfile = handler.baseFilename
+        self.logtail = LogTail(self.logfile)
 
         logger.debug("Created Ctrl_Api")
 
@@ -90,100 +95,15 @@ class CtrlApi():
         return self.waiters
 
     def get_actions(self, parser, action_set):
-        """TBD"""
-        actions = []
-        a_dict = {
-            'SET_FIELD': (parser.OFPActionSetField, 'field'),
-            'COPY_TTL_OUT': (parser.OFPActionCopyTtlOut, None),
-            'COPY_TTL_IN': (parser.OFPActionCopyTtlIn, None),
-            'POP_PBB': (parser.OFPActionPopPbb, None),
-            'PUSH_PBB': (parser.OFPActionPushPbb, 'ethertype'),
-            'POP_MPLS': (parser.OFPActionPopMpls, 'ethertype'),
-            'PUSH_MPLS': (parser.OFPActionPushMpls, 'ethertype'),
-            'POP_VLAN': (parser.OFPActionPopVlan, None),
-            'PUSH_VLAN': (parser.OFPActionPushVlan, 'ethertype'),
-            'DEC_MPLS_TTL': (parser.OFPActionDecMplsTtl, None),
-            'SET_MPLS_TTL': (parser.OFPActionSetMplsTtl, 'mpls_ttl'),
-            'DEC_NW_TTL': (parser.OFPActionDecNwTtl, None),
-            'SET_NW_TTL': (parser.OFPActionSetNwTtl, 'nw_ttl'),
-            'SET_QUEUE': (parser.OFPActionSetQueue, 'queue_id'),
-            'GROUP': (parser.OFPActionGroup, 'group_id'),
-            'OUTPUT': (parser.OFPActionOutput, 'port'),
-        }
-
-        for action in action_set:
-            key = list(action.keys())[0]  # There should be only one key
-            value = action[key]
-            if key in a_dict:
-                found_action = a_dict[key][0]       # the action
-                if a_dict[key][1]:       # check if the action needs a value
-                    kwargs = {}
-                    if a_dict[key][1] == 'field':
-                        a_value = value.split('=')
-                        val = 0
-                        if len(a_value) > 1:
-                            val = int(
-                                a_value[1]) if a_value[1].isdigit() else a_value[1]
-                        kwargs = {a_value[0]: val}
-                    elif a_dict[key][1] == 'port':
-                        a_value = value.upper()
-                        val = self.port_id[a_value] if a_value in self.port_id else int(
-                            a_value)
-                        kwargs = {a_dict[key][1]: val}
-                    else:
-                        kwargs = {a_dict[key][1]: int(value)}
-                    actions.append(found_action(**kwargs))
-                else:
-                    actions.append(found_action())
-            else:
-                raise Exception("Action {} not supported!".format(key))
-        return actions
+        """Returns list of action objects of action_set (list of
+        {action: value} dicts)
+        """
+        return list(compile_actions(parser, freeze(action_set)))
 
     def _get_instructions(self, actions, ofproto, parser):
-        """TBD"""
-        # instructions
-        inst = []
-        apply_actions = []
-        write_actions = []
-
-        for item in actions:
-            # Python 2 has both types
-            if isinstance(item, str) or (not PYTHON3 and isinstance(item, unicode)):
-                if item.startswith('WRITE_METADATA'):
-                    metadata = item.split(':')[1].split('/')
-                    # expecting hex data
-                    inst += [parser.OFPInstructionWriteMetadata(
-                        int(metadata[0], 16), int(metadata[1], 16))]
-                elif item.startswith('GOTO_TABLE'):
-                    table_id = int(item.split(':')[1])
-                    inst += [parser.OFPInstructionGotoTable(table_id)]
-                elif item.startswith('METER'):
-                    meter_id = int(item.split(':')[1])
-                    inst += [parser.OFPInstructionMeter(meter_id)]
-                elif item.startswith('CLEAR_ACTIONS'):
-                    inst += [parser.OFPInstructionActions(
-                        ofproto.OFPIT_CLEAR_ACTIONS, [])]
-                else:  # Apply Actions
-                    action = item.split(':')
-                    apply_actions += [{action[0]: action[1]}]
-
-            elif isinstance(item, dict):  # WRITE ACTIONS
-                wractions = item["WRITE_ACTIONS"]
-                for witem in wractions:
-                    action = witem.split(':')
-                    write_actions += [{action[0]: action[1]}]
-
-        if apply_actions:
-            applyActions = self.get_actions(parser, apply_actions)
-            inst += [parser.OFPInstructionActions(
-                ofproto.OFPIT_APPLY_ACTIONS, applyActions)]
-
-        if write_actions:
-            writeActions = self.get_actions(parser, write_actions)
-            inst += [parser.OFPInstructionActions(
-                ofproto.OFPIT_WRITE_ACTIONS, writeActions)]
-
-        return inst
+        """Returns list of instruction objects of actions (Ryu's format)
+        """
+        return list(compile_instructions(ofproto, parser, freeze(actions)))
 
     def read_logs(self):
         items = []
@@ -197,76 +117,157 @@ class CtrlApi():
                 # items.append(line)
         return items
 
+    def tail_logs(self, cursor=None, limit=None, level=None, dpid=None,
+                  tail=None):
+        """Returns log entries from cursor (see LogTail.read)
+        """
+        return self.logtail.read(cursor, limit or LOG_LIMIT, level, dpid,
+                                 tail)
+
     # methods linked to web api
 
     def process_meter_upload(self, configlist):
         """Sends meters to the switch to update meter tables.
         """
-        switches = [str(t[0]) for t in self.get_switches()]
-        for swconfig in configlist:    # for each
-            dpid = list(swconfig.keys())[0]
-
-            if dpid not in switches:
-                break
-
-            for flow in swconfig[dpid]:
-                flow['dpid'] = dpid
-                flow['operation'] = 'add'
-                _ = self.process_meter_message(flow)
-        return 'Meters added successfully!'
+        return self._bulk_upload(configlist, self._serialized(self._meter_mod))
 
     def process_group_upload(self, configlist):
         """Sends groups to the switch to update group tables.
         """
-        switches = [str(t[0]) for t in self.get_switches()]
-        for swconfig in configlist:    # for each
-            dpid = list(swconfig.keys())[0]
-
-            if dpid not in switches:
-                break
-
-            for flow in swconfig[dpid]:
-                flow['dpid'] = dpid
-                flow['operation'] = 'add'
-                _ = self.process_group_message(flow)
-        return 'Groups added successfully!'
+        return self._bulk_upload(configlist, self._serialized(self._group_mod))
 
     def process_flow_upload(self, configlist):
         """Sends flows to the switch to update flow tables.
         """
+        return self._bulk_upload(configlist, self._serialized_flow_mod)
+
+    @staticmethod
+    def _serialized(build):
+        """Returns function building the message of an entry with
+        build(data_path, entry), with a new xid, and returning it with its
+        bytes
+        """
+        def serialized(data_path, entry):
+            msg = build(data_path, entry)
+            data_path.set_xid(msg)
+            msg.serialize()
+            return msg, msg.buf
+        return serialized
+
+    def _serialized_flow_mod(self, data_path, flow_entry):
+        """Builds Flow Mod message of flow_entry, with a new xid, and returns
+        it with its bytes. Entries differing by their matches only share the
+        template of the entry without match, serialized once, into which
+        their matches are patched
+        """
+        ofproto = data_path.ofproto
+        parser = data_path.ofproto_parser
+        match = compile_match_fields(ofproto, freeze(flow_entry.get("match")))
+        template = compile_flow(ofproto, parser, dict(flow_entry, match=None))
+        msg = template.flow_mod(data_path, match=parser.OFPMatch(
+            _ordered_fields=[field[1] for field in match]))
+        xid = data_path.set_xid(msg)
+        return msg, template.serialize(data_path, xid, match)
+
+    def _bulk_upload(self, configlist, build):
+        """Compiles all entries of configlist with build(data_path, entry),
+        which returns the message of entry (with a new xid) and its bytes,
+        then sends them to all switches in parallel, in a single write per
+        switch ended with a barrier request.
+
+        Returns a report with the number of entries installed, the number
+        of entries unconfirmed (no barrier reply in time) and the errors of
+        failed entries (each with the dpid and index of its entry).
+        """
+        switches = {str(dpid): data_path
+                    for dpid, data_path in self.get_switches()}
+        report = {"installed": 0, "unconfirmed": 0, "errors": []}
+        batches = {}  # dpid -> (data_path, bufs, xid -> entry index)
+        for swconfig in configlist:
+            for dpid, entries in swconfig.items():
+                data_path = switches.get(str(dpid))
+                if not data_path:
+                    report["errors"] += [
+                        {"dpid": dpid, "index": index,
+                         "error": "Datapath does not exist!"}
+                        for index in range(len(entries))]
+                    continue
+
+                _, bufs, xids = batches.setdefault(
+                    data_path.id, (data_path, [], {}))
+                for index, entry in enumerate(entries):
+                    entry = dict(entry, dpid=dpid, operation='add')
+                    try:
+                        msg, buf = build(data_path, entry)
+                    except KeyError as err:
+                        report["errors"].append(
+                            {"dpid": dpid, "index": index,
+                             "error": "Unrecognized field " + repr(err)})
+                    except Exception as err:
+                        report["errors"].append(
+                            {"dpid": dpid, "index": index,
+                             "error": "Error " + repr(err)})
+                    else:
+                        bufs.append(buf)
+                        xids[msg.xid] = (dpid, index)
+                        # failed entries are dropped from the mirror on
+                        # next reconciliation
+                        self.mirror.apply(data_path.id, msg)
+
+        hub.joinall([hub.spawn(self._bulk_send, data_path, bufs, xids, report)
+                     for data_path, bufs, xids in batches.values() if bufs])
+        return report
+
+    def _bulk_send(self, data_path, bufs, xids, report):
+        """Sends bufs to the switch in a single write ended with a barrier
+        request, and waits for the barrier reply (errors of the entries, if
+        any, are received before it).
+        """
+        barrier = data_path.ofproto_parser.OFPBarrierRequest(data_path)
+        data_path.set_xid(barrier)
+        barrier.serialize()
+        pending = {"xids": xids, "errors": {}, "done": hub.Event()}
+        waiters = self.bulk_waiters.setdefault(data_path.id, {})
+        waiters[barrier.xid] = pending
+        try:
+            if not data_path.send(b''.join(bufs + [barrier.buf])):
+                for dpid, index in xids.values():
+                    report["errors"].append(
+                        {"dpid": dpid, "index": index,
+                         "error": "Datapath is disconnected!"})
+                return
+            done = pending["done"].wait(timeout=self.BULK_TIMEOUT)
+        finally:
+            del waiters[barrier.xid]
+
+        for xid, error in pending["errors"].items():
+            dpid, index = xids[xid]
+            report["errors"].append(
+                {"dpid": dpid, "index": index, "error": error})
+        ok = len(xids) - len(pending["errors"])
+        report["installed" if done else "unconfirmed"] += ok
+
+    def bulk_error(self, msg):
+        """Records an error message received for an entry of a bulk upload
+        """
+        for pending in self.bulk_waiters.get(msg.datapath.id, {}).values():
+            if msg.xid in pending["xids"]:
+                pending["errors"][msg.xid] = "Error type {} code {}".format(
+                    msg.type, msg.code)
 
-        # config_tree = {}
-        switches = [str(t[0]) for t in self.get_switches()]
-        for swconfig in configlist:    # for each
-            dpid = list(swconfig.keys())[0]
-            if dpid not in switches:
-                break
-            for flow in swconfig[dpid]:
-                flow['dpid'] = dpid
-                flow['operation'] = 'add'
-                _ = self.process_flow_message(flow)
-        return 'Flows added successfully!'
+    def bulk_barrier(self, msg):
+        """Completes a bulk upload on reception of its barrier reply
+        """
+        pending = self.bulk_waiters.get(msg.datapath.id, {}).get(msg.xid)
+        if pending:
+            pending["done"].set()
 
     # @set_ev_cls(event.EventSwitchEnter)
 
     def get_topology_data(self):
         """Get Topology Data
         """
-        switch_list = get_all_switch(self.app)
-        switches = [switch.to_dict() for switch in switch_list]
-        links_list = get_all_link(self.app)
-        links = [link.to_dict() for link in links_list]
-        host_list = get_all_host(self.app)
-
-        # To remove hosts that are not removed by controller
-        ports = []
-        for switch in switch_list:
-            ports += switch.ports
-        port_macs = [p.hw_addr for p in ports]
-        n_host_list = [h for h in host_list if h.port.hw_addr in port_macs]
-
-        hosts = [h.to_dict() for h in n_host_list]
-        return {"switches": switches, "links": links, "hosts": hosts}
+        return self.topology.data()
 
     def delete_flow_list(self, flowlist):
         """Delete a set of flows
@@ -338,6 +339,129 @@ class CtrlApi():
             return func(data_path, self.waiters)
         return None
 
+    def get_mirror(self, dpid, kind=FLOWS, since=None, **filters):
+        """Returns entries of table kind (flows, groups or meters) of switch
+        dpid from its mirror, or the changes (of all tables) since version
+        since. Flows can be filtered by table_id, cookie and/or priority.
+
+        Returns None if the switch is unknown, and changes are None if
+        they are no longer all logged (the client must reload the tables).
+        """
+        mirror = self.mirror.switches.get(dpid)
+        if mirror is None or kind not in (FLOWS, GROUPS, METERS):
+            return None
+        if since is not None:
+            changes = mirror.since(since)
+            if changes is not None:
+                changes = [{"version": version, "op": op, "kind": kind,
+                            "entry": record}
+                           for version, op, kind, record in changes]
+            return {"version": mirror.version, "changes": changes}
+
+        if kind == FLOWS:
+            entries = mirror.flows(**filters)
+        else:
+            entries = list(mirror.tables[kind].values())
+        return {"version": mirror.version, "entries": entries}
+
+    def _reconcile_loop(self):
+        """Reconciles the mirror with the tables of each switch in turn, at
+        a low rate (each switch once per RECONCILE_PERIOD)
+        """
+        while True:
+            switches = dict(self.get_switches()) if self.dpset else {}
+            for dpid in list(self.mirror.switches):
+                if dpid not in switches:
+                    self.mirror.forget(dpid)
+            if not switches:
+                hub.sleep(self.RECONCILE_PERIOD)
+            for dpid, data_path in switches.items():
+                hub.sleep(self.RECONCILE_PERIOD / len(switches))
+                try:
+                    self._reconcile(data_path)
+                except Exception as err:
+                    logger.error("Error at reconciliation of %s: %s",
+                                 dpid, err)
+
+    def _reconcile(self, data_path):
+        ofproto = data_path.ofproto
+        parser = data_path.ofproto_parser
+        requests = (
+            (FLOWS, parser.OFPFlowStatsRequest(
+                data_path, 0, ofproto.OFPTT_ALL, ofproto.OFPP_ANY,
+                ofproto.OFPG_ANY, 0, 0, parser.OFPMatch())),
+            (GROUPS, parser.OFPGroupDescStatsRequest(data_path, 0)),
+            (METERS, parser.OFPMeterConfigStatsRequest(
+                data_path, 0, ofproto.OFPM_ALL)))
+        mirror = self.mirror.get(data_path.id)
+        for kind, stats in requests:
+            version = mirror.version
+            msgs = []
+            ofctl_utils.send_stats_request(
+                data_path, stats, self.waiters, msgs, logger)
+            # skip incomplete replies, and tables changed meanwhile (they
+            # will be reconciled next time)
+            if (not msgs or msgs[-1].flags & ofproto.OFPMPF_REPLY_MORE
+                    or mirror.version != version):
+                continue
+            self.mirror.reconcile(data_path.id, kind,
+                                  [body for msg in msgs for body in msg.body])
+
+    def get_stats_all(self, request, dpids=None, timeout=STATS_TIMEOUT):
+        """Sends a stats request to all (or selected) switches at once and
+        merges their replies as they arrive (in stats_reply_handler).
+
+        request is "flows", "groups", "meters" or a key of reqfunction.
+        Switches that do not reply within timeout seconds are listed under
+        "timeout" instead of holding up the others (their replies, if any,
+        are discarded).
+        """
+        if request in ("flows", "groups", "meters"):
+            def func(dpid, data_path):
+                return self.get_stats(request, dpid)
+        elif request in self.reqfunction:
+            def func(dpid, data_path):
+                return self.reqfunction[request](data_path, self.waiters)
+        else:
+            return None
+
+        switches = dict(self.get_switches())
+        if dpids is not None:
+            switches = {dpid: switches[dpid] for dpid in dpids
+                        if dpid in switches}
+        replies = {}
+
+        def _get_stats(dpid, data_path):
+            try:
+                replies[dpid] = func(dpid, data_path)
+            except Exception as err:
+                replies[dpid] = err
+
+        threads = [hub.spawn(_get_stats, dpid, data_path)
+                   for dpid, data_path in switches.items()]
+        with hub.Timeout(timeout, False):
+            hub.joinall(threads)
+
+        result = {"stats": {}, "timeout": [], "errors": {}}
+        for dpid in switches:
+            if dpid not in replies:
+                result["timeout"].append(dpid)
+            elif isinstance(replies[dpid], Exception):
+                result["errors"][dpid] = repr(replies[dpid])
+            elif replies[dpid]:
+                self._merge(result["stats"], replies[dpid])
+        return result
+
+    def _merge(self, merged, reply):
+        """Merges reply (dict keyed by dpid, or by kind of stats then by
+        dpid) into merged
+        """
+        for key, value in reply.items():
+            if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                self._merge(merged[key], value)
+            else:
+                merged[key] = value
+
     def process_flow_message(self, flow_entry):
         """Process Flow Mod message
         """
@@ -346,105 +470,7 @@ class CtrlApi():
         if not data_path:
             return "Datapath does not exist!"
 
-        ofproto = data_path.ofproto
-        parser = data_path.ofproto_parser
-
-        command = {
-            'add': ofproto.OFPFC_ADD,
-            'mod': ofproto.OFPFC_MODIFY,
-            'modst': ofproto.OFPFC_MODIFY_STRICT,
-            'del': ofproto.OFPFC_DELETE,
-            'delst': ofproto.OFPFC_DELETE_STRICT,
-        }
-
-        # Initialize arguments for the flow mod message
-        msg_kwargs = {
-            'datapath': data_path,
-            'command': command.get(flow_entry["operation"], ofproto.OFPFC_ADD),
-            'buffer_id': ofproto.OFP_NO_BUFFER,
-        }
-
-        msg_kwargs['table_id'] = flow_entry.get('table_id', 0)
-
-        # Match fields
-        mf = flow_entry.get("match", None)
-        # convert port names to numbers
-        if "in_port" in mf:
-            x = mf["in_port"]
-            mf["in_port"] = self.port_id[x] if x in self.port_id else x
-        # convert masks to tuples
-        for f in mf:
-            mask_pos = str(mf[f]).find('/')
-            if mask_pos >= 0:
-                parts = mf[f].split('/')
-                mf[f] = (parts[0], parts[1])
-            if str(mf[f]).startswith('0x'):
-                mf[f] = int(mf[f], 16)
-
-        msg_kwargs['match'] = parser.OFPMatch(**mf) if mf else None
-
-        msg_kwargs['hard_timeout'] = flow_entry.get('hard_timeout', 0)
-        msg_kwargs['idle_timeout'] = flow_entry.get('idle_timeout', 0)
-        msg_kwargs['priority'] = flow_entry.get('priority', 0)
-        msg_kwargs['cookie'] = flow_entry.get('cookie', 0)
-        msg_kwargs['cookie_mask'] = flow_entry.get('cookie_mask', 0)
-        op = flow_entry.get('out_port', -1)  # make it 0
-        og = flow_entry.get('out_group', -1)
-        msg_kwargs['out_port'] = ofproto.OFPP_ANY if op <= 0 else op
-        msg_kwargs['out_group'] = ofproto.OFPG_ANY if og <= 0 else og
-
-        # instructions
-        inst = []
-        if "actions" in flow_entry:  # Ryu's format
-            inst = self._get_instructions(
-                flow_entry['actions'], ofproto, parser)
-        else:              # FlowManager's format
-            # Goto meter
-            if ("meter_id" in flow_entry) and flow_entry['meter_id']:
-                inst += [parser.OFPInstructionMeter(flow_entry["meter_id"])]
-            # Apply Actions
-            if ("apply" in flow_entry) and flow_entry["apply"]:
-                applyActions = self.get_actions(parser, flow_entry["apply"])
-                inst += [parser.OFPInstructionActions(
-                    ofproto.OFPIT_APPLY_ACTIONS, applyActions)]
-            # Clear Actions
-            if ("clearactions" in flow_entry) and flow_entry["clearactions"]:
-                inst += [parser.OFPInstructionActions(
-                    ofproto.OFPIT_CLEAR_ACTIONS, [])]
-            # Write Actions
-            if ("write" in flow_entry) and flow_entry["write"]:
-                # bc actions must be unique they are in dict
-                # from dict to list
-                toList = [{k: flow_entry["write"][k]}
-                          for k in flow_entry["write"]]
-                # print(toList)
-                writeActions = self.get_actions(parser, toList)
-                inst += [parser.OFPInstructionActions(
-                    ofproto.OFPIT_WRITE_ACTIONS, writeActions)]
-            # Write Metadata
-            if ("metadata" in flow_entry) and flow_entry["metadata"]:
-                meta_mask = flow_entry.get("metadata_mask", 0)
-                inst += [parser.OFPInstructionWriteMetadata(
-                    flow_entry["metadata"], meta_mask)]
-            # Goto Table Metadata
-            if ("goto" in flow_entry) and flow_entry["goto"]:
-                inst += [parser.OFPInstructionGotoTable(
-                    table_id=flow_entry["goto"])]
-
-        msg_kwargs['instructions'] = inst
-
-        # Flags
-        flags = 0
-        flags += 0x01 if flow_entry.get('SEND_FLOW_REM', False) else 0
-        flags += 0x02 if flow_entry.get('CHECK_OVERLAP', False) else 0
-        flags += 0x04 if flow_entry.get('RESET_COUNTS', False) else 0
-        flags += 0x08 if flow_entry.get('NO_PKT_COUNTS', False) else 0
-        flags += 0x10 if flow_entry.get('NO_BYT_COUNTS', False) else 0
-
-        msg_kwargs['flags'] = flags
-
-        # ryu/ryu/ofproto/ofproto_v1_3_parser.py
-        msg = parser.OFPFlowMod(**msg_kwargs)
+        msg = self._flow_mod(data_path, flow_entry)
         try:
             data_path.send_msg(msg)    # ryu/ryu/controller/controller.py
         except KeyError as err:
@@ -453,8 +479,15 @@ class CtrlApi():
             print(msg)
             return "Error " + err.__repr__()
 
+        self.mirror.apply(data_path.id, msg)
         return "Message sent successfully."
 
+    def _flow_mod(self, data_path, flow_entry):
+        """Builds Flow Mod message (from compiled template of flow_entry)
+        """
+        return compile_flow(data_path.ofproto, data_path.ofproto_parser,
+                            flow_entry).flow_mod(data_path)
+
     def process_group_message(self, d):
         """Sends group form data to the switch to update group tables.
         """
@@ -463,6 +496,20 @@ class CtrlApi():
         if not data_path:
             return "Datapath does not exist!"
 
+        group_mod = self._group_mod(data_path, d)
+        try:
+            data_path.send_msg(group_mod)    # ryu/ryu/controller/controller.py
+        except KeyError as err:
+            return err.__repr__()
+        except Exception as err:
+            return err.__repr__()
+
+        self.mirror.apply(data_path.id, group_mod)
+        return "Message sent successfully."
+
+    def _group_mod(self, data_path, d):
+        """Builds Group Mod message
+        """
         ofproto = data_path.ofproto
         parser = data_path.ofproto_parser
 
@@ -508,26 +555,30 @@ class CtrlApi():
                     weight, watch_port, watch_group, actions))
 
         #print(dp, cmd, gtype, group_id, buckets)
-        group_mod = parser.OFPGroupMod(
-            data_path, cmd, gtype, group_id, buckets)
+        return parser.OFPGroupMod(data_path, cmd, gtype, group_id, buckets)
+
+    def process_meter_message(self, d):
+        """Sends meter form data to the switch to update meter table.
+        """
+        dpid = int(d.get("dpid", 0))
+        data_path = self.dpset.get(dpid)
+        if not data_path:
+            return "Datapath does not exist!"
 
+        meter_mod = self._meter_mod(data_path, d)
         try:
-            data_path.send_msg(group_mod)    # ryu/ryu/controller/controller.py
+            data_path.send_msg(meter_mod)
         except KeyError as err:
             return err.__repr__()
         except Exception as err:
             return err.__repr__()
 
+        self.mirror.apply(data_path.id, meter_mod)
         return "Message sent successfully."
 
-    def process_meter_message(self, d):
-        """Sends meter form data to the switch to update meter table.
+    def _meter_mod(self, data_path, d):
+        """Builds Meter Mod message
         """
-        dpid = int(d.get("dpid", 0))
-        data_path = self.dpset.get(dpid)
-        if not data_path:
-            return "Datapath does not exist!"
-
         ofproto = data_path.ofproto
         parser = data_path.ofproto_parser
 
@@ -576,15 +627,7 @@ class CtrlApi():
                     bands += [parser.OFPMeterBandDscpRemark(rate=band[1],
                                                             burst_size=band[2], prec_level=band[3])]
 
-        meter_mod = parser.OFPMeterMod(data_path, cmd, flags, meter_id, bands)
-        try:
-            data_path.send_msg(meter_mod)
-        except KeyError as err:
-            return err.__repr__()
-        except Exception as err:
-            return err.__repr__()
-
-        return "Message sent successfully."
+        return parser.OFPMeterMod(data_path, cmd, flags, meter_id, bands)
 
     # def get_flow_stats(self, req, dpid): # unused
     #     flow = {}  # no filters
@@ -592,5 +635,5 @@ class CtrlApi():
     #     return self.ofctl.get_flow_stats(dp, self.waiters, flow)
 
 
-# This is is needed for get_topology_data()
+# This is is needed for the topology view
 app_manager.require_app('ryu.topology.switches', api_style=True)
@@ -0,0 +1,366 @@
+# Copyright (c) 2018-2022 Maen Artimy
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This module compiles flow entries in JSON format (Ryu's and FlowManager's)
+into immutable templates of Flow Mod messages.
+
+Parsed matches, actions and instructions, and compiled templates, are kept
+in LRU caches, so repeated installs of the same entry (or of entries sharing
+their matches or actions) skip parsing entirely. Fields that change from an
+install to the next (priority, cookie, timeouts...) can be given to the
+template instead of compiling a new entry.
+
+Templates are also serialized once: messages are serialized by patching the
+xid, the fields given and the match (from match fields compiled and
+serialized once per value) into a copy of the template's bytes.
+"""
+
+from functools import lru_cache
+from struct import pack, pack_into
+from types import MappingProxyType
+
+
+PORT_ID = MappingProxyType({
+    "IN_PORT": 0xfffffff8,
+    "TABLE": 0xfffffff9,
+    "NORMAL": 0xfffffffa,
+    "FLOOD": 0xfffffffb,
+    "ALL": 0xfffffffc,
+    "CONTROLLER": 0xfffffffd,
+    "LOCAL": 0xfffffffe,
+    "ANY": 0xffffffff
+})
+
+CACHE_SIZE = 4096  # entries of each LRU cache
+
+# fields of the fixed part of Flow Mod messages (OpenFlow 1.3 layout), after
+# the header
+FLOW_MOD_FIELDS = ('cookie', 'cookie_mask', 'table_id', 'command',
+                   'idle_timeout', 'hard_timeout', 'priority', 'buffer_id',
+                   'out_port', 'out_group', 'flags')
+
+
+@lru_cache(maxsize=None)
+def action_table(parser):
+    """Returns table of actions supported by ofproto parser (built once per
+    ofproto version), mapping action name to class and argument name.
+    """
+    return MappingProxyType({
+        'SET_FIELD': (parser.OFPActionSetField, 'field'),
+        'COPY_TTL_OUT': (parser.OFPActionCopyTtlOut, None),
+        'COPY_TTL_IN': (parser.OFPActionCopyTtlIn, None),
+        'POP_PBB': (parser.OFPActionPopPbb, None),
+        'PUSH_PBB': (parser.OFPActionPushPbb, 'ethertype'),
+        'POP_MPLS': (parser.OFPActionPopMpls, 'ethertype'),
+        'PUSH_MPLS': (parser.OFPActionPushMpls, 'ethertype'),
+        'POP_VLAN': (parser.OFPActionPopVlan, None),
+        'PUSH_VLAN': (parser.OFPActionPushVlan, 'ethertype'),
+        'DEC_MPLS_TTL': (parser.OFPActionDecMplsTtl, None),
+        'SET_MPLS_TTL': (parser.OFPActionSetMplsTtl, 'mpls_ttl'),
+        'DEC_NW_TTL': (parser.OFPActionDecNwTtl, None),
+        'SET_NW_TTL': (parser.OFPActionSetNwTtl, 'nw_ttl'),
+        'SET_QUEUE': (parser.OFPActionSetQueue, 'queue_id'),
+        'GROUP': (parser.OFPActionGroup, 'group_id'),
+        'OUTPUT': (parser.OFPActionOutput, 'port'),
+    })
+
+
+def freeze(value):
+    """Returns hashable copy of value (dicts and lists become tuples), to be
+    used as cache key.
+    """
+    if isinstance(value, dict):
+        return tuple((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_action(parser, key, value):
+    """Returns action object of action key with value
+    """
+    table = action_table(parser)
+    if key not in table:
+        raise Exception("Action {} not supported!".format(key))
+    found_action, arg = table[key]
+    if not arg:  # check if the action needs a value
+        return found_action()
+    if arg == 'field':
+        a_value = value.split('=')
+        val = 0
+        if len(a_value) > 1:
+            val = int(a_value[1]) if a_value[1].isdigit() else a_value[1]
+        return found_action(**{a_value[0]: val})
+    if arg == 'port':
+        a_value = value.upper()
+        val = PORT_ID[a_value] if a_value in PORT_ID else int(a_value)
+        return found_action(**{arg: val})
+    return found_action(**{arg: int(value)})
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_actions(parser, action_set):
+    """Returns tuple of action objects of action_set (frozen list of
+    {action: value} dicts)
+    """
+    return tuple(compile_action(parser, key, value)
+                 for action in action_set for key, value in action[:1])
+
+
+def match_value(field, value):
+    """Returns value of match field converted from JSON format (port names,
+    masks and hexadecimal strings) to the format of OFPMatch
+    """
+    # convert port names to numbers
+    if field == "in_port" and value in PORT_ID:
+        value = PORT_ID[value]
+    # convert masks to tuples
+    if str(value).find('/') >= 0:
+        parts = value.split('/')
+        value = (parts[0], parts[1])
+    if str(value).startswith('0x'):
+        value = int(value, 16)
+    return value
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_match(parser, match):
+    """Returns OFPMatch of match (frozen dict of match fields), or None if
+    there is no match field
+    """
+    mf = {f: match_value(f, value) for f, value in match or ()}
+    return parser.OFPMatch(**mf) if mf else None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_match_field(ofproto, field, value):
+    """Returns (OXM type, (field, value) item of OFPMatch, serialized OXM
+    TLV) of match field with value (in JSON format)
+    """
+    field, value = ofproto.oxm_normalize_user(field, match_value(field, value))
+    num, value, mask = ofproto.oxm_from_user(field, value)
+    buf = bytearray()
+    ofproto.oxm_serialize(num, value, mask, buf, 0)
+    return (num[0] if isinstance(num, tuple) else num,
+            ofproto.oxm_to_user(num, value, mask), bytes(buf))
+
+
+def compile_match_fields(ofproto, match):
+    """Returns compiled fields (see compile_match_field) of match (frozen
+    dict of match fields), in the order of OFPMatch
+    """
+    return tuple(sorted(compile_match_field(ofproto, f, value)
+                        for f, value in match or ()))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_instructions(ofproto, parser, actions):
+    """Returns tuple of instruction objects of actions (frozen list in Ryu's
+    format)
+    """
+    inst = []
+    apply_actions = []
+    write_actions = []
+
+    for item in actions:
+        if isinstance(item, str):
+            if item.startswith('WRITE_METADATA'):
+                metadata = item.split(':')[1].split('/')
+                # expecting hex data
+                inst += [parser.OFPInstructionWriteMetadata(
+                    int(metadata[0], 16), int(metadata[1], 16))]
+            elif item.startswith('GOTO_TABLE'):
+                table_id = int(item.split(':')[1])
+                inst += [parser.OFPInstructionGotoTable(table_id)]
+            elif item.startswith('METER'):
+                meter_id = int(item.split(':')[1])
+                inst += [parser.OFPInstructionMeter(meter_id)]
+            elif item.startswith('CLEAR_ACTIONS'):
+                inst += [parser.OFPInstructionActions(
+                    ofproto.OFPIT_CLEAR_ACTIONS, [])]
+            else:  # Apply Actions
+                action = item.split(':')
+                apply_actions += [((action[0], action[1]),)]
+
+        elif isinstance(item, tuple):  # WRITE ACTIONS (frozen dict)
+            wractions = dict(item)["WRITE_ACTIONS"]
+            for witem in wractions:
+                action = witem.split(':')
+                write_actions += [((action[0], action[1]),)]
+
+    if apply_actions:
+        inst += [parser.OFPInstructionActions(
+            ofproto.OFPIT_APPLY_ACTIONS,
+            list(compile_actions(parser, tuple(apply_actions))))]
+
+    if write_actions:
+        inst += [parser.OFPInstructionActions(
+            ofproto.OFPIT_WRITE_ACTIONS,
+            list(compile_actions(parser, tuple(write_actions))))]
+
+    return tuple(inst)
+
+
+class FlowTemplate():
+    """Immutable compiled flow entry, which makes Flow Mod messages
+    """
+
+    __slots__ = ('kwargs', '_parts')
+
+    def __init__(self, kwargs):
+        object.__setattr__(self, 'kwargs', MappingProxyType(kwargs))
+        object.__setattr__(self, '_parts', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('flow templates are read-only')
+
+    def flow_mod(self, datapath, **fields):
+        """Returns Flow Mod message for datapath, with fields (e.g. priority
+        or cookie) overriding those of the template
+        """
+        kwargs = dict(self.kwargs, **fields) if fields else self.kwargs
+        return datapath.ofproto_parser.OFPFlowMod(datapath, **kwargs)
+
+    def serialize(self, datapath, xid, match=None, **fields):
+        """Returns bytes of flow_mod(datapath, **fields) with xid, and with
+        match (compiled fields, see compile_match_fields) if given.
+
+        The template is serialized once, then only the xid, the fields
+        (those of the fixed part of the message, see FLOW_MOD_FIELDS) and
+        the match are patched into a copy of its bytes.
+        """
+        if self._parts is None:
+            object.__setattr__(self, '_parts', self._split(datapath))
+        head, match_buf, tail = self._parts
+        ofproto = datapath.ofproto
+        if fields:
+            kwargs = dict(self.kwargs, **fields)
+            head = bytearray(head)
+            pack_into(ofproto.OFP_FLOW_MOD_PACK_STR0, head,
+                      ofproto.OFP_HEADER_SIZE,
+                      *(kwargs[field] for field in FLOW_MOD_FIELDS))
+        if match is not None:
+            tlvs = b''.join(field[2] for field in match)
+            length = 4 + len(tlvs)  # type and length, then the TLVs
+            match_buf = (pack('!HH', ofproto.OFPMT_OXM, length) + tlvs
+                         + bytes(-length % 8))
+        buf = bytearray(head + match_buf + tail)
+        pack_into('!HI', buf, 2, len(buf), xid)
+        return buf
+
+    def _split(self, datapath):
+        # fixed part, match and instructions of the serialized template
+        msg = self.flow_mod(datapath)
+        msg.serialize()
+        ofproto = datapath.ofproto
+        start = ofproto.OFP_FLOW_MOD_SIZE - ofproto.OFP_MATCH_SIZE
+        end = start + msg.match.length + (-msg.match.length % 8)
+        return (bytes(msg.buf[:start]), bytes(msg.buf[start:end]),
+                bytes(msg.buf[end:]))
+
+
+def compile_flow(ofproto, parser, flow_entry):
+    """Returns FlowTemplate of flow_entry (dict in JSON format), which is
+    left untouched
+    """
+    # the same template serves all switches
+    return _compile_flow(ofproto, parser, freeze(
+        {k: v for k, v in flow_entry.items() if k != 'dpid'}))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _compile_flow(ofproto, parser, frozen_entry):
+    flow_entry = dict(frozen_entry)
+
+    command = {
+        'add': ofproto.OFPFC_ADD,
+        'mod': ofproto.OFPFC_MODIFY,
+        'modst': ofproto.OFPFC_MODIFY_STRICT,
+        'del': ofproto.OFPFC_DELETE,
+        'delst': ofproto.OFPFC_DELETE_STRICT,
+    }
+
+    # Initialize arguments for the flow mod message
+    msg_kwargs = {
+        'command': command.get(flow_entry.get("operation"), ofproto.OFPFC_ADD),
+        'buffer_id': ofproto.OFP_NO_BUFFER,
+    }
+
+    msg_kwargs['table_id'] = flow_entry.get('table_id', 0)
+
+    # Match fields
+    msg_kwargs['match'] = compile_match(parser, flow_entry.get("match"))
+
+    msg_kwargs['hard_timeout'] = flow_entry.get('hard_timeout', 0)
+    msg_kwargs['idle_timeout'] = flow_entry.get('idle_timeout', 0)
+    msg_kwargs['priority'] = flow_entry.get('priority', 0)
+    msg_kwargs['cookie'] = flow_entry.get('cookie', 0)
+    msg_kwargs['cookie_mask'] = flow_entry.get('cookie_mask', 0)
+    op = flow_entry.get('out_port', -1)  # make it 0
+    og = flow_entry.get('out_group', -1)
+    msg_kwargs['out_port'] = ofproto.OFPP_ANY if op <= 0 else op
+    msg_kwargs['out_group'] = ofproto.OFPG_ANY if og <= 0 else og
+
+    # instructions
+    inst = []
+    if "actions" in flow_entry:  # Ryu's format
+        inst = list(compile_instructions(
+            ofproto, parser, flow_entry['actions']))
+    else:              # FlowManager's format
+        # Goto meter
+        if flow_entry.get("meter_id"):
+            inst += [parser.OFPInstructionMeter(flow_entry["meter_id"])]
+        # Apply Actions
+        if flow_entry.get("apply"):
+            inst += [parser.OFPInstructionActions(
+                ofproto.OFPIT_APPLY_ACTIONS,
+                list(compile_actions(parser, flow_entry["apply"])))]
+        # Clear Actions
+        if flow_entry.get("clearactions"):
+            inst += [parser.OFPInstructionActions(
+                ofproto.OFPIT_CLEAR_ACTIONS, [])]
+        # Write Actions
+        if flow_entry.get("write"):
+            # bc actions must be unique they are in dict
+            # from dict to list
+            to_list = tuple((item,) for item in flow_entry["write"])
+            inst += [parser.OFPInstructionActions(
+                ofproto.OFPIT_WRITE_ACTIONS,
+                list(compile_actions(parser, to_list)))]
+        # Write Metadata
+        if flow_entry.get("metadata"):
+            meta_mask = flow_entry.get("metadata_mask", 0)
+            inst += [parser.OFPInstructionWriteMetadata(
+                flow_entry["metadata"], meta_mask)]
+        # Goto Table Metadata
+        if flow_entry.get("goto"):
+            inst += [parser.OFPInstructionGotoTable(
+                table_id=flow_entry["goto"])]
+
+    msg_kwargs['instructions'] = tuple(inst)
+
+    # Flags
+    flags = 0
+    flags += 0x01 if flow_entry.get('SEND_FLOW_REM', False) else 0
+    flags += 0x02 if flow_entry.get('CHECK_OVERLAP', False) else 0
+    flags += 0x04 if flow_entry.get('RESET_COUNTS', False) else 0
+    flags += 0x08 if flow_entry.get('NO_PKT_COUNTS', False) else 0
+    flags += 0x10 if flow_entry.get('NO_BYT_COUNTS', False) else 0
+
+    msg_kwargs['flags'] = flags
+
+    return FlowTemplate(msg_kwargs)
@@ -20,8 +20,8 @@ The main module of the FlowManager Applications
 import os
 import sys
 import logging
+import logging.handlers
 import time
-import json
 
 from ryu.base import app_manager
 from ryu.app.wsgi import WSGIApplication
@@ -34,6 +34,7 @@ from ryu.controller.handler import MAIN_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 
 from ryu.ofproto import ofproto_v1_3
+from ryu.topology import event as topo_event
 from ryu.lib import ofctl_v1_3
 from ryu.lib import hub
 # from ryu.lib import ofctl_utils
@@ -46,10 +47,14 @@ from ryu.lib.packet import ether_types
 
 from webapi import WebApi
 from ctrlapi import CtrlApi
+from pushhub import PushHub, PUSH_WINDOW
+from assets import AssetCache
 
 
 LOGLEVEL = logging.INFO
 LOGFILE = "flwmgr.log"
+LOG_MAX_BYTES = 10 * 2**20  # size at which the log file is rotated
+LOG_BACKUPS = 3  # rotated log files kept
 MONITOR_PKTIN = False
 MAGIC_COOKIE = 0x00007ab700000000
 PYTHON3 = sys.version_info > (3, 0)
@@ -71,11 +76,17 @@ class FlowManager(app_manager.RyuApp):
         super(FlowManager, self).__init__(*args, **kwargs)
         self.wsgi = None #kwargs['wsgi']
         self.dpset = None #kwargs['dpset']
+        self.history = None  # set by main app (store of the tsdb sink)
+        self.tracker_version = 0  # version of tracker last sent to clients
         hub.spawn(self._get_services)
         #self.writer = None
         self.ofctl = ofctl_v1_3
         #self.ws_manager = self.wsgi.websocketmanager
         self.ctrl_api = CtrlApi(self)
+        self.push_hub = PushHub(PUSH_WINDOW)
+        self.assets = AssetCache(os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "web"))
+        hub.spawn(self.assets.preload)
 
         # Data exchanged with WebApi
         #self.wsgi.register(WebApi, {"webctl": self.ctrl_api})
@@ -86,7 +97,9 @@ class FlowManager(app_manager.RyuApp):
         while not self.wsgi and not self.dpset:
             hub.sleep(1)
         self.ws_manager = self.wsgi.websocketmanager
-        self.wsgi.register(WebApi, {"webctl": self.ctrl_api})
+        self.wsgi.register(WebApi, {"webctl": self.ctrl_api,
+                                    "history": self.history,
+                                    "assets": self.assets})
 
     def get_packet_summary(self, content):
         """Get some packet information
@@ -162,6 +175,7 @@ class FlowManager(app_manager.RyuApp):
         log = list(
             map(str, ['Removed', data_path.id, msg.table_id, reason, match, msg.cookie]))
         logger.debug(', '.join(log))
+        self.ctrl_api.mirror.flow_removed(data_path.id, msg)
 
     @set_ev_cls(ofp_event.EventOFPErrorMsg,
                 [HANDSHAKE_DISPATCHER, CONFIG_DISPATCHER, MAIN_DISPATCHER])
@@ -176,6 +190,24 @@ class FlowManager(app_manager.RyuApp):
         log = list(
             map(str, ['ErrorMsg', data_path.id, msg.type, msg.code]))
         logger.error(', '.join(log))
+        self.ctrl_api.bulk_error(msg)
+
+    @set_ev_cls([topo_event.EventSwitchEnter, topo_event.EventSwitchLeave,
+                 topo_event.EventSwitchReconnected, topo_event.EventPortAdd,
+                 topo_event.EventPortDelete, topo_event.EventPortModify,
+                 topo_event.EventLinkAdd, topo_event.EventLinkDelete,
+                 topo_event.EventHostAdd, topo_event.EventHostDelete,
+                 topo_event.EventHostMove])
+    def topology_change_handler(self, event):
+        """Handles topology changes (keeps the topology view up to date)
+        """
+        self.ctrl_api.topology.update(event)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, event):
+        """Handles a barrier reply (end of a bulk upload)
+        """
+        self.ctrl_api.bulk_barrier(event.msg)
 
     '''
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
@@ -196,17 +228,18 @@ class FlowManager(app_manager.RyuApp):
             return
 
         # Monitor packets. Flow entries with cookies take precedance
-        tracked_msg = None
+        tracker = self.ctrl_api.get_tracker()
+        tracked = None
         if msg.cookie & MAGIC_COOKIE == MAGIC_COOKIE:
             # track the packet if it has a magic cookie
-            tracked_msg = self.ctrl_api.get_tracker().track(msg.cookie, pkt)
+            tracked = tracker.track(msg.cookie, pkt)
         elif MONITOR_PKTIN:
             # track the packet the global tracking option is enabled
-            tracked_msg = self.ctrl_api.get_tracker().track(MAGIC_COOKIE, pkt)
+            tracked = tracker.track(MAGIC_COOKIE, pkt)
 
-        # Send the tracked message to the interface
-        if tracked_msg:
-            self.rpc_broadcall("update", tracked_msg)
+        # Send the changed nodes to the interface (once per push window)
+        if tracked:
+            self.push_hub.publish_state("diff", self.tracker_diff)
 
         # Continue the normal processing of Packet_In
 
@@ -226,12 +259,16 @@ class FlowManager(app_manager.RyuApp):
         self.rpc_broadcall("log", log)
     '''
     
+    def tracker_diff(self):
+        """Returns changes of tracker since last sent to clients
+        """
+        diff = self.ctrl_api.get_tracker().diff(self.tracker_version)
+        self.tracker_version = diff["version"]
+        return diff
+
     def rpc_broadcall(self, func, msg):
-        msg = {"method": func, "params": msg}
-        try:
-            self.ws_manager.broadcast(json.dumps(msg))
-        except Exception as err:
-            logger.error("Error at rpc_broadcall %s", err)
+        # merged with other messages and sent off the caller's greenlet
+        self.push_hub.publish(func, msg)
 
 
 def get_logger(logfile_name, loglevel):
@@ -239,7 +276,9 @@ def get_logger(logfile_name, loglevel):
     """
     a_logger = logging.getLogger("flowmanager")
     a_logger.setLevel(loglevel)
-    f_handler = logging.FileHandler(logfile_name, mode="w")
+    open(logfile_name, "w").close()  # start with an empty log
+    f_handler = logging.handlers.RotatingFileHandler(
+        logfile_name, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
     f_format = logging.Formatter(
         '%(asctime)s:%(name)s:%(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
     f_handler.setFormatter(f_format)
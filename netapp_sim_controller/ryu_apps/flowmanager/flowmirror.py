@@ -0,0 +1,310 @@
+# Copyright (c) 2018-2022 Maen Artimy
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This module keeps a controller-side mirror of the flow, group and meter
+tables of each switch, so that reads (and "changes since version N"
+queries) are served from memory without a switch round trip.
+
+Mirrors are updated from the messages the controller sends (FlowMod,
+GroupMod, MeterMod), from flow removed events and from periodic
+reconciliation with the switches' own tables.
+"""
+
+from collections import deque
+from functools import lru_cache
+
+from ryu.lib import ofctl_v1_3
+from ryu.ofproto import ofproto_v1_3_parser
+
+
+FLOWS = "flows"
+GROUPS = "groups"
+METERS = "meters"
+
+CHANGELOG_SIZE = 10000  # changes kept per switch for delta queries
+OFPTT_ALL = 0xff
+CACHE_SIZE = 4096  # conversions of match fields and instructions kept
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _match_field_str(field, value):
+    # ofctl looks port numbers up in the ofproto module on each conversion,
+    # so each match field is converted once
+    match = ofproto_v1_3_parser.OFPMatch(_ordered_fields=[(field, value)])
+    return next(iter(ofctl_v1_3.match_to_str(match).items()))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _instruction_str(instruction):
+    return tuple(ofctl_v1_3.actions_to_str([instruction]))
+
+
+def match_str(match):
+    """Returns ofctl's dict of match (OFPMatch)
+    """
+    record = {}
+    for field, value in match.items():
+        key, value = _match_field_str(field, value)
+        record.setdefault(key, value)
+    return record
+
+
+def actions_str(instructions):
+    """Returns ofctl's list of actions of instructions
+    """
+    return [action for instruction in instructions
+            for action in _instruction_str(instruction)]
+
+
+def flow_record(entry):
+    """Returns JSON-ready dict of flow entry (OFPFlowMod or OFPFlowStats),
+    in the format of ofctl's flow stats
+    """
+    return {
+        "table_id": entry.table_id,
+        "priority": entry.priority,
+        "cookie": entry.cookie,
+        "idle_timeout": entry.idle_timeout,
+        "hard_timeout": entry.hard_timeout,
+        "flags": entry.flags,
+        "match": match_str(entry.match),
+        "actions": actions_str(entry.instructions),
+    }
+
+
+def group_record(entry):
+    """Returns JSON-ready dict of group (OFPGroupMod or OFPGroupDescStats)
+    """
+    return {
+        "group_id": entry.group_id,
+        "type": entry.type,
+        "buckets": [{
+            "weight": bucket.weight,
+            "watch_port": bucket.watch_port,
+            "watch_group": bucket.watch_group,
+            "actions": [ofctl_v1_3.action_to_str(action)
+                        for action in bucket.actions]
+        } for bucket in entry.buckets],
+    }
+
+
+def meter_record(entry):
+    """Returns JSON-ready dict of meter (OFPMeterMod or OFPMeterConfigStats)
+    """
+    return {
+        "meter_id": entry.meter_id,
+        "flags": entry.flags,
+        "bands": [band.to_jsondict() for band in entry.bands],
+    }
+
+
+def flow_key(table_id, priority, match):
+    """Returns key identifying a flow entry in its switch (as strict
+    FlowMods do)
+    """
+    return (table_id, priority, tuple(sorted(match.items())))
+
+
+class SwitchMirror():
+    """Mirror of the tables of a switch, with a version number incremented
+    on each change (from version) and a log of the latest changes
+    """
+
+    def __init__(self, version=0):
+        self.version = version
+        self.tables = {FLOWS: {}, GROUPS: {}, METERS: {}}
+        self.changes = deque(maxlen=CHANGELOG_SIZE)
+        # flow indexes: table_id / cookie / priority -> set of flow keys
+        self.indexes = {"table_id": {}, "cookie": {}, "priority": {}}
+
+    def put(self, kind, key, record):
+        """Adds or replaces entry of table kind
+        """
+        table = self.tables[kind]
+        if table.get(key) == record:
+            return
+        if kind == FLOWS:
+            if key in table:
+                self._unindex(key, table[key])
+            self._index(key, record)
+        table[key] = record
+        self._changed("put", kind, record)
+
+    def remove(self, kind, key):
+        """Removes entry of table kind, if any
+        """
+        record = self.tables[kind].pop(key, None)
+        if record is None:
+            return
+        if kind == FLOWS:
+            self._unindex(key, record)
+        self._changed("remove", kind, record)
+
+    def _changed(self, op, kind, record):
+        self.version += 1
+        self.changes.append((self.version, op, kind, record))
+
+    def _index(self, key, record):
+        for field, index in self.indexes.items():
+            index.setdefault(record[field], set()).add(key)
+
+    def _unindex(self, key, record):
+        for field, index in self.indexes.items():
+            keys = index.get(record[field])
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del index[record[field]]
+
+    def flows(self, **filters):
+        """Returns flow records, filtered by table_id, cookie and/or
+        priority (using indexes)
+        """
+        table = self.tables[FLOWS]
+        candidates = None
+        for field, value in filters.items():
+            if value is None:
+                continue
+            keys = self.indexes[field].get(value, set())
+            if candidates is None or len(keys) < len(candidates):
+                candidates, keys = keys, candidates
+            if keys is not None:
+                candidates = candidates & keys
+        if candidates is None:
+            return list(table.values())
+        return [table[key] for key in candidates]
+
+    def since(self, version):
+        """Returns list of changes (version, op, kind, record) after version,
+        or None if they are no longer all in the log (or if version is not
+        one of this mirror's)
+        """
+        if version > self.version:
+            return None
+        if version == self.version:
+            return []
+        if not self.changes or self.changes[0][0] > version + 1:
+            return None
+        return [change for change in self.changes if change[0] > version]
+
+
+class FlowMirror():
+    """Mirrors of all switches, keyed by dpid
+    """
+
+    def __init__(self):
+        self.switches = {}
+        self._versions = {}  # dpid -> first version of next mirror
+
+    def get(self, dpid):
+        """Returns SwitchMirror of switch dpid
+        """
+        mirror = self.switches.get(dpid)
+        if mirror is None:
+            mirror = self.switches[dpid] = SwitchMirror(
+                self._versions.pop(dpid, 0))
+        return mirror
+
+    def forget(self, dpid):
+        """Drops mirror of switch dpid. Versions of its next mirror follow
+        (with a gap) the ones of the dropped mirror, so that clients holding
+        one of them reload the tables instead of getting wrong changes
+        """
+        mirror = self.switches.pop(dpid, None)
+        if mirror is not None:
+            self._versions[dpid] = mirror.version + 1
+
+    def apply(self, dpid, msg):
+        """Updates mirror of switch dpid with message sent to it
+        """
+        name = msg.__class__.__name__
+        if name == "OFPFlowMod":
+            self._flow_mod(self.get(dpid), msg)
+        elif name == "OFPGroupMod":
+            ofp = msg.datapath.ofproto
+            self._table_mod(self.get(dpid), GROUPS, msg.group_id, msg,
+                            group_record, ofp.OFPGC_DELETE, ofp.OFPG_ALL)
+        elif name == "OFPMeterMod":
+            ofp = msg.datapath.ofproto
+            self._table_mod(self.get(dpid), METERS, msg.meter_id, msg,
+                            meter_record, ofp.OFPMC_DELETE, ofp.OFPM_ALL)
+
+    def flow_removed(self, dpid, msg):
+        """Updates mirror of switch dpid with flow removed message
+        """
+        self.get(dpid).remove(
+            FLOWS, flow_key(msg.table_id, msg.priority, msg.match))
+
+    def reconcile(self, dpid, kind, entries):
+        """Replaces table kind of switch dpid with entries (stats bodies
+        received from the switch), recording changes only
+        """
+        mirror = self.get(dpid)
+        if kind == FLOWS:
+            records = {flow_key(e.table_id, e.priority, e.match):
+                       flow_record(e) for e in entries}
+        elif kind == GROUPS:
+            records = {e.group_id: group_record(e) for e in entries}
+        else:
+            records = {e.meter_id: meter_record(e) for e in entries}
+        for key in [key for key in mirror.tables[kind]
+                    if key not in records]:
+            mirror.remove(kind, key)
+        for key, record in records.items():
+            mirror.put(kind, key, record)
+
+    def _flow_mod(self, mirror, msg):
+        ofp = msg.datapath.ofproto
+        if msg.command == ofp.OFPFC_ADD:
+            mirror.put(FLOWS, flow_key(msg.table_id, msg.priority, msg.match),
+                       flow_record(msg))
+            return
+
+        if msg.command in (ofp.OFPFC_MODIFY_STRICT, ofp.OFPFC_DELETE_STRICT):
+            key = flow_key(msg.table_id, msg.priority, msg.match)
+            keys = [key] if key in mirror.tables[FLOWS] else []
+        else:
+            # non-strict commands apply to all entries whose match includes
+            # the message's match fields
+            fields = list(msg.match.items())
+            table = mirror.tables[FLOWS]
+            keys = [key for key in (
+                        table if msg.table_id == OFPTT_ALL
+                        else mirror.indexes["table_id"].get(msg.table_id, ()))
+                    if all(item in key[2] for item in fields)]
+        if msg.cookie_mask:
+            keys = [key for key in keys
+                    if (mirror.tables[FLOWS][key]["cookie"] & msg.cookie_mask)
+                    == (msg.cookie & msg.cookie_mask)]
+
+        for key in list(keys):
+            if msg.command in (ofp.OFPFC_DELETE, ofp.OFPFC_DELETE_STRICT):
+                mirror.remove(FLOWS, key)
+            else:
+                record = dict(mirror.tables[FLOWS][key])
+                record["actions"] = actions_str(msg.instructions)
+                mirror.put(FLOWS, key, record)
+
+    def _table_mod(self, mirror, kind, key, msg, make_record, delete,
+                   all_ids):
+        if msg.command == delete:
+            if key == all_ids:
+                for k in list(mirror.tables[kind]):
+                    mirror.remove(kind, k)
+            else:
+                mirror.remove(kind, key)
+        else:
+            mirror.put(kind, key, make_record(msg))
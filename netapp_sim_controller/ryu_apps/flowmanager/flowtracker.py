@@ -46,50 +46,114 @@ UDP = udp.udp.__name__
 #         self._f.flush()
 
 
-class Tracker():
+class Node():
+    """Node of a tracker tree: a protocol header (or the tree's id, at the
+    root), its count of packets ending there and its children by name
+    """
+
+    __slots__ = ("name", "count", "children", "version")
+
+    def __init__(self, name, version=0):
+        self.name = name
+        self.count = 0
+        self.children = {}
+        self.version = version  # last change to the node or its subtree
+
+    def to_dict(self, since=None):
+        """Returns node as a dict, in the format of the web interface. If
+        since is given, only children changed after version since are kept.
+        """
+        node = {"name": self.name, "children": [
+            child.to_dict(since) for child in self.children.values()
+            if since is None or child.version > since]}
+        if self.count:
+            node["count"] = self.count
+        return node
+
 
-    all_stats = []
+class Tracker():
+    """Trees of the packets of tracked flows (one per flow cookie), with a
+    node per protocol header. Each change increments the tracker's version,
+    so the changes since a version can be sent instead of all trees.
+    """
+
+    def __init__(self):
+        self.roots = {}  # id -> Node
+        self.version = 0
+        self.cleared = {}  # id -> version at which tree was reset or created
+        self.removed = {}  # id -> version at which tree was untracked
+
+    @property
+    def all_stats(self):
+        return self.trees()
+
+    def trees(self):
+        """Returns all trees as dicts
+        """
+        return [root.to_dict() for root in self.roots.values()]
 
     def untrack(self, id):
-        if id in self.existing_name(self.all_stats):
-            root = self.get_name(id, self.all_stats)
-            self.all_stats.remove(root)
+        if self.roots.pop(id, None):
+            self.version += 1
+            self.removed[id] = self.version
+            self.cleared.pop(id, None)
 
     def reset(self, id):
-        if id in self.existing_name(self.all_stats):
-            root = self.get_name(id, self.all_stats)
-            root["children"] = []
+        root = self.roots.get(id)
+        if root:
+            self.version += 1
+            root.children = {}
+            root.count = 0
+            root.version = self.version
+            self.cleared[id] = self.version
 
     def track(self, id, pkt):
+        """Counts packet pkt in tree id, and returns the new version
+        """
+        self.version += 1
+        version = self.version
         # Find if a tree has been created for this ID,
         # Otherwise, create a new one
-        if id in self.existing_name(self.all_stats):
-            root = self.get_name(id, self.all_stats)
-        else:
-            root = {"name": id, "children": []}
-            self.all_stats.append(root)
-
-        # Get all protocols in a packet
-        header_list = [(p.protocol_name, p) for p in pkt.protocols if isinstance(
-            p, packet_base.PacketBase)]
-
-        for k in header_list:
-            name = self.getName(k, header_list)
-            if name in self.existing_name(root['children']):
-                # If the protcol is found in the tree, make it root
-                # for the next protocol
-                root = self.get_name(name, root['children'])
+        node = self.roots.get(id)
+        if node is None:
+            node = self.roots[id] = Node(id)
+            self.cleared[id] = version
+            self.removed.pop(id, None)
+        node.version = version
+
+        # Walk down the tree along the protocols of the packet, creating
+        # the nodes not found
+        for p in pkt.protocols:
+            if not isinstance(p, packet_base.PacketBase):
+                continue
+            name = self.getName((p.protocol_name, p), None)
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[name] = Node(name)
+            child.version = version
+            node = child
+
+        node.count += 1
+        return version
+
+    def diff(self, since):
+        """Returns changes after version since: the trees reduced to their
+        changed nodes (trees reset or created meanwhile are sent whole and
+        marked "replace"), and the ids of trees untracked meanwhile
+        """
+        trees = []
+        for id, root in self.roots.items():
+            if root.version <= since:
+                continue
+            if self.cleared.get(id, 0) > since:
+                tree = root.to_dict()
+                tree["replace"] = True
             else:
-                # If the protcol is not found in the tree, create a new node
-                # and make it root for the next protocol
-                new_root = {"name": name, "children": []}
-                root['children'].append(new_root)
-                root = new_root
-
-        c = root.setdefault('count', 0)
-        root['count'] = c + 1
-
-        return self.all_stats
+                tree = root.to_dict(since)
+            trees.append(tree)
+        return {"since": since, "version": self.version, "trees": trees,
+                "removed": [id for id, version in self.removed.items()
+                            if version > since]}
 
     def getName(self, k, header_list):
         if k[0] in [ETHERNET, IPV4, IPV6]:
@@ -101,13 +165,3 @@ class Tracker():
             d = k[1].dst_port
             return "{} [{}]".format(k[0], d)
         return k[0]
-
-    def existing_name(self, lst):
-        for n in lst:
-            yield n['name']
-
-    def get_name(self, name, lst):
-        for n in lst:
-            if n.get('name', None) == name:
-                return n
-        return None
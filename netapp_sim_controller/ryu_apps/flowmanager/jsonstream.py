@@ -0,0 +1,98 @@
+# Copyright (c) 2018-2022 Maen Artimy
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This module serializes JSON documents (stats, topology...) as a stream of
+chunks, so large responses are never held in memory as a whole string and
+clients start receiving them at once.
+
+Records (dicts in lists reached from the root through dicts only, e.g. the
+flows of {dpid: [flows]} or the switches of the topology) are encoded one at
+a time, and can be paginated and projected on some of their fields.
+"""
+
+from itertools import islice
+from json import dumps
+
+
+CHUNK_SIZE = 65536  # bytes of JSON buffered before a chunk is sent
+QUERY_PARAMS = ("fields", "limit", "cursor")  # pagination and projection
+
+
+def is_records(value):
+    """Returns True if value is a list of records (dicts)
+    """
+    return isinstance(value, list) and bool(value) and \
+        isinstance(value[0], dict)
+
+
+def record_lists(doc):
+    """Yields lists of records of doc
+    """
+    if isinstance(doc, dict):
+        for value in doc.values():
+            for records in record_lists(value):
+                yield records
+    elif is_records(doc):
+        yield doc
+
+
+def next_cursor(doc, stop):
+    """Returns cursor of next page of doc if page ends at record stop (None
+    if there are no more records)
+    """
+    if stop is None:
+        return None
+    if any(len(records) > stop for records in record_lists(doc)):
+        return stop
+    return None
+
+
+def iter_json(doc, fields=None, start=0, stop=None, chunk_size=CHUNK_SIZE):
+    """Yields doc encoded as JSON, in bytes chunks of about chunk_size.
+
+    Only records from start to stop (of each list of records) are encoded,
+    reduced to fields if given.
+    """
+    buf = []
+    size = 0
+    for piece in _encode(doc, fields, start, stop):
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buf).encode("utf-8")
+            buf = []
+            size = 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def _encode(value, fields, start, stop):
+    if isinstance(value, dict):
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield (", " if i else "") + dumps(str(key)) + ": "
+            for piece in _encode(item, fields, start, stop):
+                yield piece
+        yield "}"
+    elif is_records(value):
+        yield "["
+        for i, record in enumerate(islice(value, start, stop)):
+            if fields is not None:
+                record = {f: record[f] for f in fields if f in record}
+            yield (", " if i else "") + dumps(record)
+        yield "]"
+    else:
+        yield dumps(value)
@@ -0,0 +1,163 @@
+# Copyright (c) 2018-2022 Maen Artimy
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This module reads the FlowManager log from a cursor (the file's inode and a
+byte offset) instead of from the start, so each read only costs the lines
+returned, and follows the log across rotations.
+
+Offsets of line starts are indexed incrementally (scanning the memory-mapped
+new bytes only), to read the last lines of the log without a full scan.
+"""
+
+import logging
+import mmap
+import os
+import re
+from array import array
+
+
+LIMIT = 1000  # default number of lines returned by a read
+
+# '%(asctime)s:%(name)s:%(levelname)s - %(message)s'
+LINE = re.compile(r"^(\S+ \S+):([^:]*):(\w+) - (.*)$")
+
+
+def parse_line(line):
+    """Returns dict of log line's fields (message only if not parsed)
+    """
+    found = LINE.match(line)
+    if not found:
+        return {"message": line}
+    return dict(zip(("time", "name", "level", "message"), found.groups()))
+
+
+def matches(entry, level=None, dpid=None):
+    """Returns True if log entry is at level (number) or above and, if dpid
+    is given, is about switch dpid (second field of event messages, e.g.
+    "Removed, <dpid>, ...")
+    """
+    if level is not None:
+        entry_level = logging.getLevelName(entry.get("level", ""))
+        if not isinstance(entry_level, int) or entry_level < level:
+            return False
+    if dpid is not None:
+        fields = entry["message"].split(", ", 2)
+        if len(fields) < 2 or fields[1] != str(dpid):
+            return False
+    return True
+
+
+class LogTail():
+    """Cursor-based reader of a (rotated) log file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.indexed = 0  # bytes of the file indexed so far
+        self.offsets = array("Q")  # offset of the start of each line
+
+    def _index(self):
+        """Indexes lines written since last call, and returns the file's
+        inode
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        if stat.st_ino != self.inode or stat.st_size < self.indexed:
+            # new (rotated or truncated) file
+            self.inode = stat.st_ino
+            self.indexed = 0
+            self.offsets = array("Q")
+        if stat.st_size > self.indexed:
+            with open(self.path, "rb") as log_file, mmap.mmap(
+                    log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                pos = self.indexed
+                end = data.rfind(b"\n", pos)
+                while 0 <= pos <= end:
+                    self.offsets.append(pos)
+                    pos = data.find(b"\n", pos, end + 1) + 1
+                self.indexed = end + 1 if end >= 0 else self.indexed
+        return self.inode
+
+    def read(self, cursor=None, limit=LIMIT, level=None, dpid=None,
+             tail=None):
+        """Returns {"cursor", "lines"}: up to limit log entries (matching
+        level and dpid) from cursor (a previous read's, or the start of the
+        file, or its tail last lines if given), and the cursor to read the
+        next ones from
+        """
+        inode = self._index()
+        if inode is None:
+            return {"cursor": cursor, "lines": []}
+
+        lines = []
+        if cursor:
+            cursor_inode, offset = (int(x) for x in cursor.split(":"))
+            if cursor_inode == inode and offset > self.indexed:
+                offset = 0  # truncated
+            elif cursor_inode != inode:
+                # rotated: read the rest of the previous file first
+                offset = self._read_rotated(cursor_inode, offset, lines,
+                                            limit, level, dpid)
+                if offset is not None:
+                    return {"cursor": "%d:%d" % (cursor_inode, offset),
+                            "lines": lines}
+                offset = 0
+        elif tail:
+            offset = self.offsets[-tail] if len(self.offsets) > tail else 0
+        else:
+            offset = 0
+
+        offset = self._read_lines(self.path, offset, self.indexed, lines,
+                                  limit, level, dpid)
+        return {"cursor": "%d:%d" % (inode, offset), "lines": lines}
+
+    def end(self):
+        """Returns cursor at the end of the log (None if there is no log)
+        """
+        inode = self._index()
+        return None if inode is None else "%d:%d" % (inode, self.indexed)
+
+    def _read_rotated(self, inode, offset, lines, limit, level, dpid):
+        # returns offset where reading stopped if limit was reached in
+        # the rotated file, or None if it was read to the end (or lost)
+        path = self.path + ".1"
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_ino != inode:
+            return None
+        offset = self._read_lines(path, offset, stat.st_size, lines, limit,
+                                  level, dpid)
+        return offset if offset < stat.st_size else None
+
+    def _read_lines(self, path, offset, end, lines, limit, level, dpid):
+        # appends entries of complete lines between offset and end, and
+        # returns offset of the next line
+        with open(path, "rb") as log_file:
+            log_file.seek(offset)
+            while offset < end and len(lines) < limit:
+                line = log_file.readline()
+                if not line.endswith(b"\n"):
+                    break  # line being written
+                offset += len(line)
+                entry = parse_line(line.decode("utf-8", "replace").rstrip())
+                if matches(entry, level, dpid):
+                    lines.append(entry)
+        return offset
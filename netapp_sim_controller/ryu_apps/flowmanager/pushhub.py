@@ -0,0 +1,164 @@
+# Copyright (c) 2018-2022 Maen Artimy
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This module pushes messages to websocket clients off the event handlers.
+
+Messages published within a window are merged and encoded once, in a single
+"batch" message, and state messages (e.g. tracker diffs) are computed once
+per window whatever the number of events. Each client has its own bounded
+queue and sender, so a slow client only delays (and loses the oldest of) its
+own messages.
+"""
+
+import json
+import logging
+from collections import deque
+from time import time
+
+from ryu.lib import hub
+
+
+PUSH_WINDOW = 0.1  # seconds during which published messages are merged
+PUSH_QUEUE_SIZE = 100  # messages queued per client before the oldest drop
+
+logger = logging.getLogger("flowmanager")
+
+
+class Client():
+    """Websocket client, with its queue of (data, time queued) and its
+    counters
+    """
+
+    __slots__ = ("ws", "queue", "event", "sent", "dropped", "lag", "max_lag")
+
+    def __init__(self, ws, queue_size):
+        self.ws = ws
+        self.queue = deque(maxlen=queue_size)
+        self.event = hub.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.lag = 0  # seconds between queueing and sending of last message
+        self.max_lag = 0
+
+    def push(self, data, now):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1  # the oldest message is dropped
+        self.queue.append((data, now))
+        self.event.set()
+
+
+class PushHub():
+    """Merges published messages and pushes them to all websocket clients
+    """
+
+    def __init__(self, window=PUSH_WINDOW, queue_size=PUSH_QUEUE_SIZE):
+        self.window = window
+        self.queue_size = queue_size
+        self.clients = {}  # ws -> Client
+        self.batch = []
+        self.states = {}  # method -> function returning params (or None)
+        self._wake = hub.Event()
+        hub.spawn(self._flush_loop)
+
+    def add(self, ws):
+        """Starts pushing messages to websocket ws
+        """
+        client = self.clients[ws] = Client(ws, self.queue_size)
+        hub.spawn(self._send_loop, client)
+
+    def remove(self, ws):
+        """Stops pushing messages to websocket ws
+        """
+        client = self.clients.pop(ws, None)
+        if client:
+            client.event.set()  # ends its sender
+
+    def publish(self, method, params):
+        """Queues message for all clients
+        """
+        if self.clients:
+            self.batch.append({"method": method, "params": params})
+            self._wake.set()
+
+    def publish_state(self, method, get_params):
+        """Queues message whose params are returned by get_params, called
+        once when the window ends (so all the events of the window are
+        covered by a single message)
+        """
+        if self.clients:
+            self.states[method] = get_params
+            self._wake.set()
+
+    def flush(self):
+        """Encodes messages queued so far, once, and queues them for each
+        client
+        """
+        batch, self.batch = self.batch, []
+        states, self.states = self.states, {}
+        for method, get_params in states.items():
+            params = get_params()
+            if params is not None:
+                batch.append({"method": method, "params": params})
+        if not batch or not self.clients:
+            return
+
+        msg = batch[0] if len(batch) == 1 else \
+            {"method": "batch", "params": batch}
+        data = json.dumps(msg)
+        now = time()
+        for client in list(self.clients.values()):
+            client.push(data, now)
+
+    def stats(self):
+        """Returns counters and send lag of each client
+        """
+        return [{
+            "client": "{}:{}".format(
+                getattr(client.ws, "environ", {}).get("REMOTE_ADDR"),
+                getattr(client.ws, "environ", {}).get("REMOTE_PORT")),
+            "queued": len(client.queue),
+            "sent": client.sent,
+            "dropped": client.dropped,
+            "lag": client.lag,
+            "max_lag": client.max_lag,
+        } for client in list(self.clients.values())]
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            hub.sleep(self.window)  # let messages of the window gather
+            try:
+                self.flush()
+            except Exception as err:
+                logger.error("Error at push flush %s", err)
+
+    def _send_loop(self, client):
+        while client.ws in self.clients:
+            if not client.queue:
+                client.event.wait()
+                client.event.clear()
+                continue
+            data, queued = client.queue.popleft()
+            try:
+                client.ws.send(data)
+            except Exception as err:
+                logger.debug("Error at push to %s: %s", client.ws, err)
+                self.remove(client.ws)
+                break
+            client.sent += 1
+            client.lag = time() - queued
+            client.max_lag = max(client.max_lag, client.lag)
@@ -0,0 +1,135 @@
+# Copyright (c) 2018-2022 Maen Artimy
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This module keeps a view of the topology (switches, links and hosts) up to
+date from topology events, and serializes it once per change, with a
+version used as ETag.
+"""
+
+import json
+from time import time
+
+from ryu.topology.api import get_all_switch, get_all_link, get_all_host
+
+
+def link_key(link):
+    """Returns key of link: (src dpid, src port, dst dpid, dst port)
+    """
+    return (link.src.dpid, link.src.port_no, link.dst.dpid, link.dst.port_no)
+
+
+class TopologyView():
+    """Topology kept up to date from events of ryu.topology
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.switches = {}  # dpid -> Switch
+        self.links = {}  # link_key -> Link
+        self.hosts = {}  # mac -> Host
+        self.loaded = False
+        self.version = 0
+        self.epoch = int(time())  # so etags of previous runs never match
+        self._body = None
+        self._addresses = 0  # number of host IPs when body was made
+
+    @property
+    def etag(self):
+        return "%x-%d" % (self.epoch, self.version)
+
+    def load(self):
+        """(Re)loads the whole topology from ryu.topology
+        """
+        self.switches = {s.dp.id: s for s in get_all_switch(self.app)}
+        self.links = {link_key(link): link
+                      for link in get_all_link(self.app)}
+        self.hosts = {h.mac: h for h in get_all_host(self.app)}
+        self.loaded = True
+        self.changed()
+
+    def changed(self):
+        self.version += 1
+        self._body = None
+
+    def update(self, event):
+        """Applies topology event (ignored until the view is loaded)
+        """
+        if not self.loaded:
+            return
+        name = event.__class__.__name__
+        if name in ("EventSwitchEnter", "EventSwitchReconnected"):
+            self.switches[event.switch.dp.id] = event.switch
+        elif name == "EventSwitchLeave":
+            dpid = event.switch.dp.id
+            self.switches.pop(dpid, None)
+            for key in [key for key in self.links
+                        if dpid in (key[0], key[2])]:
+                del self.links[key]
+        elif name == "EventLinkAdd":
+            self.links[link_key(event.link)] = event.link
+        elif name == "EventLinkDelete":
+            self.links.pop(link_key(event.link), None)
+        elif name == "EventHostAdd":
+            self.hosts[event.host.mac] = event.host
+        elif name == "EventHostDelete":
+            self.hosts.pop(event.host.mac, None)
+        elif name == "EventHostMove":
+            self.hosts[event.dst.mac] = event.dst
+        elif name in ("EventPortAdd", "EventPortModify", "EventPortDelete"):
+            # switches (and their ports) of events are copies, so ports of
+            # cached switches are updated from the event
+            self._update_port(event.port, name != "EventPortDelete")
+        self.changed()
+
+    def _update_port(self, port, present):
+        switch = self.switches.get(port.dpid)
+        if switch is None:
+            return
+        ports = [p for p in switch.ports if p.port_no != port.port_no]
+        if present:
+            ports.append(port)
+            ports.sort(key=lambda p: p.port_no)
+        switch.ports = ports
+
+    def data(self):
+        """Returns topology as dict of switches, links and hosts (only
+        those attached to known ports)
+        """
+        if not self.loaded:
+            self.load()
+        port_macs = {port.hw_addr for switch in self.switches.values()
+                     for port in switch.ports}
+        return {
+            "switches": [s.to_dict() for s in self.switches.values()],
+            "links": [link.to_dict() for link in self.links.values()],
+            # To remove hosts that are not removed by controller
+            "hosts": [h.to_dict() for h in self.hosts.values()
+                      if h.port.hw_addr in port_macs]}
+
+    def body(self):
+        """Returns topology serialized as JSON (made once per change)
+        """
+        if not self.loaded:
+            self.load()
+        # host IPs are learnt without events
+        addresses = sum(len(h.ipv4) + len(h.ipv6)
+                        for h in self.hosts.values())
+        if addresses != self._addresses:
+            self._addresses = addresses
+            self.changed()
+        if self._body is None:
+            self._body = json.dumps(self.data()).encode("utf-8")
+        return self._body
@@ -19,6 +19,9 @@ $(function () {
     let pause = false
     const cookie_list = [];
     let selectedCookie = "default";
+    let trees = [];
+    let version = null;  // version of trees, null until loaded
+    let loading = false;
 
     const header = '<thead> \
     <th>Time</th> \
@@ -94,10 +97,63 @@ $(function () {
             // sessionStorage.setItem('trees', params);
             return "";
         },
+        diff: function (params) {
+            if (version === null || params.since > version) {
+                // diffs were missed: reload all trees
+                loadTrees();
+                return "";
+            }
+            trees = trees.filter(tree => params.removed.indexOf(tree.name) < 0);
+            params.trees.forEach(tree => {
+                let idx = trees.findIndex(t => t.name === tree.name);
+                if (idx < 0) {
+                    trees.push(tree);
+                } else if (tree.replace) {
+                    trees[idx] = tree;
+                } else {
+                    mergeNode(trees[idx], tree);
+                }
+            });
+            version = Math.max(version, params.version);
+            if (trees.length > 0) update_stats.update(trees);
+            return "";
+        },
         log: function (params) {
             add_row(params)
             return "";
         },
+        batch: function (params) {
+            // messages merged by the controller
+            params.forEach(msg => update_stats[msg.method](msg.params));
+            return "";
+        },
+    }
+
+    // Merge changed nodes of a diff into a tree
+    function mergeNode(node, changed) {
+        if ("count" in changed) node.count = changed.count;
+        changed.children.forEach(child => {
+            let found = node.children.find(c => c.name === child.name);
+            if (found) {
+                mergeNode(found, child);
+            } else {
+                node.children.push(child);
+            }
+        });
+    }
+
+    function loadTrees() {
+        if (loading) return;
+        loading = true;
+        $.getJSON("/tracker")
+            .done(function (response) {
+                trees = response.trees;
+                version = response.version;
+                if (trees.length > 0) update_stats.update(trees);
+            })
+            .always(function () {
+                loading = false;
+            });
     }
 
     function openWebsocket() {
@@ -133,6 +189,7 @@ $(function () {
         //     update_stats.update(trees)
         // }
 
+        loadTrees();
         openWebsocket();
         tabObj.setActive();
 
@@ -19,17 +19,24 @@ This module includes class WebApi, which is part of the FlowManager application.
 import os
 import sys
 import logging
-import mimetypes
+import json
+from urllib.parse import parse_qs
 from ryu.app.wsgi import ControllerBase
 from ryu.app.wsgi import Response
 from ryu.app.wsgi import WebSocketRPCServer
 from ryu.app.wsgi import route
 from ryu.app.wsgi import websocket
+from ryu.lib import hub
+from jsonstream import QUERY_PARAMS, iter_json, next_cursor
+from logtail import LIMIT as LOG_LIMIT
 
 
 PYTHON3 = sys.version_info > (3, 0)
 logger = logging.getLogger("flowmanager")
 
+LOG_PARAMS = ("cursor", "limit", "level", "dpid", "tail")
+LOG_POLL = 0.5  # seconds between reads of the log for live tails
+
 
 class WebApi(ControllerBase):
     """This class offers an web-facing API for FlowManager
@@ -40,8 +47,10 @@ class WebApi(ControllerBase):
         """
         super(WebApi, self).__init__(req, link, data, **config)
         self.ctrl_api = data["webctl"]
+        self.history = data.get("history")
         # self.rpc_clients = data["rpc_clients"]
         self.rootdir = os.path.dirname(os.path.abspath(__file__))
+        self.assets = data["assets"]
         # logger.debug("Created WebApi")
 
     def get_unicode(self, any_string):
@@ -49,15 +58,76 @@ class WebApi(ControllerBase):
         """
         return any_string if PYTHON3 else any_string.decode("utf-8")
 
-    def make_response(self, filename):
-        """Response with file content
+    def make_response(self, req, asset):
+        """Response with cached file content: not modified (304) if the
+        client's copy is still valid, gzipped if accepted, or the requested
+        range
         """
-        filetype, _ = mimetypes.guess_type(filename)
-        if not filetype:
-            filetype = 'application/octet-stream'
-        logger.debug("Making response from %s as %s", filename, filetype)
-        res = Response(content_type=filetype)
-        res.body = open(filename, 'rb').read()
+        # gzip only if asked for, with a non-zero quality
+        gzipped = asset.gzip is not None and req.range is None and \
+            "Accept-Encoding" in req.headers and \
+            bool(req.accept_encoding.acceptable_offers(["gzip"]))
+        etag = asset.etag + "-gz" if gzipped else asset.etag
+
+        res = Response(content_type=asset.content_type)
+        res.etag = etag
+        res.last_modified = asset.mtime
+        res.cache_control = "no-cache"  # revalidated with etag
+        res.headers["Accept-Ranges"] = "bytes"
+        res.headers["Vary"] = "Accept-Encoding"
+        if "If-None-Match" in req.headers:
+            not_modified = etag in req.if_none_match
+        else:
+            not_modified = req.if_modified_since is not None and \
+                asset.mtime <= req.if_modified_since.timestamp()
+        if not_modified:
+            res.status = 304
+            res.body = b""
+            return res
+
+        if req.range is not None and res in req.if_range:
+            span = req.range.range_for_length(len(asset.body))
+            if span is None:
+                res.status = 416
+                res.headers["Content-Range"] = "bytes */%d" % len(
+                    asset.body)
+                res.body = b""
+                return res
+            res.status = 206
+            res.content_range = (span[0], span[1], len(asset.body))
+            res.body = asset.body[span[0]:span[1]]
+            return res
+
+        if gzipped:
+            res.content_encoding = "gzip"
+            res.body = asset.gzip
+        else:
+            res.body = asset.body
+        return res
+
+    def json_response(self, req, doc):
+        """Response streaming doc as JSON in chunks, with its records
+        paginated (limit, cursor) and reduced to some fields (fields, comma
+        separated) if requested. The cursor of the next page, if any, is
+        sent in header X-Next-Cursor.
+        """
+        try:
+            fields = req.GET.get('fields')
+            fields = fields.split(',') if fields else None
+            limit = req.GET.get('limit')
+            limit = int(limit) if limit else None
+            cursor = int(req.GET.get('cursor') or 0)
+            if cursor < 0 or (limit is not None and limit < 0):
+                raise ValueError(cursor, limit)
+        except ValueError:
+            return Response(status=400)
+
+        stop = cursor + limit if limit is not None else None
+        res = Response(content_type="application/json")
+        following = next_cursor(doc, stop)
+        if following is not None:
+            res.headers['X-Next-Cursor'] = str(following)
+        res.app_iter = iter_json(doc, fields, cursor, stop)
         return res
 
     def form_response(self, process_response):
@@ -68,30 +138,74 @@ class WebApi(ControllerBase):
         return res
 
     @route('monitor', '/home/{filename:.*}', methods=['GET'])
-    def get_filename(self, _, filename):
+    def get_filename(self, req, filename):
         """Load statis files
         """
         logger.debug("Requesting file %s", filename)
         if (filename == "" or filename is None):
             filename = "index.html"
+        if self.assets.resolve(filename) is None:
+            return Response(status=403)  # outside of web directory
         try:
-            filename = os.path.join(self.rootdir, "web", filename)
-            return self.make_response(filename)
+            asset = self.assets.get(filename)
         except IOError as err:
             logger.error("IOError %s", err)
             return Response(status=400)
+        if asset is None:
+            return Response(status=404)
+        return self.make_response(req, asset)
 
     @route('monitor', '/status', methods=['GET'])
     def get_flow_stats(self, req):
         """Get stats
         """
         if 'status' in req.GET and 'dpid' in req.GET:
-            res = Response(content_type="application/json")
-            res.json = self.ctrl_api.get_stats(
-                req.GET['status'], req.GET['dpid'])
-            return res
+            return self.json_response(req, self.ctrl_api.get_stats(
+                req.GET['status'], req.GET['dpid']))
         return Response(status=404)  # Resource does not exist
 
+    @route('monitor', '/stats', methods=['GET'])
+    def get_all_stats(self, req):
+        """Get stats of all (or selected) switches at once
+        """
+        request = req.GET.get('request')
+        try:
+            dpids = req.GET.get('dpid')
+            dpids = [int(dpid, 0) for dpid in dpids.split(',')] if dpids \
+                else None
+            timeout = float(req.GET.get('timeout',
+                                        self.ctrl_api.STATS_TIMEOUT))
+        except ValueError:
+            return Response(status=400)
+
+        stats = self.ctrl_api.get_stats_all(request, dpids, timeout)
+        if stats is None:
+            return Response(status=404)  # Resource does not exist
+        return self.json_response(req, stats)
+
+    @route('monitor', '/mirror', methods=['GET'])
+    def get_mirror(self, req):
+        """Get flows, groups or meters of a switch (or their changes since
+        a version) from the controller-side mirror of its tables
+        """
+        try:
+            dpid = int(req.GET['dpid'], 0)
+            since = req.GET.get('since')
+            since = int(since) if since else None
+            filters = {field: int(req.GET[field], 0)
+                       for field in ('table_id', 'cookie', 'priority')
+                       if req.GET.get(field)}
+        except (KeyError, ValueError):
+            return Response(status=400)
+
+        mirror = self.ctrl_api.get_mirror(
+            dpid, req.GET.get('kind', 'flows'), since, **filters)
+        if mirror is None:
+            return Response(status=404)  # Resource does not exist
+        if since is not None and mirror["changes"] is None:
+            return Response(status=410)  # Changes no longer logged
+        return self.json_response(req, mirror)
+
     @route('monitor', '/data', methods=['GET'])
     def get_switch_data(self, req):
         """Get switch data
@@ -101,32 +215,130 @@ class WebApi(ControllerBase):
         if req.GET.get("list") == "switches":
             lst = {t[0]: t[0] for t in self.ctrl_api.get_switches()}
         else:
-            request = list(req.GET.keys())[0]
+            request = [key for key in req.GET.keys()
+                       if key not in QUERY_PARAMS][0]
             dpid = int(req.GET[request])
             lst = self.ctrl_api.get_stats_request(request, dpid)
 
-        res = Response(content_type="application/json")
-        res.json = lst
-        return res
+        return self.json_response(req, lst)
 
     @route('monitor', '/topology', methods=['GET'])
-    def get_topology(self, _):
-        """Get topology info
+    def get_topology(self, req):
+        """Get topology info (not modified if the client's version is
+        current)
         """
         logger.debug("Requesting topology")
+        if any(param in req.GET for param in QUERY_PARAMS):
+            return self.json_response(req, self.ctrl_api.get_topology_data())
+        topology = self.ctrl_api.topology
+        body = topology.body()
+        res = Response(content_type="application/json")
+        res.etag = topology.etag
+        res.cache_control = "no-cache"  # revalidated with etag
+        if topology.etag in req.if_none_match:
+            res.status = 304
+            res.body = b""
+            return res
+        res.body = body
+        return res
+
+    @route('monitor', '/history', methods=['GET'])
+    def get_history_index(self, _):
+        """List metrics and series kept in measures history
+        """
+        if not self.history:
+            return Response(status=404)  # history is kept by tsdb sink only
         res = Response(content_type="application/json")
-        res.json = self.ctrl_api.get_topology_data()
+        res.json = {metric: self.history.series(metric)
+                    for metric in self.history.metrics()}
+        return res
+
+    @route('monitor', '/history/{metric}', methods=['GET'])
+    def get_history(self, req, metric):
+        """Get measures of a series, optionally within a time range
+        (start, end) and downsampled in buckets of step seconds
+        """
+        logger.debug("Requesting history of %s", metric)
+        if not self.history or 'series' not in req.GET:
+            return Response(status=404)
+        try:
+            start = req.GET.get('start')
+            start = float(start) if start else None
+            end = req.GET.get('end')
+            end = float(end) if end else None
+            step = req.GET.get('step')
+            step = float(step) if step else None
+            if step is not None and step <= 0:
+                raise ValueError(step)
+        except ValueError:
+            return Response(status=400)
+
+        series = req.GET['series']
+        try:
+            if step:
+                times, mins, maxs, avgs = self.history.downsample(
+                    metric, series, step, start, end)
+                body = {"timestamps": times.tolist(), "min": mins.tolist(),
+                        "max": maxs.tolist(), "avg": avgs.tolist()}
+            else:
+                times, values = self.history.query(metric, series, start,
+                                                   end)
+                body = {"timestamps": times.tolist(),
+                        "values": values.tolist()}
+        except ValueError:
+            return Response(status=400)  # names out of the store
+        res = Response(content_type="application/json")
+        res.json = body
+        return res
+
+    @route('monitor', '/tracker', methods=['GET'])
+    def get_tracker(self, _):
+        """Get all trees of tracked packets, with their version (clients
+        then apply the diffs sent after that version)
+        """
+        tracker = self.ctrl_api.get_tracker()
+        res = Response(content_type="application/json")
+        res.json = {"version": tracker.version, "trees": tracker.trees()}
+        return res
+
+    @route('monitor', '/push', methods=['GET'])
+    def get_push_stats(self, _):
+        """Get queue, drop and send lag counters of websocket clients
+        """
+        res = Response(content_type="application/json")
+        res.json = self.ctrl_api.app.push_hub.stats()
         return res
 
     @route('monitor', '/logs', methods=['GET'])
-    def get_logs(self, _):
-        """Get log mesages
+    def get_logs(self, req):
+        """Get log mesages. With any of cursor, limit, level, dpid or tail,
+        only the entries after cursor (or the last tail ones) are returned,
+        with the cursor to read the next ones from
         """
         logger.debug("Requesting logs")
         res = Response(content_type="application/json")
-        res.json = self.ctrl_api.read_logs()
+        if not any(param in req.GET for param in LOG_PARAMS):
+            res.json = self.ctrl_api.read_logs()
+            return res
+        try:
+            res.json = self.ctrl_api.tail_logs(**self.log_params(req.GET))
+        except ValueError:
+            return Response(status=400)
         return res
 
+    def log_params(self, params):
+        """Returns arguments of CtrlApi.tail_logs from query params
+        """
+        args = {"cursor": params.get("cursor") or None}
+        for param in ("limit", "dpid", "tail"):
+            if params.get(param):
+                args[param] = int(params[param], 0)
+        if params.get("level"):
+            args["level"] = logging.getLevelName(params["level"].upper())
+            if not isinstance(args["level"], int):
+                raise ValueError(params["level"])
+        return args
+
     @route('monitor', '/meterform', methods=['POST'])
     def post_meter_form(self, req):
         """Connect with meter form
@@ -153,14 +365,25 @@ class WebApi(ControllerBase):
         groups = req.json.get('groups', None)
         flows = req.json.get('flows', None)
 
-        response_meters = self.ctrl_api.process_meter_upload(
-            meters) if meters else ''
-        response_groups = self.ctrl_api.process_group_upload(
-            groups) if groups else ''
-        response_flows = self.ctrl_api.process_flow_upload(
-            flows) if flows else ''
-        response_all = "{}, {}, {}".format(
-            response_meters, response_groups, response_flows)
+        # meters and groups first, as flows may refer to them
+        reports = {}
+        if meters:
+            reports["meters"] = self.ctrl_api.process_meter_upload(meters)
+        if groups:
+            reports["groups"] = self.ctrl_api.process_group_upload(groups)
+        if flows:
+            reports["flows"] = self.ctrl_api.process_flow_upload(flows)
+
+        if req.GET.get("report") == "json":  # errors of each entry
+            res = Response(content_type="application/json")
+            res.json = reports
+            return res
+
+        response_all = ", ".join(
+            "{}: {} installed, {} unconfirmed, {} failed".format(
+                kind.capitalize(), reports[kind]["installed"],
+                reports[kind]["unconfirmed"], len(reports[kind]["errors"]))
+            for kind in reports)
         res = Response()
         res.text = self.get_unicode(response_all)
         return res
@@ -193,9 +416,55 @@ class WebApi(ControllerBase):
             self.ctrl_api.rest_flow_monitoring(req.json))
         return res
 
+    @websocket('monitor', '/logs/tail')
+    def websocket_log_tail(self, ws):
+        """Sends new log entries (filtered as in /logs) as they are written
+        """
+        try:
+            params = {k: v[-1] for k, v in parse_qs(
+                ws.environ.get("QUERY_STRING", "")).items()}
+            args = self.log_params(params)
+        except ValueError:
+            return
+        if not args["cursor"] and not args.get("tail"):
+            args["cursor"] = self.ctrl_api.logtail.end()  # new entries only
+
+        # the client never sends anything: reading is only for noticing
+        # disconnection, even if no new entry passes the filters
+        closed = hub.Event()
+
+        def _read():
+            try:
+                while ws.wait() is not None:
+                    pass
+            except Exception:
+                pass
+            closed.set()
+
+        reader = hub.spawn(_read)
+        try:
+            while not closed.is_set():
+                logs = self.ctrl_api.tail_logs(**args)
+                args["cursor"] = logs["cursor"]
+                args.pop("tail", None)
+                try:
+                    if logs["lines"]:
+                        ws.send(json.dumps(logs))
+                except Exception:
+                    break  # disconnected
+                if len(logs["lines"]) < args.get("limit", LOG_LIMIT):
+                    closed.wait(timeout=LOG_POLL)
+        finally:
+            hub.kill(reader)
+
     @websocket('monitor', '/ws')
     def websocket_handler_2(self, ws):
         logger.debug('WebSocket connected: %s', ws)
         rpc_server = WebSocketRPCServer(ws, self.ctrl_api.app)
-        rpc_server.serve_forever()
+        push_hub = self.ctrl_api.app.push_hub
+        push_hub.add(ws)
+        try:
+            rpc_server.serve_forever()
+        finally:
+            push_hub.remove(ws)
         logger.debug('WebSocket disconnected: %s', ws)
@@ -0,0 +1,196 @@
+'''
+    Proactive forwarding between hosts, along shortest path trees computed
+    by the path service (one flow per host and switch).
+'''
+
+
+from ryu.base.app_manager import RyuApp
+from ryu.controller.handler import set_ev_cls
+from ryu.lib.hub import spawn, sleep
+from ryu.lib.packet.ether_types import ETH_TYPE_ARP, ETH_TYPE_IP
+from ryu.topology.event import (EventSwitchEnter, EventSwitchLeave,
+                                EventLinkDelete)
+
+from common import *
+
+
+# cookie and priority of installed flows (under the 65535 of trap flows)
+FORWARDING_COOKIE = 0xf0
+FORWARDING_PRIORITY = 1000
+
+
+class Forwarding(RyuApp):
+    '''
+        Ryu app for proactive forwarding between hosts. For every host of
+        the ARP table whose in-port is known, installs flows along the
+        shortest path tree towards it computed by PathService (weighted by
+        FORWARDING:WEIGHT), matching IPv4 packets and ARP packets to the
+        host, so that no packet to it ever reaches the controller. Each
+        switch holds one flow of each kind per host.
+
+        Trees are synchronized with the hosts every monitoring period: only
+        those of hosts that appeared, moved or left are recomputed (all of
+        them when switch links changed), and the flow changes are then sent
+        as a single write per switch. When a link fails or a switch leaves,
+        only the trees using it are recomputed and reinstalled. Trees are
+        otherwise kept as long as their host stays on the same in-port
+        (they are not moved when metrics change).
+
+        Requirements:
+        -------------
+        Switches app (built-in): for datapath and link lists.
+
+        PathService app: for hosts and shortest path trees.
+
+        Attributes:
+        -----------
+        trees: dict mapping host IP to installed tree, dict mapping DPID of
+        each switch to tuple of next node (DPID or host IP) and out-port
+        number.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(Forwarding, self).__init__(*args, **kwargs)
+        self.name = FORWARDING
+
+        self._switches = get_app(SWITCHES)
+        self._path_service = get_app(PATH_SERVICE)
+
+        self.trees = {}
+        self._hosts = {}  # host IP -> in-port at last sync
+        self._links = frozenset()  # switch-switch links at last sync
+        self._by_link = {}  # (src DPID, dst DPID) -> hosts of trees using it
+
+        spawn(self._sync_loop)
+
+    def _sync_loop(self):
+        while True:
+            sleep(MONITOR_PERIOD)
+            try:
+                self.sync()
+            except Exception as e:
+                print(' *** ERROR in forwarding._sync_loop:',
+                      e.__class__.__name__, e)
+
+    def sync(self):
+        '''
+            Removes trees of hosts that left, and installs trees of hosts
+            that appeared or moved (and of hosts not routable before). All
+            trees are recomputed if switch links changed.
+        '''
+        self._path_service.update_topology()
+        hosts = self._path_service.hosts()
+        links = frozenset((link.src.dpid, link.dst.dpid)
+                          for link in list(self._switches.links))
+        if links != self._links:
+            changed = hosts.keys() | self._hosts.keys()
+        else:
+            changed = {ip for ip in hosts.keys() | self._hosts.keys()
+                       if hosts.get(ip) != self._hosts.get(ip)}
+            changed |= hosts.keys() - self.trees.keys()
+        self._hosts = hosts
+        self._links = links
+        self._apply({ip: self._tree(ip) for ip in changed})
+
+    def _tree(self, ip):
+        # returns tree towards host ip as dict mapping DPID to (next node,
+        # out-port), or None
+        if ip not in self._hosts:
+            return None
+        try:
+            tree = self._path_service.tree(ip, FORWARDING_WEIGHT)
+        except KeyError:
+            return None
+        # hosts are identified by IP addresses
+        return {node: hop for node, hop in tree.items()
+                if not isinstance(node, str)} or None
+
+    def _reroute(self, hosts):
+        # recomputes trees of hosts after a topology change
+        self._path_service.update_topology()
+        self._apply({ip: self._tree(ip) for ip in hosts})
+
+    def _apply(self, changes):
+        # replaces trees of hosts (removes those mapped to None), then sends
+        # the resulting flow changes to each switch
+        mods = {}  # DPID -> host IP -> out-port (None: delete)
+        for ip, tree in changes.items():
+            old = self.trees.pop(ip, {})
+            for dpid, (next_node, port_no) in old.items():
+                ips = self._by_link.get((dpid, next_node), set())
+                ips.discard(ip)
+                if not ips:
+                    self._by_link.pop((dpid, next_node), None)
+                if not tree or dpid not in tree:
+                    mods.setdefault(dpid, {})[ip] = None
+            if not tree:
+                continue
+            self.trees[ip] = tree
+            for dpid, (next_node, port_no) in tree.items():
+                if next_node != ip:
+                    self._by_link.setdefault((dpid, next_node), set()).add(ip)
+                if old.get(dpid, (None, None))[1] != port_no:
+                    mods.setdefault(dpid, {})[ip] = port_no
+
+        for dpid, entries in mods.items():
+            self._send_flows(dpid, entries)
+
+    def _flow_mods(self, datapath, ip, port_no):
+        parser = datapath.ofproto_parser
+        ofproto = datapath.ofproto
+        matches = (parser.OFPMatch(eth_type=ETH_TYPE_IP, ipv4_dst=ip),
+                   parser.OFPMatch(eth_type=ETH_TYPE_ARP, arp_tpa=ip))
+        for match in matches:
+            if port_no is None:
+                yield parser.OFPFlowMod(
+                    datapath=datapath, cookie=FORWARDING_COOKIE,
+                    command=ofproto.OFPFC_DELETE_STRICT,
+                    priority=FORWARDING_PRIORITY, out_port=ofproto.OFPP_ANY,
+                    out_group=ofproto.OFPG_ANY, match=match)
+            else:
+                yield parser.OFPFlowMod(
+                    datapath=datapath, cookie=FORWARDING_COOKIE,
+                    priority=FORWARDING_PRIORITY, match=match,
+                    instructions=[parser.OFPInstructionActions(
+                        ofproto.OFPIT_APPLY_ACTIONS,
+                        [parser.OFPActionOutput(port_no)])])
+
+    def _send_flows(self, dpid, entries):
+        # sends flow mods of entries to switch in a single write
+        datapath = self._switches.dps.get(dpid, None)
+        if not datapath:
+            return
+        bufs = []
+        for ip, port_no in entries.items():
+            for msg in self._flow_mods(datapath, ip, port_no):
+                datapath.set_xid(msg)
+                msg.serialize()
+                bufs.append(msg.buf)
+        if not datapath.send(b''.join(bufs)):
+            print(' *** ERROR in forwarding._send_flows: '
+                  'switch %d is disconnected.' % dpid)
+
+    @set_ev_cls(EventSwitchEnter)
+    def _switch_enter_handler(self, ev):
+        # remove flows left by a previous run (trees are installed on next
+        # sync, as links change)
+        datapath = ev.switch.dp
+        parser = datapath.ofproto_parser
+        ofproto = datapath.ofproto
+        datapath.send_msg(
+            parser.OFPFlowMod(
+                datapath=datapath, cookie=FORWARDING_COOKIE,
+                cookie_mask=0xffffffffffffffff, table_id=ofproto.OFPTT_ALL,
+                command=ofproto.OFPFC_DELETE, out_port=ofproto.OFPP_ANY,
+                out_group=ofproto.OFPG_ANY, match=parser.OFPMatch()))
+
+    @set_ev_cls(EventSwitchLeave)
+    def _switch_leave_handler(self, ev):
+        dpid = ev.switch.dp.id
+        self._reroute([ip for ip, tree in self.trees.items() if dpid in tree])
+
+    @set_ev_cls(EventLinkDelete)
+    def _link_delete_handler(self, ev):
+        link = ev.link
+        ips = self._by_link.get((link.src.dpid, link.dst.dpid), ())
+        self._reroute(list(ips))
@@ -0,0 +1,164 @@
+'''
+    Local registry of the resources (and metrics) already provisioned in
+    Gnocchi, so that only topology changes lead to provisioning calls.
+'''
+
+
+from json import dump, dumps, load
+from os import replace
+
+from ryu.lib.hub import spawn, joinall
+
+from gnocchiclient.exceptions import Conflict, NotFound
+
+
+# max number of resources provisioned concurrently
+WORKERS = 8
+
+RESOURCE_METRICS_URL = 'v1/resource/generic/%s/metric'
+
+
+class GnocchiRegistry:
+    '''
+        Provisions Gnocchi resources and their metrics on first use only.
+
+        IDs of provisioned resources are kept in a set persisted to a JSON
+        file, so they are not provisioned again after a restart. New
+        resources are created by a bounded pool of workers, each with a
+        single call creating the resource together with its metrics.
+
+        Attributes:
+        -----------
+        resource_types: dict mapping resource type name to dict of its
+        definition ('def'), its metric names ('metrics') and their units
+        ('units').
+    '''
+
+    def __init__(self, client, path, resource_types, archive_policy,
+                 user_id=None, project_id=None, workers=WORKERS):
+        self.resource_types = resource_types
+        self._client = client
+        self._path = path
+        self._archive_policy = archive_policy
+        self._user_id = user_id
+        self._project_id = project_id
+        self._workers = workers
+        self._provisioned = set()
+        try:
+            with open(path, 'r') as f:
+                self._provisioned = set(load(f))
+
+        except FileNotFoundError:
+            pass
+
+        except Exception as e:
+            print(' *** WARNING in gnocchi_registry: could not load', path,
+                  e.__class__.__name__, e)
+
+    def __contains__(self, resource_id):
+        return resource_id in self._provisioned
+
+    def __len__(self):
+        return len(self._provisioned)
+
+    def ensure(self, resources):
+        '''
+            Provisions resources (list of tuples of resource type name and
+            attributes, which must include 'id') that are not provisioned
+            yet. Returns the list of IDs of newly provisioned resources.
+        '''
+        new = {}
+        for resource_type, attributes in resources:
+            if attributes['id'] not in self._provisioned:
+                new.setdefault(attributes['id'], (resource_type, attributes))
+        if not new:
+            return []
+
+        todo = iter(list(new.values()))
+        done = []
+
+        def _worker():
+            for resource_type, attributes in todo:
+                try:
+                    self._provision(resource_type, attributes)
+
+                except Exception as e:
+                    print(' *** ERROR in gnocchi_registry.ensure:',
+                          e.__class__.__name__, e)
+
+                else:
+                    done.append(attributes['id'])
+
+        joinall([spawn(_worker) for _ in range(min(self._workers, len(new)))])
+        if done:
+            self._provisioned.update(done)
+            self._save()
+        return done
+
+    def forget(self, resource_id=None):
+        '''
+            Removes resource (or all resources if resource_id is None) from
+            registry, to provision it again on next use (e.g. if it was
+            deleted from Gnocchi).
+        '''
+        if resource_id is None:
+            self._provisioned.clear()
+        else:
+            self._provisioned.discard(resource_id)
+        self._save()
+
+    def _save(self):
+        try:
+            tmp = self._path + '.tmp'
+            with open(tmp, 'w') as f:
+                dump(sorted(self._provisioned), f)
+            replace(tmp, self._path)
+
+        except Exception as e:
+            print(' *** WARNING in gnocchi_registry: could not save',
+                  self._path, e.__class__.__name__, e)
+
+    def _ensure_resource_types(self):
+        for resource_type in self.resource_types.values():
+            try:
+                self._client.resource_type.create(resource_type['def'])
+            except Conflict:
+                pass
+
+    def _provision(self, resource_type, attributes):
+        definition = self.resource_types[resource_type]
+        metrics = {
+            name: {'archive_policy_name': self._archive_policy, 'unit': unit}
+            for name, unit in zip(definition['metrics'], definition['units'])}
+        resource = dict(attributes)
+        resource.update({
+            'user_id': self._user_id,
+            'project_id': self._project_id,
+            'metrics': metrics
+        })
+        try:
+            self._client.resource.create(resource_type, resource)
+
+        except NotFound:
+            self._ensure_resource_types()
+            self._client.resource.create(resource_type, resource)
+
+        except Conflict:
+            # resource exists (e.g. registry was lost), but maybe not all of
+            # its metrics: they are added through the resource (one call
+            # for all of them, or one per metric if some exist)
+            try:
+                self._add_metrics(attributes['id'], metrics)
+            except Conflict:
+                for name, metric in metrics.items():
+                    try:
+                        self._add_metrics(attributes['id'], {name: metric})
+                    except Conflict:
+                        pass
+
+    def _add_metrics(self, resource_id, metrics):
+        # unlike metric.create, does not fetch the created metrics back
+        self._client.api.post(
+            RESOURCE_METRICS_URL % resource_id,
+            headers={'Content-Type': 'application/json'},
+            data=dumps(metrics))
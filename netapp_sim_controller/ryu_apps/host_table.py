@@ -0,0 +1,161 @@
+'''
+    Table of the hosts discovered by SimpleARP: one record per host (IP
+    address, MAC address and in-port), keyed by integer IP address, with
+    secondary indexes by integer MAC address and by switch.
+'''
+
+
+from socket import inet_aton, inet_ntoa
+from struct import Struct
+
+
+# conversions of addresses (on the packet-in path)
+_IP = Struct('!L')
+
+
+def ip_to_int(ip):
+    return _IP.unpack(inet_aton(ip))[0]
+
+
+def int_to_ip(ip):
+    return inet_ntoa(_IP.pack(ip))
+
+
+def mac_to_int(mac):
+    return int(mac.replace(':', ''), 16)
+
+
+def int_to_mac(mac):
+    return mac.to_bytes(6, 'big').hex(':')
+
+
+class Host:
+    '''
+        Record of a host.
+
+        Attributes:
+        -----------
+        ip: IP address as int (None while not resolved).
+
+        mac: MAC address as int.
+
+        dpid, port_no: in-port (switch and port the host is attached to).
+    '''
+
+    __slots__ = ('ip', 'mac', 'dpid', 'port_no')
+
+    def __init__(self, ip, mac, dpid=None, port_no=None):
+        self.ip = ip
+        self.mac = mac
+        self.dpid = dpid
+        self.port_no = port_no
+
+    @property
+    def ip_address(self):
+        return None if self.ip is None else int_to_ip(self.ip)
+
+    @property
+    def mac_address(self):
+        return int_to_mac(self.mac)
+
+
+class HostTable:
+    '''
+        Hosts by IP address (resolved hosts only), by MAC address (also
+        hosts located by host events but not resolved yet) and by switch.
+        Iterating over the table yields the resolved hosts.
+    '''
+
+    def __init__(self):
+        self._by_ip = {}  # ip -> Host
+        self._by_mac = {}  # mac -> Host
+        self._by_dpid = {}  # dpid -> mac -> Host
+
+    def __len__(self):
+        return len(self._by_ip)
+
+    def __iter__(self):
+        return iter(list(self._by_ip.values()))
+
+    def __contains__(self, ip):
+        return ip in self._by_ip
+
+    def __getitem__(self, ip):
+        return self._by_ip[ip]
+
+    def get(self, ip):
+        return self._by_ip.get(ip, None)
+
+    def by_mac(self, mac):
+        return self._by_mac.get(mac, None)
+
+    def on_switch(self, dpid):
+        '''
+            Returns list of hosts attached to switch dpid.
+        '''
+        return list(self._by_dpid.get(dpid, {}).values())
+
+    def learn(self, ip, mac, dpid, port_no):
+        '''
+            Records host of IP address ip at MAC address mac and in-port
+            (dpid, port_no), replacing the host previously at ip (if its MAC
+            address changed), and returns it.
+        '''
+        host = self._by_mac.get(mac, None)
+        old = self._by_ip.get(ip, None)
+        if old is not None and old is not host:
+            self.remove(old)
+        if host is None:
+            host = self._by_mac[mac] = Host(None, mac)
+        elif host.ip is not None and host.ip != ip:
+            del self._by_ip[host.ip]
+        host.ip = ip
+        self._by_ip[ip] = host
+        self._move(host, dpid, port_no)
+        return host
+
+    def locate(self, mac, dpid, port_no):
+        '''
+            Records in-port (dpid, port_no) of host of MAC address mac
+            (resolved or not), and returns it.
+        '''
+        host = self._by_mac.get(mac, None)
+        if host is None:
+            host = self._by_mac[mac] = Host(None, mac)
+        self._move(host, dpid, port_no)
+        return host
+
+    def _move(self, host, dpid, port_no):
+        if host.dpid != dpid:
+            self._unindex(host)
+            self._by_dpid.setdefault(dpid, {})[host.mac] = host
+        host.dpid = dpid
+        host.port_no = port_no
+
+    def _unindex(self, host):
+        # removes host from index by switch
+        hosts = self._by_dpid.get(host.dpid, None)
+        if hosts is not None and hosts.get(host.mac, None) is host:
+            del hosts[host.mac]
+            if not hosts:
+                del self._by_dpid[host.dpid]
+
+    def remove(self, host):
+        '''
+            Removes host from table.
+        '''
+        if self._by_mac.get(host.mac, None) is host:
+            del self._by_mac[host.mac]
+        if host.ip is not None and self._by_ip.get(host.ip, None) is host:
+            del self._by_ip[host.ip]
+        self._unindex(host)
+
+    def remove_switch(self, dpid):
+        '''
+            Removes hosts attached to switch dpid from table, and returns
+            them.
+        '''
+        hosts = list(self._by_dpid.pop(dpid, {}).values())
+        for host in hosts:
+            self.remove(host)
+        return hosts
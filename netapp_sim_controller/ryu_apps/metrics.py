@@ -1,16 +1,12 @@
 from time import time
-from urllib3 import disable_warnings
-from urllib3.exceptions import InsecureRequestWarning
 
 from ryu.base.app_manager import RyuApp
 from ryu.lib.hub import spawn, sleep
 
-from keystoneauth1.session import Session
-from keystoneauth1.identity.v3 import Password
-from gnocchiclient.client import Client
-from gnocchiclient.exceptions import Conflict, NotFound
-
 from common import *
+from export_pipeline import ExportPipeline
+from host_table import ip_to_int
+from metrics_sinks import SINKS
 
 
 RESOURCE_TYPES = {
@@ -61,6 +57,21 @@ RESOURCE_TYPES = {
         },
         'metrics': ['bandwidth', 'delay', 'jitter', 'loss_rate'],
         'units': ['Mbit/s', 's', 's', '']
+    },
+    'sdn_exporter': {
+        'def': {
+            'name': 'sdn_exporter',
+            'attributes': {
+                'node': {
+                    'max_length': 255,
+                    'min_length': 0,
+                    'required': True,
+                    'type': 'string'
+                }
+            }
+        },
+        'metrics': ['queue.depth', 'export.latency', 'spilled', 'dropped'],
+        'units': ['', 's', '', '']
     }
 }
 
@@ -69,7 +80,15 @@ class Metrics(RyuApp):
     '''
         Ryu app for sending monitoring measures collected from various other 
         apps (like network_monitor, network_delay_detector and delay_monitor) 
-        periodically to OpenStack's Ceilometer (Gnocchi time series database).
+        periodically to a sink chosen in conf.yml: OpenStack's Ceilometer 
+        (Gnocchi time series database), a Prometheus /metrics endpoint or an 
+        embedded time series store.
+
+        Measures are collected every period and handed to an export pipeline
+        (bounded queue and export workers), so that a slow or unreachable
+        Gnocchi does not stall collection. The pipeline's own metrics (queue
+        depth, export latency, spilled and dropped periods) are exported
+        along with the measures.
 
         Requirements:
         -------------
@@ -82,6 +101,15 @@ class Metrics(RyuApp):
         NetworkDelayDetector app: for switch-switch link delays.
 
         DelayMonitor: for host-switch link delays.
+
+        WSGIApplication (built-in, set by main app): for the REST API of the
+        sink (if any).
+
+        Attributes:
+        -----------
+        sink: MetricsSink measures are exported to.
+
+        history: TimeSeriesStore of past measures if sink is tsdb, else None.
     '''
 
     def __init__(self, *args, **kwargs):
@@ -94,38 +122,62 @@ class Metrics(RyuApp):
         self._network_delay_detector = get_app(NETWORK_DELAY_DETECTOR)
         self._delay_monitor = get_app(DELAY_MONITOR)
 
-        self._session = None
-        self._client = None
+        self.wsgi = None
+        self.sink = None
+        self.history = None
         try:
-            self._os_authenticate()
-            self._archive_policies = [
-                ap['name'] for ap in self._client.archive_policy.list()]
+            self.sink = SINKS[METRICS_SINK](RESOURCE_TYPES)
+            self.history = getattr(self.sink, 'store', None)
+            self._pipeline = ExportPipeline(
+                self.sink.export, METRICS_SPILL, METRICS_QUEUE_SIZE,
+                METRICS_WORKERS, METRICS_MAX_BATCH, METRICS_SPILL_MAX)
 
         except Exception as e:
             print(' *** ERROR in metrics.__init__:', e.__class__.__name__, e)
 
         else:
             spawn(self._add_measures)
+            spawn(self._get_services)
+
+    def _get_services(self):
+        while not self.wsgi:
+            sleep(SERVICE_LOOKUP_INTERVAL)
+        self.sink.serve(self.wsgi)
 
     def _add_measures(self):
+        versions = {}  # monitor -> version of last exported snapshot
         while True:
             sleep(MONITOR_PERIOD)
+            # measures are read from monitors' snapshots, which do not change
+            # while being iterated, and only if they changed since last export
+            bandwidths = self._network_monitor.snapshots.get(
+                versions.get(NETWORK_MONITOR, None))
+            links = self._network_delay_detector.snapshots.get(
+                versions.get(NETWORK_DELAY_DETECTOR, None))
+            hosts = self._delay_monitor.snapshots.get(
+                versions.get(DELAY_MONITOR, None))
+            if not bandwidths and not links and not hosts:
+                continue
+
             try:
                 measures = {}
+                resources = []
                 t = time()
-                for dpid, ports in self._network_monitor.free_bandwidth.items():
+                free_bandwidth = (
+                    bandwidths.free_bandwidth if bandwidths else {})
+                for dpid, ports in free_bandwidth.items():
                     for port_no, (bw_up, bw_down) in ports.items():
                         try:
                             node = str(dpid).zfill(16)
                             port_name = self._switches.dps[dpid].ports[
                                 port_no].name.decode()
                             id = node + ':' + port_name
-                            self._ensure_resource('sdn_port', {
+                            resources.append(('sdn_port', {
                                 'id': id,
                                 'name': port_name,
                                 'number': port_no,
                                 'node': node
-                            })
+                            }))
 
                             measures.update({
                                 id: {
@@ -144,17 +196,18 @@ class Metrics(RyuApp):
                             print(' *** ERROR in metrics._add_measures:',
                                   e.__class__.__name__, e)
 
-                for src_dpid, dsts in self._network_delay_detector.delay.items():
+                loss_rate = self._network_monitor.snapshots.get().loss_rate
+                for src_dpid, dsts in (links.delay if links else {}).items():
                     for dst_dpid, delay in dsts.items():
                         try:
                             src = str(src_dpid).zfill(16)
                             dst = str(dst_dpid).zfill(16)
                             id = src + '->' + dst
-                            self._ensure_resource('sdn_link', {
+                            resources.append(('sdn_link', {
                                 'id': id,
                                 'src': src,
                                 'dst': dst
-                            })
+                            }))
 
                             measures.update({
                                 id: {
@@ -164,11 +217,12 @@ class Metrics(RyuApp):
                                     }],
                                     'jitter': [{
                                         'timestamp': t,
-                                        'value': self._network_delay_detector.jitter[src_dpid][dst_dpid]
+                                        'value': links.jitter[src_dpid][
+                                            dst_dpid]
                                     }],
                                     'loss_rate': [{
                                         'timestamp': t,
-                                        'value': self._network_monitor.loss_rate[src_dpid][dst_dpid]
+                                        'value': loss_rate[src_dpid][dst_dpid]
                                     }]
                                 }
                             })
@@ -177,17 +231,18 @@ class Metrics(RyuApp):
                             print(' *** ERROR in metrics._add_measures:',
                                   e.__class__.__name__, e)
 
-                for src, delay in self._delay_monitor.delay.items():
+                for src, delay in (hosts.delay if hosts else {}).items():
                     try:
                         delay = delay / 2
-                        jitter = self._delay_monitor.jitter[src] / 2
-                        dst = str(self._simple_arp._in_ports[src][0]).zfill(16)
+                        jitter = hosts.jitter[src] / 2
+                        dst = str(self._simple_arp.hosts[
+                            ip_to_int(src)].dpid).zfill(16)
                         id = src + '->' + dst
-                        self._ensure_resource('sdn_link', {
+                        resources.append(('sdn_link', {
                             'id': id,
                             'src': src,
                             'dst': dst
-                        })
+                        }))
 
                         measures.update({
                             id: {
@@ -203,11 +258,11 @@ class Metrics(RyuApp):
                         })
 
                         id = dst + '->' + src
-                        self._ensure_resource('sdn_link', {
+                        resources.append(('sdn_link', {
                             'id': id,
                             'src': dst,
                             'dst': src
-                        })
+                        }))
 
                         measures.update({
                             id: {
@@ -226,67 +281,25 @@ class Metrics(RyuApp):
                         print(' *** ERROR in metrics._add_measures:',
                               e.__class__.__name__, e)
 
+                id = 'exporter:' + CONTROLLER_IP
+                resources.append(('sdn_exporter', {
+                    'id': id,
+                    'node': CONTROLLER_IP
+                }))
+                measures[id] = {
+                    name: [{'timestamp': t, 'value': value}]
+                    for name, value in self._pipeline.stats().items()}
+
             except Exception as e:
                 print(' *** ERROR in metrics._add_measures:',
                       e.__class__.__name__, e)
 
             else:
-                try:
-                    print(self._client.metric.batch_resources_metrics_measures(
-                        measures))
-
-                except Exception as e:
-                    print(' *** ERROR in metrics._add_measures:',
-                          e.__class__.__name__, e)
-
-    def _os_authenticate(self):
-        if not OS_VERIFY_CERT: 
-            disable_warnings(InsecureRequestWarning)
-        self._session = Session(Password(auth_url=OS_URL + ':' + OS_AUTH_PORT,
-                                         username=OS_USERNAME,
-                                         password=OS_PASSWORD,
-                                         user_domain_id=OS_USER_DOMAIN_ID,
-                                         project_id=OS_PROJECT_ID),
-                                verify=OS_VERIFY_CERT)
-        self._client = Client(1, self._session)
-
-    def _os_ensure_resource_types(self):
-        for type in RESOURCE_TYPES.values():
-            try:
-                self._client.resource_type.create(type['def'])
-            except Conflict:
-                pass
-
-    def _os_ensure_metrics(self, resource_id: str, metrics: list, units: list):
-        os_archive_policy = OS_ARCHIVE_POLICY
-        if os_archive_policy not in self._archive_policies:
-            print(' *** WARNING in metrics._os_ensure_metrics: '
-                  'OPENSTACK:ARCHIVE_POLICY parameter invalid or missing from '
-                  'conf.yml. Defaulting to ceilometer-low.')
-            os_archive_policy = 'ceilometer-low'
-        for i, name in enumerate(metrics):
-            try:
-                self._client.metric.create(
-                    name=name, resource_id=resource_id, unit=units[i],
-                    archive_policy_name=os_archive_policy)
-            except Conflict:
-                pass
-
-    def _os_ensure_resource(self, resource_type: str, attributes: dict):
-        attributes.update({
-            'user_id': OS_USER_ID,
-            'project_id': OS_PROJECT_ID
-        })
-        try:
-            self._client.resource.create(resource_type, attributes)
-        except NotFound:
-            self._os_ensure_resource_types()
-            self._client.resource.create(resource_type, attributes)
-        except Conflict:
-            pass
-
-    def _ensure_resource(self, resource_type, attributes):
-        self._os_ensure_resource(resource_type, attributes)
-        self._os_ensure_metrics(attributes['id'],
-                                RESOURCE_TYPES[resource_type]['metrics'],
-                                RESOURCE_TYPES[resource_type]['units'])
+                # snapshots are handed over to the pipeline, which takes care
+                # of retrying their export
+                self._pipeline.put(resources, measures)
+                for monitor, snapshot in ((NETWORK_MONITOR, bandwidths),
+                                          (NETWORK_DELAY_DETECTOR, links),
+                                          (DELAY_MONITOR, hosts)):
+                    if snapshot:
+                        versions[monitor] = snapshot.version
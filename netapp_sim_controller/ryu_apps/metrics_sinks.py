@@ -0,0 +1,257 @@
+'''
+    Destinations of the measures exported by the metrics app, one of which
+    is chosen in conf.yml (METRICS:SINK).
+'''
+
+
+from abc import ABC, abstractmethod
+from math import isinf, isnan
+from operator import itemgetter
+from time import time
+
+from ryu.app.wsgi import ControllerBase, Response, route
+
+from common import *
+from tsdb import TimeSeriesStore
+
+
+PROMETHEUS_SINK = 'prometheus_sink'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4'
+# series not updated for that many monitoring periods are no longer exposed
+PROMETHEUS_STALE_PERIODS = 10
+
+
+class MetricsSink(ABC):
+    '''
+        Base class of sinks.
+
+        Attributes:
+        -----------
+        resource_types: dict mapping resource type name to dict of its
+        definition ('def'), its metric names ('metrics') and their units
+        ('units').
+    '''
+
+    def __init__(self, resource_types):
+        self.resource_types = resource_types
+
+    @abstractmethod
+    def export(self, resources, measures):
+        '''
+            Exports measures (dict mapping resource ID to dict mapping metric
+            name to list of points, as expected by Gnocchi's batch API) of
+            resources (list of tuples of resource type name and attributes,
+            which include 'id'). Raises an exception on failure.
+
+            Called by export workers of the metrics app.
+        '''
+
+    def serve(self, wsgi):
+        '''
+            Registers the sink's REST API (if any) on the WSGI application.
+        '''
+        pass
+
+
+class GnocchiSink(MetricsSink):
+    '''
+        Sink sending measures to OpenStack's Ceilometer (Gnocchi time series
+        database), provisioning resources and metrics on first use.
+
+        Requires the OpenStack client libraries (keystoneauth1 and
+        gnocchiclient), which the other sinks do not.
+    '''
+
+    def __init__(self, resource_types):
+        super(GnocchiSink, self).__init__(resource_types)
+        from urllib3 import disable_warnings
+        from urllib3.exceptions import InsecureRequestWarning
+        from keystoneauth1.session import Session
+        from keystoneauth1.identity.v3 import Password
+        from gnocchiclient.client import Client
+        from gnocchiclient.exceptions import NotFound
+        from gnocchi_registry import GnocchiRegistry
+
+        if not OS_VERIFY_CERT:
+            disable_warnings(InsecureRequestWarning)
+        self._session = Session(
+            Password(auth_url=OS_URL + ':' + OS_AUTH_PORT,
+                     username=OS_USERNAME,
+                     password=OS_PASSWORD,
+                     user_domain_id=OS_USER_DOMAIN_ID,
+                     project_id=OS_PROJECT_ID),
+            verify=OS_VERIFY_CERT)
+        self._client = Client(1, self._session)
+        self._not_found = NotFound
+        archive_policies = [
+            ap['name'] for ap in self._client.archive_policy.list()]
+        os_archive_policy = OS_ARCHIVE_POLICY
+        if os_archive_policy not in archive_policies:
+            print(' *** WARNING in metrics_sinks.GnocchiSink: '
+                  'OPENSTACK:ARCHIVE_POLICY parameter invalid or missing '
+                  'from conf.yml. Defaulting to ceilometer-low.')
+            os_archive_policy = 'ceilometer-low'
+        self._registry = GnocchiRegistry(
+            self._client, GNOCCHI_REGISTRY, resource_types,
+            os_archive_policy, OS_USER_ID, OS_PROJECT_ID)
+
+    def export(self, resources, measures):
+        # measures of resources that could not be provisioned are left out,
+        # so that they don't fail the whole batch
+        self._registry.ensure(resources)
+        measures = {id: measure for id, measure in measures.items()
+                    if id in self._registry}
+        try:
+            self._client.metric.batch_resources_metrics_measures(measures)
+
+        except self._not_found:
+            # some resources were deleted from Gnocchi behind our back, so
+            # provision all of them again on retry
+            self._registry.forget()
+            raise
+
+
+class PrometheusSink(MetricsSink):
+    '''
+        Sink exposing the latest measures in Prometheus text format, on the
+        /metrics route of the WSGI application.
+
+        The exposition is rendered once per export (i.e. once per monitoring
+        period) into a buffer, which scrapes are served from as is. Measures
+        older than the ones exposed (e.g. periods replayed from the export
+        spill) are ignored.
+    '''
+
+    def __init__(self, resource_types):
+        super(PrometheusSink, self).__init__(resource_types)
+        self.body = b''
+        self._labels = {}  # resource ID -> (resource type, labels)
+        self._values = {}  # resource ID -> {metric: (timestamp, value)}
+        self._updated = {}  # resource ID -> time of last export
+
+    def export(self, resources, measures):
+        for resource_type, attributes in resources:
+            labels = ','.join(
+                '%s="%s"' % (name, _escape(value))
+                for name, value in sorted(attributes.items()))
+            self._labels[attributes['id']] = (resource_type, labels)
+
+        t = time()
+        for id, metrics in measures.items():
+            values = self._values.setdefault(id, {})
+            for name, points in metrics.items():
+                if not points:
+                    continue
+                point = max(points, key=_timestamp)
+                held = values.get(name, None)
+                if held is None or point['timestamp'] >= held[0]:
+                    values[name] = (point['timestamp'], point['value'])
+                    self._updated[id] = t
+
+        stale = t - PROMETHEUS_STALE_PERIODS * MONITOR_PERIOD
+        for id in [id for id, u in self._updated.items() if u < stale]:
+            del self._updated[id]
+            self._values.pop(id, None)
+            self._labels.pop(id, None)
+
+        self.body = self._render().encode()
+
+    def _render(self):
+        series = {}  # (resource type, metric) -> list of (labels, value)
+        for id, values in self._values.items():
+            resource_type, labels = self._labels.get(id, (None, None))
+            if resource_type is None:
+                continue
+            for name, (_, value) in values.items():
+                series.setdefault((resource_type, name), []).append(
+                    (labels, value))
+
+        lines = []
+        for resource_type, definition in self.resource_types.items():
+            for name, unit in zip(definition['metrics'], definition['units']):
+                samples = series.get((resource_type, name))
+                if not samples:
+                    continue
+                metric = _metric_name(resource_type + '_' + name)
+                lines.append('# HELP %s %s %s%s' % (
+                    metric, resource_type, name,
+                    ' (' + unit + ')' if unit else ''))
+                lines.append('# TYPE %s gauge' % metric)
+                for labels, value in samples:
+                    lines.append('%s{%s} %s' % (metric, labels,
+                                                _format_value(value)))
+        lines.append('')
+        return '\n'.join(lines)
+
+    def serve(self, wsgi):
+        wsgi.register(PrometheusApi, {PROMETHEUS_SINK: self})
+
+
+class PrometheusApi(ControllerBase):
+    '''
+        REST API of PrometheusSink.
+    '''
+
+    def __init__(self, req, link, data, **config):
+        super(PrometheusApi, self).__init__(req, link, data, **config)
+        self.sink = data[PROMETHEUS_SINK]
+
+    @route('metrics', '/metrics', methods=['GET'])
+    def get_metrics(self, _):
+        return Response(content_type=PROMETHEUS_CONTENT_TYPE,
+                        charset='utf-8', body=self.sink.body)
+
+
+class TSDBSink(MetricsSink):
+    '''
+        Sink appending measures to an embedded columnar time series store
+        (in data/tsdb directory), which keeps them for METRICS:TSDB_RETENTION
+        days and serves history queries.
+
+        Attributes:
+        -----------
+        store: TimeSeriesStore.
+    '''
+
+    def __init__(self, resource_types):
+        super(TSDBSink, self).__init__(resource_types)
+        self.store = TimeSeriesStore(METRICS_TSDB,
+                                     METRICS_TSDB_RETENTION * 86400)
+        self.store.expire(time() - self.store.retention)
+
+    def export(self, resources, measures):
+        for id, metrics in measures.items():
+            for name, points in metrics.items():
+                if points:
+                    self.store.append(
+                        name, id, [point['timestamp'] for point in points],
+                        [point['value'] for point in points])
+
+
+_timestamp = itemgetter('timestamp')
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _format_value(value):
+    # Prometheus spells infinities and NaN its own way
+    value = float(value)
+    if isnan(value):
+        return 'NaN'
+    if isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def _metric_name(name):
+    return ''.join(c if c.isalnum() or c == '_' else '_' for c in name)
+
+
+SINKS = {
+    'gnocchi': GnocchiSink,
+    'prometheus': PrometheusSink,
+    'tsdb': TSDBSink
+}
@@ -14,16 +14,20 @@
 # limitations under the License.
 
 
+from functools import partial
 from time import time
 
 from ryu.base.app_manager import RyuApp
 from ryu.controller.handler import set_ev_cls, MAIN_DISPATCHER
-from ryu.controller.ofp_event import EventOFPPacketIn, EventOFPEchoReply
-from ryu.lib.hub import spawn, sleep
-from ryu.topology.switches import LLDPPacket
-from ryu.topology.event import EventSwitchLeave, EventLinkDelete
+from ryu.controller.ofp_event import EventOFPEchoReply
+from ryu.topology.event import (EventSwitchEnter, EventSwitchLeave,
+                                EventPortAdd, EventPortDelete,
+                                EventLinkDelete)
 
 from common import *
+from packet_in_dispatcher import LLDP_PACKET
+from sample_store import SampleStore
+from snapshot import SnapshotPublisher
 
 
 class NetworkDelayDetector(RyuApp):
@@ -39,6 +43,10 @@ class NetworkDelayDetector(RyuApp):
         -------------
         Switches app (built-in): for datapath and port lists.
 
+        ProbeScheduler app: for sending ECHO requests.
+
+        PacketInDispatcher app: for receiving LLDP packets.
+
         Attributes:
         ----------- 
         lldp_latency: dict mapping src DPID and dst DPID to LLDP latency 
@@ -49,6 +57,11 @@ class NetworkDelayDetector(RyuApp):
 
         delay: dict mapping src DPID and dst DPID to link delay in seconds 
         (one-way).
+
+        jitter: dict mapping src DPID and dst DPID to link jitter in seconds.
+
+        snapshots: SnapshotPublisher of delay and jitter, published each time 
+        they are updated (once per period).
     '''
 
     def __init__(self, *args, **kwargs):
@@ -56,98 +69,106 @@ class NetworkDelayDetector(RyuApp):
         self.name = NETWORK_DELAY_DETECTOR
 
         self._switches = get_app(SWITCHES)
+        # (dpid, port_no) -> Port, to look up LLDP sending timestamps in
+        # Switches app's port data without scanning all ports
+        self._ports = {(port.dpid, port.port_no): port
+                       for port in list(self._switches.ports)}
 
         self.lldp_latency = {}
         self.echo_latency = {}
         self.delay = {}
-        self._delay_history = {}
+        self._delay_history = SampleStore(('delay',), MONITOR_SAMPLES)
         self.jitter = {}
-        spawn(self._detector)
-
-    def _detector(self):
-        while True:
-            self._send_echo_requests()
-            for src, dsts in list(self.lldp_latency.items()):
-                self.delay.setdefault(src, {})
-                self.jitter.setdefault(src, {})
-                for dst, lldp_lat in list(dsts.items()):
-                    '''
-                                        Controller
-                                        |        |
-                        src_echo_latency|        |dst_echo_latency
-                                        |        |
-                                  SwitchA--------SwitchB
-
-                         fwd_lldp_latency------->
-                                         <-------rpl_lldp_latency
-
-                        fwd_delay = (fwd_lldp_latency - dst_echo_latency / 2)
-                        rpl_delay = (rpl_lldp_latency - src_echo_latency / 2)
-                    '''
-                    delay = max(
-                        0, (lldp_lat
-                            - self.echo_latency.get(dst, -float('inf')) / 2))
-                    self.delay[src][dst] = delay 
-
-                    # =========================================================
-                    # code for jitter calculations
-                    key = (src, dst)
-                    self._save_stats(self._delay_history, key, delay, 
-                                     MONITOR_SAMPLES)
-                    if len(self._delay_history[key]) > 1:
-                        self.jitter[src][dst] = abs(
-                            self._delay_history[key][1]
-                            - self._delay_history[key][0])
-                    # =========================================================
-
-            sleep(MONITOR_PERIOD)
-
-    def _send_echo_requests(self):
-        for datapath in list(self._switches.dps.values()):
-            datapath.send_msg(
-                datapath.ofproto_parser.OFPEchoRequest(
-                    datapath, data=bytes('%f' % time(), 'utf-8')))
-
-            # Important! Don't send echo requests together, because that will
-            # generate a lot of echo replies almost at the same time, which
-            # will generate a lot of delay of waiting in queue when handling
-            # echo replies.
-            sleep(0.05)
-
-    def _save_stats(self, _dict, key, value, length):
-        _dict.setdefault(key, [])
-        _dict[key].append(value)
-        if len(_dict[key]) > length:
-            _dict[key].pop(0)
-
-    @set_ev_cls(EventOFPPacketIn, MAIN_DISPATCHER)
-    def _lldp_packet_in_handler(self, ev):
-        msg = ev.msg
-        try:
-            src_dpid, src_port_no = LLDPPacket.lldp_parse(msg.data)
-
-        except LLDPPacket.LLDPUnknownFormat:
-            return
-
-        else:
-            for port, port_data in list(self._switches.ports.items()):
-                lldp_timestamp = port_data.timestamp
-                if (lldp_timestamp
-                        and src_dpid == port.dpid
-                        and src_port_no == port.port_no):
-                    self.lldp_latency.setdefault(src_dpid, {})
-                    self.lldp_latency[src_dpid][msg.datapath.id] = (
-                        ev.timestamp - lldp_timestamp)
-                    return
+        self.snapshots = SnapshotPublisher(delay={}, jitter={})
+
+        self._probe_scheduler = get_app(PROBE_SCHEDULER)
+        self._probe_scheduler.register(NETWORK_DELAY_DETECTOR,
+                                       self._echo_probes,
+                                       on_sweep=self._update_delays)
+
+        get_app(PACKET_IN_DISPATCHER).register(
+            LLDP_PACKET, self._lldp_packet_in_handler)
+
+    def _update_delays(self):
+        for src, dsts in list(self.lldp_latency.items()):
+            self.delay.setdefault(src, {})
+            self.jitter.setdefault(src, {})
+            for dst, lldp_lat in list(dsts.items()):
+                '''
+                                    Controller
+                                    |        |
+                    src_echo_latency|        |dst_echo_latency
+                                    |        |
+                              SwitchA--------SwitchB
+
+                     fwd_lldp_latency------->
+                                     <-------rpl_lldp_latency
+
+                    fwd_delay = (fwd_lldp_latency - dst_echo_latency / 2)
+                    rpl_delay = (rpl_lldp_latency - src_echo_latency / 2)
+                '''
+                delay = max(
+                    0, (lldp_lat
+                        - self.echo_latency.get(dst, -float('inf')) / 2))
+                self.delay[src][dst] = delay 
+
+                # =============================================================
+                # code for jitter calculations
+                key = (src, dst)
+                self._delay_history.append(key, delay)
+                delays = self._delay_history.column(key, 'delay', 2)
+                if len(delays) > 1:
+                    self.jitter[src][dst] = abs(delays[1] - delays[0])
+                # =============================================================
+
+        self.snapshots.publish(delay=self.delay, jitter=self.jitter)
+
+    def _echo_probes(self):
+        return [(datapath.id, partial(self._send_echo_request, datapath))
+                for datapath in list(self._switches.dps.values())]
+
+    def _send_echo_request(self, datapath):
+        datapath.send_msg(
+            datapath.ofproto_parser.OFPEchoRequest(
+                datapath, data=bytes('%f' % time(), 'utf-8')))
+
+    def _lldp_packet_in_handler(self, ev, src):
+        src_dpid, src_port_no = src
+        port = self._ports.get((src_dpid, src_port_no), None)
+        port_data = self._switches.ports.get(port, None)
+        if port_data and port_data.timestamp:
+            self.lldp_latency.setdefault(src_dpid, {})
+            self.lldp_latency[src_dpid][ev.msg.datapath.id] = (
+                ev.timestamp - port_data.timestamp)
 
     @set_ev_cls(EventOFPEchoReply, MAIN_DISPATCHER)
     def _echo_reply_handler(self, ev):
         msg = ev.msg
-        self.echo_latency[msg.datapath.id] = (ev.timestamp - eval(msg.data))
+        sent_at = eval(msg.data)
+        self._probe_scheduler.replied(NETWORK_DELAY_DETECTOR, msg.datapath.id,
+                                      sent_at)
+        self.echo_latency[msg.datapath.id] = (ev.timestamp - sent_at)
+
+    @set_ev_cls(EventSwitchEnter)
+    def _switch_enter_handler(self, ev):
+        for port in ev.switch.ports:
+            self._ports[(port.dpid, port.port_no)] = port
+
+    @set_ev_cls(EventPortAdd)
+    def _port_add_handler(self, ev):
+        port = ev.port
+        self._ports[(port.dpid, port.port_no)] = port
+
+    @set_ev_cls(EventPortDelete)
+    def _port_delete_handler(self, ev):
+        port = ev.port
+        self._ports.pop((port.dpid, port.port_no), None)
 
     @set_ev_cls(EventSwitchLeave)
     def _switch_leave_handler(self, ev):
         dpid = ev.switch.dp.id
+        for port in ev.switch.ports:
+            self._ports.pop((port.dpid, port.port_no), None)
         self.lldp_latency.pop(dpid, None)
         for dsts in list(self.lldp_latency.values()):
             dsts.pop(dpid, None)
@@ -155,9 +176,13 @@ class NetworkDelayDetector(RyuApp):
         self.delay.pop(dpid, None)
         for dsts in list(self.delay.values()):
             dsts.pop(dpid, None)
+        for src, dst in self._delay_history.keys():
+            if dpid in (src, dst):
+                self._delay_history.pop((src, dst))
 
     @set_ev_cls(EventLinkDelete)
     def _link_delete_handler(self, ev):
         link = ev.link
         self.lldp_latency.get(link.src.dpid, {}).pop(link.dst.dpid, None)
         self.delay.get(link.src.dpid, {}).pop(link.dst.dpid, None)
+        self._delay_history.pop((link.src.dpid, link.dst.dpid))
@@ -14,17 +14,37 @@
 # limitations under the License.
 
 
+from functools import partial
+from itertools import chain
+
+from numpy import (array, column_stack, concatenate, divide, fromiter,
+                   maximum, ones, where, zeros, float64, int64, uint64)
+
 from ryu.base.app_manager import RyuApp
 from ryu.controller.handler import set_ev_cls, MAIN_DISPATCHER
 from ryu.controller.ofp_event import (EventOFPPortStatsReply,
                                       EventOFPPortDescStatsReply)
 from ryu.ofproto.ofproto_v1_3 import OFPP_LOCAL
-from ryu.lib.hub import spawn, sleep
+from ryu.ofproto.ofproto_v1_3_parser import OFPPortStats
 from ryu.topology.event import (EventSwitchLeave, EventPortDelete, 
                                 EventLinkAdd, EventLinkDelete)
 
 
 from common import *
+from sample_store import SampleStore
+from snapshot import SnapshotPublisher
+
+
+PORT_STATS_FIELDS = ('tx_bytes', 'rx_bytes', 'tx_packets', 'rx_packets',
+                     'tx_errors', 'rx_errors', 'tx_dropped', 'rx_dropped',
+                     'duration_sec', 'duration_nsec')
+PORT_SPEED_FIELDS = ('up', 'down')
+
+# columns of port numbers and of PORT_STATS_FIELDS in OFPPortStats tuples
+_PORT_NO = OFPPortStats._fields.index('port_no')
+_COLUMNS = [OFPPortStats._fields.index(field) for field in PORT_STATS_FIELDS]
+_TX_BYTES, _RX_BYTES, _TX_PACKETS, _RX_PACKETS = 0, 1, 2, 3
+_DURATION_SEC, _DURATION_NSEC = 8, 9
 
 
 class NetworkMonitor(RyuApp):
@@ -33,26 +53,39 @@ class NetworkMonitor(RyuApp):
         sending OFPPortDescStatsRequest and OFPPortStatsRequest to all 
         switches. Most recent measures are saved in dictionaries. 
 
+        Port stats replies are buffered as they arrive, and speeds, free 
+        bandwidths and loss rates of all ports replied are computed at once, 
+        on a single array, at the end of each monitoring sweep (or when a 
+        switch replies again before).
+
         Requirements:
         -------------
         Switches app (built-in): for datapath and list.
 
+        ProbeScheduler app: for sending requests.
+
         Attributes:
         -----------
         port_features: dict mapping DPID and port number (nested) to tuple of 
         port's state, connected link's state, and port's capacity in kB/s.
 
-        port_stats: dict mapping DPID and port number to list of 
+        port_stats: SampleStore mapping DPID and port number to the 
         MONITOR_SAMPLES number of the most recent measures of port's Tx and Rx 
         bytes, packets, errors, and dropped, and period of measure in seconds 
-        and nanoseconds.
+        and nanoseconds (see PORT_STATS_FIELDS).
 
-        port_speed: dict mapping DPID and port number to list of of 
+        port_speed: SampleStore mapping DPID and port number to the 
         MONITOR_SAMPLES number of the most recent measures of port's speeds 
-        (up and down) in B/s.
+        (up and down) in B/s (see PORT_SPEED_FIELDS).
 
         free_bandwidth: dict mapping DPID and port number (nested) to tuple of 
         port's current available bandwidths (up and down) in Mbit/s.
+
+        loss_rate: dict mapping src DPID and dst DPID (nested) to loss rate 
+        of link.
+
+        snapshots: SnapshotPublisher of free_bandwidth and loss_rate, 
+        published at the end of each monitoring sweep.
     '''
 
     def __init__(self, *args, **kwargs):
@@ -62,34 +95,38 @@ class NetworkMonitor(RyuApp):
         self._switches = get_app(SWITCHES)
 
         self.port_features = {}
-        self.port_stats = {}
-        self.port_speed = {}
+        # counters are uint64 in OpenFlow (all-ones if unsupported)
+        self.port_stats = SampleStore(PORT_STATS_FIELDS, MONITOR_SAMPLES,
+                                      dtype=uint64)
+        self.port_speed = SampleStore(PORT_SPEED_FIELDS, MONITOR_SAMPLES)
         self.free_bandwidth = {}
         self._link_ports = {}
         self.loss_rate = {}
-        spawn(self._monitor)
-
-    def _monitor(self):
-        while True:
-            for datapath in list(self._switches.dps.values()):
-                parser = datapath.ofproto_parser
-                datapath.send_msg(parser.OFPPortDescStatsRequest(datapath, 0))
-                datapath.send_msg(parser.OFPPortStatsRequest(
-                    datapath, 0, datapath.ofproto.OFPP_ANY))
-
-                # Important! Don't send requests together, because that will
-                # generate a lot of replies almost at the same time, which
-                # will generate a lot of delay of waiting in queue when
-                # handling them.
-                sleep(0.05)
-
-            sleep(MONITOR_PERIOD)
-
-    def _save_stats(self, _dict, key, value, length):
-        _dict.setdefault(key, [])
-        _dict[key].append(value)
-        if len(_dict[key]) > length:
-            _dict[key].pop(0)
+        self._replies = {}  # dpid -> port stats replied since last update
+        self._replied = set()  # dpids whose replies are complete
+        # dpid -> (port numbers as bytes and as list, port_stats rows,
+        # port_speed rows, capacities in Mbit/s) of last reply
+        self._port_rows = {}
+        self.snapshots = SnapshotPublisher(free_bandwidth={}, loss_rate={})
+
+        self._probe_scheduler = get_app(PROBE_SCHEDULER)
+        self._probe_scheduler.register(NETWORK_MONITOR, self._stats_probes,
+                                       on_sweep=self._publish)
+
+    def _publish(self):
+        self._update_stats()
+        self.snapshots.publish(free_bandwidth=self.free_bandwidth,
+                               loss_rate=self.loss_rate)
+
+    def _stats_probes(self):
+        return [(datapath.id, partial(self._request_stats, datapath))
+                for datapath in list(self._switches.dps.values())]
+
+    def _request_stats(self, datapath):
+        parser = datapath.ofproto_parser
+        datapath.send_msg(parser.OFPPortDescStatsRequest(datapath, 0))
+        datapath.send_msg(parser.OFPPortStatsRequest(
+            datapath, 0, datapath.ofproto.OFPP_ANY))
 
     @set_ev_cls(EventOFPPortDescStatsReply, MAIN_DISPATCHER)
     def _port_desc_stats_reply_handler(self, ev):
@@ -106,7 +143,7 @@ class NetworkMonitor(RyuApp):
                       ofproto.OFPPS_LIVE: 'Live'}
 
         dpid = datapath.id
-        self.port_features.setdefault(dpid, {})
+        features = dict(self.port_features.setdefault(dpid, {}))
         for port in msg.body:
             port_no = port.port_no
             if port_no != OFPP_LOCAL:
@@ -126,95 +163,134 @@ class NetworkMonitor(RyuApp):
                     config_dict[config] if config in config_dict else 'up',
                     state_dict[state] if state in state_dict else 'up',
                     curr_speed)
+        if self.port_features[dpid] != features:
+            self._port_rows.pop(dpid, None)
 
     @set_ev_cls(EventOFPPortStatsReply, MAIN_DISPATCHER)
     def _port_stats_reply_handler(self, ev):
         msg = ev.msg
         dpid = msg.datapath.id
-        self.free_bandwidth.setdefault(dpid, {})
-        for stat in msg.body:
-            port_no = stat.port_no
-            if port_no != OFPP_LOCAL:
-                key = (dpid, port_no)
-                self._save_stats(
-                    self.port_stats, key, (stat.tx_bytes, stat.rx_bytes,
-                                           stat.tx_packets, stat.rx_packets,
-                                           stat.tx_errors, stat.rx_errors,
-                                           stat.tx_dropped, stat.rx_dropped,
-                                           stat.duration_sec,
-                                           stat.duration_nsec), 
-                                           MONITOR_SAMPLES)
-
-                # =============================================================
-                # this section of the code is changed from the original
-                # the original code combines up speed and down speed
-                # the new code separates them
-                up_pre = 0
-                down_pre = 0
-                period = MONITOR_PERIOD
-                tmp = self.port_stats[key]
-                if len(tmp) > 1:
-                    up_pre = tmp[-2][0]
-                    down_pre = tmp[-2][1]
-                    period = (tmp[-1][-2] + tmp[-1][-1] / (10 ** 9)
-                              - tmp[-2][-2] + tmp[-2][-1] / (10 ** 9))
-                up_speed = ((tmp[-1][0] - up_pre) / period) if period else 0
-                down_speed = ((tmp[-1][1] - down_pre) / period) if period else 0
-                self._save_stats(
-                    self.port_speed, key, (up_speed, down_speed), 
-                    MONITOR_SAMPLES)
-
-                capacity = self.port_features.get(
-                    dpid, {}).get(port_no, (0, 0, 0))[2] / 10**3
-
-                self.free_bandwidth[dpid][port_no] = (
-                    max(capacity - up_speed * 8/10**6, 0),    # unit: Mbit/s
-                    max(capacity - down_speed * 8/10**6, 0))  # unit: Mbit/s
-                # =============================================================
-
-                # =============================================================
-                # code for loss rate calculation
-                # sometimes counters are reset leading to Rx being higher than
-                # Tx, so maybe use packet counts periodically?
-                dst_key = self._link_ports.get(key, (None, None))
-                if dst_key in self.port_stats:
-                    #tx_pre = 0
-                    #rx_pre = 0
-                    tx_pkt = 0
-                    if len(tmp) > 0: # > 1
-                        #tx_pre = tmp[-2][2]
-                        #rx_pre = tmp[-2][3]
-                        tx_pkt = tmp[-1][2]
-                    #tx_pkt = tmp[-1][2] - tx_pre
-                    #rx_pkt = tmp[-1][3] - rx_pre 
-
-                    dst_tmp = self.port_stats[dst_key]
-                    #dst_tx_pre = 0
-                    #dst_rx_pre = 0
-                    if len(dst_tmp) > 0: # > 1
-                        #dst_tx_pre = dst_tmp[-2][2]
-                        #dst_rx_pre = dst_tmp[-2][3]
-                        dst_rx_pkt = dst_tmp[-1][3]
-                    #dst_tx_pkt = dst_tmp[-1][2] - dst_tx_pre
-                    #dst_rx_pkt = dst_tmp[-1][3] - dst_rx_pre
-
-                    try:
-                        loss_rate = max(0, (tx_pkt - dst_rx_pkt) / tx_pkt)
-                    except:
-                        loss_rate = 1
-                    self.loss_rate.setdefault(dpid, {})
-                    self.loss_rate[dpid][dst_key[0]] = loss_rate
-                    #print(key, '->', dst_key, ':', round(loss_rate * 100, 2), 
-                    #      '%', '(Tx=%d,Rx=%d)' % (tx_pkt, dst_rx_pkt))
-                # =============================================================
+        more = msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE
+        if not more:
+            self._probe_scheduler.replied(NETWORK_MONITOR, dpid)
+        # a switch replying again before the end of the sweep gets its
+        # former stats computed first, so that each port appears once per
+        # update
+        if dpid in self._replied:
+            self._update_stats()
+        self._replies.setdefault(dpid, []).extend(msg.body)
+        if not more:
+            self._replied.add(dpid)
+
+    def _rows(self, dpid, port_nos):
+        # rows of ports port_nos (array) of dpid in port_stats and
+        # port_speed, and their capacities, cached as long as the switch
+        # replies with the same ports and they keep the same features
+        key = port_nos.tobytes()
+        rows = self._port_rows.get(dpid, None)
+        if rows is None or rows[0] != key:
+            port_nos = port_nos.tolist()
+            keys = [(dpid, port_no) for port_no in port_nos]
+            features = self.port_features.get(dpid, {})
+            rows = self._port_rows[dpid] = (
+                key, port_nos, self.port_stats.rows(keys),
+                self.port_speed.rows(keys),
+                array([features.get(port_no, (0, 0, 0))[2]
+                       for port_no in port_nos], dtype=float64) / 10**3)
+        return rows
+
+    def _update_stats(self):
+        replies = self._replies
+        self._replies = {}
+        self._replied = set()
+        stats = []
+        for body in replies.values():
+            stats += body
+        if not stats:
+            return
+
+        # all replies are turned into one array (a row per port, OFPPortStats
+        # being tuples) so that speeds and free bandwidths of all ports are
+        # computed at once
+        width = len(OFPPortStats._fields)
+        values = fromiter(chain.from_iterable(stats), dtype=uint64,
+                          count=len(stats) * width).reshape(-1, width)
+        kept = values[:, _PORT_NO] != OFPP_LOCAL
+        ports = []
+        start = 0
+        for dpid, body in replies.items():
+            end = start + len(body)
+            port_nos = values[start:end, _PORT_NO][kept[start:end]]
+            if len(port_nos):
+                ports.append((dpid, self._rows(dpid, port_nos)))
+            start = end
+        if not ports:
+            return
+        values = values[kept][:, _COLUMNS]
+        rows = concatenate([port_rows[2] for _, port_rows in ports])
+        has_pre = self.port_stats.counts(rows) > 0
+        pre = self.port_stats.latest(rows)
+        self.port_stats.append_rows(rows, values)
+
+        # =====================================================================
+        # this section of the code is changed from the original
+        # the original code combines up speed and down speed
+        # the new code separates them
+        now = values[:, _DURATION_SEC] + values[:, _DURATION_NSEC] / 10**9
+        then = pre[:, _DURATION_SEC] + pre[:, _DURATION_NSEC] / 10**9
+        period = where(has_pre, now - then, MONITOR_PERIOD)
+        # differences wrap around modulo 2**64, read as signed they are
+        # negative (as before) if counters were reset
+        up_bytes = (values[:, _TX_BYTES]
+                    - where(has_pre, pre[:, _TX_BYTES], 0)).view(int64)
+        down_bytes = (values[:, _RX_BYTES]
+                      - where(has_pre, pre[:, _RX_BYTES], 0)).view(int64)
+        up_speed = zeros(len(values))
+        down_speed = zeros(len(values))
+        divide(up_bytes, period, out=up_speed, where=period != 0)
+        divide(down_bytes, period, out=down_speed, where=period != 0)
+        self.port_speed.append_rows(
+            concatenate([port_rows[3] for _, port_rows in ports]),
+            column_stack((up_speed, down_speed)))
+
+        capacity = concatenate([port_rows[4] for _, port_rows in ports])
+        free_up = maximum(capacity - up_speed * 8/10**6, 0)  # unit: Mbit/s
+        free_down = maximum(capacity - down_speed * 8/10**6, 0)  # Mbit/s
+        free = zip(free_up.tolist(), free_down.tolist())
+        for dpid, port_rows in ports:
+            self.free_bandwidth.setdefault(dpid, {}).update(
+                zip(port_rows[1], free))
+        # =====================================================================
+
+        # =====================================================================
+        # code for loss rate calculation
+        # sometimes counters are reset leading to Rx being higher than
+        # Tx, so maybe use packet counts periodically?
+        links = [(src, dst) for src, dst in list(self._link_ports.items())
+                 if src in self.port_stats and dst in self.port_stats]
+        if not links:
+            return
+        tx_pkt = self.port_stats.latest(self.port_stats.rows(
+            [src for src, _ in links]))[:, _TX_PACKETS]
+        dst_rx_pkt = self.port_stats.latest(self.port_stats.rows(
+            [dst for _, dst in links]))[:, _RX_PACKETS]
+        lost = (tx_pkt - dst_rx_pkt).view(int64)
+        loss_rate = ones(len(links))
+        divide(maximum(lost, 0), tx_pkt, out=loss_rate, where=tx_pkt != 0)
+        for (src, dst), rate in zip(links, loss_rate.tolist()):
+            self.loss_rate.setdefault(src[0], {})[dst[0]] = rate
+        # =====================================================================
 
     @set_ev_cls(EventSwitchLeave)
     def _switch_leave_handler(self, ev):
         dpid = ev.switch.dp.id
         self.port_features.pop(dpid, None)
-        for _, port_no in list(self.port_stats):
+        self._replies.pop(dpid, None)
+        self._replied.discard(dpid)
+        self._port_rows.pop(dpid, None)
+        for _, port_no in self.port_stats.keys():
             self.port_stats.pop((dpid, port_no), None)
-        for _, port_no in list(self.port_speed):
+        for _, port_no in self.port_speed.keys():
             self.port_speed.pop((dpid, port_no), None)
         self.free_bandwidth.pop(dpid, None)
 
@@ -226,6 +302,7 @@ class NetworkMonitor(RyuApp):
         self.port_features.get(dpid, {}).pop(port_no)
         self.port_stats.pop((dpid, port_no), None)
         self.port_speed.pop((dpid, port_no), None)
+        self._port_rows.pop(dpid, None)
         self.free_bandwidth.get(dpid, {}).pop(port_no, None)
 
     @set_ev_cls(EventLinkAdd)
@@ -0,0 +1,148 @@
+from collections import namedtuple
+from struct import Struct
+
+from ryu.base.app_manager import RyuApp
+from ryu.controller.handler import set_ev_cls, MAIN_DISPATCHER
+from ryu.controller.ofp_event import EventOFPPacketIn
+from ryu.lib.addrconv import mac as mac_conv
+from ryu.lib.packet.arp import ARP_HW_TYPE_ETHERNET
+from ryu.lib.packet.packet import Packet
+from ryu.lib.packet.ether_types import (ETH_TYPE_ARP, ETH_TYPE_IP,
+                                        ETH_TYPE_LLDP, ETH_TYPE_8021Q,
+                                        ETH_TYPE_8021AD)
+from ryu.lib.packet.in_proto import IPPROTO_ICMP
+from ryu.topology.switches import LLDPPacket
+
+from common import *
+
+
+# packet kinds handlers can register for
+ARP_PACKET = 'arp'
+ICMP_PACKET = 'icmp'  # ICMP packets sent to controller decoy
+LLDP_PACKET = 'lldp'
+
+_CONTROLLER_MAC = mac_conv.text_to_bin(CONTROLLER_MAC)
+
+# ARP header of Ethernet/IPv4 packets: hardware and protocol types and
+# address lengths, opcode, sender MAC and IP, target MAC and IP
+_ARP_HEADER = Struct('!HHBBH6sL6sL')
+_ARP_TYPES = (ARP_HW_TYPE_ETHERNET, ETH_TYPE_IP, 6, 4)
+
+# ARP packet passed to handlers: Ethernet source MAC address, opcode, sender
+# and target addresses (MAC addresses as bytes, IP addresses as ints)
+ARPHeader = namedtuple('ARPHeader',
+                       ('eth_src', 'opcode', 'src_mac', 'src_ip',
+                        'dst_mac', 'dst_ip'))
+
+
+def _ethertype(data):
+    # ethertype of raw Ethernet frame (after any VLAN tags) and offset of
+    # its payload, or (None, None) for truncated frames
+    if len(data) < 14:
+        return None, None
+    ethertype = data[12] << 8 | data[13]
+    offset = 14
+    while (ethertype in (ETH_TYPE_8021Q, ETH_TYPE_8021AD)
+           and len(data) >= offset + 4):
+        ethertype = data[offset + 2] << 8 | data[offset + 3]
+        offset += 4
+    return ethertype, offset
+
+
+def classify(data):
+    '''
+        Returns kind of packet (ARP_PACKET, ICMP_PACKET, LLDP_PACKET or None)
+        from its raw Ethernet frame, by only reading its ethertype (after any
+        VLAN tags) and, for IPv4, its protocol number.
+    '''
+    ethertype, offset = _ethertype(data)
+
+    if ethertype == ETH_TYPE_ARP:
+        return ARP_PACKET
+    if ethertype == ETH_TYPE_LLDP:
+        return LLDP_PACKET
+    if (ethertype == ETH_TYPE_IP
+            and len(data) > offset + 9
+            and data[offset + 9] == IPPROTO_ICMP
+            and data[:6] == _CONTROLLER_MAC):
+        return ICMP_PACKET
+    return None
+
+
+def parse_arp(data):
+    '''
+        Returns ARPHeader of raw Ethernet frame of ARP packet, read from its
+        bytes (None if it is not an Ethernet/IPv4 ARP packet).
+    '''
+    _, offset = _ethertype(data)
+    if offset is None or len(data) < offset + _ARP_HEADER.size:
+        return None
+    header = _ARP_HEADER.unpack_from(data, offset)
+    if header[:4] != _ARP_TYPES:
+        return None
+    return ARPHeader(data[6:12], *header[4:])
+
+
+def _parse_packet(data):
+    return Packet(data)
+
+
+def _parse_lldp(data):
+    try:
+        return LLDPPacket.lldp_parse(data)
+
+    except LLDPPacket.LLDPUnknownFormat:
+        return None
+
+
+_PARSERS = {
+    ARP_PACKET: parse_arp,
+    ICMP_PACKET: _parse_packet,
+    LLDP_PACKET: _parse_lldp
+}
+
+
+class PacketInDispatcher(RyuApp):
+    '''
+        Ryu app for handling EventOFPPacketIn once for all the other apps.
+        The kind of each packet is read from its raw bytes (without parsing
+        it) and the packet is parsed at most once, then passed to the
+        handlers registered for its kind; other packets are ignored.
+
+        Handlers are called with the event and the parsed packet: an
+        ARPHeader for ARP_PACKET (read with struct, without building address
+        strings), a Packet for ICMP_PACKET, or a (src DPID, src port number)
+        tuple for LLDP_PACKET (malformed ARP packets and LLDP packets not
+        sent by the Switches app are dropped).
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(PacketInDispatcher, self).__init__(*args, **kwargs)
+        self.name = PACKET_IN_DISPATCHER
+
+        self._handlers = {}  # kind -> list of handlers
+
+    def register(self, kind, handler):
+        '''
+            Registers handler for packets of kind (ARP_PACKET, ICMP_PACKET
+            or LLDP_PACKET).
+        '''
+        self._handlers.setdefault(kind, []).append(handler)
+
+    @set_ev_cls(EventOFPPacketIn, MAIN_DISPATCHER)
+    def _packet_in_handler(self, ev):
+        data = ev.msg.data
+        kind = classify(data)
+        handlers = self._handlers.get(kind, None)
+        if not handlers:
+            return
+
+        pkt = _PARSERS[kind](data)
+        if pkt is None:
+            return
+        for handler in handlers:
+            try:
+                handler(ev, pkt)
+            except Exception as e:
+                print(' *** ERROR in packet_in_dispatcher._packet_in_handler:',
+                      e.__class__.__name__, e)
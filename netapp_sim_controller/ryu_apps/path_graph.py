@@ -0,0 +1,463 @@
+'''
+    Weighted graph of switches and hosts for QoS-aware path computation.
+
+    The graph is stored in compact adjacency arrays (CSR: the out-edges of
+    node i are edges indptr[i] to indptr[i + 1] - 1), with the free
+    bandwidth, delay, jitter and loss rate of each edge in NumPy arrays.
+
+    The paths found by queries are cached (their end-to-end metrics are
+    computed from the current metrics of their edges on each query). A metric
+    of an edge is only updated when it moves by more than a threshold, and
+    then only the cached paths it may affect are invalidated: those using the
+    edge if it got worse, all those ranked by the metric if it got better.
+'''
+
+
+from collections import OrderedDict
+from heapq import heappop, heappush
+from math import inf
+
+from numpy import (argsort, array, bincount, concatenate, cumsum, full,
+                   log1p, minimum, zeros, float64, int64)
+
+
+METRICS = ('bandwidth', 'delay', 'jitter', 'loss')
+# additive weights of shortest path queries
+WEIGHTS = ('hops', 'delay', 'jitter', 'loss')
+
+# value of metrics not measured (yet): unknown bandwidth does not constrain
+DEFAULTS = {'bandwidth': inf, 'delay': 0., 'jitter': 0., 'loss': 0.}
+# changes of metrics smaller than these are always ignored
+FLOORS = {'bandwidth': 1., 'delay': 1e-4, 'jitter': 1e-4, 'loss': 1e-3}
+# loss rates are capped so that their weight -log(1 - loss) stays finite
+MAX_LOSS = 1 - 1e-9
+
+
+class PathGraph:
+    '''
+        Graph of nodes (DPIDs of switches, IP addresses of hosts) and
+        directed edges (with the port they leave from), answering
+        k-shortest, widest and delay-constrained path queries, and shortest
+        path trees.
+
+        Attributes:
+        -----------
+        threshold: relative change of a metric below which it is not
+        updated.
+
+        cache_size: max number of cached query results.
+
+        nodes: list of node IDs, by node index.
+
+        index: dict mapping node ID to node index.
+
+        indptr, targets, ports: CSR adjacency arrays (edge's target node
+        index and source port, by edge index).
+
+        metrics: dict mapping metric name to array of values by edge index.
+
+        version: number of topology changes.
+
+        hits, misses: counters of cached and computed query results.
+    '''
+
+    def __init__(self, threshold=0.1, cache_size=1024):
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.nodes = []
+        self.index = {}
+        self.indptr = zeros(1, dtype=int64)
+        self.targets = zeros(0, dtype=int64)
+        self.ports = zeros(0, dtype=int64)
+        self.metrics = {metric: zeros(0, dtype=float64)
+                        for metric in METRICS}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._edges = {}  # (src ID, dst ID) -> edge index
+        self._links = {}  # (src ID, dst ID) -> port
+        self._adj = ([0], [], [])  # indptr, targets and sources as lists
+        self._incoming = None  # node index -> indexes of edges entering it
+        self._lists = {}  # weight -> list of values by edge index
+        self._values = {}  # metric -> list of values by edge index
+        self._cache = OrderedDict()  # key -> (edge paths, edges, metrics)
+        self._by_edge = {}  # edge index -> keys of results using it
+        self._by_metric = {metric: set() for metric in METRICS}
+
+    def __contains__(self, node):
+        return node in self.index
+
+    def set_topology(self, links):
+        '''
+            Sets edges of graph to links (dict mapping (src ID, dst ID) to
+            port of src), keeping the metrics of edges already known. Returns
+            True if the topology changed (which clears cached results).
+        '''
+        links = dict(links)
+        if links == self._links:
+            return False
+
+        nodes = list(dict.fromkeys(
+            node for link in links for node in link))
+        index = {node: i for i, node in enumerate(nodes)}
+        keys = list(links)
+        src = array([index[u] for u, _ in keys], dtype=int64)
+        dst = array([index[v] for _, v in keys], dtype=int64)
+        order = argsort(src, kind='stable')
+        keys = [keys[i] for i in order]
+
+        old_edges = self._edges
+        self.nodes = nodes
+        self.index = index
+        self.indptr = concatenate((zeros(1, dtype=int64), cumsum(
+            bincount(src, minlength=len(nodes))))).astype(int64)
+        self.targets = dst[order]
+        self.ports = array([links[key] for key in keys], dtype=int64)
+        self._edges = {key: e for e, key in enumerate(keys)}
+        self._links = links
+        for metric in METRICS:
+            values = full(len(keys), DEFAULTS[metric], dtype=float64)
+            for e, key in enumerate(keys):
+                old = old_edges.get(key)
+                if old is not None:
+                    values[e] = self.metrics[metric][old]
+            self.metrics[metric] = values
+
+        self._adj = (self.indptr.tolist(), self.targets.tolist(),
+                     src[order].tolist())
+        self._lists = {}
+        self._values = {}
+        self._incoming = None
+        self.clear_cache()
+        self.version += 1
+        return True
+
+    def update_metrics(self, values):
+        '''
+            Updates metrics of edges from values (dict mapping (src ID, dst
+            ID) to dict mapping metric name to value), ignoring changes below
+            threshold, and invalidates cached results they may affect.
+            Returns number of metrics updated.
+        '''
+        worse = {}  # edge -> metrics
+        better = set()  # metrics
+        for key, edge_values in values.items():
+            e = self._edges.get(key)
+            if e is None:
+                continue
+            for metric, new in edge_values.items():
+                if new is None:
+                    new = DEFAULTS[metric]
+                column = self.metrics[metric]
+                old = float(column[e])
+                if not self._moved(metric, old, new):
+                    continue
+                column[e] = new
+                self._lists.pop(metric, None)
+                self._values.pop(metric, None)
+                if (new > old) == (metric == 'bandwidth'):
+                    better.add(metric)
+                else:
+                    worse.setdefault(e, set()).add(metric)
+
+        for metric in better:
+            for key in list(self._by_metric[metric]):
+                self._invalidate(key)
+        for e, metrics in worse.items():
+            for key in list(self._by_edge.get(e, ())):
+                if self._cache[key][2] & metrics:
+                    self._invalidate(key)
+        return len(better) + sum(len(m) for m in worse.values())
+
+    def _moved(self, metric, old, new):
+        if old == new:
+            return False
+        if inf in (old, new):
+            return True
+        delta = abs(new - old)
+        return delta > FLOORS[metric] and delta > self.threshold * abs(old)
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._by_edge = {}
+        self._by_metric = {metric: set() for metric in METRICS}
+
+    def _invalidate(self, key):
+        _, edges, metrics = self._cache.pop(key)
+        for e in edges:
+            keys = self._by_edge.get(e)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_edge[e]
+        for metric in metrics:
+            self._by_metric[metric].discard(key)
+
+    def _weights(self, weight):
+        values = self._lists.get(weight)
+        if values is None:
+            if weight == 'hops':
+                values = [1.] * len(self.targets)
+            elif weight == 'loss':
+                values = (-log1p(-minimum(self.metrics['loss'],
+                                          MAX_LOSS))).tolist()
+            else:
+                values = self._metric(weight)
+            self._lists[weight] = values
+        return values
+
+    def _metric(self, metric):
+        values = self._values.get(metric)
+        if values is None:
+            values = self._values[metric] = self.metrics[metric].tolist()
+        return values
+
+    def _cached(self, key, metrics, src, compute):
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return [self._describe(src, edges) for edges in cached[0]]
+
+        self.misses += 1
+        edge_paths = compute()
+        edges = {e for path in edge_paths for e in path}
+        self._cache[key] = (edge_paths, edges, metrics)
+        for e in edges:
+            self._by_edge.setdefault(e, set()).add(key)
+        for metric in metrics:
+            self._by_metric[metric].add(key)
+        while len(self._cache) > self.cache_size:
+            self._invalidate(next(iter(self._cache)))
+        return [self._describe(src, edges) for edges in edge_paths]
+
+    def _describe(self, src, edges):
+        '''
+            Returns path of edge indexes as dict of nodes, ports and
+            end-to-end metrics (current ones).
+        '''
+        nodes = [self.nodes[src]]
+        nodes.extend(self.nodes[self._adj[1][e]] for e in edges)
+        bandwidths = self._metric('bandwidth')
+        delays = self._metric('delay')
+        jitters = self._metric('jitter')
+        losses = self._metric('loss')
+        bandwidth = min((bandwidths[e] for e in edges), default=inf)
+        delivered = 1.
+        for e in edges:
+            delivered *= 1 - losses[e]
+        return {
+            'nodes': nodes,
+            'ports': [int(self.ports[e]) for e in edges],
+            'hops': len(edges),
+            'delay': sum(delays[e] for e in edges),
+            'jitter': sum(jitters[e] for e in edges),
+            'loss': 1 - delivered,
+            # unknown (not measured) bandwidth is None
+            'bandwidth': None if bandwidth == inf else bandwidth,
+        }
+
+    def _ends(self, src, dst):
+        return self.index[src], self.index[dst]
+
+    def shortest_paths(self, src, dst, k=1, weight='delay'):
+        '''
+            Returns list of (up to) k shortest loopless paths from src to dst
+            (node IDs), by increasing total weight (hops, delay, jitter or
+            loss). Raises KeyError if a node is unknown.
+        '''
+        if weight not in WEIGHTS:
+            raise ValueError('unknown weight %s' % weight)
+        s, t = self._ends(src, dst)
+        return self._cached(
+            ('shortest', src, dst, k, weight), {weight} & set(METRICS), s,
+            lambda: self._k_shortest(s, t, k, self._weights(weight)))
+
+    def widest_path(self, src, dst):
+        '''
+            Returns list of the path from src to dst with the most free
+            bandwidth (fewest hops among them), if any.
+        '''
+        s, t = self._ends(src, dst)
+        return self._cached(('widest', src, dst), {'bandwidth'}, s,
+                            lambda: self._widest(s, t))
+
+    def constrained_path(self, src, dst, max_delay, min_bandwidth=0):
+        '''
+            Returns list of the path from src to dst with the most free
+            bandwidth among those whose delay is at most max_delay and free
+            bandwidth at least min_bandwidth, if any.
+        '''
+        s, t = self._ends(src, dst)
+        return self._cached(
+            ('constrained', src, dst, max_delay, min_bandwidth),
+            {'bandwidth', 'delay'}, s,
+            lambda: self._constrained(s, t, max_delay, min_bandwidth))
+
+    def tree(self, dst, weight='delay'):
+        '''
+            Returns shortest path tree towards dst (node ID) by weight, as
+            dict mapping each node that can reach dst to tuple of the next
+            node and the out-port towards dst. Raises KeyError if dst is
+            unknown.
+        '''
+        if weight not in WEIGHTS:
+            raise ValueError('unknown weight %s' % weight)
+        t = self.index[dst]
+        weights = self._weights(weight)
+        targets, sources = self._adj[1:]
+        if self._incoming is None:
+            self._incoming = [[] for _ in self.nodes]
+            for e, v in enumerate(targets):
+                self._incoming[v].append(e)
+        # Dijkstra from dst over reversed edges
+        dist = {t: 0.}
+        succ = {}
+        heap = [(0., t)]
+        while heap:
+            d, v = heappop(heap)
+            if d > dist[v]:
+                continue
+            for e in self._incoming[v]:
+                u = sources[e]
+                nd = d + weights[e]
+                if nd < dist.get(u, inf):
+                    dist[u] = nd
+                    succ[u] = e
+                    heappush(heap, (nd, u))
+        return {self.nodes[u]: (self.nodes[targets[e]], int(self.ports[e]))
+                for u, e in succ.items()}
+
+    def _dijkstra(self, s, t, weights, banned_nodes=(), banned_edges=(),
+                  bandwidths=None, min_bandwidth=0):
+        # returns (cost, edges) of shortest path from s to t avoiding
+        # banned nodes and edges (and edges under min_bandwidth), or None
+        indptr, targets, sources = self._adj
+        dist = {s: 0.}
+        prev = {}
+        heap = [(0., s)]
+        while heap:
+            d, u = heappop(heap)
+            if u == t:
+                break
+            if d > dist[u]:
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = targets[e]
+                if v in banned_nodes or e in banned_edges or (
+                        bandwidths is not None and
+                        bandwidths[e] < min_bandwidth):
+                    continue
+                nd = d + weights[e]
+                if nd < dist.get(v, inf):
+                    dist[v] = nd
+                    prev[v] = e
+                    heappush(heap, (nd, v))
+        else:
+            return None
+
+        edges = []
+        v = t
+        while v != s:
+            e = prev[v]
+            edges.append(e)
+            v = sources[e]
+        edges.reverse()
+        return dist[t], edges
+
+    def _k_shortest(self, s, t, k, weights):
+        # Yen's algorithm
+        first = self._dijkstra(s, t, weights)
+        if first is None:
+            return []
+        targets = self._adj[1]
+        paths = [first[1]]
+        seen = {tuple(first[1])}
+        candidates = []
+        while len(paths) < k:
+            last = paths[-1]
+            root_nodes = [s] + [targets[e] for e in last]
+            for i in range(len(last)):
+                root = last[:i]
+                banned_edges = {path[i] for path in paths
+                                if len(path) > i and path[:i] == root}
+                found = self._dijkstra(root_nodes[i], t, weights,
+                                       set(root_nodes[:i]), banned_edges)
+                if found is None:
+                    continue
+                path = root + found[1]
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    cost = sum(weights[e] for e in root) + found[0]
+                    heappush(candidates, (cost, len(path), path))
+            if not candidates:
+                break
+            paths.append(heappop(candidates)[2])
+        return paths
+
+    def _widest(self, s, t):
+        # modified Dijkstra maximizing the bottleneck bandwidth
+        indptr, targets, sources = self._adj
+        bandwidths = self._weights('bandwidth')
+        best = {s: inf}
+        hops = {s: 0}
+        prev = {}
+        heap = [(-inf, 0, s)]
+        while heap:
+            b, h, u = heappop(heap)
+            b = -b
+            if u == t:
+                break
+            if b < best[u] or h > hops[u]:
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = targets[e]
+                nb = min(b, bandwidths[e])
+                known = best.get(v, -1)
+                if nb > known or (nb == known and h + 1 < hops[v]):
+                    best[v] = nb
+                    hops[v] = h + 1
+                    prev[v] = e
+                    heappush(heap, (-nb, h + 1, v))
+        else:
+            return []
+
+        edges = []
+        v = t
+        while v != s:
+            e = prev[v]
+            edges.append(e)
+            v = sources[e]
+        edges.reverse()
+        return [edges]
+
+    def _constrained(self, s, t, max_delay, min_bandwidth):
+        # the widest path within the delay bound is the least delay path
+        # over the edges with at least the largest bandwidth level for
+        # which that delay is within the bound (binary search, since lower
+        # levels keep more edges hence never increase the least delay)
+        delays = self._weights('delay')
+        bandwidths = self._weights('bandwidth')
+        levels = sorted({b for b in bandwidths if b >= min_bandwidth})
+        best = None
+        lo, hi = 0, len(levels) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            found = self._dijkstra(s, t, delays, bandwidths=bandwidths,
+                                   min_bandwidth=levels[mid])
+            if found is not None and found[0] <= max_delay:
+                best = found[1]
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        if best is None and s == t:
+            best = []
+        return [] if best is None else [best]
+
+    def stats(self):
+        '''
+            Returns size of graph and counters of cache.
+        '''
+        return {'nodes': len(self.nodes), 'edges': len(self.targets),
+                'version': self.version, 'cached': len(self._cache),
+                'hits': self.hits, 'misses': self.misses}
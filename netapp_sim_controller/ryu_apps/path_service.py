@@ -0,0 +1,241 @@
+'''
+    QoS-aware path computation over the live network graph, as a Ryu app
+    (Python API) with a REST API (GET /paths).
+'''
+
+
+from json import dumps
+
+from ryu.app.wsgi import ControllerBase, Response, route
+from ryu.base.app_manager import RyuApp
+from ryu.controller.handler import set_ev_cls
+from ryu.lib.hub import spawn, sleep
+from ryu.topology.event import (EventSwitchLeave, EventLinkAdd,
+                                EventLinkDelete)
+
+from common import *
+from path_graph import PathGraph, WEIGHTS
+
+
+PATH_API = 'path_api'
+PATH_MODES = ('shortest', 'widest', 'constrained')
+
+
+class PathService(RyuApp):
+    '''
+        Ryu app keeping a weighted graph of switches and hosts, whose edges
+        are switch-switch links (from Switches app) and host-switch links
+        (from ARP table), weighted with the measures of the monitors, and
+        answering k-shortest, widest and delay-constrained path queries.
+
+        Topology is refreshed on link events and every monitoring period,
+        along with the metrics (only changes of more than PATH:THRESHOLD
+        invalidate cached paths).
+
+        Nodes are identified by DPID (int) for switches and IP address (str)
+        for hosts. Paths are dicts of nodes, ports (out-port of each hop,
+        0 for hosts), hops, delay and jitter (in seconds), loss rate and
+        free bandwidth (bottleneck, in Mbit/s, None if not measured yet).
+
+        Requirements:
+        -------------
+        Switches app (built-in): for switch-switch links.
+
+        SimpleARP app: for hosts and their in-ports.
+
+        NetworkMonitor app: for free bandwidth and loss rates.
+
+        NetworkDelayDetector app: for switch-switch link delays.
+
+        DelayMonitor: for host-switch link delays.
+
+        WSGIApplication (built-in, set by main app): for the REST API.
+
+        Attributes:
+        -----------
+        graph: PathGraph.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(PathService, self).__init__(*args, **kwargs)
+        self.name = PATH_SERVICE
+
+        self._switches = get_app(SWITCHES)
+        self._simple_arp = get_app(SIMPLE_ARP)
+        self._network_monitor = get_app(NETWORK_MONITOR)
+        self._network_delay_detector = get_app(NETWORK_DELAY_DETECTOR)
+        self._delay_monitor = get_app(DELAY_MONITOR)
+
+        self.wsgi = None
+        self.graph = PathGraph(PATH_THRESHOLD, PATH_CACHE_SIZE)
+
+        spawn(self._update)
+        spawn(self._get_services)
+
+    def _get_services(self):
+        while not self.wsgi:
+            sleep(SERVICE_LOOKUP_INTERVAL)
+        self.wsgi.register(PathApi, {PATH_API: self})
+
+    def _update(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(' *** ERROR in path_service._update:',
+                      e.__class__.__name__, e)
+            sleep(MONITOR_PERIOD)
+
+    @set_ev_cls([EventSwitchLeave, EventLinkAdd, EventLinkDelete])
+    def _topology_change_handler(self, ev):
+        try:
+            self.update_topology()
+        except Exception as e:
+            print(' *** ERROR in path_service._topology_change_handler:',
+                  e.__class__.__name__, e)
+
+    def hosts(self):
+        '''
+            Returns dict mapping IP address of hosts whose in-port is known
+            to tuple of DPID and port number of their switch.
+        '''
+        return {host.ip_address: (host.dpid, host.port_no)
+                for host in self._simple_arp.hosts}
+
+    def _links(self, hosts):
+        # (src, dst) -> out-port of src, for switch-switch and host-switch
+        # links in both directions
+        links = {(link.src.dpid, link.dst.dpid): link.src.port_no
+                 for link in list(self._switches.links)}
+        for ip, (dpid, port_no) in hosts.items():
+            links[(dpid, ip)] = port_no
+            links[(ip, dpid)] = 0
+        return links
+
+    def update_topology(self):
+        '''
+            Updates topology of graph from the Switches app and ARP table.
+            Returns True if it changed.
+        '''
+        return self.graph.set_topology(self._links(self.hosts()))
+
+    def refresh(self):
+        '''
+            Updates topology and metrics of graph from the Switches app and
+            the latest snapshots of the monitors.
+        '''
+        hosts = self.hosts()
+        self.graph.set_topology(self._links(hosts))
+
+        network = self._network_monitor.snapshots.get()
+        links = self._network_delay_detector.snapshots.get()
+        host_measures = self._delay_monitor.snapshots.get()
+        free_bandwidth = network.free_bandwidth
+        values = {}
+        for link in list(self._switches.links):
+            src, dst = link.src.dpid, link.dst.dpid
+            up = free_bandwidth.get(src, {}).get(link.src.port_no)
+            down = free_bandwidth.get(dst, {}).get(link.dst.port_no)
+            measured = [bw for bw in (up and up[0], down and down[1])
+                        if bw is not None]
+            values[(src, dst)] = {
+                'bandwidth': min(measured) if measured else None,
+                'delay': links.delay.get(src, {}).get(dst),
+                'jitter': links.jitter.get(src, {}).get(dst),
+                'loss': network.loss_rate.get(src, {}).get(dst),
+            }
+        for ip, (dpid, port_no) in hosts.items():
+            # host delays are round trips
+            delay = host_measures.delay.get(ip)
+            jitter = host_measures.jitter.get(ip)
+            delay = None if delay is None else delay / 2
+            jitter = None if jitter is None else jitter / 2
+            up, down = free_bandwidth.get(dpid, {}).get(port_no, (None, None))
+            values[(dpid, ip)] = {'bandwidth': up, 'delay': delay,
+                                  'jitter': jitter}
+            values[(ip, dpid)] = {'bandwidth': down, 'delay': delay,
+                                  'jitter': jitter}
+        self.graph.update_metrics(values)
+
+    def paths(self, src, dst, k=1, weight='delay'):
+        '''
+            Returns list of (up to) k shortest paths from src to dst, by
+            weight (hops, delay, jitter or loss). Raises KeyError if src or
+            dst is unknown.
+        '''
+        return self.graph.shortest_paths(src, dst, k, weight)
+
+    def widest_path(self, src, dst):
+        '''
+            Returns list of the path from src to dst with the most free
+            bandwidth, if any.
+        '''
+        return self.graph.widest_path(src, dst)
+
+    def tree(self, dst, weight='delay'):
+        '''
+            Returns shortest path tree towards dst by weight, as dict mapping
+            each node that can reach dst to tuple of the next node and the
+            out-port towards dst. Raises KeyError if dst is unknown.
+        '''
+        return self.graph.tree(dst, weight)
+
+    def constrained_path(self, src, dst, max_delay, min_bandwidth=0):
+        '''
+            Returns list of the path from src to dst with the most free
+            bandwidth among those with at most max_delay (in seconds) and at
+            least min_bandwidth (in Mbit/s), if any.
+        '''
+        return self.graph.constrained_path(src, dst, max_delay,
+                                           min_bandwidth)
+
+
+def _node(value):
+    # DPIDs are given as numbers, hosts as IP addresses
+    return int(value) if value.isdigit() else value
+
+
+class PathApi(ControllerBase):
+    '''
+        REST API of PathService:
+
+        GET /paths?src=<node>&dst=<node>[&mode=shortest&k=1&weight=delay]
+        GET /paths?src=<node>&dst=<node>&mode=widest
+        GET /paths?src=<node>&dst=<node>&mode=constrained&max_delay=<s>
+            [&min_bandwidth=<Mbit/s>]
+    '''
+
+    def __init__(self, req, link, data, **config):
+        super(PathApi, self).__init__(req, link, data, **config)
+        self.service = data[PATH_API]
+
+    @route('paths', '/paths', methods=['GET'])
+    def get_paths(self, req):
+        params = req.GET
+        mode = params.get('mode', 'shortest')
+        weight = params.get('weight', 'delay')
+        try:
+            src = _node(params['src'])
+            dst = _node(params['dst'])
+            k = int(params.get('k', 1))
+            max_delay = float(params.get('max_delay', 0))
+            min_bandwidth = float(params.get('min_bandwidth', 0))
+            if mode not in PATH_MODES or weight not in WEIGHTS or k < 1 or (
+                    mode == 'constrained' and 'max_delay' not in params):
+                raise ValueError
+        except (KeyError, ValueError):
+            return Response(status=400)
+
+        graph = self.service.graph
+        if src not in graph or dst not in graph:
+            return Response(status=404)
+        if mode == 'widest':
+            paths = self.service.widest_path(src, dst)
+        elif mode == 'constrained':
+            paths = self.service.constrained_path(src, dst, max_delay,
+                                                  min_bandwidth)
+        else:
+            paths = self.service.paths(src, dst, k, weight)
+        return Response(content_type='application/json', charset='utf-8',
+                        text=dumps({'version': graph.version,
+                                    'paths': paths}))
@@ -0,0 +1,204 @@
+from collections import deque
+from random import random
+from time import time
+
+from ryu.base.app_manager import RyuApp
+from ryu.controller.handler import set_ev_cls
+from ryu.lib.hub import spawn, sleep
+from ryu.topology.event import EventSwitchLeave
+
+from common import *
+
+
+# a target whose replies take longer than this ratio of the period (or that
+# does not reply at all) is probed every 2, 4, ..., MAX_BACKOFF sweeps
+SLOW_REPLY_RATIO = 0.5
+MAX_BACKOFF = 8
+
+# requests unanswered after this number of periods are considered lost
+LOST_AFTER = 2
+
+# weight of the newest reply time in the smoothed reply time
+RTT_WEIGHT = 0.2
+
+# in seconds, margin between the time a probe is recorded as sent and the
+# time its sender stamps it with
+STAMP_SLACK = 0.001
+
+
+class ProbeScheduler(RyuApp):
+    '''
+        Ryu app for sending the periodic probes of the other apps (OpenFlow
+        stats requests, ECHO requests, ICMP pings, ARP requests, etc.). Each
+        probe class is registered with a generator of probes that is swept
+        once per period, its probes being spread evenly (and jittered) over
+        the period instead of being sent back to back or at fixed intervals.
+
+        Probes are sent to targets (a switch, a host, etc.). At most
+        MONITOR_MAX_IN_FLIGHT probes of a class are left unanswered per
+        target, and targets that reply slowly (or not at all) are probed
+        less often by that class until they recover, without affecting the
+        other classes nor the other targets of the same switch.
+
+        Requirements:
+        -------------
+        Switches app (built-in): for switch removal.
+
+        Attributes:
+        -----------
+        sweep_period: dict mapping probe class name to the duration in
+        seconds of its last full sweep (should be close to its period).
+
+        rtt: dict mapping probe class name and target (as a tuple) to
+        smoothed reply time in seconds.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(ProbeScheduler, self).__init__(*args, **kwargs)
+        self.name = PROBE_SCHEDULER
+
+        self.sweep_period = {}
+        self.rtt = {}
+        self._periods = {}  # name -> period
+        self._in_flight = {}  # (name, target) -> deque of sending timestamps
+        self._backoff = {}  # (name, target) -> probed every n sweeps
+        self._threads = {}
+
+    def register(self, name, probes, period=MONITOR_PERIOD, acked=True,
+                 on_sweep=None):
+        '''
+            Registers (or replaces) probe class name. probes is a callable
+            returning an iterable of (DPID, send) pairs or (DPID, send,
+            target) triples, send being a callable that sends one probe to
+            target (switch DPID itself if not given) by way of switch DPID.
+            If acked, replied must be called when the reply to a probe is
+            received. on_sweep, if given, is called at the end of each
+            sweep.
+        '''
+        self._periods[name] = period
+        thread = self._threads.pop(name, None)
+        if thread:
+            thread.kill()
+        self._threads[name] = spawn(
+            self._sweep_loop, name, probes, period, acked, on_sweep)
+
+    def run_once(self, name, probes, period=MONITOR_PERIOD, acked=False):
+        '''
+            Sweeps probes once (in the background), spread over period.
+        '''
+        spawn(self._sweep, name, probes, period, acked, 0)
+
+    def replied(self, name, target, sent_at=None):
+        '''
+            Acknowledges a probe of class name sent to target: the one sent
+            at time sent_at if the reply carries it (probes sent before are
+            then lost), else the oldest unanswered one.
+        '''
+        key = (name, target)
+        sent = self._in_flight.get(key, None)
+        if not sent:
+            return
+        if sent_at is None:
+            sent_at = sent.popleft()
+        else:
+            matched = 0
+            while sent and sent[0] <= sent_at + STAMP_SLACK:
+                sent.popleft()
+                matched += 1
+            if not matched:
+                return  # already considered lost
+            # probes sent before the one replied to are lost
+            for _ in range(matched - 1):
+                self._slow_down(key)
+        rtt = time() - sent_at
+        self.rtt[key] = (RTT_WEIGHT * rtt
+                         + (1 - RTT_WEIGHT) * self.rtt.get(key, rtt))
+        if rtt > SLOW_REPLY_RATIO * self._periods.get(name, MONITOR_PERIOD):
+            self._slow_down(key)
+        else:
+            self._speed_up(key)
+
+    def _slow_down(self, key):
+        self._backoff[key] = min(2 * self._backoff.get(key, 1), MAX_BACKOFF)
+
+    def _speed_up(self, key):
+        backoff = self._backoff.get(key, 1) // 2
+        if backoff > 1:
+            self._backoff[key] = backoff
+        else:
+            self._backoff.pop(key, None)
+
+    def _may_send(self, key, period, acked, sweep):
+        if sweep % self._backoff.get(key, 1):
+            return False
+        if not acked:
+            return True
+
+        sent = self._in_flight.setdefault(key, deque())
+        now = time()
+        while sent and now - sent[0] > LOST_AFTER * period:
+            sent.popleft()
+            self._slow_down(key)
+        if len(sent) >= MONITOR_MAX_IN_FLIGHT:
+            return False
+        sent.append(now)
+        return True
+
+    def _forget(self, keys):
+        for key in keys:
+            self.rtt.pop(key, None)
+            self._in_flight.pop(key, None)
+            self._backoff.pop(key, None)
+
+    def _sweep(self, name, probes, period, acked, sweep):
+        start = time()
+        try:
+            targets = list(probes())
+        except Exception as e:
+            print(' *** ERROR in probe_scheduler._sweep:', name,
+                  e.__class__.__name__, e)
+            targets = []
+
+        targets = [((name, probe[2] if len(probe) > 2 else probe[0]),
+                    probe[1]) for probe in targets]
+        # state of targets no longer probed is dropped
+        keys = {key for key, _ in targets}
+        self._forget([key for key in list(self._in_flight)
+                      if key[0] == name and key not in keys])
+
+        interval = period / len(targets) if targets else 0
+        for i, (key, send) in enumerate(targets):
+            # each probe is sent at a random time within its own slot, so
+            # that probes of different classes do not line up
+            delay = start + (i + random()) * interval - time()
+            if delay > 0:
+                sleep(delay)
+            if self._may_send(key, period, acked, sweep):
+                try:
+                    send()
+                except Exception as e:
+                    print(' *** ERROR in probe_scheduler._sweep:', name,
+                          e.__class__.__name__, e)
+        return start
+
+    def _sweep_loop(self, name, probes, period, acked, on_sweep):
+        sweep = 0
+        while True:
+            start = self._sweep(name, probes, period, acked, sweep)
+            sleep(max(0, start + period - time()))
+            self.sweep_period[name] = time() - start
+            sweep += 1
+            if on_sweep:
+                try:
+                    on_sweep()
+                except Exception as e:
+                    print(' *** ERROR in probe_scheduler._sweep_loop:', name,
+                          e.__class__.__name__, e)
+
+    @set_ev_cls(EventSwitchLeave)
+    def _switch_leave_handler(self, ev):
+        # state of switch-level probes (hosts behind the switch are dropped
+        # by their class's next sweep)
+        dpid = ev.switch.dp.id
+        self._forget([key for key in list(self._in_flight)
+                      if key[1] == dpid])
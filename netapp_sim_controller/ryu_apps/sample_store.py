@@ -0,0 +1,161 @@
+'''
+    Array-backed ring buffer store shared by the monitoring apps to keep the
+    MONITOR_SAMPLES most recent samples of each monitored item (port, link,
+    host, etc.).
+
+    Each key (e.g. (dpid, port_no) or (src, dst)) is given a row of a
+    preallocated NumPy array. Every row holds twice the window length and
+    each sample is written at both its slot and its mirror slot, so the last
+    N samples of a key are always a contiguous slice: appending is O(1) and
+    reading returns a view, never a copy.
+'''
+
+
+from numpy import empty, minimum, zeros, float64, int64
+
+
+class SampleStore:
+    '''
+        Fixed-length sample histories keyed by arbitrary hashable keys.
+
+        Attributes:
+        -----------
+        fields: tuple of column names (e.g. 'tx_bytes', 'rx_bytes', ...).
+
+        length: number of samples retained per key.
+    '''
+
+    def __init__(self, fields, length, dtype=float64, capacity=64):
+        self.fields = tuple(fields)
+        self.length = int(length)
+        self._index = {field: i for i, field in enumerate(self.fields)}
+        self._dtype = dtype
+        self._rows = {}  # key -> row
+        self._free = []  # released rows
+        self._data = zeros((capacity, 2 * self.length, len(self.fields)),
+                           dtype=dtype)
+        self._head = zeros(capacity, dtype=int64)  # next write slot
+        self._count = zeros(capacity, dtype=int64)  # samples held
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(list(self._rows))
+
+    def keys(self):
+        return list(self._rows)
+
+    def _grow(self):
+        capacity = len(self._head)
+        data = zeros((2 * capacity,) + self._data.shape[1:],
+                     dtype=self._dtype)
+        data[:capacity] = self._data
+        self._data = data
+        head = zeros(2 * capacity, dtype=int64)
+        head[:capacity] = self._head
+        self._head = head
+        count = zeros(2 * capacity, dtype=int64)
+        count[:capacity] = self._count
+        self._count = count
+
+    def row(self, key):
+        '''
+            Returns row of key, allocating one if key is new.
+        '''
+        row = self._rows.get(key, None)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = len(self._rows)
+                if row >= len(self._head):
+                    self._grow()
+            self._rows[key] = row
+        return row
+
+    def rows(self, keys):
+        '''
+            Returns array of rows of keys, allocating rows for new keys.
+        '''
+        rows = empty(len(keys), dtype=int64)
+        for i, key in enumerate(keys):
+            rows[i] = self.row(key)
+        return rows
+
+    def append(self, key, values):
+        '''
+            Appends sample (sequence of values, one per field) to key's
+            history, dropping the oldest one if the history is full.
+        '''
+        row = self.row(key)
+        head = self._head[row]
+        self._data[row, head] = values
+        self._data[row, head + self.length] = values
+        self._head[row] = (head + 1) % self.length
+        if self._count[row] < self.length:
+            self._count[row] += 1
+
+    def append_rows(self, rows, values):
+        '''
+            Vectorized append of one sample per row (values is a 2D array of
+            shape (len(rows), len(fields))). Rows must be unique.
+        '''
+        head = self._head[rows]
+        self._data[rows, head] = values
+        self._data[rows, head + self.length] = values
+        self._head[rows] = (head + 1) % self.length
+        self._count[rows] = minimum(self._count[rows] + 1, self.length)
+
+    def count(self, key):
+        row = self._rows.get(key, None)
+        return 0 if row is None else int(self._count[row])
+
+    def counts(self, rows):
+        return self._count[rows]
+
+    def last(self, key, n=None):
+        '''
+            Returns view of the last n (or all held) samples of key, oldest
+            first, as a 2D array of shape (n, len(fields)).
+        '''
+        row = self._rows.get(key, None)
+        if row is None:
+            return self._data[0, :0]
+        count = int(self._count[row])
+        n = count if n is None else min(n, count)
+        end = self._head[row] + self.length
+        return self._data[row, end - n:end]
+
+    def column(self, key, field, n=None):
+        '''
+            Returns view of the last n (or all held) values of field of key,
+            oldest first.
+        '''
+        return self.last(key, n)[:, self._index[field]]
+
+    def latest(self, rows, back=0):
+        '''
+            Vectorized read of the sample written back samples before the
+            most recent one for each row, as a 2D array of shape
+            (len(rows), len(fields)). Caller should check counts(rows) to
+            know which rows hold enough samples.
+        '''
+        slot = self._head[rows] + self.length - 1 - back
+        return self._data[rows, slot]
+
+    def pop(self, key, default=None):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return default
+        self._head[row] = 0
+        self._count[row] = 0
+        self._free.append(row)
+        return row
+
+    def clear(self):
+        for key in list(self._rows):
+            self.pop(key)
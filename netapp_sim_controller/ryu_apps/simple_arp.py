@@ -13,63 +13,89 @@
 # limitations under the License.
 
 
-from ipaddress import ip_address
-from re import sub
+from collections import deque
+from struct import Struct
+from time import time
 
-from ryu.base.app_manager import RyuApp, lookup_service_brick
-from ryu.controller.handler import set_ev_cls, MAIN_DISPATCHER
-from ryu.controller.ofp_event import EventOFPPacketIn
+from ryu.base.app_manager import RyuApp
+from ryu.controller.handler import set_ev_cls
 from ryu.lib.packet.packet import Packet
 from ryu.lib.packet.ethernet import ethernet
-from ryu.lib.packet.arp import arp, ARP_REQUEST, ARP_REPLY
-from ryu.lib.packet.ether_types import ETH_TYPE_ARP
+from ryu.lib.packet.arp import (arp, ARP_REQUEST, ARP_REPLY,
+                                ARP_HW_TYPE_ETHERNET)
+from ryu.lib.packet.ether_types import ETH_TYPE_ARP, ETH_TYPE_IP
+from ryu.lib.hub import spawn, sleep
 from ryu.lib.mac import BROADCAST_STR
-from ryu.lib.hub import sleep, spawn
 from ryu.topology.event import (EventSwitchEnter, EventSwitchLeave,
-                                EventHostAdd)
+                                EventHostAdd, EventHostMove)
 
 from common import *
+from arp_discovery import IPPool, TokenBucket
+from host_table import (HostTable, ip_to_int, int_to_ip, mac_to_int,
+                        int_to_mac)
+from packet_in_dispatcher import ARP_PACKET
+from timer_wheel import TimerWheel
 
 
-# get individual IP addresses from IP_POOL
-IPS = []
-_pools = sub('[^0-9.:,]+', '', IP_POOL).split(',')
-for _pool in _pools:
-    try:
-        # if _pool is an interval
-        _start, _end = _pool.split(':')
-        for ip in range(int(ip_address(_start).packed.hex(), 16),
-                        int(ip_address(_end).packed.hex(), 16) + 1):
-            IPS.append(ip_address(ip).exploded)
+# IP addresses of IP_POOL, as integer ranges
+IPS, _invalid = IPPool.parse(IP_POOL)
+for _pool in _invalid:
+    print(' *** WARNING in simple_arp: invalid IP address pool or '
+          'value %s.' % _pool)
 
-    except ValueError:
-        # if _pool is one value
-        try:
-            IPS.append(ip_address(_pool).exploded)
+_CONTROLLER_IP = ip_to_int(CONTROLLER_IP)
+_CONTROLLER_MAC = mac_to_int(CONTROLLER_MAC).to_bytes(6, 'big')
 
-        except ValueError:
-            print(' *** WARNING in simple_arp: invalid IP address pool or '
-                  'value %s.', _pool)
+# Ethernet frame of ARP replies, packed from the addresses of ARP headers
+_ARP_REPLY = Struct('!6s6sHHHBBH6sL6sL')
+
+# in seconds, resolution of ARP entries' expiry
+ARP_TICK = 1
+# in seconds, time left to a host to answer the re-resolution of its entry
+# (or to an unknown host to answer a proxied request) before it is dropped
+ARP_TIMEOUT = 3
+# group of each switch through which controller's ARP requests are flooded
+# along a spanning tree of the network, to edge ports
+ARP_FLOOD_GROUP = 0xfffff000
 
 
 class SimpleARP(RyuApp):
     '''
         Ryu app for IPv4 layer discovery through ARP requests sent by 
-        controller to pools of IP addresses by way of each connected switch 
-        (at each consumption of EventSwitchEnter). Creates ARP table mapping 
-        hosts' IP addresses to MAC addresses, updated periodically (by default 
-        every 1 minute).
-
-        Also acts as ARP proxy; responding to hosts' ARP requests which are 
-        all directed to controller via flows installed on switches.
+        controller to pools of IP addresses. Creates ARP table mapping 
+        hosts' IP addresses to MAC addresses. Addresses of the pools not in 
+        the table are swept periodically (by default every 1 minute), each 
+        once across the network: a single request, sent to the root of a 
+        spanning tree of the switches (one per connected set of switches), 
+        which each switch floods through its ARP_FLOOD_GROUP group to its 
+        children in the tree and to its edge ports (ports not linked to 
+        other switches). New switches (at each consumption of 
+        EventSwitchEnter) and new hosts' ports are swept as they appear. All 
+        ARP requests are rate-limited to NETWORK:ARP_RATE per second by a 
+        token bucket.
+
+        Each entry expires ARP_REFRESH after it was last learnt (on a timer 
+        wheel): its host alone is then re-resolved by an ARP request sent 
+        to its in-port only, and the entry is dropped if the host does not 
+        answer within ARP_TIMEOUT. A host that moves is re-resolved on its 
+        new port.
+
+        Also acts as full ARP proxy: hosts' broadcast ARP requests are all 
+        directed to controller via flows installed on switches (instead of 
+        flooding the network), and answered by controller for any host in 
+        the table (unknown hosts are resolved, once per ARP_TIMEOUT, for 
+        the requests that follow).
 
         Requirements:
         -------------
-        Switches app (built-in): for datapath list.
+        Switches app (built-in): for datapath and link lists.
+
+        PacketInDispatcher app: for receiving ARP packets.
 
         Attributes:
         -----------
-        arp_table: dict mapping hosts' IP addresses to MAC addresses.
+        hosts: HostTable of hosts' IP addresses, MAC addresses and in-ports
+        (all as integers; the controller decoy is not included).
     '''
 
     def __init__(self, *args, **kwargs):
@@ -78,71 +104,178 @@ class SimpleARP(RyuApp):
         
         self._switches = get_app(SWITCHES)
 
-        self.arp_table = {CONTROLLER_IP: CONTROLLER_MAC}  # ip -> mac
-        self._reverse_arp_table = {CONTROLLER_MAC: CONTROLLER_IP}  # mac -> ip
-        self._in_ports = {}  # mac -> (dpid, port_no)
-
-        self._threads = {}
-
-    def _arp(self, datapath):
-        while datapath.id in self._switches.dps:
-            self._batch_arp(datapath, ip)
-            if not self.arp_table:
-                sleep(10)
-            else:
-                sleep(ARP_REFRESH)
-
-    def _batch_arp(self, datapath, ip, out_port=None):
-        for ip in IPS:
-            self._request_arp(datapath, ip, out_port)
-
-            # don't send ARP requests together to not overwhelm network
-            # with traffic and controller with handlers
-            sleep(0.05)
-
-    def _request_arp(self, datapath, dst_ip, out_port=None):
+        self.hosts = HostTable()
+        self._expiry = TimerWheel(ARP_TICK)  # ip -> expiry of entry
+        self._pending = set()  # ips being resolved
+        self._tokens = TokenBucket(ARP_RATE)  # of ARP requests
+        self._flood_ports = {}  # dpid -> out-ports of flood group
+        self._roots = []  # datapaths of roots of flood trees
+        self._flood_updated = 0
+
+        get_app(PACKET_IN_DISPATCHER).register(
+            ARP_PACKET, self._arp_packet_in_handler)
+
+        spawn(self._sweep_loop)
+        spawn(self._expiry_loop)
+
+    def _edge_ports(self, dpids=None):
+        # (datapath, port numbers) of switches' ports not linked to other
+        # switches (those of switches dpids only, if given)
+        linked = {(link.src.dpid, link.src.port_no)
+                  for link in list(self._switches.links)}
+        edge_ports = []
+        for dpid, datapath in list(self._switches.dps.items()):
+            if dpids is not None and dpid not in dpids:
+                continue
+            port_nos = [port_no for port_no in (datapath.ports or ())
+                        if port_no <= datapath.ofproto.OFPP_MAX and
+                        (dpid, port_no) not in linked]
+            if port_nos:
+                edge_ports.append((datapath, port_nos))
+        return edge_ports
+
+    def _flood_roots(self):
+        # roots of flood trees, updated at most once per ARP_TICK
+        if time() - self._flood_updated > ARP_TICK:
+            self._roots = self._update_flood()
+            self._flood_updated = time()
+        return self._roots
+
+    def _update_flood(self):
+        # updates the flood groups of switches along a breadth-first
+        # spanning tree of each connected set of switches: each switch
+        # floods to its edge ports and to its children in the tree. Returns
+        # datapaths of roots of trees with edge ports
+        dps = {dpid: datapath
+               for dpid, datapath in list(self._switches.dps.items())
+               if dpid in self._flood_ports}
+        neighbours = {}
+        for link in list(self._switches.links):
+            if link.src.dpid in dps and link.dst.dpid in dps:
+                neighbours.setdefault(link.src.dpid, []).append(
+                    (link.dst.dpid, link.src.port_no))
+        ports = {datapath.id: list(port_nos)
+                 for datapath, port_nos in self._edge_ports(dps)}
+
+        roots = []
+        tree = set()
+        for root in sorted(dps):
+            if root in tree:
+                continue
+            tree.add(root)
+            queue = deque([root])
+            reached = False
+            while queue:
+                dpid = queue.popleft()
+                reached = reached or dpid in ports
+                for neighbour, port_no in neighbours.get(dpid, ()):
+                    if neighbour not in tree:
+                        tree.add(neighbour)
+                        ports.setdefault(dpid, []).append(port_no)
+                        queue.append(neighbour)
+            if reached:
+                roots.append(dps[root])
+
+        for dpid, datapath in dps.items():
+            out_ports = tuple(sorted(ports.get(dpid, ())))
+            if self._flood_ports.get(dpid, None) != out_ports:
+                try:
+                    self._set_flood_group(
+                        datapath, datapath.ofproto.OFPGC_MODIFY, out_ports)
+                except Exception as e:
+                    print(' *** ERROR in simple_arp._update_flood:',
+                          e.__class__.__name__, e)
+        return roots
+
+    def _set_flood_group(self, datapath, command, out_ports):
+        parser = datapath.ofproto_parser
+        datapath.send_msg(
+            parser.OFPGroupMod(
+                datapath, command, datapath.ofproto.OFPGT_ALL,
+                ARP_FLOOD_GROUP,
+                [parser.OFPBucket(actions=[parser.OFPActionOutput(port_no)])
+                 for port_no in out_ports]))
+        self._flood_ports[datapath.id] = out_ports
+
+    def _sweep_loop(self):
+        while True:
+            start = time()
+            try:
+                self._sweep()
+            except Exception as e:
+                print(' *** ERROR in simple_arp._sweep_loop:',
+                      e.__class__.__name__, e)
+            sleep(max(0, start + ARP_REFRESH - time()))
+
+    def _sweep(self, edge_ports=None, done=None):
+        # requests each address of IPS missing from ARP table (known hosts
+        # are refreshed when their entries expire) once, by way of
+        # edge_ports (by default flooded from the roots of flood trees,
+        # updated along the way), until done() is true
+        for ip in IPS.ints():
+            if done is not None and done():
+                return
+            if (ip in self.hosts or ip in self._pending or
+                    ip == _CONTROLLER_IP):
+                continue
+            self._request(self._requests(int_to_ip(ip), edge_ports))
+
+    def _requests(self, ip, edge_ports=None):
+        # arguments of _request_arp requesting ip by way of edge_ports (by
+        # default flooded from the roots of flood trees)
+        if edge_ports is not None:
+            return [(datapath, ip, port_nos)
+                    for datapath, port_nos in edge_ports]
+        return [(datapath, ip, [datapath.ofproto.OFPP_TABLE])
+                for datapath in self._flood_roots()]
+
+    def _request(self, requests):
+        # sends ARP requests, tuples of _request_arp's arguments, as tokens
+        # allow
+        for request in requests:
+            wait = self._tokens.take()
+            if wait:
+                sleep(wait)
+            try:
+                self._request_arp(*request)
+            except Exception as e:
+                print(' *** ERROR in simple_arp._request:',
+                      e.__class__.__name__, e)
+
+    def _request_arp(self, datapath, dst_ip, out_ports,
+                     dst_mac=BROADCAST_STR):
         pkt = Packet()
         pkt.add_protocol(
             ethernet(ethertype=ETH_TYPE_ARP, src=CONTROLLER_MAC,
-                     dst=BROADCAST_STR))
+                     dst=dst_mac))
         pkt.add_protocol(
             arp(opcode=ARP_REQUEST,
                 src_mac=CONTROLLER_MAC, src_ip=CONTROLLER_IP,
-                dst_mac=BROADCAST_STR, dst_ip=dst_ip))
+                dst_mac=dst_mac, dst_ip=dst_ip))
         pkt.serialize()
 
         parser = datapath.ofproto_parser
         ofproto = datapath.ofproto
 
-        if out_port == None:
-            out_port = ofproto.OFPP_FLOOD
-
         datapath.send_msg(
             parser.OFPPacketOut(
                 datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
                 in_port=ofproto.OFPP_CONTROLLER, data=pkt.data,
-                actions=[parser.OFPActionOutput(out_port)]))
+                actions=[parser.OFPActionOutput(out_port)
+                         for out_port in out_ports]))
 
-    def _reply_arp(self, datapath, requested_ip, eth_dst, ip_dst, out_port):
+    def _reply_arp(self, datapath, requested_ip, requested_mac, eth_dst,
+                   ip_dst, out_port):
         # this is needed to resolve decoy controller ARP entries for ARP
         # poisoning prevention systems, by replying to ARP requests sent
         # to controller
         # it also acts as ARP proxy
-        if requested_ip == CONTROLLER_IP:
-            requested_mac = CONTROLLER_MAC
-        else:
-            requested_mac = self.arp_table.get(requested_ip, None)
-
-        if not requested_mac:
-            return
-
-        pkt = Packet()
-        pkt.add_protocol(
-            ethernet(ethertype=ETH_TYPE_ARP, src=requested_mac, dst=eth_dst))
-        pkt.add_protocol(
-            arp(opcode=ARP_REPLY, src_mac=requested_mac, src_ip=requested_ip,
-                dst_mac=eth_dst, dst_ip=ip_dst))
-        pkt.serialize()
+        # (MAC addresses as bytes and IP addresses as ints, as in ARP
+        # headers)
+        data = _ARP_REPLY.pack(
+            eth_dst, requested_mac, ETH_TYPE_ARP, ARP_HW_TYPE_ETHERNET,
+            ETH_TYPE_IP, 6, 4, ARP_REPLY, requested_mac, requested_ip,
+            eth_dst, ip_dst)
 
         parser = datapath.ofproto_parser
         ofproto = datapath.ofproto
@@ -150,7 +283,7 @@ class SimpleARP(RyuApp):
         datapath.send_msg(
             parser.OFPPacketOut(
                 datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
-                in_port=ofproto.OFPP_CONTROLLER, data=pkt.data,
+                in_port=ofproto.OFPP_CONTROLLER, data=data,
                 actions=[parser.OFPActionOutput(out_port)]))
 
     def _add_flow(self, datapath, priority, match, actions):
@@ -161,71 +294,154 @@ class SimpleARP(RyuApp):
                 instructions=[parser.OFPInstructionActions(
                     datapath.ofproto.OFPIT_APPLY_ACTIONS, actions)]))
         
+    def _expiry_loop(self):
+        last = time()
+        while True:
+            sleep(ARP_TICK)
+            ticks = int((time() - last) / ARP_TICK)
+            last += ticks * ARP_TICK
+            try:
+                self._expire(self._expiry.advance(ticks))
+            except Exception as e:
+                print(' *** ERROR in simple_arp._expiry_loop:',
+                      e.__class__.__name__, e)
+
+    def _expire(self, ips):
+        # drops entries of hosts that did not answer, and re-resolves those
+        # of the other expired entries by way of their in-ports
+        requests = []
+        for ip in ips:
+            if ip in self._pending:
+                self._pending.discard(ip)
+                self._forget(ip)
+                continue
+            host = self.hosts.get(ip)
+            datapath = self._switches.dps.get(host.dpid, None) \
+                if host else None
+            if not datapath:
+                self._forget(ip)
+                continue
+            self._pending.add(ip)
+            self._expiry.schedule(ip, ARP_TIMEOUT)
+            requests.append((datapath, int_to_ip(ip), [host.port_no],
+                             int_to_mac(host.mac)))
+        if requests:
+            spawn(self._request, requests)
+
+    def _resolve(self, ip):
+        # requests unknown ip by way of all edge ports, once per
+        # ARP_TIMEOUT
+        if ip in self._pending:
+            return
+        self._pending.add(ip)
+        self._expiry.schedule(ip, ARP_TIMEOUT)
+        spawn(self._request, self._requests(int_to_ip(ip)))
+
+    def _learn(self, ip, mac, dpid, port_no):
+        self.hosts.learn(ip, mac, dpid, port_no)
+        self._pending.discard(ip)
+        self._expiry.schedule(ip, ARP_REFRESH)
+
+    def _forget(self, ip):
+        host = self.hosts.get(ip)
+        if host:
+            self.hosts.remove(host)
+        self._pending.discard(ip)
+        self._expiry.cancel(ip)
+
     @set_ev_cls(EventSwitchEnter)
     def _switch_enter_handler(self, ev):
         datapath = ev.switch.dp
         parser = datapath.ofproto_parser
+        to_controller = [parser.OFPActionOutput(
+            datapath.ofproto.OFPP_CONTROLLER)]
 
         # install flow to allow ARP replies to reach controller decoy
         self._add_flow(
             datapath, 65535,
             parser.OFPMatch(eth_type=ETH_TYPE_ARP, arp_tpa=CONTROLLER_IP),
-            [parser.OFPActionOutput(datapath.ofproto.OFPP_CONTROLLER)])
+            to_controller)
+
+        # install flows to direct hosts' ARP requests to controller (ARP
+        # proxy), except those of controller itself, flooded through the
+        # flood group (empty until the flood trees are updated; deleting
+        # the group of a former connection also deletes its flow)
+        self._set_flood_group(datapath, datapath.ofproto.OFPGC_DELETE, ())
+        self._set_flood_group(datapath, datapath.ofproto.OFPGC_ADD, ())
+        self._flood_updated = 0
+        self._add_flow(
+            datapath, 65534,
+            parser.OFPMatch(eth_type=ETH_TYPE_ARP, arp_op=ARP_REQUEST,
+                            arp_spa=CONTROLLER_IP),
+            [parser.OFPActionGroup(ARP_FLOOD_GROUP)])
+        self._add_flow(
+            datapath, 65533,
+            parser.OFPMatch(eth_type=ETH_TYPE_ARP, arp_op=ARP_REQUEST),
+            to_controller)
 
-        dpid = datapath.id
-        thread = self._threads.get(dpid, None)
-        if thread:
-            thread.kill()
-        self._threads[dpid] = spawn(self._arp, datapath)
+        # discover hosts of new switch without waiting for ARP_REFRESH
+        spawn(self._sweep, self._edge_ports([datapath.id]))
 
     @set_ev_cls(EventHostAdd)
     def _host_add_handler(self, ev):
         # some hosts may take a while before manifesting. when they do, send
         # ARP requests without waiting for ARP_REFRESH
-        host = ev.host
-        mac = host.mac
-        if mac == CONTROLLER_MAC:
+        if ev.host.mac == CONTROLLER_MAC:
             return
 
-        port = host.port
-        dpid = port.dpid
-        port_no = port.port_no
-        self._in_ports[mac] = (dpid, port_no)
+        port = ev.host.port
+        host = self.hosts.locate(mac_to_int(ev.host.mac), port.dpid,
+                                 port.port_no)
 
-        if mac not in self._reverse_arp_table:
-            datapath = self._switches.dps.get(dpid, None)
+        if host.ip is None:
+            datapath = self._switches.dps.get(port.dpid, None)
             if datapath:
-                self._batch_arp(datapath, ip, port_no)
-
-    @set_ev_cls(EventOFPPacketIn, MAIN_DISPATCHER)
-    def _arp_packet_in_handler(self, ev):
-        pkt = Packet(ev.msg.data)
-        arp_pkt = pkt.get_protocol(arp)
-        if arp_pkt:
-            eth = pkt.get_protocol(ethernet)
-            if eth.dst != BROADCAST_STR:
-                src = eth.src
-                src_ip = arp_pkt.src_ip
-                self.arp_table[src_ip] = src
-                self._reverse_arp_table[src] = src_ip
-                self._in_ports[src_ip] = (ev.msg.datapath.id,
-                                          ev.msg.match['in_port'])
-            else:
-                dst_ip = arp_pkt.dst_ip
-                if dst_ip == CONTROLLER_IP:
-                    self._reply_arp(ev.msg.datapath, dst_ip, eth.src,
-                                    arp_pkt.src_ip, ev.msg.match['in_port'])
+                spawn(self._sweep, [(datapath, [port.port_no])],
+                      lambda: host.ip is not None)
+
+    @set_ev_cls(EventHostMove)
+    def _host_move_handler(self, ev):
+        # only the host that moved is re-resolved, on its new port
+        port = ev.dst.port
+        host = self.hosts.locate(mac_to_int(ev.dst.mac), port.dpid,
+                                 port.port_no)
+        if host.ip is not None:
+            self._pending.discard(host.ip)
+            self._expire([host.ip])
+
+    def _arp_packet_in_handler(self, ev, header):
+        # addresses are read from ARP header as ints (and MAC addresses as
+        # bytes), and replies packed from them
+        datapath = ev.msg.datapath
+        in_port = ev.msg.match['in_port']
+        src, dst = header.src_ip, header.dst_ip
+        mac = int.from_bytes(header.eth_src, 'big')
+        if header.opcode != ARP_REQUEST:
+            self._learn(src, mac, datapath.id, in_port)
+            return
+
+        # senders of requests are learnt too (but not hosts probing their
+        # own address)
+        if src not in (0, _CONTROLLER_IP):
+            self._learn(src, mac, datapath.id, in_port)
+        if dst == src:
+            return
+        if dst == _CONTROLLER_IP:
+            self._reply_arp(datapath, dst, _CONTROLLER_MAC, header.eth_src,
+                            src, in_port)
+            return
+        host = self.hosts.get(dst)
+        if host:
+            self._reply_arp(datapath, dst, host.mac.to_bytes(6, 'big'),
+                            header.eth_src, src, in_port)
+        else:
+            self._resolve(dst)
 
     @set_ev_cls(EventSwitchLeave)
     def _switch_leave_handler(self, ev):
-        dpid = ev.switch.dp.id
-        thread = self._threads.get(dpid, None)
-        if thread:
-            thread.kill()
-
-        for mac, (host_dpid, _) in list(self._in_ports.items()):
-            if host_dpid == dpid:
-                ip = self._reverse_arp_table.get(mac, None)
-                self.arp_table.pop(ip, None)
-                self._reverse_arp_table.pop(mac, None)
-                self._in_ports.pop(mac, None)
+        self._flood_ports.pop(ev.switch.dp.id, None)
+        self._flood_updated = 0
+        for host in self.hosts.remove_switch(ev.switch.dp.id):
+            if host.ip is not None:
+                self._pending.discard(host.ip)
+                self._expiry.cancel(host.ip)
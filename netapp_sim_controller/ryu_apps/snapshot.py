@@ -0,0 +1,92 @@
+'''
+    Immutable, versioned snapshots of the measures of the monitoring apps.
+
+    Monitors keep updating their live dicts from event handlers, and publish
+    a frozen copy of them once per sweep (copy-on-write). Readers (exporters,
+    REST handlers, etc.) get the latest snapshot in O(1) and can iterate it
+    without copying it and without it changing under them.
+'''
+
+
+from time import time
+from types import MappingProxyType
+
+
+def freeze(value):
+    '''
+        Returns read-only copy of value (nested dicts become mapping proxies
+        and lists become tuples).
+    '''
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class Snapshot:
+    '''
+        Read-only view of measures, accessible as attributes or items
+        (e.g. snapshot.delay or snapshot['delay']).
+
+        Attributes:
+        -----------
+        version: version number, incremented each time measures change.
+
+        timestamp: time of publication.
+    '''
+
+    __slots__ = ('version', 'timestamp', '_data')
+
+    def __init__(self, version, timestamp, data):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'timestamp', timestamp)
+        object.__setattr__(self, '_data', data)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('snapshots are read-only')
+
+    def __getattr__(self, name):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self._data[name]
+
+    def __contains__(self, name):
+        return name in self._data
+
+    def keys(self):
+        return self._data.keys()
+
+
+class SnapshotPublisher:
+    '''
+        Holds the latest snapshot of a monitor.
+    '''
+
+    def __init__(self, **data):
+        self._snapshot = Snapshot(0, time(), freeze(data))
+
+    def publish(self, **data):
+        '''
+            Publishes a frozen copy of data (measures by name) as the new
+            snapshot, unless it is equal to the current one, and returns the
+            current snapshot.
+        '''
+        data = freeze(data)
+        if data != self._snapshot._data:
+            self._snapshot = Snapshot(self._snapshot.version + 1, time(), data)
+        return self._snapshot
+
+    def get(self, since=None):
+        '''
+            Returns the latest snapshot, or None if since is given and the
+            latest snapshot's version is not newer than since.
+        '''
+        snapshot = self._snapshot
+        if since is not None and snapshot.version <= since:
+            return None
+        return snapshot
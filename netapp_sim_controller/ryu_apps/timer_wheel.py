@@ -0,0 +1,72 @@
+'''
+    Hashed timing wheel: timers are hashed by expiry tick into a fixed ring
+    of slots, so scheduling, cancelling and expiring a timer cost O(1)
+    whatever the number of timers (instead of scanning all of them).
+'''
+
+
+from math import ceil
+
+
+class TimerWheel:
+    '''
+        Wheel of timers identified by key, advanced one tick at a time.
+        Timers longer than a full turn of the wheel stay in their slot for
+        as many extra turns (rounds).
+
+        Attributes:
+        -----------
+        tick: duration of a tick in seconds.
+
+        slots: number of slots (ticks per turn).
+    '''
+
+    def __init__(self, tick, slots=256):
+        self.tick = tick
+        self.slots = slots
+        self._buckets = [{} for _ in range(slots)]  # key -> rounds left
+        self._slot_of = {}  # key -> slot
+        self._cursor = 0
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, key):
+        return key in self._slot_of
+
+    def schedule(self, key, delay):
+        '''
+            (Re)schedules timer key to expire in delay seconds (at least one
+            tick).
+        '''
+        self.cancel(key)
+        ticks = max(1, ceil(delay / self.tick))
+        slot = (self._cursor + ticks) % self.slots
+        self._buckets[slot][key] = (ticks - 1) // self.slots
+        self._slot_of[key] = slot
+
+    def cancel(self, key):
+        '''
+            Cancels timer key (if scheduled).
+        '''
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            del self._buckets[slot][key]
+
+    def advance(self, ticks=1):
+        '''
+            Advances wheel by ticks and returns list of keys of the timers
+            that expired.
+        '''
+        expired = []
+        for _ in range(ticks):
+            self._cursor = (self._cursor + 1) % self.slots
+            bucket = self._buckets[self._cursor]
+            for key, rounds in list(bucket.items()):
+                if rounds:
+                    bucket[key] = rounds - 1
+                else:
+                    del bucket[key]
+                    del self._slot_of[key]
+                    expired.append(key)
+        return expired
@@ -0,0 +1,188 @@
+'''
+    Embedded columnar time series store, kept in local files.
+'''
+
+
+from os import listdir, makedirs
+from os.path import getsize, isdir, join
+from shutil import rmtree
+from urllib.parse import quote, unquote
+
+from numpy import (asarray, float64, memmap, empty, concatenate, argsort,
+                   floor, flatnonzero, diff, minimum, maximum, add)
+
+
+TIMESTAMPS = '.ts'
+VALUES = '.val'
+# in seconds, time span of a partition
+PARTITION = 86400
+ITEM_SIZE = 8  # bytes of a float64
+
+
+class TimeSeriesStore:
+    '''
+        Append-only store of time series (timestamp, value).
+
+        Each metric has its own directory, split in time partitions (one
+        sub-directory per PARTITION seconds, named after its start time).
+        In a partition, each series is stored in two column files: one of
+        timestamps and one of values, both arrays of float64. Columns are
+        memory-mapped for queries, and whole partitions are removed when
+        they fall out of retention.
+
+        Attributes:
+        -----------
+        root: path of the store's directory.
+
+        retention: in seconds, how long points are kept (None for ever).
+    '''
+
+    def __init__(self, root, retention=None):
+        self.root = root
+        self.retention = retention
+        makedirs(root, exist_ok=True)
+
+    def _dir(self, metric, partition=None):
+        path = join(self.root, _quote(metric))
+        if partition is not None:
+            path = join(path, str(partition))
+        return path
+
+    def _partitions(self, metric, start=None, end=None):
+        try:
+            partitions = sorted(
+                int(name) for name in listdir(self._dir(metric))
+                if name.isdigit())
+
+        except FileNotFoundError:
+            return []
+
+        return [p for p in partitions
+                if (start is None or p + PARTITION > start)
+                and (end is None or p < end)]
+
+    def append(self, metric, series, timestamps, values):
+        '''
+            Appends points (timestamps and values, both sequences of numbers)
+            to series of metric. Raises ValueError if a name is empty, '.' or
+            '..'.
+        '''
+        name = _quote(series)
+        timestamps = asarray(timestamps, dtype=float64)
+        values = asarray(values, dtype=float64)
+        partitions = (floor(timestamps / PARTITION) * PARTITION).astype(int)
+        new_partition = False
+        for partition in sorted(set(partitions.tolist())):
+            path = self._dir(metric, partition)
+            if not isdir(path):
+                makedirs(path, exist_ok=True)
+                new_partition = True
+            mask = partitions == partition
+            path = join(path, name)
+            for ext, column in ((TIMESTAMPS, timestamps), (VALUES, values)):
+                with open(path + ext, 'ab') as f:
+                    column[mask].tofile(f)
+
+        if new_partition and self.retention:
+            self.expire(timestamps.max() - self.retention)
+
+    def expire(self, before):
+        '''
+            Removes partitions of all metrics that end before time before.
+        '''
+        for metric in self.metrics():
+            for partition in self._partitions(metric):
+                if partition + PARTITION <= before:
+                    rmtree(self._dir(metric, partition), ignore_errors=True)
+
+    def metrics(self):
+        '''
+            Returns sorted list of metric names.
+        '''
+        return sorted(unquote(name) for name in listdir(self.root)
+                      if isdir(join(self.root, name)))
+
+    def series(self, metric):
+        '''
+            Returns sorted list of names of series of metric.
+        '''
+        names = set()
+        for partition in self._partitions(metric):
+            for name in listdir(self._dir(metric, partition)):
+                if name.endswith(TIMESTAMPS):
+                    names.add(unquote(name[:-len(TIMESTAMPS)]))
+        return sorted(names)
+
+    def query(self, metric, series, start=None, end=None):
+        '''
+            Returns points of series of metric with timestamp in
+            [start, end), as tuple of arrays of timestamps and values sorted
+            by timestamp. Raises ValueError if a name is empty, '.' or '..'.
+        '''
+        name = _quote(series)
+        ts_parts = []
+        val_parts = []
+        for partition in self._partitions(metric, start, end):
+            path = join(self._dir(metric, partition), name)
+            try:
+                # a write may have been interrupted between both columns
+                n = min(getsize(path + TIMESTAMPS),
+                        getsize(path + VALUES)) // ITEM_SIZE
+
+            except FileNotFoundError:
+                continue
+
+            if not n:
+                continue
+            ts = memmap(path + TIMESTAMPS, dtype=float64, mode='r', shape=n)
+            val = memmap(path + VALUES, dtype=float64, mode='r', shape=n)
+            mask = True
+            if start is not None:
+                mask = ts >= start
+            if end is not None:
+                mask = mask & (ts < end)
+            if mask is True:
+                ts_parts.append(asarray(ts).copy())
+                val_parts.append(asarray(val).copy())
+            else:
+                ts_parts.append(ts[mask])
+                val_parts.append(val[mask])
+
+        if not ts_parts:
+            return empty(0), empty(0)
+        ts = concatenate(ts_parts)
+        val = concatenate(val_parts)
+        # points are appended in order, except those exported late (e.g.
+        # after being spilled)
+        if len(ts) > 1 and (diff(ts) < 0).any():
+            order = argsort(ts, kind='stable')
+            ts, val = ts[order], val[order]
+        return ts, val
+
+    def downsample(self, metric, series, step, start=None, end=None):
+        '''
+            Returns points of series of metric with timestamp in
+            [start, end), aggregated in buckets of step seconds, as tuple of
+            arrays of bucket start times, minimums, maximums and averages.
+            Empty buckets are left out.
+        '''
+        ts, val = self.query(metric, series, start, end)
+        if not len(ts):
+            return empty(0), empty(0), empty(0), empty(0)
+        origin = start if start is not None else floor(ts[0] / step) * step
+        buckets = floor((ts - origin) / step)
+        firsts = concatenate(([0], flatnonzero(diff(buckets)) + 1))
+        counts = diff(concatenate((firsts, [len(ts)])))
+        return (origin + buckets[firsts] * step,
+                minimum.reduceat(val, firsts),
+                maximum.reduceat(val, firsts),
+                add.reduceat(val, firsts) / counts)
+
+
+def _quote(name):
+    # names are quoted into file names, which must stay in their directory
+    # (raises ValueError otherwise)
+    quoted = quote(name, safe='')
+    if quoted in ('', '.', '..'):
+        raise ValueError('invalid name: %r' % name)
+    return quoted
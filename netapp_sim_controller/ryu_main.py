@@ -26,11 +26,15 @@ class RyuMain(RyuApp):
     _CONTEXTS = {
         OFP_HANDLER: OFPHandler,
         SWITCHES: Switches,
+        PROBE_SCHEDULER: ProbeScheduler,
+        PACKET_IN_DISPATCHER: PacketInDispatcher,
         SIMPLE_ARP: SimpleARP,
         NETWORK_MONITOR: NetworkMonitor,
         NETWORK_DELAY_DETECTOR: NetworkDelayDetector,
         DELAY_MONITOR: DelayMonitor,
         METRICS: Metrics,
+        PATH_SERVICE: PathService,
+        FORWARDING: Forwarding,
 
         WSGI: WSGIApplication,
         DPSET: DPSet,
@@ -40,17 +44,24 @@ class RyuMain(RyuApp):
     def __init__(self, *args, **kwargs):
         super(RyuMain, self).__init__(*args, **kwargs)
         self.switches = kwargs[SWITCHES]
+        self.probe_scheduler = kwargs[PROBE_SCHEDULER]
+        self.packet_in_dispatcher = kwargs[PACKET_IN_DISPATCHER]
         self.simple_arp = kwargs[SIMPLE_ARP]
         self.network_monitor = kwargs[NETWORK_MONITOR]
         self.network_delay_detector = kwargs[NETWORK_DELAY_DETECTOR]
         self.delay_monitor = kwargs[DELAY_MONITOR]
         self.metrics = kwargs[METRICS]
+        self.path_service = kwargs[PATH_SERVICE]
+        self.forwarding = kwargs[FORWARDING]
 
         self.wsgi = kwargs[WSGI]
         self.dpset = kwargs[DPSET]
         self.flowmanager = kwargs[FLOW_MANAGER]
         self.flowmanager.wsgi = self.wsgi
         self.flowmanager.dpset = self.dpset
+        self.metrics.wsgi = self.wsgi
+        self.path_service.wsgi = self.wsgi
+        self.flowmanager.history = self.metrics.history
 
         spawn(self._test)
 
@@ -63,12 +74,12 @@ class RyuMain(RyuApp):
             # print(i)
             # print()
             print('### ARP TABLE ###')
-            pprint(self.simple_arp.arp_table)
+            pprint({host.ip_address: host.mac_address
+                    for host in self.simple_arp.hosts})
             print('#################')
             print()
-            #pprint(self.simple_arp._reverse_arp_table)
-            #print()
-            #pprint(self.simple_arp._in_ports)
+            #pprint({host.mac_address: (host.dpid, host.port_no)
+            #        for host in self.simple_arp.hosts})
             #print()
             #pprint(self.network_monitor.port_features)
             #print()
@@ -76,17 +87,20 @@ class RyuMain(RyuApp):
             #print()
             #pprint(self.network_monitor.port_speed)
             #print()
+            network = self.network_monitor.snapshots.get()
+            links = self.network_delay_detector.snapshots.get()
+            hosts = self.delay_monitor.snapshots.get()
             print('### FREE BANDWIDTH ###')
-            for dpid, ports in self.network_monitor.free_bandwidth.items():
+            for dpid, ports in network.free_bandwidth.items():
                 for port, (bw_up, bw_down) in ports.items():
                     print('< switch %d, port %d > : UP %.2f Mbps | '
                           'DOWN %.2f Mbps' % (dpid, port, bw_up, bw_down))
             print('######################')
             print()
             print('### LOSS RATE ###')
-            for src in self.network_monitor.loss_rate:
-                for dst in self.network_monitor.loss_rate[src]:
-                    loss = self.network_monitor.loss_rate[src][dst]
+            for src in network.loss_rate:
+                for dst in network.loss_rate[src]:
+                    loss = network.loss_rate[src][dst]
                     print(src, '-->', dst, ':', round(loss * 100, 2), '%')
             print('#################')
             print()
@@ -100,35 +114,38 @@ class RyuMain(RyuApp):
             #    print(dpid, '<-->', 'ctrl', round(lat * 1000, 2), 'ms')
             #print()
             print('### SWITCH DELAY ###')
-            for src in self.network_delay_detector.delay:
-                for dst in self.network_delay_detector.delay[src]:
-                    lat = self.network_delay_detector.delay[src][dst]
+            for src in links.delay:
+                for dst in links.delay[src]:
+                    lat = links.delay[src][dst]
                     print(src, '-->', dst, ':', round(lat * 1000, 2), 'ms')
             print('####################')
             print()
             #for src, dst in self.network_delay_detector._delay_history:
-            #    delays = self.network_delay_detector._delay_history[(src,dst)]
+            #    delays = self.network_delay_detector._delay_history.column(
+            #        (src, dst), 'delay')
             #    print(src, '-->', dst, end='')
             #    pprint([round(delay * 1000, 2) for delay in delays])
             #print()
             print('### SWITCH JITTER ###')
-            for src in self.network_delay_detector.jitter:
-                for dst in self.network_delay_detector.jitter[src]:
-                    jitter = self.network_delay_detector.jitter[src][dst]
+            for src in links.jitter:
+                for dst in links.jitter[src]:
+                    jitter = links.jitter[src][dst]
                     print(src, '-->', dst, ':', round(jitter * 1000, 2), 'ms')
             print('#####################')
             print()
-            #for ip, jitters in self.delay_monitor._delay_history.items():
+            #for ip in self.delay_monitor._delay_history:
+            #    jitters = self.delay_monitor._delay_history.column(
+            #        ip, 'delay')
             #    print(ip, ':', end='')
             #    pprint([round(jitter * 1000, 2) for jitter in jitters])
             #print()
             print('### HOST DELAY ###')
-            for ip, delay in self.delay_monitor.delay.items():
+            for ip, delay in hosts.delay.items():
                 print(ip, '<-> switch :', round(delay * 1000, 2), 'ms')
             print('##################')
             print()
             print('### HOST JITTER ###')
-            for ip, jitter in self.delay_monitor.jitter.items():
+            for ip, jitter in hosts.jitter.items():
                 print(ip, '<-> switch :', round(jitter * 1000, 2), 'ms')
             print('###################')
             print()
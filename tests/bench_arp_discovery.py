@@ -0,0 +1,177 @@
+'''
+    Compares IP_POOL stored as a list of address strings (as before) and as
+    integer ranges, for a pool of 65k addresses (a /16): parse time, memory,
+    membership tests and sweeps of the addresses missing from an ARP table
+    of 1000 hosts. Then runs SimpleARP's discovery sweep of this pool on a
+    k=28 fat-tree of stub datapaths (980 switches, 392 edge switches with 14
+    host ports each), and counts the packet-outs sent: the former sweep
+    (every missing address by way of every edge switch, run over the first
+    /24 only and extrapolated) and the current one (every missing address
+    flooded once along a spanning tree of the switches). Also checks that
+    the flood groups reach every edge port exactly once.
+'''
+
+from ipaddress import ip_address
+from random import sample, seed
+from sys import getsizeof
+from time import perf_counter
+from types import SimpleNamespace as NS
+from unittest.mock import patch
+
+from ryu.base.app_manager import SERVICE_BRICKS
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+from context import *
+from netapp_sim_controller.ryu_apps import simple_arp
+from netapp_sim_controller.ryu_apps.arp_discovery import IPPool
+from netapp_sim_controller.ryu_apps.host_table import ip_to_int
+
+
+POOL = '10.0.0.0:10.0.255.255'
+HOSTS_NB = 1000
+LOOKUPS_NB = 100000
+K = 28
+
+
+class Datapath(object):
+    '''
+        Datapath counting the packet-outs sent, and keeping the out-ports of
+        its flood group.
+    '''
+
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+
+    def __init__(self, id, ports_nb):
+        self.id = id
+        self.ports = dict.fromkeys(range(1, ports_nb + 1))
+        self.packet_outs = 0
+        self.flood_ports = ()
+
+    def send_msg(self, msg):
+        if isinstance(msg, ofproto_v1_3_parser.OFPPacketOut):
+            self.packet_outs += 1
+        elif isinstance(msg, ofproto_v1_3_parser.OFPGroupMod):
+            self.flood_ports = [bucket.actions[0].port
+                                for bucket in msg.buckets]
+
+
+def fat_tree(k):
+    # datapaths and links of a k-ary fat-tree: k pods of k/2 edge switches
+    # (ports 1 to k/2 to hosts, k/2+1 to k to the pod's aggregation
+    # switches) and k/2 aggregation switches (ports 1 to k/2 to the pod's
+    # edge switches, k/2+1 to k to core switches), and (k/2)^2 core
+    # switches (port p to pod p)
+    half = k // 2
+    dps, links = {}, []
+
+    def link(src, src_port_no, dst, dst_port_no):
+        links.append(NS(src=NS(dpid=src, port_no=src_port_no),
+                        dst=NS(dpid=dst, port_no=dst_port_no)))
+        links.append(NS(src=NS(dpid=dst, port_no=dst_port_no),
+                        dst=NS(dpid=src, port_no=src_port_no)))
+
+    edges = [1000 * pod + i for pod in range(k) for i in range(half)]
+    for pod in range(k):
+        for i in range(half):
+            edge, aggregation = 1000 * pod + i, 1000 * pod + half + i
+            for j in range(half):
+                link(edge, half + 1 + j, 1000 * pod + half + j, i + 1)
+                link(aggregation, half + 1 + j, 100000 + half * i + j,
+                     pod + 1)
+    for dpid in {link.src.dpid for link in links}:
+        dps[dpid] = Datapath(dpid, k)
+    return dps, links, edges
+
+
+def flood_reach(dps, links, roots):
+    # edge ports reached by a request flooded from roots, through the flood
+    # groups of switches
+    peers = {(link.src.dpid, link.src.port_no): link.dst.dpid
+             for link in links}
+    reached, queue = [], [root.id for root in roots]
+    while queue:
+        dpid = queue.pop()
+        for port_no in dps[dpid].flood_ports:
+            if (dpid, port_no) in peers:
+                queue.append(peers[(dpid, port_no)])
+            else:
+                reached.append((dpid, port_no))
+    return reached
+
+
+def sweep(name, arp, dps, *args):
+    for datapath in dps.values():
+        datapath.packet_outs = 0
+    measure(name, lambda: arp._sweep(*args))
+    return sum(datapath.packet_outs for datapath in dps.values())
+
+
+def parse_list(text):
+    # former parsing of IP_POOL into IPS
+    ips = []
+    start, end = text.split(':')
+    for ip in range(int(ip_address(start).packed.hex(), 16),
+                    int(ip_address(end).packed.hex(), 16) + 1):
+        ips.append(ip_address(ip).exploded)
+    return ips
+
+
+def measure(name, function):
+    start = perf_counter()
+    result = function()
+    print('%-28s %9.1f ms' % (name, (perf_counter() - start) * 1000))
+    return result
+
+
+if __name__ == '__main__':
+    seed(0)
+    ips = measure('parse (list)', lambda: parse_list(POOL))
+    pool, _ = measure('parse (ranges)', lambda: IPPool.parse(POOL))
+    print('%-28s %9d bytes' % (
+        'memory (list)', getsizeof(ips) + sum(map(getsizeof, ips))))
+    print('%-28s %9d bytes' % (
+        'memory (ranges)', getsizeof(pool.starts) + getsizeof(pool.ends)))
+
+    lookups = sample(ips, LOOKUPS_NB // 2) + [
+        '10.1.%d.%d' % (i // 250, i % 250) for i in range(LOOKUPS_NB // 2)]
+    # lookups in the list are linear: only 1% of them are measured
+    measure('%dk lookups (list)' % (LOOKUPS_NB // 100000),
+            lambda: sum(ip in ips for ip in lookups[::100]))
+    measure('%dk lookups (ranges)' % (LOOKUPS_NB // 1000),
+            lambda: sum(ip in pool for ip in lookups))
+
+    arp_table = {ip: None for ip in sample(ips, HOSTS_NB)}
+    missing = measure('sweep of missing (list)',
+                      lambda: [ip for ip in ips if ip not in arp_table])
+    measure('sweep of missing (ranges)',
+            lambda: [ip for ip in pool if ip not in arp_table])
+
+    dps, links, edges = fat_tree(K)
+    SERVICE_BRICKS.update({
+        SWITCHES: NS(dps=dps, links=links),
+        PACKET_IN_DISPATCHER: NS(register=lambda *args: None)})
+    # requests are sent without waiting for tokens
+    with patch.object(simple_arp, 'spawn'), \
+            patch.object(simple_arp, 'sleep'), \
+            patch.object(simple_arp, 'IPS', pool):
+        arp = simple_arp.SimpleARP()
+        for datapath in dps.values():
+            arp._switch_enter_handler(NS(switch=NS(dp=datapath)))
+        for i, ip in enumerate(arp_table):
+            arp.hosts.learn(ip_to_int(ip), i + 1, edges[i % len(edges)], 1)
+
+        roots = measure('flood trees', arp._update_flood)
+        reached = flood_reach(dps, links, roots)
+        print('%-28s %9d of %d edge ports (%d duplicates)' % (
+            'flood reach', len(set(reached)), len(edges) * K // 2,
+            len(reached) - len(set(reached))))
+
+        edge_ports = arp._edge_ports()
+        with patch.object(simple_arp, 'IPS',
+                          IPPool.parse('10.0.0.0:10.0.0.255')[0]):
+            former = sweep('former sweep (/24)', arp, dps, edge_ports)
+        current = sweep('current sweep', arp, dps)
+    print('%-28s %9d packet-outs' % (
+        'former sweep', former * len(pool) // 256))
+    print('%-28s %9d packet-outs' % ('current sweep', current))
@@ -0,0 +1,170 @@
+'''
+    Compares the former host tables of SimpleARP (dicts of address strings:
+    IP -> MAC, MAC -> IP, and in-ports by MAC and by IP) and the HostTable
+    (one record per host, keyed by integer addresses, indexed by switch),
+    for 10k hosts on 392 switches: memory, lookups by IP address and removal
+    of the hosts of a switch (on switch leave).
+
+    Lookups start from address strings (as parsed by ryu): ARP proxy replies
+    look up the MAC address string of the requested IP address, and in-port
+    lookups the in-port of an IP address. Then ARP requests for known hosts
+    are handled from their raw frames, as on the packet-in path: parsed by
+    ryu, looked up in the dicts and replied to with a packet serialized by
+    ryu (as before), or read by parse_arp, looked up in the table and
+    replied to with a packed frame (by SimpleARP).
+'''
+
+
+from random import randrange, seed
+from sys import getsizeof
+from time import perf_counter
+from types import SimpleNamespace as NS
+from unittest.mock import patch
+
+from ryu.base.app_manager import SERVICE_BRICKS
+from ryu.lib.packet.arp import arp, ARP_REQUEST, ARP_REPLY
+from ryu.lib.packet.ether_types import ETH_TYPE_ARP
+from ryu.lib.packet.ethernet import ethernet
+from ryu.lib.packet.packet import Packet
+from ryu.lib.mac import BROADCAST_STR
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+from context import *
+from host_table import HostTable, ip_to_int, int_to_ip, int_to_mac
+from packet_in_dispatcher import parse_arp
+import simple_arp
+
+
+HOSTS_NB = 10000
+SWITCHES_NB = 392
+LOOKUPS_NB = 100000
+PACKET_INS_NB = 10000
+REQUESTER_IP, REQUESTER_MAC = '10.1.0.1', '02:00:00:01:00:01'
+
+
+class Datapath(object):
+
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+    id = 1
+
+    def send_msg(self, msg):
+        pass
+
+
+def request_frame(dst_ip):
+    pkt = Packet()
+    pkt.add_protocol(ethernet(ethertype=ETH_TYPE_ARP, src=REQUESTER_MAC,
+                              dst=BROADCAST_STR))
+    pkt.add_protocol(arp(opcode=ARP_REQUEST, src_mac=REQUESTER_MAC,
+                         src_ip=REQUESTER_IP, dst_ip=dst_ip))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def legacy_packet_in(ev, arp_table):
+    # former SimpleARP._arp_packet_in_handler, for requests of known hosts
+    # (learning of the requesting host left out)
+    pkt = Packet(ev.msg.data)
+    arp_pkt = pkt.get_protocol(arp)
+    eth = pkt.get_protocol(ethernet)
+    datapath = ev.msg.datapath
+    reply = Packet()
+    reply.add_protocol(ethernet(ethertype=ETH_TYPE_ARP,
+                                src=arp_table[arp_pkt.dst_ip], dst=eth.src))
+    reply.add_protocol(arp(opcode=ARP_REPLY,
+                           src_mac=arp_table[arp_pkt.dst_ip],
+                           src_ip=arp_pkt.dst_ip, dst_mac=eth.src,
+                           dst_ip=arp_pkt.src_ip))
+    reply.serialize()
+    datapath.send_msg(datapath.ofproto_parser.OFPPacketOut(
+        datapath=datapath, buffer_id=datapath.ofproto.OFP_NO_BUFFER,
+        in_port=datapath.ofproto.OFPP_CONTROLLER, data=reply.data,
+        actions=[datapath.ofproto_parser.OFPActionOutput(
+            ev.msg.match['in_port'])]))
+
+
+def size(obj, seen=None):
+    # deep size of dicts, tuples, records and their items
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    total = getsizeof(obj)
+    if isinstance(obj, dict):
+        total += sum(size(key, seen) + size(value, seen)
+                     for key, value in obj.items())
+    elif isinstance(obj, tuple):
+        total += sum(size(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        total += sum(size(getattr(obj, slot), seen)
+                     for slot in obj.__slots__)
+    return total
+
+
+def measure(name, function):
+    start = perf_counter()
+    result = function()
+    print('%-28s %9.1f ms' % (name, (perf_counter() - start) * 1000))
+    return result
+
+
+if __name__ == '__main__':
+    seed(0)
+    hosts = [(ip_to_int('10.0.0.0') + i, 0x020000000000 + i,
+              randrange(SWITCHES_NB), randrange(1, 48))
+             for i in range(HOSTS_NB)]
+
+    # former tables
+    arp_table, reverse_arp_table, in_ports = {}, {}, {}
+    for ip, mac, dpid, port_no in hosts:
+        ip, mac = int_to_ip(ip), int_to_mac(mac)
+        arp_table[ip] = mac
+        reverse_arp_table[mac] = ip
+        in_ports[mac] = in_ports[ip] = (dpid, port_no)
+    table = HostTable()
+    for host in hosts:
+        table.learn(*host)
+
+    print('%-28s %9d bytes' % ('memory (dicts)', size(
+        (arp_table, reverse_arp_table, in_ports))))
+    print('%-28s %9d bytes' % ('memory (table)', size(
+        (table._by_ip, table._by_mac, table._by_dpid))))
+
+    lookups = [hosts[randrange(HOSTS_NB)][0] for _ in range(LOOKUPS_NB)]
+    ips = [int_to_ip(ip) for ip in lookups]
+    measure('%dk replies (dicts)' % (LOOKUPS_NB // 1000),
+            lambda: [arp_table[ip] for ip in ips])
+    measure('%dk replies (table)' % (LOOKUPS_NB // 1000),
+            lambda: [int_to_mac(table[ip_to_int(ip)].mac) for ip in ips])
+    measure('%dk in-ports (dicts)' % (LOOKUPS_NB // 1000),
+            lambda: [in_ports.get(arp_table[ip]) for ip in ips])
+    measure('%dk in-ports (table)' % (LOOKUPS_NB // 1000),
+            lambda: [table[ip_to_int(ip)].port_no for ip in ips])
+
+    events = [NS(msg=NS(datapath=Datapath(), match={'in_port': 1},
+                        data=request_frame(ip)))
+              for ip in ips[:PACKET_INS_NB]]
+    SERVICE_BRICKS.update({
+        SWITCHES: NS(dps={}, links=[]),
+        PACKET_IN_DISPATCHER: NS(register=lambda *args: None)})
+    with patch.object(simple_arp, 'spawn'):
+        proxy = simple_arp.SimpleARP()
+    proxy.hosts = table
+    measure('%dk packet-ins (dicts)' % (PACKET_INS_NB // 1000),
+            lambda: [legacy_packet_in(ev, arp_table) for ev in events])
+    measure('%dk packet-ins (table)' % (PACKET_INS_NB // 1000),
+            lambda: [proxy._arp_packet_in_handler(ev, parse_arp(ev.msg.data))
+                     for ev in events])
+
+    def remove_dicts(dpid):
+        for key, (host_dpid, _) in list(in_ports.items()):
+            if host_dpid == dpid:
+                ip = reverse_arp_table.get(key, key)
+                mac = arp_table.pop(ip, None)
+                reverse_arp_table.pop(mac, None)
+                in_ports.pop(mac, None)
+                in_ports.pop(ip, None)
+
+    measure('switch leave (dicts)', lambda: remove_dicts(0))
+    measure('switch leave (table)', lambda: table.remove_switch(0))
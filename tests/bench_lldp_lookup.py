@@ -0,0 +1,95 @@
+'''
+    Measures the cost of NetworkDelayDetector._lldp_packet_in_handler with
+    10k switch ports known to the Switches app, before (scan of all ports for
+    each LLDP packet-in) and after ((dpid, port_no) index).
+'''
+
+
+from random import randrange
+from time import perf_counter, time
+from types import SimpleNamespace
+
+from ryu.base.app_manager import SERVICE_BRICKS
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto.ofproto_v1_3_parser import OFPPort
+from ryu.topology.switches import LLDPPacket, Port, PortDataState
+
+from context import *
+from netapp_sim_controller.ryu_apps.network_delay_detector import (
+    NetworkDelayDetector)
+from netapp_sim_controller.ryu_apps.packet_in_dispatcher import (
+    PacketInDispatcher, _parse_lldp)
+from netapp_sim_controller.ryu_apps.probe_scheduler import ProbeScheduler
+
+
+SWITCHES_NB = 200
+PORTS_NB = 50  # per switch, 10k ports in total
+PACKETS_NB = 2000
+
+
+def legacy_handler(detector, ev):
+    msg = ev.msg
+    try:
+        src_dpid, src_port_no = LLDPPacket.lldp_parse(msg.data)
+
+    except LLDPPacket.LLDPUnknownFormat:
+        return
+
+    else:
+        for port, port_data in list(detector._switches.ports.items()):
+            lldp_timestamp = port_data.timestamp
+            if (lldp_timestamp
+                    and src_dpid == port.dpid
+                    and src_port_no == port.port_no):
+                detector.lldp_latency.setdefault(src_dpid, {})
+                detector.lldp_latency[src_dpid][msg.datapath.id] = (
+                    ev.timestamp - lldp_timestamp)
+                return
+
+
+def index_handler(detector, ev):
+    # as called by PacketInDispatcher, which parses LLDP packets once
+    src = _parse_lldp(ev.msg.data)
+    if src:
+        detector._lldp_packet_in_handler(ev, src)
+
+
+def measure(name, handler, detector, packets):
+    start = perf_counter()
+    for ev in packets:
+        handler(detector, ev)
+    elapsed = perf_counter() - start
+    print('%-8s %10.2f us/packet-in' % (name, elapsed / len(packets) * 10**6))
+
+
+if __name__ == '__main__':
+    ports = PortDataState()
+    switches = SimpleNamespace(dps={}, ports=ports)
+    SERVICE_BRICKS[SWITCHES] = switches
+    SERVICE_BRICKS[PROBE_SCHEDULER] = ProbeScheduler()
+    SERVICE_BRICKS[PACKET_IN_DISPATCHER] = PacketInDispatcher()
+    detector = NetworkDelayDetector()
+
+    for dpid in range(1, SWITCHES_NB + 1):
+        for port_no in range(1, PORTS_NB + 1):
+            port = Port(dpid, ofproto_v1_3, OFPPort(
+                port_no, '00:00:00:00:00:01', b'eth%d' % port_no, 0, 0, 0, 0,
+                0, 0, 0, 0))
+            ports.add_port(port, LLDPPacket.lldp_packet(
+                dpid, port_no, '00:00:00:00:00:01', 120))
+            ports.lldp_sent(port)
+            detector._port_add_handler(SimpleNamespace(port=port))
+
+    packets = []
+    for _ in range(PACKETS_NB):
+        dpid = randrange(1, SWITCHES_NB + 1)
+        port_no = randrange(1, PORTS_NB + 1)
+        packets.append(SimpleNamespace(
+            timestamp=time(),
+            msg=SimpleNamespace(
+                datapath=SimpleNamespace(id=dpid % SWITCHES_NB + 1),
+                data=LLDPPacket.lldp_packet(
+                    dpid, port_no, '00:00:00:00:00:01', 120))))
+
+    measure('scan', legacy_handler, detector, packets)
+    measure('index', index_handler, detector, packets)
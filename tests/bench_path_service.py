@@ -0,0 +1,98 @@
+'''
+    Builds the path service's graph of a k=28 fat-tree (980 switches, one
+    host per edge switch) with random link metrics, and prints the time of
+    building it, of (uncached and cached) path queries between random hosts,
+    and of metric updates slowing down 1% of the links (which only drop the
+    cached results using them).
+'''
+
+
+from random import random, sample, seed
+from time import perf_counter
+
+from context import *
+from path_graph import PathGraph
+
+
+K = 28
+QUERIES_NB = 200
+
+
+def fat_tree(k):
+    # (src, dst) -> port of src, switches numbered from 1, hosts 'h<n>'
+    half = k // 2
+    core = list(range(1, half * half + 1))
+    aggs = []
+    edges = []
+    links = {}
+    dpid = len(core)
+    for pod in range(k):
+        pod_aggs = list(range(dpid + 1, dpid + half + 1))
+        pod_edges = list(range(dpid + half + 1, dpid + k + 1))
+        dpid += k
+        for i, agg in enumerate(pod_aggs):
+            for j in range(half):
+                links[(agg, core[i * half + j])] = half + j + 1
+                links[(core[i * half + j], agg)] = pod + 1
+            for j, edge in enumerate(pod_edges):
+                links[(agg, edge)] = j + 1
+                links[(edge, agg)] = half + i + 1
+        aggs += pod_aggs
+        edges += pod_edges
+    hosts = []
+    for edge in edges:
+        host = 'h%d' % edge
+        links[(edge, host)] = 1
+        links[(host, edge)] = 0
+        hosts.append(host)
+    return dpid, links, hosts
+
+
+def random_metrics(links):
+    return {link: {'bandwidth': 10 + random() * 990,
+                   'delay': 0.001 + random() * 0.01,
+                   'jitter': random() * 0.001,
+                   'loss': random() * 0.01} for link in links}
+
+
+def measure(name, graph, queries, query):
+    start = perf_counter()
+    for src, dst in queries:
+        query(graph, src, dst)
+    elapsed = perf_counter() - start
+    print('%-28s %8.2f ms/query' % (name, elapsed * 1000 / len(queries)))
+
+
+if __name__ == '__main__':
+    seed(0)
+    switches_nb, links, hosts = fat_tree(K)
+    graph = PathGraph(threshold=0.1, cache_size=4 * QUERIES_NB)
+    start = perf_counter()
+    graph.set_topology(links)
+    metrics = random_metrics(links)
+    graph.update_metrics(metrics)
+    print('graph of %d switches, %d hosts, %d edges built in %.1f ms' % (
+        switches_nb, len(hosts), len(links),
+        (perf_counter() - start) * 1000))
+
+    queries = [tuple(sample(hosts, 2)) for _ in range(QUERIES_NB)]
+    for name, query in (
+            ('shortest (delay)',
+             lambda g, s, d: g.shortest_paths(s, d)),
+            ('4-shortest (delay)',
+             lambda g, s, d: g.shortest_paths(s, d, k=4)),
+            ('widest',
+             lambda g, s, d: g.widest_path(s, d)),
+            ('constrained (50 ms)',
+             lambda g, s, d: g.constrained_path(s, d, 0.05))):
+        measure(name, graph, queries, query)
+        measure(name + ' cached', graph, queries, query)
+
+    moved = {link: {'delay': metrics[link]['delay'] * 2}
+             for link in sample(list(links), len(links) // 100)}
+    cached = graph.stats()['cached']
+    start = perf_counter()
+    graph.update_metrics(moved)
+    print('%d links updated in %.1f ms, %d of %d cached results kept' % (
+        len(moved), (perf_counter() - start) * 1000,
+        graph.stats()['cached'], cached))
@@ -0,0 +1,113 @@
+'''
+    Replays a synthetic stream of OFPPortStatsReply messages (48 ports x 500
+    switches per round) through NetworkMonitor._port_stats_reply_handler
+    (replies being buffered, then computed at once at the end of the round,
+    as at the end of each monitoring sweep) and through the former
+    port-by-port implementation, and prints the time spent per round by
+    each.
+'''
+
+
+from random import randint
+from time import perf_counter
+from types import SimpleNamespace
+
+from ryu.base.app_manager import SERVICE_BRICKS
+from ryu.ofproto import ofproto_v1_3
+from ryu.ofproto.ofproto_v1_3_parser import OFPPortStats
+
+from context import *
+from netapp_sim_controller.ryu_apps.network_monitor import NetworkMonitor
+from netapp_sim_controller.ryu_apps.probe_scheduler import ProbeScheduler
+
+
+SWITCHES_NB = 500
+PORTS_NB = 48
+ROUNDS = 10
+
+
+def legacy_handler(monitor, ev):
+    msg = ev.msg
+    dpid = msg.datapath.id
+    monitor.free_bandwidth.setdefault(dpid, {})
+    for stat in msg.body:
+        key = (dpid, stat.port_no)
+        stats = monitor._legacy_stats.setdefault(key, [])
+        stats.append((stat.tx_bytes, stat.rx_bytes, stat.tx_packets,
+                      stat.rx_packets, stat.tx_errors, stat.rx_errors,
+                      stat.tx_dropped, stat.rx_dropped, stat.duration_sec,
+                      stat.duration_nsec))
+        if len(stats) > MONITOR_SAMPLES:
+            stats.pop(0)
+        up_pre = 0
+        down_pre = 0
+        period = MONITOR_PERIOD
+        if len(stats) > 1:
+            up_pre = stats[-2][0]
+            down_pre = stats[-2][1]
+            period = (stats[-1][-2] + stats[-1][-1] / (10 ** 9)
+                      - stats[-2][-2] + stats[-2][-1] / (10 ** 9))
+        up_speed = ((stats[-1][0] - up_pre) / period) if period else 0
+        down_speed = ((stats[-1][1] - down_pre) / period) if period else 0
+        capacity = monitor.port_features.get(
+            dpid, {}).get(stat.port_no, (0, 0, 0))[2] / 10**3
+        monitor.free_bandwidth[dpid][stat.port_no] = (
+            max(capacity - up_speed * 8/10**6, 0),
+            max(capacity - down_speed * 8/10**6, 0))
+
+
+def make_stream():
+    stream = []
+    counters = {}
+    for r in range(ROUNDS):
+        replies = []
+        for dpid in range(1, SWITCHES_NB + 1):
+            body = []
+            for port_no in range(1, PORTS_NB + 1):
+                tx, rx = counters.get((dpid, port_no), (0, 0))
+                tx += randint(0, 10**8)
+                rx += randint(0, 10**8)
+                counters[(dpid, port_no)] = (tx, rx)
+                body.append(OFPPortStats(
+                    port_no, rx // 1500, tx // 1500, rx, tx, 0, 0, 0, 0, 0,
+                    0, 0, 0, r * int(MONITOR_PERIOD), randint(0, 10**9 - 1)))
+            replies.append(SimpleNamespace(msg=SimpleNamespace(
+                datapath=SimpleNamespace(id=dpid, ofproto=ofproto_v1_3),
+                flags=0, body=body)))
+        stream.append(replies)
+    return stream
+
+
+def batched_handler(monitor, ev):
+    monitor._port_stats_reply_handler(ev)
+
+
+def replay(name, handler, monitor, stream, end=None):
+    times = []
+    for replies in stream:
+        start = perf_counter()
+        for ev in replies:
+            handler(monitor, ev)
+        if end:
+            end()
+        times.append(perf_counter() - start)
+    print('%-12s %8.2f ms/round (min %.2f ms, %d ports/round)' % (
+        name, sum(times) / len(times) * 1000, min(times) * 1000,
+        SWITCHES_NB * PORTS_NB))
+
+
+if __name__ == '__main__':
+    # NetworkMonitor only needs the Switches app for its datapath list (no
+    # switch is connected, so no request is actually sent)
+    SERVICE_BRICKS[SWITCHES] = SimpleNamespace(dps={})
+    SERVICE_BRICKS[PROBE_SCHEDULER] = ProbeScheduler()
+    monitor = NetworkMonitor()
+    monitor._legacy_stats = {}
+    for dpid in range(1, SWITCHES_NB + 1):
+        monitor.port_features[dpid] = {
+            port_no: ('up', 'up', 10**7) for port_no in range(1, PORTS_NB + 1)}
+
+    stream = make_stream()
+    replay('per-port', legacy_handler, monitor, stream)
+    replay('batched', batched_handler, monitor, stream,
+           monitor._update_stats)
@@ -0,0 +1,62 @@
+'''
+    Tests of the IP address pools and token bucket of the ARP discovery.
+'''
+
+
+from unittest import TestCase, main
+
+from .context import *
+from arp_discovery import IPPool, TokenBucket
+
+
+class IPPoolTest(TestCase):
+
+    def test_parse(self):
+        pool, invalid = IPPool.parse(
+            ' >\n  10.0.0.1:10.0.0.5,\n  10.0.0.9, 10.20.0.10:10.20.0.12,'
+            ' 10.0.0.300, 10.0.0.9:10.0.0.1,')
+        self.assertEqual(invalid, ['10.0.0.300', '10.0.0.9:10.0.0.1'])
+        self.assertEqual(len(pool), 9)
+        self.assertEqual(list(pool), [
+            '10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4', '10.0.0.5',
+            '10.0.0.9', '10.20.0.10', '10.20.0.11', '10.20.0.12'])
+
+    def test_merge(self):
+        pool, _ = IPPool.parse('10.0.0.4:10.0.0.8,10.0.0.1:10.0.0.5,'
+                               '10.0.0.9,10.0.0.20')
+        self.assertEqual(list(zip(pool.starts, pool.ends)),
+                         [(167772161, 167772169), (167772180, 167772180)])
+        self.assertEqual(len(pool), 10)
+
+    def test_contains(self):
+        pool, _ = IPPool.parse('10.0.0.0:10.0.255.255,192.168.1.1')
+        self.assertEqual(len(pool), 65537)
+        for ip in ('10.0.0.0', '10.0.128.7', '10.0.255.255', '192.168.1.1'):
+            self.assertIn(ip, pool)
+        for ip in ('9.255.255.255', '10.1.0.0', '192.168.1.2', 'host'):
+            self.assertNotIn(ip, pool)
+
+    def test_empty(self):
+        pool, invalid = IPPool.parse('')
+        self.assertEqual((len(pool), list(pool), invalid), (0, [], []))
+        self.assertNotIn('10.0.0.1', pool)
+
+
+class TokenBucketTest(TestCase):
+
+    def test_rate(self):
+        bucket = TokenBucket(10, burst=2)
+        now = bucket._last
+        self.assertEqual(bucket.take(now=now), 0)
+        self.assertEqual(bucket.take(now=now), 0)
+        # in debt: wait for refill, and longer for each further token
+        self.assertAlmostEqual(bucket.take(now=now), 0.1)
+        self.assertAlmostEqual(bucket.take(now=now), 0.2)
+        self.assertEqual(bucket.take(now=now + 0.5), 0)
+        # refill is capped at burst
+        bucket.take(now=now + 100)
+        self.assertEqual(bucket.tokens, 1)
+
+
+if __name__ == '__main__':
+    main()
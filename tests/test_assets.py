@@ -0,0 +1,52 @@
+'''
+    Tests of the in-memory cache of the web interface's static files.
+'''
+
+
+import gzip
+from os import mkdir
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from .context import *
+from assets import AssetCache
+
+
+class AssetCacheTest(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.root = join(self.tmp.name, 'web')
+        mkdir(self.root)
+        mkdir(join(self.root, 'js'))
+        with open(join(self.root, 'js', 'app.js'), 'w') as f:
+            f.write('var x = 1;\n' * 100)
+        with open(join(self.root, 'logo.png'), 'wb') as f:
+            f.write(b'\x89PNG' * 100)
+        with open(join(self.tmp.name, 'secret.txt'), 'w') as f:
+            f.write('secret')
+        self.cache = AssetCache(self.root)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_preload_and_variants(self):
+        self.cache.preload()
+        self.assertEqual(sorted(self.cache.assets), ['js/app.js', 'logo.png'])
+        script = self.cache.get('js/app.js')
+        self.assertEqual(gzip.decompress(script.gzip), script.body)
+        self.assertLess(len(script.gzip), len(script.body))
+        self.assertIsNone(self.cache.get('logo.png').gzip)
+        self.assertIs(self.cache.get('js/../js/app.js'), script)
+
+    def test_paths_outside_root(self):
+        self.assertIsNone(self.cache.resolve('../secret.txt'))
+        self.assertIsNone(self.cache.get('../secret.txt'))
+        self.assertIsNone(self.cache.get('/etc/passwd'))
+        self.assertIsNone(self.cache.get('missing.js'))
+        self.assertEqual(self.cache.resolve('js/./app.js'), 'js/app.js')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+'''
+    Tests of CtrlApi's bulk uploads and stats requests to all switches,
+    against stand-in datapaths.
+'''
+
+
+from logging import FileHandler, getLogger
+from os.path import join
+from struct import unpack_from
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace as NS
+from unittest import TestCase, main
+
+from ryu.lib import hub
+from ryu.ofproto import ofproto_v1_3 as ofp
+from ryu.ofproto import ofproto_v1_3_parser as parser
+
+from .context import *
+from ctrlapi import CtrlApi
+
+
+def messages(buf):
+    # (type, xid) of each OpenFlow message of buf
+    offset = 0
+    while offset < len(buf):
+        _, msg_type, length, xid = unpack_from('!BBHI', buf, offset)
+        yield msg_type, xid
+        offset += length
+
+
+class Datapath:
+    '''
+        Stand-in datapath recording its writes. on_write, if given, is
+        called with the datapath and the (type, xid) of the messages of each
+        write, to reply to them.
+    '''
+
+    ofproto = ofp
+    ofproto_parser = parser
+
+    def __init__(self, dpid, on_write=None, connected=True):
+        self.id = dpid
+        self.xid = 0
+        self.writes = []
+        self.on_write = on_write
+        self.connected = connected
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send(self, buf):
+        if not self.connected:
+            return False
+        self.writes.append(list(messages(buf)))
+        if self.on_write:
+            hub.spawn(self.on_write, self, self.writes[-1])
+        return True
+
+
+def flows(n):
+    return [{'priority': 1, 'match': {'in_port': 1},
+             'actions': ['OUTPUT:%d' % (i + 2)]} for i in range(n)]
+
+
+class CtrlApiTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        logger = getLogger('flowmanager')
+        self.handler = FileHandler(join(self.tmp.name, 'flowmanager.log'))
+        logger.handlers.insert(0, self.handler)
+        self.dps = {}
+        self.api = CtrlApi(NS(dpset=NS(
+            get=self.dps.get, get_all=lambda: list(self.dps.items()))))
+
+    def tearDown(self):
+        getLogger('flowmanager').removeHandler(self.handler)
+        self.handler.close()
+        self.tmp.cleanup()
+
+    def add(self, dp):
+        self.dps[dp.id] = dp
+        return dp
+
+
+class BulkUploadTest(CtrlApiTestCase):
+
+    def reply(self, errors=()):
+        # replies to the barrier of each write, after errors of the entries
+        # at indexes errors
+        def on_write(dp, msgs):
+            for index in errors:
+                self.api.bulk_error(NS(datapath=dp, xid=msgs[index][1],
+                                       type=1, code=2))
+            self.api.bulk_barrier(NS(datapath=dp, xid=msgs[-1][1]))
+        return on_write
+
+    def test_single_write_per_switch(self):
+        dp1 = self.add(Datapath(1, self.reply()))
+        dp2 = self.add(Datapath(2, self.reply()))
+        report = self.api.process_flow_upload(
+            [{'1': flows(3)}, {'2': flows(2)}, {'1': flows(1)}])
+        self.assertEqual(report, {'installed': 6, 'unconfirmed': 0,
+                                  'errors': []})
+        for dp, n in ((dp1, 4), (dp2, 2)):
+            self.assertEqual(len(dp.writes), 1)
+            types = [msg_type for msg_type, _ in dp.writes[0]]
+            self.assertEqual(types, [ofp.OFPT_FLOW_MOD] * n
+                             + [ofp.OFPT_BARRIER_REQUEST])
+        self.assertEqual(self.api.bulk_waiters, {1: {}, 2: {}})
+
+    def test_unknown_switch(self):
+        self.add(Datapath(1, self.reply()))
+        report = self.api.process_flow_upload([{'1': flows(1)},
+                                               {'9': flows(2)}])
+        self.assertEqual(report['installed'], 1)
+        self.assertEqual(report['errors'], [
+            {'dpid': '9', 'index': 0, 'error': 'Datapath does not exist!'},
+            {'dpid': '9', 'index': 1, 'error': 'Datapath does not exist!'}])
+
+    def test_errors_are_matched_per_xid(self):
+        # both switches use the same xids, only dp1 reports an error
+        self.add(Datapath(1, self.reply(errors=[1])))
+        self.add(Datapath(2, self.reply()))
+        report = self.api.process_flow_upload([{'1': flows(3),
+                                                '2': flows(3)}])
+        self.assertEqual(report['installed'], 5)
+        self.assertEqual(report['errors'], [
+            {'dpid': '1', 'index': 1, 'error': 'Error type 1 code 2'}])
+
+    def test_timeout(self):
+        self.api.BULK_TIMEOUT = 0.1
+        self.add(Datapath(1))  # never replies
+        self.add(Datapath(2, self.reply()))
+        self.add(Datapath(3, connected=False))
+        report = self.api.process_flow_upload([{'1': flows(2),
+                                                '2': flows(1),
+                                                '3': flows(1)}])
+        self.assertEqual((report['installed'], report['unconfirmed']),
+                         (1, 2))
+        self.assertEqual(report['errors'], [
+            {'dpid': '3', 'index': 0, 'error': 'Datapath is disconnected!'}])
+        # late replies are ignored
+        self.assertEqual(self.api.bulk_waiters[1], {})
+        self.api.bulk_barrier(NS(datapath=self.dps[1], xid=3))
+
+
+class StatsAllTest(CtrlApiTestCase):
+
+    def setUp(self):
+        super(StatsAllTest, self).setUp()
+        for dpid in (1, 2, 3, 4):
+            self.add(Datapath(dpid))
+
+    def stats(self, kind):
+        # replies of stats requests keyed by dpid, as ofctl's; switch 2
+        # stalls and switch 3 fails
+        def get(data_path, waiters):
+            if data_path.id == 2:
+                hub.sleep(10)
+            if data_path.id == 3:
+                raise ValueError('bad reply')
+            return {str(data_path.id): [kind]}
+        return get
+
+    def test_timeout_and_errors(self):
+        self.api.reqfunction['portstat'] = self.stats('port')
+        result = self.api.get_stats_all('portstat', timeout=0.2)
+        self.assertEqual(result, {
+            'stats': {'1': ['port'], '4': ['port']}, 'timeout': [2],
+            'errors': {3: "ValueError('bad reply')"}})
+
+    def test_selected_switches(self):
+        self.api.reqfunction['portstat'] = self.stats('port')
+        result = self.api.get_stats_all('portstat', dpids=[4, 9])
+        self.assertEqual(result, {'stats': {'4': ['port']}, 'timeout': [],
+                                  'errors': {}})
+        self.assertIsNone(self.api.get_stats_all('unknown'))
+
+    def test_merge_desc_and_stats(self):
+        for kind in ('groups', 'meters'):
+            self.api.ofctl = NS(
+                get_group_desc=self.stats('group desc'),
+                get_group_stats=self.stats('group stats'),
+                get_meter_config=self.stats('meter desc'),
+                get_meter_stats=self.stats('meter stats'))
+            result = self.api.get_stats_all(kind, dpids=[1, 4], timeout=1)
+            name = kind[:-1]
+            self.assertEqual(result['stats'], {
+                'desc': {'1': [name + ' desc'], '4': [name + ' desc']},
+                'stats': {'1': [name + ' stats'], '4': [name + ' stats']}})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+'''
+    Tests of ExportPipeline's coalescing, retries and disk spill.
+'''
+
+
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from .context import *
+from netapp_sim_controller.ryu_apps import export_pipeline
+from netapp_sim_controller.ryu_apps.export_pipeline import (
+    ExportPipeline, coalesce)
+
+
+def period(t, ids):
+    return ([('sdn_link', {'id': id}) for id in ids],
+            {id: {'delay': [{'timestamp': t, 'value': t}]} for id in ids})
+
+
+class ExportPipelineTest(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.exports = []
+        self.failures = 0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _export(self, resources, measures):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('unreachable')
+        self.exports.append((resources, measures))
+
+    def _pipeline(self, capacity=2, spill_max=3):
+        # no workers: tests drive _send and _unspill themselves
+        return ExportPipeline(self._export, join(self.tmp.name, 'spill'),
+                              capacity, 0, 4, spill_max)
+
+    def test_coalesce(self):
+        resources, measures = coalesce([period(1, ['a', 'b']),
+                                        period(2, ['b'])])
+        self.assertEqual(len(resources), 3)
+        self.assertEqual([p['value'] for p in measures['b']['delay']], [1, 2])
+        self.assertEqual(len(measures['a']['delay']), 1)
+
+    def test_overflow_is_spilled_then_dropped(self):
+        pipeline = self._pipeline()
+        for t in range(7):
+            pipeline.put(*period(t, ['a']))
+        self.assertEqual(pipeline.stats(), {'queue.depth': 2,
+                                            'export.latency': 0.0,
+                                            'spilled': 3, 'dropped': 2})
+
+        # spill survives restarts and is exported oldest first
+        pipeline = self._pipeline()
+        self.assertEqual(pipeline.stats()['spilled'], 3)
+        periods = pipeline._unspill(2)
+        self.assertEqual([p[1]['a']['delay'][0]['value'] for p in periods],
+                         [2, 3])
+        self.assertEqual(pipeline.stats()['spilled'], 1)
+
+    @patch.object(export_pipeline, 'sleep')
+    def test_retries_with_backoff_then_spills(self, sleep):
+        pipeline = self._pipeline()
+        self.failures = 2
+        pipeline._send([period(1, ['a']), period(2, ['a'])])
+        self.assertEqual(len(self.exports), 1)
+        self.assertEqual(pipeline.exported, 2)
+        # exponential backoff, with jitter of +/- 50%
+        for i, call in enumerate(sleep.call_args_list):
+            delay = export_pipeline.BACKOFF_MIN * 2 ** i
+            self.assertTrue(delay * 0.5 <= call.args[0] < delay * 1.5)
+
+        self.failures = export_pipeline.RETRIES
+        pipeline._send([period(3, ['a'])])
+        self.assertEqual(pipeline.stats()['spilled'], 1)
+        self.assertEqual(pipeline.exported, 2)
+
+
+if __name__ == '__main__':
+    main()
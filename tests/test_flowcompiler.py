@@ -0,0 +1,102 @@
+'''
+    Tests of the flow compiler of FlowManager.
+'''
+
+
+from copy import deepcopy
+from os.path import abspath, dirname, join
+from types import SimpleNamespace
+from unittest import TestCase, main
+
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+from .context import *
+from flowcompiler import (PORT_ID, compile_flow, compile_actions,
+                          compile_match_fields, freeze)
+
+
+path.insert(0, abspath(join(dirname(__file__), '..', 'netapp_sim_controller',
+                            'ryu_apps', 'flowmanager')))
+
+
+DATAPATH = SimpleNamespace(id=1, ofproto=ofproto_v1_3,
+                           ofproto_parser=ofproto_v1_3_parser)
+ENTRY = {
+    'dpid': 1,
+    'operation': 'add',
+    'priority': 10,
+    'match': {'in_port': 'IN_PORT', 'eth_type': '0x800',
+              'ipv4_dst': '10.0.0.0/255.255.255.0'},
+    'actions': ['SET_FIELD:ipv4_dst=10.0.0.1', 'OUTPUT:CONTROLLER',
+                {'WRITE_ACTIONS': ['OUTPUT:2']}, 'GOTO_TABLE:1']
+}
+
+
+class FlowCompilerTest(TestCase):
+
+    def _compile(self, entry):
+        return compile_flow(ofproto_v1_3, ofproto_v1_3_parser, entry)
+
+    def test_entry_is_not_mutated(self):
+        entry = deepcopy(ENTRY)
+        self._compile(entry)
+        self.assertEqual(entry, ENTRY)
+
+    def test_compiled_flow_mod(self):
+        msg = self._compile(ENTRY).flow_mod(DATAPATH)
+        self.assertEqual(msg.priority, 10)
+        self.assertEqual(msg.match['in_port'], PORT_ID['IN_PORT'])
+        self.assertEqual(msg.match['eth_type'], 0x800)
+        self.assertEqual(msg.match['ipv4_dst'], ('10.0.0.0', '255.255.255.0'))
+        self.assertEqual([i.type for i in msg.instructions], [
+            ofproto_v1_3.OFPIT_GOTO_TABLE, ofproto_v1_3.OFPIT_APPLY_ACTIONS,
+            ofproto_v1_3.OFPIT_WRITE_ACTIONS])
+        msg.serialize()
+
+    def test_templates_are_cached_and_immutable(self):
+        template = self._compile(ENTRY)
+        self.assertIs(self._compile(deepcopy(ENTRY)), template)
+        self.assertIs(self._compile(dict(ENTRY, dpid=2)), template)
+        with self.assertRaises(AttributeError):
+            template.kwargs = {}
+        with self.assertRaises(TypeError):
+            template.kwargs['priority'] = 0
+
+        msg = template.flow_mod(DATAPATH, priority=20, cookie=7)
+        self.assertEqual((msg.priority, msg.cookie), (20, 7))
+        self.assertEqual(template.kwargs['priority'], 10)
+
+    def test_serialized_template(self):
+        def serialized(msg):
+            msg.set_xid(7)
+            msg.serialize()
+            return bytes(msg.buf)
+
+        template = self._compile(ENTRY)
+        self.assertEqual(bytes(template.serialize(DATAPATH, 7)),
+                         serialized(template.flow_mod(DATAPATH)))
+        self.assertEqual(
+            bytes(template.serialize(DATAPATH, 7, priority=20, cookie=3)),
+            serialized(template.flow_mod(DATAPATH, priority=20, cookie=3)))
+
+        # matches patched into the template of the entry without match
+        template = self._compile(dict(ENTRY, match=None))
+        for match in ({'in_port': 2}, ENTRY['match'],
+                      {'eth_src': '00:00:00:00:00:01', 'vlan_vid': 4099}):
+            fields = compile_match_fields(ofproto_v1_3, freeze(match))
+            self.assertEqual(
+                bytes(template.serialize(DATAPATH, 7, fields)),
+                serialized(self._compile(dict(ENTRY, match=match)).flow_mod(
+                    DATAPATH)))
+
+    def test_actions_are_cached(self):
+        actions = freeze([{'OUTPUT': 'controller'}])
+        first = compile_actions(ofproto_v1_3_parser, actions)
+        self.assertIs(compile_actions(ofproto_v1_3_parser, actions), first)
+        self.assertEqual(first[0].port, PORT_ID['CONTROLLER'])
+        with self.assertRaises(Exception):
+            compile_actions(ofproto_v1_3_parser, freeze([{'FOO': '1'}]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+'''
+    Tests of FlowMirror's updates from sent messages, indexes and delta
+    queries.
+'''
+
+
+from types import SimpleNamespace
+from unittest import TestCase, main
+
+from ryu.lib import ofctl_v1_3
+from ryu.ofproto import ofproto_v1_3 as ofp
+from ryu.ofproto import ofproto_v1_3_parser as parser
+
+from .context import *
+from flowmirror import (FlowMirror, FLOWS, GROUPS, CHANGELOG_SIZE,
+                        actions_str, match_str)
+
+
+DP = SimpleNamespace(id=1, ofproto=ofp, ofproto_parser=parser)
+
+
+def flow_mod(command=ofp.OFPFC_ADD, table_id=0, priority=1, cookie=0,
+             cookie_mask=0, port=2, **match):
+    return parser.OFPFlowMod(
+        DP, cookie=cookie, cookie_mask=cookie_mask, table_id=table_id,
+        command=command, priority=priority, match=parser.OFPMatch(**match),
+        instructions=[parser.OFPInstructionActions(
+            ofp.OFPIT_APPLY_ACTIONS, [parser.OFPActionOutput(port)])])
+
+
+class FlowMirrorTest(TestCase):
+
+    def setUp(self):
+        self.mirror = FlowMirror()
+        self.switch = self.mirror.get(1)
+
+    def test_add_modify_delete(self):
+        self.mirror.apply(1, flow_mod(in_port=1, priority=10))
+        self.mirror.apply(1, flow_mod(in_port=2, priority=10))
+        self.mirror.apply(1, flow_mod(in_port=1, priority=10))  # no change
+        self.assertEqual(self.switch.version, 2)
+
+        self.mirror.apply(1, flow_mod(ofp.OFPFC_MODIFY_STRICT, priority=10,
+                                      port=3, in_port=1))
+        flows = self.switch.flows()
+        self.assertEqual(sorted(f['actions'][0] for f in flows),
+                         ['OUTPUT:2', 'OUTPUT:3'])
+
+        self.mirror.apply(1, flow_mod(ofp.OFPFC_DELETE,
+                                      table_id=ofp.OFPTT_ALL))
+        self.assertEqual(self.switch.flows(), [])
+        self.assertEqual(self.switch.version, 5)
+
+    def test_indexes(self):
+        self.mirror.apply(1, flow_mod(in_port=1, cookie=7))
+        self.mirror.apply(1, flow_mod(in_port=2, table_id=1, cookie=7))
+        self.mirror.apply(1, flow_mod(in_port=3, table_id=1, priority=5))
+        self.assertEqual(len(self.switch.flows(cookie=7)), 2)
+        self.assertEqual(len(self.switch.flows(table_id=1)), 2)
+        self.assertEqual(len(self.switch.flows(table_id=1, cookie=7)), 1)
+        self.assertEqual(self.switch.flows(table_id=2), [])
+
+        self.mirror.apply(1, flow_mod(ofp.OFPFC_DELETE, table_id=1,
+                                      cookie=7, cookie_mask=0xff))
+        self.assertEqual(len(self.switch.flows(table_id=1)), 1)
+        self.assertEqual(self.switch.flows(cookie=7)[0]['table_id'], 0)
+
+    def test_since(self):
+        self.mirror.apply(1, flow_mod(in_port=1))
+        version = self.switch.version
+        self.mirror.apply(1, flow_mod(in_port=2))
+        self.mirror.apply(1, parser.OFPGroupMod(
+            DP, ofp.OFPGC_ADD, ofp.OFPGT_ALL, 1, []))
+        changes = self.switch.since(version)
+        self.assertEqual([(op, kind) for _, op, kind, _ in changes],
+                         [('put', FLOWS), ('put', GROUPS)])
+        self.assertEqual(self.switch.since(self.switch.version), [])
+
+        for port in range(CHANGELOG_SIZE):
+            self.mirror.apply(1, flow_mod(in_port=port + 3))
+        self.assertIsNone(self.switch.since(version))
+
+    def test_since_recreated_mirror(self):
+        self.mirror.apply(1, flow_mod(in_port=1))
+        self.mirror.apply(1, flow_mod(in_port=2))
+        old, latest = 1, self.switch.version
+        self.mirror.forget(1)
+        switch = self.mirror.get(1)
+        # clients of the dropped mirror must reload, even once the new
+        # mirror's version passes theirs
+        self.assertIsNone(switch.since(latest))
+        for port in range(3):
+            self.mirror.apply(1, flow_mod(in_port=port))
+        self.assertGreater(switch.version, latest)
+        self.assertIsNone(switch.since(old))
+        self.assertIsNone(switch.since(latest))
+        # unknown (future) versions too
+        self.assertIsNone(switch.since(switch.version + 1))
+
+    def test_reconcile(self):
+        self.mirror.apply(1, flow_mod(in_port=1))
+        self.mirror.apply(1, flow_mod(in_port=2))
+        version = self.switch.version
+        kept = flow_mod(in_port=1)
+        self.mirror.reconcile(1, FLOWS, [parser.OFPFlowStats(
+            table_id=kept.table_id, priority=kept.priority,
+            idle_timeout=0, hard_timeout=0, flags=0, cookie=0,
+            packet_count=0, byte_count=0, match=kept.match,
+            instructions=kept.instructions)])
+        self.assertEqual(self.switch.version, version + 1)
+        self.assertEqual(len(self.switch.flows()), 1)
+
+    def test_records_match_ofctl(self):
+        msg = parser.OFPFlowMod(
+            DP, match=parser.OFPMatch(
+                in_port=ofp.OFPP_CONTROLLER, vlan_vid=0x1003,
+                eth_dst=('ff:ff:ff:00:00:00', 'ff:ff:ff:00:00:00'),
+                eth_type=0x800, ipv4_dst='10.0.0.1'),
+            instructions=[
+                parser.OFPInstructionGotoTable(1),
+                parser.OFPInstructionActions(ofp.OFPIT_WRITE_ACTIONS, [
+                    parser.OFPActionOutput(ofp.OFPP_FLOOD)])])
+        for _ in range(2):  # from cached conversions the second time
+            self.assertEqual(match_str(msg.match),
+                             ofctl_v1_3.match_to_str(msg.match))
+            self.assertEqual(actions_str(msg.instructions),
+                             ofctl_v1_3.actions_to_str(msg.instructions))
+
+
+if __name__ == '__main__':
+    main()
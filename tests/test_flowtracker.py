@@ -0,0 +1,72 @@
+'''
+    Tests of the flow tracker trees and their diffs.
+'''
+
+
+from unittest import TestCase, main
+
+from ryu.lib.packet import ethernet, ipv4, packet, tcp, udp
+
+from .context import *
+from flowtracker import Tracker
+
+
+def make_packet(l4, dst_port):
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(src='00:00:00:00:00:01',
+                                       dst='00:00:00:00:00:02'))
+    pkt.add_protocol(ipv4.ipv4(src='10.0.0.1', dst='10.0.0.2'))
+    pkt.add_protocol(l4(dst_port=dst_port))
+    return pkt
+
+
+def leaves(tree):
+    if not tree['children']:
+        return {tree['name']: tree.get('count', 0)}
+    found = {}
+    for child in tree['children']:
+        found.update(leaves(child))
+    return found
+
+
+class TrackerTest(TestCase):
+
+    def setUp(self):
+        self.tracker = Tracker()
+
+    def test_instances_are_independent(self):
+        self.tracker.track(1, make_packet(tcp.tcp, 80))
+        self.assertEqual(Tracker().trees(), [])
+
+    def test_counts(self):
+        for _ in range(3):
+            self.tracker.track(1, make_packet(tcp.tcp, 80))
+        self.tracker.track(1, make_packet(udp.udp, 53))
+        tree, = self.tracker.trees()
+        self.assertEqual(leaves(tree), {'tcp [80]': 3, 'udp [53]': 1})
+
+    def test_diff(self):
+        self.tracker.track(1, make_packet(tcp.tcp, 80))
+        self.tracker.track(2, make_packet(tcp.tcp, 80))
+        since = self.tracker.version
+        self.tracker.track(1, make_packet(udp.udp, 53))
+
+        diff = self.tracker.diff(since)
+        self.assertEqual(diff['version'], self.tracker.version)
+        tree, = diff['trees']
+        self.assertEqual(tree['name'], 1)
+        self.assertNotIn('replace', tree)
+        self.assertEqual(leaves(tree), {'udp [53]': 1})
+
+        since = self.tracker.version
+        self.tracker.reset(1)
+        self.tracker.untrack(2)
+        diff = self.tracker.diff(since)
+        self.assertEqual(diff['trees'], [{'name': 1, 'children': [],
+                                          'replace': True}])
+        self.assertEqual(diff['removed'], [2])
+        self.assertEqual(self.tracker.diff(self.tracker.version)['trees'], [])
+
+
+if __name__ == '__main__':
+    main()
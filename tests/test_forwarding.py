@@ -0,0 +1,226 @@
+'''
+    Tests of the proactive forwarding of routes computed by the path service.
+'''
+
+
+from types import SimpleNamespace as NS
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from ryu.base.app_manager import SERVICE_BRICKS
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+from .context import *
+from netapp_sim_controller.ryu_apps import forwarding
+from netapp_sim_controller.ryu_apps.common import SWITCHES, PATH_SERVICE
+from netapp_sim_controller.ryu_apps.forwarding import Forwarding
+
+
+H1, H2, H3 = '10.0.0.1', '10.0.0.2', '10.0.0.3'
+
+
+def link(src, dst):
+    return NS(src=NS(dpid=src), dst=NS(dpid=dst))
+
+
+class Datapath(object):
+    '''
+        Datapath recording flow mods sent, as tuples of command, destination
+        IP and out-port (None for deletes), per write.
+    '''
+
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+
+    def __init__(self, id):
+        self.id = id
+        self.writes = []
+        self._msgs = []
+
+    def set_xid(self, msg):
+        self._msgs.append(msg)
+
+    def send(self, buf):
+        mods = []
+        for msg in self._msgs:
+            match = dict(msg.match.items())
+            self.assert_dst_only(match)
+            port_no = None
+            if msg.instructions:
+                port_no = msg.instructions[0].actions[0].port
+            mods.append((msg.command,
+                         match.get('ipv4_dst', match.get('arp_tpa')),
+                         port_no))
+        self.writes.append(sorted(mods, key=str))
+        self._msgs = []
+        return True
+
+    @staticmethod
+    def assert_dst_only(match):
+        assert set(match) in ({'eth_type', 'ipv4_dst'},
+                              {'eth_type', 'arp_tpa'}), match
+
+
+class PathService(object):
+    '''
+        PathService returning the trees set in trees (unknown hosts raise
+        KeyError), and recording the hosts asked for.
+    '''
+
+    def __init__(self, hosts, trees):
+        self._hosts = hosts
+        self.trees = trees
+        self.asked = []
+
+    def update_topology(self):
+        return False
+
+    def hosts(self):
+        return dict(self._hosts)
+
+    def tree(self, dst, weight='delay'):
+        self.asked.append(dst)
+        return dict(self.trees[dst])
+
+
+class ForwardingTest(TestCase):
+    '''
+        Host 10.0.0.1 on port 1 of switch 1, host 10.0.0.2 on port 1 of
+        switch 3, switches 1 and 3 linked through switch 2 (by their ports 2
+        and 3) and through switch 4 (by its ports 1 and 3, and their port
+        3), trees going through switch 2.
+    '''
+
+    def setUp(self):
+        self.dps = {dpid: Datapath(dpid) for dpid in (1, 2, 3, 4)}
+        self.path_service = PathService(
+            {H1: (1, 1), H2: (3, 1)},
+            {H1: {1: (H1, 1), 2: (1, 2), 3: (2, 2), 4: (1, 1), H2: (3, 0)},
+             H2: {3: (H2, 1), 2: (3, 3), 1: (2, 2), 4: (3, 3), H1: (1, 0)}})
+        self.links = [link(u, v) for u, v in (
+            (1, 2), (2, 1), (2, 3), (3, 2), (1, 4), (4, 1), (3, 4), (4, 3))]
+        self.apps = {SWITCHES: NS(dps=self.dps, links=self.links),
+                     PATH_SERVICE: self.path_service}
+        SERVICE_BRICKS.update(self.apps)
+        with patch.object(forwarding, 'spawn'):
+            self.forwarding = Forwarding()
+
+    def tearDown(self):
+        for name in self.apps:
+            SERVICE_BRICKS.pop(name, None)
+
+    def writes(self):
+        # returns (and clears) writes of each datapath
+        writes = {dpid: dp.writes for dpid, dp in self.dps.items()
+                  if dp.writes}
+        for dp in self.dps.values():
+            dp.writes = []
+        return writes
+
+    def sync(self):
+        # syncs, and returns hosts whose trees were computed
+        self.path_service.asked = []
+        self.forwarding.sync()
+        return sorted(self.path_service.asked)
+
+    def test_tree(self):
+        self.forwarding._hosts = self.path_service.hosts()
+        # hosts are left out of trees
+        self.assertEqual(self.forwarding._tree(H2),
+                         {3: (H2, 1), 2: (3, 3), 1: (2, 2), 4: (3, 3)})
+        self.forwarding._hosts[H3] = (4, 2)
+        self.assertIsNone(self.forwarding._tree(H3))
+
+    def test_sync(self):
+        add = ofproto_v1_3.OFPFC_ADD
+        delete = ofproto_v1_3.OFPFC_DELETE_STRICT
+        self.assertEqual(self.sync(), [H1, H2])
+        self.assertEqual(self.forwarding.trees[H2][1], (2, 2))
+        self.assertEqual(self.forwarding._by_link[(1, 2)], {H2})
+        writes = self.writes()
+        # one write per switch, with IPv4 and ARP flows of both hosts
+        self.assertEqual(writes[2], [[(add, H1, 2)] * 2 + [(add, H2, 3)] * 2])
+        self.assertEqual(sorted(writes), [1, 2, 3, 4])
+
+        # nothing is computed nor resent while hosts stay on the same ports
+        self.assertEqual(self.sync(), [])
+        self.assertEqual(self.writes(), {})
+
+        # only the tree of a new host is computed
+        self.path_service._hosts[H3] = (4, 2)
+        self.path_service.trees[H3] = {
+            4: (H3, 2), 1: (4, 3), 2: (1, 2), 3: (4, 3)}
+        self.assertEqual(self.sync(), [H3])
+        self.assertEqual(self.writes()[2], [[(add, H3, 2)] * 2])
+
+        # trees of a host that left are removed
+        del self.path_service._hosts[H2]
+        self.assertEqual(self.sync(), [])
+        self.assertNotIn(H2, self.forwarding.trees)
+        self.assertNotIn(H2, set().union(*self.forwarding._by_link.values()))
+        self.assertEqual(self.writes()[2], [[(delete, H2, None)] * 2])
+
+        # all trees are recomputed when links change
+        self.links.pop()
+        self.assertEqual(self.sync(), [H1, H3])
+        self.assertEqual(self.writes(), {})
+
+    def test_unroutable_hosts_are_retried(self):
+        del self.path_service.trees[H2]
+        self.assertEqual(self.sync(), [H1, H2])
+        self.assertNotIn(H2, self.forwarding.trees)
+        self.assertEqual(self.sync(), [H2])
+        self.path_service.trees[H2] = {3: (H2, 1)}
+        self.assertEqual(self.sync(), [H2])
+        self.assertEqual(self.sync(), [])
+
+    def test_apply(self):
+        delete = ofproto_v1_3.OFPFC_DELETE_STRICT
+        add = ofproto_v1_3.OFPFC_ADD
+        self.forwarding.sync()
+        self.writes()
+
+        # rerouted through switch 4 instead of switch 2
+        self.forwarding._apply({H2: {3: (H2, 1), 1: (4, 3), 4: (3, 3)}})
+        writes = self.writes()
+        # switches 3 and 4 forward to the same ports, so they are left alone
+        self.assertEqual(writes, {
+            1: [[(add, H2, 3)] * 2],
+            2: [[(delete, H2, None)] * 2]})
+        self.assertNotIn((1, 2), self.forwarding._by_link)
+        self.assertEqual(self.forwarding._by_link[(1, 4)], {H2})
+        self.assertEqual(self.forwarding._by_link[(2, 1)], {H1})
+
+    def test_link_delete(self):
+        self.forwarding.sync()
+        self.writes()
+        self.path_service.asked = []
+
+        self.path_service.trees[H2] = {
+            3: (H2, 1), 1: (4, 3), 2: (3, 3), 4: (3, 3)}
+        self.forwarding._link_delete_handler(NS(link=link(1, 2)))
+        # only the tree using link 1 -> 2 is recomputed
+        self.assertEqual(self.path_service.asked, [H2])
+        self.assertEqual(self.forwarding.trees[H2][1], (4, 3))
+        self.assertEqual(self.forwarding.trees[H1][2], (1, 2))
+        self.assertEqual(sorted(self.writes()), [1])
+
+        # links no tree uses are ignored
+        self.forwarding._link_delete_handler(NS(link=link(1, 2)))
+        self.assertEqual(self.path_service.asked, [H2])
+        self.assertEqual(self.writes(), {})
+
+    def test_switch_leave(self):
+        self.forwarding.sync()
+        self.writes()
+        self.path_service.trees[H2] = {3: (H2, 1), 1: (4, 3), 4: (3, 3)}
+        self.path_service.trees[H1] = {1: (H1, 1), 3: (4, 3), 4: (1, 1)}
+        self.path_service.asked = []
+        self.forwarding._switch_leave_handler(NS(switch=NS(dp=self.dps[2])))
+        self.assertEqual(sorted(self.path_service.asked), [H1, H2])
+        self.assertFalse(any(2 in tree
+                             for tree in self.forwarding.trees.values()))
+
+
+if __name__ == '__main__':
+    main()
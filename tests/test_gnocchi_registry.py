@@ -0,0 +1,168 @@
+'''
+    Tests of GnocchiRegistry against a local stand-in Gnocchi HTTP server.
+'''
+
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import SkipTest, TestCase, main
+from urllib.parse import unquote
+
+try:
+    from keystoneauth1.session import Session
+    from gnocchiclient.auth import GnocchiBasicPlugin
+    from gnocchiclient.client import Client
+
+except ImportError as e:
+    raise SkipTest('missing dependency: %s' % e)
+
+from .context import *
+from netapp_sim_controller.ryu_apps.gnocchi_registry import (
+    GnocchiRegistry)
+from netapp_sim_controller.ryu_apps.metrics import RESOURCE_TYPES
+
+
+class StandInGnocchi(BaseHTTPRequestHandler):
+    '''
+        Minimal Gnocchi v1 API: resource types, resources (with inline
+        metrics) and metrics creation. Requests are recorded in server.calls
+        and metric creations are counted in server.metric_calls.
+    '''
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, body):
+        data = dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        body = loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server.calls.append(('POST', self.path))
+        parts = [unquote(part) for part in self.path.strip('/').split('/')]
+        if parts[1] == 'resource_type':
+            server.resource_types.add(body['name'])
+            return self._reply(201, body)
+
+        if parts[1] == 'resource' and parts[-1] == 'metric':
+            # /v1/resource/generic/<id>/metric
+            server.metric_calls += 1
+            metrics = server.resources[parts[3]]
+            for name in body:
+                if name in metrics:
+                    return self._reply(409, {'description': 'Named metric %s '
+                                             'already exists' % name})
+            metrics.update(body)
+            return self._reply(200, [{'id': name, 'name': name}
+                                     for name in metrics])
+
+        if parts[1] == 'resource':
+            if parts[2] not in server.resource_types:
+                return self._reply(404, {'description': 'Resource type %s '
+                                         'does not exist' % parts[2]})
+            if body['id'] in server.resources:
+                return self._reply(409, {'description': 'Resource %s already '
+                                         'exists' % body['id']})
+            server.resources[body['id']] = set(body.get('metrics', {}))
+            return self._reply(201, body)
+
+        if parts[1] == 'metric':
+            server.metric_calls += 1
+            metrics = server.resources[body['resource_id']]
+            if body['name'] in metrics:
+                return self._reply(409, {'description': 'Named metric %s '
+                                         'already exists' % body['name']})
+            metrics.add(body['name'])
+            return self._reply(201, body)
+
+        return self._reply(404, {'description': 'Not found'})
+
+
+class GnocchiRegistryTest(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInGnocchi)
+        self.server.calls = []
+        self.server.metric_calls = 0
+        self.server.resource_types = set()
+        self.server.resources = {}
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = Client(1, Session(auth=GnocchiBasicPlugin(
+            'admin', 'http://127.0.0.1:%d' % self.server.server_port)))
+        self.tmp = TemporaryDirectory()
+        self.path = join(self.tmp.name, 'registry.json')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def _registry(self):
+        return GnocchiRegistry(self.client, self.path, RESOURCE_TYPES,
+                               'low', 'user', 'project')
+
+    def _resources(self, n):
+        return [('sdn_link', {'id': '%016d->%016d' % (i, i + 1),
+                              'src': '%016d' % i, 'dst': '%016d' % (i + 1)})
+                for i in range(n)]
+
+    def test_provisions_new_resources_once(self):
+        registry = self._registry()
+        self.assertEqual(len(registry.ensure(self._resources(20))), 20)
+        # first creation fails on unknown resource type, then resource types
+        # are created and every resource is created with its metrics
+        self.assertEqual(self.server.resource_types, set(RESOURCE_TYPES))
+        self.assertEqual(len(self.server.resources), 20)
+        self.assertEqual(self.server.metric_calls, 0)
+        metrics = set(RESOURCE_TYPES['sdn_link']['metrics'])
+        for resource_metrics in self.server.resources.values():
+            self.assertEqual(resource_metrics, metrics)
+
+        calls = len(self.server.calls)
+        self.assertEqual(registry.ensure(self._resources(20)), [])
+        self.assertEqual(len(self.server.calls), calls)
+
+        self.assertEqual(len(registry.ensure(self._resources(21))), 1)
+        self.assertEqual(len(self.server.calls), calls + 1)
+
+    def test_registry_persists_across_restarts(self):
+        self._registry().ensure(self._resources(5))
+        calls = len(self.server.calls)
+
+        registry = self._registry()
+        self.assertEqual(len(registry), 5)
+        self.assertEqual(registry.ensure(self._resources(5)), [])
+        self.assertEqual(len(self.server.calls), calls)
+
+    def test_existing_resource_gets_missing_metrics(self):
+        self.server.resource_types.add('sdn_link')
+        resource_id = '%016d->%016d' % (0, 1)
+        self.server.resources[resource_id] = {'delay'}
+
+        self.assertEqual(self._registry().ensure(self._resources(1)),
+                         [resource_id])
+        self.assertEqual(self.server.resources[resource_id],
+                         set(RESOURCE_TYPES['sdn_link']['metrics']))
+        # one call for all metrics, then one per metric (no refetch)
+        self.assertEqual(self.server.metric_calls,
+                         1 + len(RESOURCE_TYPES['sdn_link']['metrics']))
+
+    def test_forget(self):
+        registry = self._registry()
+        registry.ensure(self._resources(3))
+        registry.forget()
+        self.assertEqual(len(self._registry()), 0)
+        self.server.resources.clear()
+        self.assertEqual(len(registry.ensure(self._resources(3))), 3)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+'''
+    Tests of the host table of SimpleARP.
+'''
+
+
+from unittest import TestCase, main
+
+from .context import *
+from host_table import (HostTable, ip_to_int, int_to_ip, mac_to_int,
+                        int_to_mac)
+
+
+IP_1 = ip_to_int('10.0.0.1')
+IP_2 = ip_to_int('10.0.0.2')
+MAC_1 = mac_to_int('00:00:00:00:00:01')
+MAC_2 = mac_to_int('00:00:00:00:00:02')
+
+
+class HostTableTest(TestCase):
+
+    def test_conversions(self):
+        self.assertEqual(int_to_ip(ip_to_int('192.168.1.254')),
+                         '192.168.1.254')
+        self.assertEqual(int_to_mac(mac_to_int('0a:1b:2c:3d:4e:5f')),
+                         '0a:1b:2c:3d:4e:5f')
+
+    def test_learn(self):
+        table = HostTable()
+        host = table.learn(IP_1, MAC_1, 1, 3)
+        self.assertIn(IP_1, table)
+        self.assertIs(table[IP_1], host)
+        self.assertIs(table.by_mac(MAC_1), host)
+        self.assertEqual((host.ip_address, host.mac_address),
+                         ('10.0.0.1', '00:00:00:00:00:01'))
+        # host moves
+        table.learn(IP_1, MAC_1, 2, 4)
+        self.assertEqual((host.dpid, host.port_no), (2, 4))
+        self.assertEqual((table.on_switch(1), table.on_switch(2)),
+                         ([], [host]))
+
+    def test_learn_changes(self):
+        table = HostTable()
+        table.learn(IP_1, MAC_1, 1, 3)
+        # IP address taken over by another MAC address
+        host = table.learn(IP_1, MAC_2, 1, 4)
+        self.assertIsNone(table.by_mac(MAC_1))
+        self.assertEqual(list(table), [host])
+        # host changes IP address
+        table.learn(IP_2, MAC_2, 1, 4)
+        self.assertNotIn(IP_1, table)
+        self.assertEqual((len(table), table[IP_2].mac), (1, MAC_2))
+
+    def test_locate(self):
+        table = HostTable()
+        host = table.locate(MAC_1, 1, 3)
+        # located but not resolved: not iterated, nor found by IP
+        self.assertEqual((len(table), list(table)), (0, []))
+        self.assertIsNone(host.ip_address)
+        self.assertIs(table.learn(IP_1, MAC_1, 1, 3), host)
+        self.assertEqual(list(table), [host])
+
+    def test_remove(self):
+        table = HostTable()
+        host = table.learn(IP_1, MAC_1, 1, 3)
+        table.remove(host)
+        self.assertEqual((len(table), table.by_mac(MAC_1), table.on_switch(1)),
+                         (0, None, []))
+
+    def test_remove_switch(self):
+        table = HostTable()
+        host_1 = table.learn(IP_1, MAC_1, 1, 3)
+        host_2 = table.locate(MAC_2, 1, 4)
+        host_3 = table.learn(ip_to_int('10.0.0.3'), 3, 2, 1)
+        self.assertCountEqual(table.remove_switch(1), [host_1, host_2])
+        self.assertEqual(list(table), [host_3])
+        self.assertIsNone(table.by_mac(MAC_2))
+        self.assertEqual(table.remove_switch(1), [])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+'''
+    Tests of the streaming JSON serialization of WebApi responses.
+'''
+
+
+from json import loads
+from os.path import join
+from unittest import TestCase, main
+
+from .context import *
+from jsonstream import iter_json, next_cursor
+
+
+FLOWS = {'1': [{'priority': i, 'match': {'in_port': i}, 'packet_count': 0}
+               for i in range(100)],
+         '2': []}
+
+
+def decode(chunks):
+    return loads(b''.join(chunks).decode())
+
+
+class JsonStreamTest(TestCase):
+
+    def test_same_document(self):
+        topology = {'switches': [{'dpid': '1', 'ports': [{'port_no': 1}]}],
+                    'links': [], 'hosts': None}
+        for doc in (FLOWS, topology, None, {'a': [1, 2], 'b': 'x'}):
+            self.assertEqual(decode(iter_json(doc)), doc)
+
+    def test_chunks(self):
+        chunks = list(iter_json(FLOWS, chunk_size=100))
+        self.assertGreater(len(chunks), 10)
+        self.assertTrue(all(len(chunk) < 200 for chunk in chunks))
+
+    def test_pagination_and_fields(self):
+        page = decode(iter_json(FLOWS, ['match', 'cookie'], 10, 20))
+        self.assertEqual(page['1'], [{'match': {'in_port': i}}
+                                     for i in range(10, 20)])
+        self.assertEqual(page['2'], [])
+        self.assertEqual(next_cursor(FLOWS, 20), 20)
+        self.assertIsNone(next_cursor(FLOWS, 100))
+        self.assertIsNone(next_cursor(FLOWS, None))
+
+
+if __name__ == '__main__':
+    main()
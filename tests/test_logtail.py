@@ -0,0 +1,78 @@
+'''
+    Tests of LogTail's cursors, filters and following of rotations.
+'''
+
+
+import logging
+from logging.handlers import RotatingFileHandler
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from .context import *
+from logtail import LogTail
+
+
+class LogTailTest(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = join(self.tmp.name, 'flwmgr.log')
+        self.handler = RotatingFileHandler(self.path, maxBytes=2000,
+                                           backupCount=1)
+        self.handler.setFormatter(logging.Formatter(
+            '%(asctime)s:%(name)s:%(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'))
+        self.logger = logging.getLogger('logtail-test')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+        self.tail = LogTail(self.path)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+        self.tmp.cleanup()
+
+    def messages(self, logs):
+        return [line['message'] for line in logs['lines']]
+
+    def test_cursor(self):
+        for i in range(5):
+            self.logger.info('message %d', i)
+        logs = self.tail.read(limit=3)
+        self.assertEqual(self.messages(logs), ['message 0', 'message 1',
+                                               'message 2'])
+        self.assertEqual(logs['lines'][0]['level'], 'INFO')
+        self.logger.info('message 5')
+        logs = self.tail.read(logs['cursor'])
+        self.assertEqual(self.messages(logs), ['message 3', 'message 4',
+                                               'message 5'])
+        self.assertEqual(self.tail.read(logs['cursor'])['lines'], [])
+        self.assertEqual(self.messages(self.tail.read(tail=2)),
+                         ['message 4', 'message 5'])
+
+    def test_filters(self):
+        self.logger.debug('Removed, 1, 0, IDLE TIMEOUT')
+        self.logger.error('ErrorMsg, 2, 1, 1')
+        self.logger.error('ErrorMsg, 1, 1, 1')
+        self.assertEqual(
+            self.messages(self.tail.read(level=logging.ERROR)),
+            ['ErrorMsg, 2, 1, 1', 'ErrorMsg, 1, 1, 1'])
+        self.assertEqual(
+            self.messages(self.tail.read(level=logging.ERROR, dpid=1)),
+            ['ErrorMsg, 1, 1, 1'])
+
+    def test_rotation(self):
+        self.logger.info('first')
+        cursor = self.tail.end()
+        for i in range(40):  # about 2 files
+            self.logger.info('message %d', i)
+        logs = self.tail.read(cursor, limit=1000)
+        self.assertEqual(self.messages(logs),
+                         ['message %d' % i for i in range(40)])
+        self.assertEqual(self.tail.read(logs['cursor'])['lines'], [])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+'''
+    Tests of the Prometheus and embedded time series store metrics sinks.
+'''
+
+
+from os.path import abspath, dirname, join
+from subprocess import run
+from sys import executable
+from tempfile import TemporaryDirectory
+from time import time
+from types import SimpleNamespace as NS
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from webob import Request
+
+from .context import *
+from netapp_sim_controller.ryu_apps import metrics_sinks
+from netapp_sim_controller.ryu_apps.metrics import RESOURCE_TYPES
+from netapp_sim_controller.ryu_apps.metrics_sinks import (
+    MetricsSink, PrometheusSink, TSDBSink)
+
+
+ROOT = abspath(join(dirname(__file__), '..'))
+
+
+def link_period(t, delays):
+    resources = []
+    measures = {}
+    for (src, dst), delay in delays.items():
+        id = src + '->' + dst
+        resources.append(('sdn_link', {'id': id, 'src': src, 'dst': dst}))
+        measures[id] = {'delay': [{'timestamp': t, 'value': delay}],
+                        'jitter': [{'timestamp': t, 'value': delay / 10}]}
+    return resources, measures
+
+
+class PrometheusSinkTest(TestCase):
+
+    def test_renders_latest_values(self):
+        sink = PrometheusSink(RESOURCE_TYPES)
+        self.assertEqual(sink.body, b'')
+        sink.export(*link_period(time(), {('1', '2'): 0.5, ('2', '1'): 0.25}))
+        sink.export(*link_period(time(), {('1', '2'): 0.75}))
+        lines = sink.body.decode().splitlines()
+        self.assertIn('# TYPE sdn_link_delay gauge', lines)
+        self.assertIn('sdn_link_delay{dst="2",id="1->2",src="1"} 0.75', lines)
+        self.assertIn('sdn_link_delay{dst="1",id="2->1",src="2"} 0.25', lines)
+        self.assertFalse([line for line in lines if 'bandwidth' in line])
+
+    def test_replayed_periods_are_ignored(self):
+        sink = PrometheusSink(RESOURCE_TYPES)
+        sink.export(*link_period(2.0, {('1', '2'): 0.75}))
+        # older period replayed from the export spill
+        sink.export(*link_period(1.0, {('1', '2'): 0.5, ('2', '1'): 0.25}))
+        lines = sink.body.decode().splitlines()
+        self.assertIn('sdn_link_delay{dst="2",id="1->2",src="1"} 0.75', lines)
+        self.assertIn('sdn_link_delay{dst="1",id="2->1",src="2"} 0.25', lines)
+
+    def test_special_values(self):
+        sink = PrometheusSink(RESOURCE_TYPES)
+        sink.export(*link_period(time(), {('1', '2'): float('inf'),
+                                          ('2', '1'): float('nan'),
+                                          ('1', '3'): float('-inf')}))
+        lines = sink.body.decode().splitlines()
+        self.assertIn('sdn_link_delay{dst="2",id="1->2",src="1"} +Inf', lines)
+        self.assertIn('sdn_link_delay{dst="1",id="2->1",src="2"} NaN', lines)
+        self.assertIn('sdn_link_delay{dst="3",id="1->3",src="1"} -Inf', lines)
+
+    def test_content_type(self):
+        registered = {}
+        wsgi = NS(register=lambda api, data: registered.update(api=api,
+                                                               data=data))
+        sink = PrometheusSink(RESOURCE_TYPES)
+        sink.serve(wsgi)
+        sink.export(*link_period(time(), {('1', '2'): 0.5}))
+        api = registered['api'](Request.blank('/metrics'), None,
+                                registered['data'])
+        response = api.get_metrics(None)
+        self.assertEqual(response.content_type, 'text/plain')
+        self.assertEqual(response.headers['Content-Type'],
+                         'text/plain; version=0.0.4; charset=utf-8')
+        self.assertEqual(response.body, sink.body)
+
+    def test_stale_series_are_dropped(self):
+        sink = PrometheusSink(RESOURCE_TYPES)
+        sink.export(*link_period(time(), {('1', '2'): 0.5}))
+        with patch.object(metrics_sinks, 'time', return_value=time() + 3600):
+            sink.export(*link_period(time(), {('2', '1'): 0.25}))
+        self.assertNotIn(b'id="1->2"', sink.body)
+        self.assertIn(b'id="2->1"', sink.body)
+
+
+class MetricsSinkTest(TestCase):
+
+    def test_export_is_abstract(self):
+        with self.assertRaises(TypeError):
+            MetricsSink(RESOURCE_TYPES)
+
+    def test_openstack_libraries_are_optional(self):
+        # other sinks work without keystoneauth1 and gnocchiclient
+        code = (
+            'import sys\n'
+            'sys.modules.update(keystoneauth1=None, gnocchiclient=None)\n'
+            'sys.path.insert(0, %r)\n'
+            'from netapp_sim_controller.ryu_apps.metrics import '
+            'RESOURCE_TYPES\n'
+            'from netapp_sim_controller.ryu_apps.metrics_sinks import '
+            'PrometheusSink\n'
+            'PrometheusSink(RESOURCE_TYPES)\n' % ROOT)
+        result = run([executable, '-c', code], capture_output=True)
+        self.assertEqual(result.returncode, 0, result.stderr.decode())
+
+
+class TSDBSinkTest(TestCase):
+
+    def test_appends_points(self):
+        with TemporaryDirectory() as tmp, \
+                patch.object(metrics_sinks, 'METRICS_TSDB', tmp):
+            sink = TSDBSink(RESOURCE_TYPES)
+            sink.export(*link_period(1.0, {('1', '2'): 0.5}))
+            sink.export(*link_period(2.0, {('1', '2'): 0.75}))
+            ts, val = sink.store.query('delay', '1->2')
+            self.assertEqual(ts.tolist(), [1.0, 2.0])
+            self.assertEqual(val.tolist(), [0.5, 0.75])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+    Tests of the port index of the network delay detector.
+'''
+
+
+from collections import namedtuple
+from types import SimpleNamespace as NS
+from unittest import TestCase, main
+
+from ryu.base.app_manager import SERVICE_BRICKS
+
+from .context import *
+from netapp_sim_controller.ryu_apps.network_delay_detector import (
+    NetworkDelayDetector)
+
+
+Port = namedtuple('Port', ('dpid', 'port_no'))
+
+
+def switch(dpid, *port_nos):
+    return NS(dp=NS(id=dpid), ports=[Port(dpid, n) for n in port_nos])
+
+
+def lldp(dpid, timestamp):
+    # LLDP packet-in received from switch dpid
+    return NS(timestamp=timestamp, msg=NS(datapath=NS(id=dpid)))
+
+
+class NetworkDelayDetectorTest(TestCase):
+    '''
+        Switch 1 with ports 1 and 2 known at startup, whose LLDP packets
+        were sent at time 10.
+    '''
+
+    def setUp(self):
+        # Switches app's port data (Port -> PortData)
+        self.port_data = {Port(1, 1): NS(timestamp=10),
+                          Port(1, 2): NS(timestamp=10)}
+        self.apps = {
+            SWITCHES: NS(ports=self.port_data, dps={}),
+            PROBE_SCHEDULER: NS(register=lambda *args, **kwargs: None),
+            PACKET_IN_DISPATCHER: NS(register=lambda *args: None)}
+        SERVICE_BRICKS.update(self.apps)
+        self.detector = NetworkDelayDetector()
+
+    def tearDown(self):
+        for name in self.apps:
+            SERVICE_BRICKS.pop(name, None)
+
+    def test_index_follows_events(self):
+        self.assertEqual(set(self.detector._ports), {(1, 1), (1, 2)})
+        self.detector._switch_enter_handler(NS(switch=switch(2, 1, 2)))
+        self.detector._port_add_handler(NS(port=Port(1, 3)))
+        self.assertEqual(set(self.detector._ports),
+                         {(1, 1), (1, 2), (1, 3), (2, 1), (2, 2)})
+        self.assertEqual(self.detector._ports[(2, 1)], Port(2, 1))
+
+        self.detector._port_delete_handler(NS(port=Port(1, 3)))
+        self.detector._switch_leave_handler(NS(switch=switch(2, 1, 2)))
+        self.assertEqual(set(self.detector._ports), {(1, 1), (1, 2)})
+
+    def test_lldp_latency(self):
+        self.detector._lldp_packet_in_handler(lldp(2, 10.5), (1, 2))
+        self.assertEqual(self.detector.lldp_latency, {1: {2: 0.5}})
+
+        # ports not indexed (or without sending timestamp) are ignored
+        self.detector._port_delete_handler(NS(port=Port(1, 2)))
+        self.detector._lldp_packet_in_handler(lldp(3, 11), (1, 2))
+        self.detector._lldp_packet_in_handler(lldp(3, 11), (4, 1))
+        self.port_data[Port(1, 1)].timestamp = None
+        self.detector._lldp_packet_in_handler(lldp(3, 11), (1, 1))
+        self.assertEqual(self.detector.lldp_latency, {1: {2: 0.5}})
+
+        # ports added later are resolved
+        self.port_data[Port(5, 1)] = NS(timestamp=10.75)
+        self.detector._switch_enter_handler(NS(switch=switch(5, 1)))
+        self.detector._lldp_packet_in_handler(lldp(1, 11), (5, 1))
+        self.assertEqual(self.detector.lldp_latency[5], {1: 0.25})
+
+
+if __name__ == '__main__':
+    main()
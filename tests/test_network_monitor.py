@@ -0,0 +1,133 @@
+'''
+    Tests of the port statistics of the network monitor.
+'''
+
+
+from types import SimpleNamespace as NS
+from unittest import TestCase, main
+
+from ryu.base.app_manager import SERVICE_BRICKS
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+from ryu.ofproto.ofproto_v1_3_parser import OFPPortStats
+
+from .context import *
+from netapp_sim_controller.ryu_apps.common import (PROBE_SCHEDULER,
+                                                   SWITCHES)
+from netapp_sim_controller.ryu_apps.network_monitor import NetworkMonitor
+from netapp_sim_controller.ryu_apps.probe_scheduler import ProbeScheduler
+
+
+UNSUPPORTED = 0xffffffffffffffff
+
+
+def reply(dpid, *stats, flags=0):
+    return NS(msg=NS(datapath=NS(id=dpid, ofproto=ofproto_v1_3),
+                     flags=flags, body=list(stats)))
+
+
+def port_stats(port_no, tx_bytes, rx_bytes, sec, errors=0, tx_packets=0,
+               rx_packets=0):
+    # rx_dropped, tx_dropped, rx_errors and tx_errors set to errors
+    return OFPPortStats(port_no, rx_packets, tx_packets, rx_bytes, tx_bytes,
+                        errors, errors, errors, errors, 0, 0, 0, 0, sec, 0)
+
+
+class NetworkMonitorTest(TestCase):
+
+    def setUp(self):
+        SERVICE_BRICKS[SWITCHES] = NS(dps={})
+        SERVICE_BRICKS[PROBE_SCHEDULER] = ProbeScheduler()
+        self.monitor = NetworkMonitor()
+        self.monitor.port_features[1] = {1: ('up', 'up', 10**6)}  # 1 Gbit/s
+
+    def tearDown(self):
+        SERVICE_BRICKS.pop(SWITCHES, None)
+        SERVICE_BRICKS.pop(PROBE_SCHEDULER, None)
+
+    def replies(self, *replies):
+        # handles replies, then updates stats (as at the end of a sweep)
+        for ev in replies:
+            self.monitor._port_stats_reply_handler(ev)
+        self.monitor._update_stats()
+
+    def test_speed(self):
+        self.replies(reply(1, port_stats(1, 10**6, 0, 1)))
+        self.replies(reply(1, port_stats(1, 26 * 10**6, 10**6, 2)))
+        self.assertEqual(self.monitor.port_speed.last((1, 1))[-1].tolist(),
+                         [25 * 10**6, 10**6])
+        self.assertEqual(self.monitor.free_bandwidth[1][1], (800, 992))
+
+    def test_unsupported_counters(self):
+        # all-ones (unsupported) counters do not fail the reply
+        for sec in (1, 2):
+            self.replies(
+                reply(1, port_stats(1, sec * 10**6, 0, sec, UNSUPPORTED)))
+        self.assertEqual(self.monitor.port_speed.last((1, 1))[-1].tolist(),
+                         [10**6, 0])
+        self.assertEqual(int(self.monitor.port_stats.column(
+            (1, 1), 'rx_dropped', 1)[0]), UNSUPPORTED)
+
+    def test_counter_reset(self):
+        self.replies(reply(1, port_stats(1, 5 * 10**6, 0, 1)))
+        self.replies(reply(1, port_stats(1, 10**6, 0, 2)))
+        self.assertEqual(self.monitor.port_speed.last((1, 1))[-1].tolist(),
+                         [-4 * 10**6, 0])
+
+    def test_batched_replies(self):
+        more = ofproto_v1_3.OFPMPF_REPLY_MORE
+        # multipart reply of switch 1, and reply of switch 2
+        self.monitor._port_stats_reply_handler(reply(
+            1, port_stats(1, 10**6, 0, 1),
+            port_stats(ofproto_v1_3.OFPP_LOCAL, 0, 0, 1), flags=more))
+        self.monitor._port_stats_reply_handler(
+            reply(1, port_stats(2, 0, 10**6, 1)))
+        self.monitor._port_stats_reply_handler(
+            reply(2, port_stats(1, 0, 0, 1)))
+        # nothing is computed before the end of the sweep
+        self.assertEqual(len(self.monitor.port_stats), 0)
+
+        # unless a switch replies again
+        self.monitor._port_stats_reply_handler(
+            reply(1, port_stats(1, 3 * 10**6, 0, 2),
+                  port_stats(2, 0, 10**6, 2)))
+        self.assertEqual(sorted(self.monitor.port_stats),
+                         [(1, 1), (1, 2), (2, 1)])
+        # first sample of port 1: 1 MB over MONITOR_PERIOD
+        self.assertEqual(self.monitor.free_bandwidth[1][1],
+                         (1000 - 8 / MONITOR_PERIOD, 1000))
+        self.monitor._publish()
+        self.assertEqual(self.monitor.port_speed.last((1, 1))[-1].tolist(),
+                         [2 * 10**6, 0])
+        self.assertEqual(self.monitor.port_speed.last((1, 2))[-1].tolist(),
+                         [0, 0])
+        self.assertEqual(self.monitor.free_bandwidth[1][1], (984, 1000))
+        self.assertEqual(
+            self.monitor.snapshots.get().free_bandwidth[1][1], (984, 1000))
+
+    def test_capacity_change(self):
+        self.replies(reply(1, port_stats(1, 0, 0, 1)))
+        self.replies(reply(1, port_stats(1, 10**6, 0, 2)))
+        self.assertEqual(self.monitor.free_bandwidth[1][1], (992, 1000))
+
+        # port 1 renegotiated at 100 Mbit/s
+        self.monitor._port_desc_stats_reply_handler(NS(msg=NS(
+            datapath=NS(id=1, ofproto=ofproto_v1_3,
+                        ofproto_parser=ofproto_v1_3_parser),
+            body=[NS(port_no=1, config=0, state=0, curr_speed=10**5)])))
+        self.replies(reply(1, port_stats(1, 2 * 10**6, 0, 3)))
+        self.assertEqual(self.monitor.free_bandwidth[1][1], (92, 100))
+
+    def test_loss_rate(self):
+        # link from port 1 of switch 1 to port 1 of switch 2, and back
+        for src, dst in ((1, 2), (2, 1)):
+            self.monitor._link_add_handler(NS(link=NS(
+                src=NS(dpid=src, port_no=1), dst=NS(dpid=dst, port_no=1))))
+        self.replies(
+            reply(1, port_stats(1, 0, 0, 1, tx_packets=100,
+                                rx_packets=50)),
+            reply(2, port_stats(1, 0, 0, 1, tx_packets=0, rx_packets=90)))
+        self.assertEqual(self.monitor.loss_rate, {1: {2: 0.1}, 2: {1: 1}})
+
+
+if __name__ == '__main__':
+    main()
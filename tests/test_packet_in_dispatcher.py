@@ -0,0 +1,139 @@
+'''
+    Tests of the classification and dispatching of packet-ins.
+'''
+
+
+from types import SimpleNamespace as NS
+from unittest import TestCase, main
+
+from ryu.lib.packet.arp import arp, ARP_REQUEST
+from ryu.lib.packet.ether_types import (ETH_TYPE_ARP, ETH_TYPE_IP,
+                                        ETH_TYPE_8021Q)
+from ryu.lib.packet.ethernet import ethernet
+from ryu.lib.packet.icmp import icmp, echo
+from ryu.lib.packet.in_proto import IPPROTO_ICMP, IPPROTO_UDP
+from ryu.lib.packet.ipv4 import ipv4
+from ryu.lib.packet.packet import Packet
+from ryu.lib.packet.udp import udp
+from ryu.lib.packet.vlan import vlan
+from ryu.topology.switches import LLDPPacket
+
+from .context import *
+from netapp_sim_controller.ryu_apps.common import CONTROLLER_MAC
+from netapp_sim_controller.ryu_apps.host_table import ip_to_int
+from netapp_sim_controller.ryu_apps.packet_in_dispatcher import (
+    classify, parse_arp, PacketInDispatcher, ARP_PACKET, ICMP_PACKET,
+    LLDP_PACKET)
+
+
+HOST_MAC = '00:00:00:00:00:01'
+
+
+def frame(*protocols):
+    pkt = Packet()
+    for protocol in protocols:
+        pkt.add_protocol(protocol)
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def icmp_frame(dst_mac, vlan_id=None, proto=IPPROTO_ICMP):
+    protocols = [ethernet(
+        ethertype=ETH_TYPE_8021Q if vlan_id else ETH_TYPE_IP,
+        src=HOST_MAC, dst=dst_mac)]
+    if vlan_id:
+        protocols.append(vlan(vid=vlan_id, ethertype=ETH_TYPE_IP))
+    protocols.append(ipv4(proto=proto, src='10.0.0.1', dst='10.0.0.2'))
+    protocols.append(icmp(data=echo(data=b'1')) if proto == IPPROTO_ICMP
+                     else udp(src_port=1, dst_port=2))
+    return frame(*protocols)
+
+
+ARP_FRAME = frame(
+    ethernet(ethertype=ETH_TYPE_ARP, src=HOST_MAC, dst='ff:ff:ff:ff:ff:ff'),
+    arp(opcode=ARP_REQUEST, src_mac=HOST_MAC, src_ip='10.0.0.1',
+        dst_ip='10.0.0.2'))
+LLDP_FRAME = bytes(LLDPPacket.lldp_packet(1, 2, HOST_MAC, 120))
+
+
+class ClassifyTest(TestCase):
+
+    def test_arp(self):
+        self.assertEqual(classify(ARP_FRAME), ARP_PACKET)
+
+    def test_lldp(self):
+        self.assertEqual(classify(LLDP_FRAME), LLDP_PACKET)
+
+    def test_icmp_to_controller(self):
+        self.assertEqual(classify(icmp_frame(CONTROLLER_MAC)), ICMP_PACKET)
+        self.assertEqual(classify(icmp_frame(CONTROLLER_MAC, vlan_id=10)),
+                         ICMP_PACKET)
+
+    def test_ignored(self):
+        # ICMP to another host, other IPv4 protocols, truncated frames
+        self.assertIsNone(classify(icmp_frame(HOST_MAC)))
+        self.assertIsNone(classify(icmp_frame(HOST_MAC, vlan_id=10)))
+        self.assertIsNone(classify(icmp_frame(CONTROLLER_MAC,
+                                              proto=IPPROTO_UDP)))
+        self.assertIsNone(classify(icmp_frame(CONTROLLER_MAC)[:20]))
+        self.assertIsNone(classify(ARP_FRAME[:12]))
+
+
+class ParseARPTest(TestCase):
+
+    def test_header(self):
+        header = parse_arp(ARP_FRAME)
+        self.assertEqual(header.opcode, ARP_REQUEST)
+        self.assertEqual(header.eth_src, bytes.fromhex('000000000001'))
+        self.assertEqual(header.src_mac, header.eth_src)
+        self.assertEqual((header.src_ip, header.dst_ip),
+                         (ip_to_int('10.0.0.1'), ip_to_int('10.0.0.2')))
+
+        tagged = frame(
+            ethernet(ethertype=ETH_TYPE_8021Q, src=HOST_MAC,
+                     dst='ff:ff:ff:ff:ff:ff'),
+            vlan(vid=10, ethertype=ETH_TYPE_ARP),
+            arp(opcode=ARP_REQUEST, src_mac=HOST_MAC, src_ip='10.0.0.1',
+                dst_ip='10.0.0.2'))
+        self.assertEqual(parse_arp(tagged), header)
+
+    def test_malformed(self):
+        self.assertIsNone(parse_arp(ARP_FRAME[:41]))
+        # not an IPv4 ARP packet
+        self.assertIsNone(parse_arp(ARP_FRAME[:16] + b'\x86\xdd' +
+                                    ARP_FRAME[18:]))
+
+
+class PacketInDispatcherTest(TestCase):
+
+    def setUp(self):
+        self.dispatcher = PacketInDispatcher()
+        self.received = []
+        for kind in (ARP_PACKET, LLDP_PACKET):
+            self.dispatcher.register(
+                kind, lambda ev, pkt, kind=kind:
+                self.received.append((kind, pkt)))
+
+    def dispatch(self, data):
+        self.dispatcher._packet_in_handler(NS(msg=NS(data=data)))
+
+    def test_dispatch(self):
+        self.dispatch(ARP_FRAME)
+        self.dispatch(LLDP_FRAME)
+        # no handler registered for ICMP
+        self.dispatch(icmp_frame(CONTROLLER_MAC))
+        self.assertEqual([kind for kind, _ in self.received],
+                         [ARP_PACKET, LLDP_PACKET])
+        self.assertEqual(self.received[0][1].dst_ip, ip_to_int('10.0.0.2'))
+        self.assertEqual(self.received[1][1], (1, 2))
+
+    def test_handler_errors(self):
+        def failing(ev, pkt):
+            raise ValueError
+        self.dispatcher._handlers[ARP_PACKET].insert(0, failing)
+        self.dispatch(ARP_FRAME)
+        self.assertEqual(len(self.received), 1)
+
+
+if __name__ == '__main__':
+    main()
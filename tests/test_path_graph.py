@@ -0,0 +1,176 @@
+'''
+    Tests of the weighted graph of the path service.
+'''
+
+
+from unittest import TestCase, main
+
+from .context import *
+from path_graph import PathGraph
+
+
+# square 1-2-3 / 1-4-3 with a diagonal 2-4, and host h on switch 3:
+# 1-2-3 is fast but narrow, 1-4-3 slow but wide
+LINKS = {(1, 2): 1, (2, 1): 1, (2, 3): 2, (3, 2): 1, (1, 4): 2, (4, 1): 1,
+         (4, 3): 2, (3, 4): 2, (2, 4): 3, (4, 2): 3, (3, 'h'): 3,
+         ('h', 3): 0}
+METRICS = {(1, 2): 0.01, (2, 3): 0.01, (1, 4): 0.05, (4, 3): 0.05,
+           (2, 4): 0.02}
+
+
+def make_graph():
+    graph = PathGraph(threshold=0.1)
+    graph.set_topology(LINKS)
+    values = {}
+    for (u, v), delay in METRICS.items():
+        bandwidth = 10. if delay == 0.01 else 100.
+        values[(u, v)] = values[(v, u)] = {'delay': delay,
+                                           'bandwidth': bandwidth}
+    graph.update_metrics(values)
+    return graph
+
+
+class PathGraphTest(TestCase):
+
+    def setUp(self):
+        self.graph = make_graph()
+
+    def test_adjacency_arrays(self):
+        graph = self.graph
+        self.assertEqual(len(graph.nodes), 5)
+        self.assertEqual(len(graph.targets), len(LINKS))
+        for (u, v), port in LINKS.items():
+            i = graph.index[u]
+            edges = range(graph.indptr[i], graph.indptr[i + 1])
+            self.assertIn((graph.index[v], port),
+                          [(graph.targets[e], graph.ports[e]) for e in edges])
+
+    def test_shortest_paths(self):
+        paths = self.graph.shortest_paths(1, 'h', k=4)
+        self.assertEqual([path['nodes'] for path in paths], [
+            [1, 2, 3, 'h'], [1, 2, 4, 3, 'h'], [1, 4, 2, 3, 'h'],
+            [1, 4, 3, 'h']])
+        self.assertEqual(paths[0]['ports'], [1, 2, 3])
+        self.assertAlmostEqual(paths[0]['delay'], 0.02)
+        self.assertEqual(paths[0]['bandwidth'], 10.)
+        delays = [path['delay'] for path in paths]
+        self.assertEqual(delays, sorted(delays))
+        hops = self.graph.shortest_paths(1, 3, k=2, weight='hops')
+        self.assertEqual([path['hops'] for path in hops], [2, 2])
+
+    def test_widest_and_constrained_paths(self):
+        self.assertEqual(self.graph.widest_path(1, 3)[0]['nodes'], [1, 4, 3])
+        self.assertEqual(
+            self.graph.constrained_path(1, 3, 0.05)[0]['nodes'], [1, 2, 3])
+        self.assertEqual(
+            self.graph.constrained_path(1, 3, 0.1)[0]['nodes'], [1, 4, 3])
+        self.assertEqual(self.graph.constrained_path(1, 3, 0.01), [])
+        self.assertEqual(
+            self.graph.constrained_path(1, 3, 1, min_bandwidth=1000), [])
+
+    def test_unknown_metrics(self):
+        graph = PathGraph()
+        graph.set_topology({(1, 2): 1, (2, 1): 1})
+        path = graph.widest_path(1, 2)[0]
+        self.assertIsNone(path['bandwidth'])
+        self.assertEqual(path['delay'], 0)
+        with self.assertRaises(KeyError):
+            graph.widest_path(1, 3)
+
+    def test_loss(self):
+        self.graph.update_metrics({(1, 2): {'loss': 0.5},
+                                   (2, 3): {'loss': 0.5}})
+        path = self.graph.shortest_paths(1, 3, weight='loss')[0]
+        self.assertEqual(path['nodes'], [1, 4, 3])
+        path = self.graph.shortest_paths(1, 3, k=4, weight='loss')[-1]
+        self.assertEqual(path['nodes'], [1, 2, 3])
+        self.assertAlmostEqual(path['loss'], 0.75)
+
+    def test_tree(self):
+        graph = self.graph
+        # 4 reaches 3 faster through 2 than directly
+        self.assertEqual(graph.tree(3), {
+            1: (2, 1), 2: (3, 2), 4: (2, 3), 'h': (3, 0)})
+        self.assertEqual(graph.tree(3, weight='hops')[4], (3, 2))
+        self.assertEqual(graph.tree('h')[3], ('h', 3))
+        # every node's path follows the tree to the shortest path's end
+        for node in (1, 2, 4):
+            path = graph.shortest_paths(node, 'h')[0]
+            self.assertEqual(path['ports'], [
+                graph.tree('h')[hop][1] for hop in path['nodes'][:-1]])
+        with self.assertRaises(KeyError):
+            graph.tree(9)
+
+    def hit(self, query, *args):
+        # whether query(*args) is answered from the cache
+        hits = self.graph.hits
+        query(*args)
+        return self.graph.hits == hits + 1
+
+    def test_cache(self):
+        graph = self.graph
+        paths = graph.shortest_paths(1, 3)
+        self.assertTrue(self.hit(graph.shortest_paths, 1, 3))
+        self.assertEqual(graph.shortest_paths(1, 3), paths)
+        self.assertEqual(graph.hits, 2)
+        # changes under threshold are ignored
+        self.assertEqual(graph.update_metrics({(1, 2): {'delay': 0.0105}}),
+                         0)
+        self.assertTrue(self.hit(graph.shortest_paths, 1, 3))
+
+    def test_invalidation(self):
+        graph = self.graph
+        graph.shortest_paths(1, 3)
+        graph.shortest_paths(4, 3)
+        graph.widest_path(1, 3)
+        # worse edge: only results using it (and its metric) are dropped
+        graph.update_metrics({(1, 2): {'delay': 0.5}})
+        self.assertFalse(self.hit(graph.shortest_paths, 1, 3))
+        self.assertTrue(self.hit(graph.shortest_paths, 4, 3))
+        self.assertTrue(self.hit(graph.widest_path, 1, 3))
+        # better edge: all results depending on the metric are dropped
+        graph.update_metrics({(4, 3): {'delay': 0.001}})
+        self.assertFalse(self.hit(graph.shortest_paths, 4, 3))
+        self.assertTrue(self.hit(graph.widest_path, 1, 3))
+
+    def test_cached_paths_have_current_metrics(self):
+        graph = self.graph
+        path = graph.shortest_paths(1, 3)[0]
+        self.assertEqual((path['bandwidth'], path['loss']), (10., 0.))
+        # metrics not ranking the path
+        graph.update_metrics({(1, 2): {'bandwidth': 5., 'loss': 0.3}})
+        self.assertTrue(self.hit(graph.shortest_paths, 1, 3))
+        path = graph.shortest_paths(1, 3)[0]
+        self.assertEqual(path['nodes'], [1, 2, 3])
+        self.assertEqual(path['bandwidth'], 5.)
+        self.assertAlmostEqual(path['loss'], 0.3)
+        # nor the widest path, which does not use the edge
+        graph.widest_path(1, 3)
+        graph.update_metrics({(4, 3): {'delay': 0.08}})
+        self.assertTrue(self.hit(graph.widest_path, 1, 3))
+        self.assertAlmostEqual(graph.widest_path(1, 3)[0]['delay'], 0.13)
+
+    def test_topology_change(self):
+        graph = self.graph
+        graph.shortest_paths(1, 3)
+        version = graph.version
+        self.assertFalse(graph.set_topology(dict(LINKS)))
+        self.assertTrue(self.hit(graph.shortest_paths, 1, 3))
+        links = dict(LINKS)
+        del links[(2, 3)]
+        self.assertTrue(graph.set_topology(links))
+        self.assertEqual(graph.version, version + 1)
+        self.assertEqual(graph.shortest_paths(1, 3)[0]['nodes'], [1, 2, 4, 3])
+        # metrics of remaining edges are kept
+        self.assertEqual(graph.widest_path(1, 3)[0]['bandwidth'], 100.)
+
+    def test_cache_size(self):
+        graph = PathGraph(cache_size=2)
+        graph.set_topology(LINKS)
+        for dst in (2, 3, 4):
+            graph.shortest_paths(1, dst)
+        self.assertEqual(graph.stats()['cached'], 2)
+
+
+if __name__ == '__main__':
+    main()
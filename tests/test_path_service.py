@@ -0,0 +1,89 @@
+'''
+    Tests of the path service's refresh of its graph from the monitors.
+'''
+
+
+from types import SimpleNamespace as NS
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from ryu.base.app_manager import SERVICE_BRICKS
+
+from .context import *
+from netapp_sim_controller.ryu_apps import path_service
+from netapp_sim_controller.ryu_apps.common import (
+    SWITCHES, SIMPLE_ARP, NETWORK_MONITOR, NETWORK_DELAY_DETECTOR,
+    DELAY_MONITOR)
+from netapp_sim_controller.ryu_apps.host_table import (
+    HostTable, ip_to_int, mac_to_int)
+from netapp_sim_controller.ryu_apps.path_service import PathService
+from netapp_sim_controller.ryu_apps.snapshot import SnapshotPublisher
+
+
+def link(src, src_port, dst, dst_port):
+    return NS(src=NS(dpid=src, port_no=src_port),
+              dst=NS(dpid=dst, port_no=dst_port))
+
+
+class PathServiceTest(TestCase):
+    '''
+        Hosts 10.0.0.1 (on port 1 of switch 1) and 10.0.0.2 (on port 1 of
+        switch 2), switches linked by their ports 2.
+    '''
+
+    def setUp(self):
+        hosts = HostTable()
+        hosts.learn(ip_to_int('10.0.0.1'), mac_to_int('00:00:00:00:00:01'),
+                    1, 1)
+        hosts.learn(ip_to_int('10.0.0.2'), mac_to_int('00:00:00:00:00:02'),
+                    2, 1)
+        self.apps = {
+            SWITCHES: NS(links=[link(1, 2, 2, 2), link(2, 2, 1, 2)]),
+            SIMPLE_ARP: NS(hosts=hosts),
+            NETWORK_MONITOR: NS(snapshots=SnapshotPublisher(
+                free_bandwidth={1: {1: (50, 40), 2: (100, 90)},
+                                2: {1: (30, 20), 2: (80, 70)}},
+                loss_rate={1: {2: 0.1}})),
+            NETWORK_DELAY_DETECTOR: NS(snapshots=SnapshotPublisher(
+                delay={1: {2: 0.01}, 2: {1: 0.02}},
+                jitter={1: {2: 0.001}})),
+            # round trips
+            DELAY_MONITOR: NS(snapshots=SnapshotPublisher(
+                delay={'10.0.0.1': 0.004, '10.0.0.2': 0.006},
+                jitter={'10.0.0.1': 0.002}))}
+        SERVICE_BRICKS.update(self.apps)
+        with patch.object(path_service, 'spawn'):
+            self.service = PathService()
+
+    def tearDown(self):
+        for name in self.apps:
+            SERVICE_BRICKS.pop(name, None)
+
+    def test_refresh(self):
+        self.service.refresh()
+        path, = self.service.paths('10.0.0.1', '10.0.0.2')
+        self.assertEqual(path['nodes'], ['10.0.0.1', 1, 2, '10.0.0.2'])
+        self.assertEqual(path['ports'], [0, 2, 1])
+        # host delays and jitters are halved round trips
+        self.assertAlmostEqual(path['delay'], 0.002 + 0.01 + 0.003)
+        self.assertAlmostEqual(path['jitter'], 0.001 + 0.001)
+        self.assertAlmostEqual(path['loss'], 0.1)
+        # bottleneck: switch 2 port 1 up
+        self.assertEqual(path['bandwidth'], 30)
+
+        back, = self.service.paths('10.0.0.2', '10.0.0.1')
+        self.assertAlmostEqual(back['delay'], 0.003 + 0.02 + 0.002)
+        self.assertEqual(back['bandwidth'], 20)
+
+    def test_refresh_without_measures(self):
+        for name in (NETWORK_MONITOR, NETWORK_DELAY_DETECTOR, DELAY_MONITOR):
+            self.apps[name].snapshots = SnapshotPublisher(
+                free_bandwidth={}, loss_rate={}, delay={}, jitter={})
+        self.service.refresh()
+        path, = self.service.paths('10.0.0.1', '10.0.0.2', weight='hops')
+        self.assertEqual(path['hops'], 3)
+        self.assertIsNone(path['bandwidth'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+'''
+    Tests of the in-flight cap, backoff and acknowledgement of probes.
+'''
+
+
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from .context import *
+from netapp_sim_controller.ryu_apps import probe_scheduler
+from netapp_sim_controller.ryu_apps.common import MONITOR_MAX_IN_FLIGHT
+from netapp_sim_controller.ryu_apps.probe_scheduler import (
+    LOST_AFTER, MAX_BACKOFF, ProbeScheduler)
+
+
+PERIOD = 1
+
+
+class ProbeSchedulerTest(TestCase):
+
+    def setUp(self):
+        self.scheduler = ProbeScheduler()
+        self.scheduler._periods.update(ports=PERIOD, pings=PERIOD)
+        self.now = 100
+        patcher = patch.object(probe_scheduler, 'time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send(self, key, sweep=0):
+        return self.scheduler._may_send(key, PERIOD, True, sweep)
+
+    def test_cap(self):
+        for _ in range(MONITOR_MAX_IN_FLIGHT):
+            self.assertTrue(self.send(('pings', '10.0.0.1')))
+        self.assertFalse(self.send(('pings', '10.0.0.1')))
+        # other hosts of the switch and other classes are not capped
+        self.assertTrue(self.send(('pings', '10.0.0.2')))
+        self.assertTrue(self.send(('ports', 1)))
+        # unacked classes are never capped
+        for _ in range(MONITOR_MAX_IN_FLIGHT + 1):
+            self.assertTrue(self.scheduler._may_send(('arp', 1), PERIOD,
+                                                     False, 0))
+
+    def test_backoff(self):
+        host = ('pings', '10.0.0.1')
+        self.assertTrue(self.send(host))
+        self.assertTrue(self.send(('ports', 1)))
+        self.scheduler.replied('ports', 1)
+        # lost pings back off the host only
+        for sweep in range(1, 5):
+            self.now += LOST_AFTER * PERIOD + 1
+            self.send(host, sweep=0)
+        self.assertEqual(self.scheduler._backoff, {host: MAX_BACKOFF})
+        self.assertFalse(self.send(host, sweep=MAX_BACKOFF // 2))
+        self.assertTrue(self.send(('ports', 1), sweep=1))
+        self.assertTrue(self.send(('pings', '10.0.0.2'), sweep=1))
+        # fast replies recover
+        self.scheduler.replied(*host)
+        self.assertEqual(self.scheduler._backoff[host], MAX_BACKOFF // 2)
+
+    def test_ack(self):
+        host = ('pings', '10.0.0.1')
+        self.send(host)
+        first = self.now
+        self.now += 0.4
+        self.send(host)
+        second = self.now
+        # slow reply to the second probe: the first one is lost
+        self.now += 0.6
+        self.scheduler.replied('pings', '10.0.0.1', second + 0.0001)
+        self.assertAlmostEqual(self.scheduler.rtt[host], 0.6, places=3)
+        self.assertEqual(self.scheduler._backoff[host], 4)
+        self.assertFalse(self.scheduler._in_flight[host])
+        # late reply to the lost probe is ignored
+        self.scheduler.replied('pings', '10.0.0.1', first)
+        self.assertAlmostEqual(self.scheduler.rtt[host], 0.6, places=3)
+
+    def test_ack_oldest(self):
+        self.send(('ports', 1))
+        self.now += 0.2
+        self.send(('ports', 1))
+        self.now += 0.4
+        # replies without timestamp acknowledge the oldest probe (slow)
+        self.scheduler.replied('ports', 1)
+        self.assertAlmostEqual(self.scheduler.rtt[('ports', 1)], 0.6)
+        self.assertEqual(self.scheduler._backoff[('ports', 1)], 2)
+        self.assertEqual(len(self.scheduler._in_flight[('ports', 1)]), 1)
+
+    def test_sweep(self):
+        sent = []
+        probes = [(1, lambda: sent.append('10.0.0.1'), '10.0.0.1'),
+                  (1, lambda: sent.append('10.0.0.2'), '10.0.0.2')]
+        self.scheduler._sweep('pings', lambda: probes, 0, True, 0)
+        self.assertEqual(sent, ['10.0.0.1', '10.0.0.2'])
+        self.assertEqual(set(self.scheduler._in_flight),
+                         {('pings', '10.0.0.1'), ('pings', '10.0.0.2')})
+        # state of targets no longer probed is dropped
+        self.scheduler._sweep('pings', lambda: probes[1:], 0, True, 1)
+        self.assertEqual(set(self.scheduler._in_flight),
+                         {('pings', '10.0.0.2')})
+
+
+if __name__ == '__main__':
+    main()
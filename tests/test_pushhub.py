@@ -0,0 +1,67 @@
+'''
+    Tests of PushHub's merging of messages and per-client queues.
+'''
+
+
+from json import loads
+from unittest import TestCase, main
+
+from ryu.lib import hub
+
+from .context import *
+from pushhub import PushHub
+
+
+class WebSocket:
+
+    def __init__(self, block=False):
+        self.received = []
+        self.block = block
+
+    def send(self, data):
+        while self.block:
+            hub.sleep(0.01)
+        self.received.append(loads(data))
+
+
+class PushHubTest(TestCase):
+
+    def test_window_is_merged_and_state_computed_once(self):
+        push = PushHub(window=0.05)
+        ws = WebSocket()
+        push.add(ws)
+        calls = []
+        for i in range(10):
+            push.publish('log', [i])
+            push.publish_state('diff', lambda: calls.append(1) or len(calls))
+        hub.sleep(0.2)
+        self.assertEqual(len(calls), 1)
+        msg, = ws.received
+        self.assertEqual(msg['method'], 'batch')
+        self.assertEqual([m['params'] for m in msg['params']],
+                         [[i] for i in range(10)] + [1])
+
+    def test_slow_client_drops_oldest(self):
+        push = PushHub(window=0, queue_size=2)
+        slow, fast = WebSocket(block=True), WebSocket()
+        push.add(slow)
+        push.add(fast)
+        hub.sleep(0)
+        for i in range(5):
+            push.publish('log', i)
+            push.flush()
+            hub.sleep(0)
+        self.assertEqual([m['params'] for m in fast.received], list(range(5)))
+        slow.block = False
+        hub.sleep(0.1)
+        # the first message was being sent when the others were queued
+        self.assertEqual([m['params'] for m in slow.received], [0, 3, 4])
+        stats = {s['sent']: s for s in push.stats()}
+        self.assertEqual(stats[3]['dropped'], 2)
+
+        push.remove(slow)
+        self.assertEqual(len(push.stats()), 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+    Tests of the ring-buffer sample store of the monitoring apps.
+'''
+
+
+from unittest import TestCase, main
+
+from numpy import array
+
+from .context import *
+from sample_store import SampleStore
+
+
+class SampleStoreTest(TestCase):
+
+    def setUp(self):
+        self.store = SampleStore(('tx', 'rx'), 3, capacity=1)
+
+    def test_wrap_around(self):
+        for i in range(5):
+            self.store.append('a', (i, 10 * i))
+        self.assertEqual(self.store.count('a'), 3)
+        self.assertEqual(self.store.last('a').tolist(),
+                         [[2, 20], [3, 30], [4, 40]])
+        self.assertEqual(self.store.last('a', 2).tolist(),
+                         [[3, 30], [4, 40]])
+        # n larger than samples held
+        self.store.append('b', (1, 1))
+        self.assertEqual(self.store.last('b', 5).tolist(), [[1, 1]])
+
+    def test_column(self):
+        for i in range(4):
+            self.store.append('a', (i, 10 * i))
+        self.assertEqual(self.store.column('a', 'rx').tolist(),
+                         [10, 20, 30])
+        self.assertEqual(self.store.column('a', 'tx', 2).tolist(), [2, 3])
+        self.assertEqual(self.store.column('a', 'tx', 0).tolist(), [])
+        self.assertEqual(self.store.column('unknown', 'tx').tolist(), [])
+
+    def test_vectorized(self):
+        # growing past capacity keeps rows
+        rows = self.store.rows(['a', 'b', 'c'])
+        self.assertEqual(rows.tolist(), [0, 1, 2])
+        for i in range(4):
+            self.store.append_rows(rows, array([[i, 0], [i, 1], [i, 2]]))
+        self.assertEqual(self.store.counts(rows).tolist(), [3, 3, 3])
+        self.assertEqual(self.store.latest(rows)[:, 0].tolist(), [3, 3, 3])
+        self.assertEqual(self.store.latest(rows, 1)[:, 0].tolist(),
+                         [2, 2, 2])
+        self.assertEqual(self.store.column('c', 'rx').tolist(), [2, 2, 2])
+
+    def test_pop(self):
+        self.store.append('a', (1, 1))
+        self.store.append('b', (2, 2))
+        row = self.store.pop('a')
+        self.assertNotIn('a', self.store)
+        self.assertIsNone(self.store.pop('a'))
+        self.assertEqual(self.store.count('a'), 0)
+        # released row is reused, without the samples of its former key
+        self.assertEqual(self.store.row('c'), row)
+        self.assertEqual(self.store.last('c').tolist(), [])
+        self.assertEqual(self.store.last('b').tolist(), [[2, 2]])
+
+    def test_clear(self):
+        for key in 'abc':
+            self.store.append(key, (1, 1))
+        self.store.clear()
+        self.assertEqual((len(self.store), self.store.keys()), (0, []))
+        self.store.append('d', (5, 5))
+        self.assertEqual(self.store.last('d').tolist(), [[5, 5]])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+'''
+    Tests of the ARP proxy, expiry and re-resolution of SimpleARP.
+'''
+
+
+from types import SimpleNamespace as NS
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from ryu.base.app_manager import SERVICE_BRICKS
+from ryu.lib.mac import BROADCAST_STR
+from ryu.lib.packet.arp import arp, ARP_REQUEST, ARP_REPLY
+from ryu.lib.packet.ether_types import ETH_TYPE_ARP
+from ryu.lib.packet.ethernet import ethernet
+from ryu.lib.packet.packet import Packet
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+from .context import *
+from netapp_sim_controller.ryu_apps import simple_arp
+from netapp_sim_controller.ryu_apps.host_table import ip_to_int, mac_to_int
+from netapp_sim_controller.ryu_apps.packet_in_dispatcher import parse_arp
+from netapp_sim_controller.ryu_apps.simple_arp import SimpleARP
+
+
+H1, MAC1 = '10.0.0.1', '00:00:00:00:00:01'
+H2, MAC2 = '10.0.0.2', '00:00:00:00:00:02'
+H3 = '10.0.0.3'
+
+
+class Datapath(object):
+    '''
+        Datapath recording the ARP packets sent, as tuples of opcode,
+        Ethernet destination, ARP source IP and MAC, ARP destination IP and
+        out-ports, and the out-ports of its flood group.
+    '''
+
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+
+    def __init__(self, id, port_nos):
+        self.id = id
+        self.ports = dict.fromkeys(port_nos)
+        self.sent = []
+        self.flood_ports = None
+
+    def send_msg(self, msg):
+        if isinstance(msg, ofproto_v1_3_parser.OFPGroupMod):
+            self.flood_ports = None \
+                if msg.command == ofproto_v1_3.OFPGC_DELETE else \
+                [bucket.actions[0].port for bucket in msg.buckets]
+        if not isinstance(msg, ofproto_v1_3_parser.OFPPacketOut):
+            return
+        pkt = Packet(msg.data)
+        eth = pkt.get_protocol(ethernet)
+        arp_pkt = pkt.get_protocol(arp)
+        self.sent.append((arp_pkt.opcode, eth.dst, arp_pkt.src_ip,
+                          arp_pkt.src_mac, arp_pkt.dst_ip,
+                          [action.port for action in msg.actions]))
+
+
+def packet_in(datapath, in_port, opcode, src_mac, src_ip, dst_ip,
+              dst_mac=BROADCAST_STR):
+    pkt = Packet()
+    pkt.add_protocol(ethernet(ethertype=ETH_TYPE_ARP, src=src_mac,
+                              dst=dst_mac))
+    pkt.add_protocol(arp(opcode=opcode, src_mac=src_mac, src_ip=src_ip,
+                         dst_mac=dst_mac if opcode == ARP_REPLY else
+                         '00:00:00:00:00:00', dst_ip=dst_ip))
+    pkt.serialize()
+    return (NS(msg=NS(datapath=datapath, match={'in_port': in_port},
+                      data=pkt.data)),
+            parse_arp(pkt.data))
+
+
+def link(src_dpid, src_port_no, dst_dpid, dst_port_no):
+    return NS(src=NS(dpid=src_dpid, port_no=src_port_no),
+              dst=NS(dpid=dst_dpid, port_no=dst_port_no))
+
+
+class SimpleARPTest(TestCase):
+    '''
+        Switches 1 and 2 linked by their ports 3, with edge ports 1 and 2.
+    '''
+
+    def setUp(self):
+        self.dps = {1: Datapath(1, (1, 2, 3)), 2: Datapath(2, (1, 2, 3))}
+        self.links = [link(1, 3, 2, 3), link(2, 3, 1, 3)]
+        self.apps = {SWITCHES: NS(dps=self.dps, links=self.links),
+                     PACKET_IN_DISPATCHER: NS(register=lambda *args: None)}
+        SERVICE_BRICKS.update(self.apps)
+        # background requests are run by run_spawned, without waiting for
+        # tokens
+        for name in ('spawn', 'sleep'):
+            patcher = patch.object(simple_arp, name)
+            self.addCleanup(patcher.stop)
+            setattr(self, name, patcher.start())
+        self.arp = SimpleARP()
+        for datapath in self.dps.values():
+            self.arp._switch_enter_handler(NS(switch=NS(dp=datapath)))
+        self.spawn.reset_mock()
+
+    def tearDown(self):
+        for name in self.apps:
+            SERVICE_BRICKS.pop(name, None)
+
+    def run_spawned(self):
+        calls = self.spawn.call_args_list
+        self.spawn.reset_mock()
+        for call in calls:
+            call[0][0](*call[0][1:])
+
+    def sent(self):
+        # returns (and clears) packets sent by each datapath
+        sent = {dpid: dp.sent for dpid, dp in self.dps.items() if dp.sent}
+        for dp in self.dps.values():
+            dp.sent = []
+        return sent
+
+    def learn(self, ip, mac, dpid, port_no):
+        self.arp._arp_packet_in_handler(*packet_in(
+            self.dps[dpid], port_no, ARP_REPLY, mac, ip, CONTROLLER_IP,
+            CONTROLLER_MAC))
+
+    def request(self, dst_ip, dpid=1, port_no=1):
+        # ARP request of host 10.0.0.1 (on port 1 of switch 1)
+        self.arp._arp_packet_in_handler(*packet_in(
+            self.dps[dpid], port_no, ARP_REQUEST, MAC1, H1, dst_ip))
+
+    def test_reply_for_known_host(self):
+        self.learn(H2, MAC2, 2, 1)
+        self.request(H2)
+        self.assertEqual(self.sent(), {
+            1: [(ARP_REPLY, MAC1, H2, MAC2, H1, [1])]})
+        # requesting host is learnt too
+        self.assertEqual(self.arp.hosts[ip_to_int(H1)].port_no, 1)
+        self.assertEqual(self.arp.hosts[ip_to_int(H1)].mac, mac_to_int(MAC1))
+
+        self.request(CONTROLLER_IP)
+        self.assertEqual(self.sent(), {1: [
+            (ARP_REPLY, MAC1, CONTROLLER_IP, CONTROLLER_MAC, H1, [1])]})
+
+        # gratuitous requests are not answered
+        self.request(H1)
+        self.run_spawned()
+        self.assertEqual(self.sent(), {})
+
+    def test_resolve_unknown_host_once(self):
+        self.request(H2)
+        self.request(H2)
+        self.run_spawned()
+        # a single request, flooded by switch 1 to its edge ports and to
+        # switch 2, which floods it to its own edge ports
+        self.assertEqual(self.sent(), {1: [
+            (ARP_REQUEST, BROADCAST_STR, CONTROLLER_IP, CONTROLLER_MAC, H2,
+             [ofproto_v1_3.OFPP_TABLE])]})
+        self.assertEqual(self.dps[1].flood_ports, [1, 2, 3])
+        self.assertEqual(self.dps[2].flood_ports, [1, 2])
+
+        # no answer within ARP_TIMEOUT: resolved again on next request
+        self.arp._expire([ip_to_int(H2)])
+        self.request(H2)
+        self.run_spawned()
+        self.assertEqual(len(self.sent()[1]), 1)
+
+        # answered: following requests are replied to
+        self.learn(H2, MAC2, 2, 1)
+        self.request(H2)
+        self.run_spawned()
+        self.assertEqual(self.sent(), {
+            1: [(ARP_REPLY, MAC1, H2, MAC2, H1, [1])]})
+
+    def test_flood_trees(self):
+        # switch 3 linked to both switches (by its ports 1 and 2, to their
+        # ports 4), switch 4 with no links
+        self.dps[3] = Datapath(3, (1, 2, 3))
+        self.dps[4] = Datapath(4, (1,))
+        for dpid in (1, 2):
+            self.dps[dpid].ports[4] = None
+            self.links += [link(dpid, 4, 3, dpid), link(3, dpid, dpid, 4)]
+        for dpid in (3, 4):
+            self.arp._switch_enter_handler(NS(switch=NS(dp=self.dps[dpid])))
+        self.arp._flood_updated = 0
+        self.assertEqual(self.arp._requests(H2), [
+            (self.dps[1], H2, [ofproto_v1_3.OFPP_TABLE]),
+            (self.dps[4], H2, [ofproto_v1_3.OFPP_TABLE])])
+        # no loop: switch 3 is only flooded to by switch 1
+        self.assertEqual(self.dps[1].flood_ports, [1, 2, 3, 4])
+        self.assertEqual(self.dps[2].flood_ports, [1, 2])
+        self.assertEqual(self.dps[3].flood_ports, [3])
+        self.assertEqual(self.dps[4].flood_ports, [1])
+
+        # groups are updated as switches leave
+        del self.dps[1]
+        self.arp._switch_leave_handler(NS(switch=NS(dp=NS(id=1))))
+        self.assertEqual(self.arp._requests(H2), [
+            (self.dps[2], H2, [ofproto_v1_3.OFPP_TABLE]),
+            (self.dps[4], H2, [ofproto_v1_3.OFPP_TABLE])])
+        self.assertEqual(self.dps[2].flood_ports, [1, 2, 4])
+        self.assertEqual(self.dps[3].flood_ports, [3])
+
+    def test_expiry(self):
+        self.learn(H2, MAC2, 2, 1)
+        self.learn(H3, '00:00:00:00:00:03', 2, 2)
+        ips = [ip_to_int(H2), ip_to_int(H3)]
+
+        # expired entries are re-resolved by way of their in-ports only
+        self.arp._expire(ips)
+        self.run_spawned()
+        self.assertEqual(self.sent(), {2: [
+            (ARP_REQUEST, MAC2, CONTROLLER_IP, CONTROLLER_MAC, H2, [1]),
+            (ARP_REQUEST, '00:00:00:00:00:03', CONTROLLER_IP,
+             CONTROLLER_MAC, H3, [2])]})
+
+        # the host that answered is kept, the other one is dropped
+        self.learn(H2, MAC2, 2, 1)
+        self.arp._expire(ips)
+        self.assertIn(ips[0], self.arp.hosts)
+        self.assertNotIn(ips[1], self.arp.hosts)
+        self.assertNotIn(ips[1], self.arp._pending)
+
+        # entries of hosts of switches that left are dropped
+        del self.dps[2]
+        self.arp._expire(ips[:1])
+        self.assertEqual(len(self.arp.hosts), 0)
+
+    def test_host_move(self):
+        self.learn(H2, MAC2, 2, 1)
+        self.arp._host_move_handler(NS(dst=NS(
+            mac=MAC2, port=NS(dpid=1, port_no=2))))
+        host = self.arp.hosts[ip_to_int(H2)]
+        self.assertEqual((host.dpid, host.port_no), (1, 2))
+        self.run_spawned()
+        self.assertEqual(self.sent(), {1: [
+            (ARP_REQUEST, MAC2, CONTROLLER_IP, CONTROLLER_MAC, H2, [2])]})
+        self.assertIn(ip_to_int(H2), self.arp._pending)
+
+        # the moved host answers on its new port
+        self.learn(H2, MAC2, 1, 2)
+        self.assertNotIn(ip_to_int(H2), self.arp._pending)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+    Tests of the immutable, versioned snapshots of monitor measures.
+'''
+
+
+from unittest import TestCase, main
+
+from .context import *
+from snapshot import freeze, SnapshotPublisher
+
+
+class FreezeTest(TestCase):
+
+    def test_freeze(self):
+        live = {1: {2: 0.5}, 'ports': [1, [2, 3]]}
+        frozen = freeze(live)
+        with self.assertRaises(TypeError):
+            frozen[1][3] = 0.1
+        with self.assertRaises(TypeError):
+            frozen['new'] = 0
+        self.assertEqual(frozen['ports'], (1, (2, 3)))
+        # copies do not follow the live dicts
+        live[1][2] = 0.9
+        live[1][4] = 0.1
+        self.assertEqual(dict(frozen[1]), {2: 0.5})
+
+
+class SnapshotPublisherTest(TestCase):
+
+    def setUp(self):
+        self.delay = {1: {2: 0.5}}
+        self.publisher = SnapshotPublisher(delay={})
+
+    def test_read_only(self):
+        snapshot = self.publisher.publish(delay=self.delay)
+        self.assertEqual(snapshot.delay[1][2], 0.5)
+        self.assertEqual(snapshot['delay'][1][2], 0.5)
+        self.assertIn('delay', snapshot)
+        self.assertEqual(list(snapshot.keys()), ['delay'])
+        with self.assertRaises(AttributeError):
+            snapshot.delay = {}
+        with self.assertRaises(AttributeError):
+            snapshot.jitter
+
+    def test_version(self):
+        self.assertEqual(self.publisher.get().version, 0)
+        first = self.publisher.publish(delay=self.delay)
+        self.assertEqual(first.version, 1)
+        # unchanged measures keep the current snapshot
+        self.assertIs(self.publisher.publish(delay={1: {2: 0.5}}), first)
+        self.delay[1][2] = 0.7
+        second = self.publisher.publish(delay=self.delay)
+        self.assertEqual(second.version, 2)
+        self.assertEqual(first.delay[1][2], 0.5)
+        self.assertGreaterEqual(second.timestamp, first.timestamp)
+
+    def test_get_since(self):
+        self.assertIs(self.publisher.get(), self.publisher.get(-1))
+        self.assertIsNone(self.publisher.get(0))
+        snapshot = self.publisher.publish(delay=self.delay)
+        self.assertIs(self.publisher.get(0), snapshot)
+        self.assertIsNone(self.publisher.get(snapshot.version))
+        self.assertIsNone(self.publisher.get(snapshot.version + 1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+'''
+    Tests of the hashed timing wheel of ARP entries' expiry.
+'''
+
+
+from unittest import TestCase, main
+
+from .context import *
+from timer_wheel import TimerWheel
+
+
+class TimerWheelTest(TestCase):
+
+    def setUp(self):
+        self.wheel = TimerWheel(tick=1, slots=8)
+
+    def expiries(self, ticks):
+        # tick at which each timer expires
+        return {key: tick for tick in range(1, ticks + 1)
+                for key in self.wheel.advance()}
+
+    def test_expiry(self):
+        self.wheel.schedule('a', 3)
+        self.wheel.schedule('b', 2.5)
+        self.wheel.schedule('c', 0)
+        self.assertEqual(len(self.wheel), 3)
+        self.assertEqual(self.expiries(5), {'a': 3, 'b': 3, 'c': 1})
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_rounds(self):
+        # longer than a turn of the wheel
+        for delay in (7, 8, 9, 17, 30):
+            self.wheel.schedule(delay, delay)
+        self.assertEqual(self.expiries(40),
+                         {7: 7, 8: 8, 9: 9, 17: 17, 30: 30})
+
+    def test_reschedule_and_cancel(self):
+        self.wheel.schedule('a', 2)
+        self.wheel.schedule('b', 2)
+        self.wheel.advance()
+        self.wheel.schedule('a', 5)  # refreshed
+        self.wheel.cancel('b')
+        self.wheel.cancel('unknown')
+        self.assertNotIn('b', self.wheel)
+        self.assertEqual(self.expiries(10), {'a': 5})
+
+    def test_advance_many(self):
+        self.wheel.schedule('a', 3)
+        self.wheel.schedule('b', 12)
+        self.assertEqual(self.wheel.advance(4), ['a'])
+        self.assertEqual(self.wheel.advance(20), ['b'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''
+    Tests of the topology view kept up to date from topology events.
+'''
+
+
+from json import loads
+from types import SimpleNamespace as NS
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from ryu.topology import event
+
+from .context import *
+import topoview
+from topoview import TopologyView
+
+
+def port(dpid, port_no):
+    return NS(dpid=dpid, port_no=port_no, hw_addr='02:%02x:%02x' % (
+        dpid, port_no), to_dict=lambda: {'dpid': dpid, 'port_no': port_no})
+
+
+def switch(dpid, ports=2):
+    s = NS(dp=NS(id=dpid), ports=[port(dpid, i) for i in range(1, ports + 1)])
+    s.to_dict = lambda: {'dpid': dpid, 'ports': [p.to_dict()
+                                                 for p in s.ports]}
+    return s
+
+
+def link(src, dst):
+    return NS(src=src, dst=dst, to_dict=lambda: {'src': src.to_dict(),
+                                                 'dst': dst.to_dict()})
+
+
+def host(mac, port):
+    h = NS(mac=mac, port=port, ipv4=[], ipv6=[])
+    h.to_dict = lambda: {'mac': mac, 'ipv4': list(h.ipv4)}
+    return h
+
+
+class TopologyViewTest(TestCase):
+
+    def setUp(self):
+        self.s1, self.s2 = switch(1), switch(2)
+        self.h1 = host('00:00:00:00:00:01', self.s1.ports[0])
+        stale = host('00:00:00:00:00:09', port(9, 1))
+        with patch.object(topoview, 'get_all_switch',
+                          return_value=[self.s1]), \
+                patch.object(topoview, 'get_all_link', return_value=[]), \
+                patch.object(topoview, 'get_all_host',
+                             return_value=[self.h1, stale]):
+            self.view = TopologyView(None)
+            self.body = loads(self.view.body())
+
+    def test_stale_hosts_are_hidden(self):
+        self.assertEqual([h['mac'] for h in self.body['hosts']],
+                         [self.h1.mac])
+
+    def test_events_update_view_once(self):
+        etag = self.view.etag
+        self.assertIs(self.view.body(), self.view.body())
+        self.assertEqual(self.view.etag, etag)
+
+        self.view.update(event.EventSwitchEnter(self.s2))
+        self.view.update(event.EventLinkAdd(link(self.s1.ports[1],
+                                                 self.s2.ports[0])))
+        self.assertNotEqual(self.view.etag, etag)
+        body = loads(self.view.body())
+        self.assertEqual(len(body['switches']), 2)
+        self.assertEqual(len(body['links']), 1)
+
+        self.view.update(event.EventSwitchLeave(self.s2))
+        body = loads(self.view.body())
+        self.assertEqual((len(body['switches']), len(body['links'])), (1, 0))
+
+    def test_port_events_update_switch_ports(self):
+        new = port(1, 3)
+        self.view.update(event.EventPortAdd(new))
+        h2 = host('00:00:00:00:00:02', new)
+        self.view.update(event.EventHostAdd(h2))
+        body = loads(self.view.body())
+        self.assertEqual([p['port_no'] for p in body['switches'][0]['ports']],
+                         [1, 2, 3])
+        self.assertIn(h2.mac, [h['mac'] for h in body['hosts']])
+
+        self.view.update(event.EventPortModify(port(1, 3)))
+        self.assertEqual(len(self.s1.ports), 3)
+        self.view.update(event.EventPortDelete(new))
+        body = loads(self.view.body())
+        self.assertEqual([p['port_no'] for p in body['switches'][0]['ports']],
+                         [1, 2])
+        self.assertNotIn(h2.mac, [h['mac'] for h in body['hosts']])
+
+    def test_learnt_ips_refresh_body(self):
+        etag = self.view.etag
+        self.h1.ipv4.append('10.0.0.1')
+        body = loads(self.view.body())
+        self.assertEqual(body['hosts'][0]['ipv4'], ['10.0.0.1'])
+        self.assertNotEqual(self.view.etag, etag)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''
+    Tests of TimeSeriesStore's partitioning, queries and retention.
+'''
+
+
+from os import listdir
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from .context import *
+from netapp_sim_controller.ryu_apps.tsdb import (
+    TimeSeriesStore, PARTITION)
+
+
+DAY = PARTITION
+
+
+class TimeSeriesStoreTest(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.store = TimeSeriesStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_partitions_and_range_scan(self):
+        timestamps = [DAY - 2, DAY - 1, DAY, DAY + 1, 2 * DAY + 5]
+        self.store.append('delay', '1->2', timestamps, [1, 2, 3, 4, 5])
+        self.store.append('delay', '2->1', [DAY], [9])
+        self.assertEqual(len(listdir(join(self.tmp.name, 'delay'))), 3)
+        self.assertEqual(self.store.metrics(), ['delay'])
+        self.assertEqual(self.store.series('delay'), ['1->2', '2->1'])
+
+        ts, val = self.store.query('delay', '1->2')
+        self.assertEqual(ts.tolist(), timestamps)
+        ts, val = self.store.query('delay', '1->2', DAY - 1, DAY + 1)
+        self.assertEqual(ts.tolist(), [DAY - 1, DAY])
+        self.assertEqual(val.tolist(), [2, 3])
+        self.assertEqual(len(self.store.query('jitter', '1->2')[0]), 0)
+
+    def test_late_points_are_sorted(self):
+        self.store.append('delay', '1->2', [10, 20], [1, 2])
+        self.store.append('delay', '1->2', [15], [3])
+        ts, val = self.store.query('delay', '1->2')
+        self.assertEqual(ts.tolist(), [10, 15, 20])
+        self.assertEqual(val.tolist(), [1, 3, 2])
+
+    def test_downsample(self):
+        self.store.append('bandwidth', 'a', [0, 1, 2, 10, 11, 35],
+                          [1, 5, 3, 2, 4, 7])
+        times, mins, maxs, avgs = self.store.downsample('bandwidth', 'a', 10)
+        self.assertEqual(times.tolist(), [0, 10, 30])
+        self.assertEqual(mins.tolist(), [1, 2, 7])
+        self.assertEqual(maxs.tolist(), [5, 4, 7])
+        self.assertEqual(avgs.tolist(), [3, 3, 7])
+
+    def test_names_stay_in_store(self):
+        for name in ('', '.', '..'):
+            with self.assertRaises(ValueError):
+                self.store.append(name, 'a', [1], [1])
+            with self.assertRaises(ValueError):
+                self.store.append('delay', name, [1], [1])
+            with self.assertRaises(ValueError):
+                self.store.query(name, 'a')
+            with self.assertRaises(ValueError):
+                self.store.query('delay', name)
+        # other names are quoted into file names
+        self.store.append('../delay', 'a/../b', [1], [1])
+        self.assertEqual(self.store.metrics(), ['../delay'])
+        self.assertEqual(self.store.series('../delay'), ['a/../b'])
+
+    def test_retention(self):
+        store = TimeSeriesStore(self.tmp.name, retention=2 * DAY)
+        store.append('delay', '1->2', [0, DAY], [1, 2])
+        store.append('delay', '1->2', [3 * DAY + 1], [3])
+        ts, _ = store.query('delay', '1->2')
+        self.assertEqual(ts.tolist(), [DAY, 3 * DAY + 1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+'''
+    Tests of the web API's responses.
+'''
+
+
+import gzip
+from email.utils import formatdate
+from os import mkdir
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from webob import Request
+
+from .context import *
+from assets import AssetCache
+from netapp_sim_controller.ryu_apps.tsdb import TimeSeriesStore
+from webapi import WebApi
+
+
+class WebApiTestCase(TestCase):
+
+    def api(self, url, headers=None, **data):
+        req = Request.blank(url, headers=headers)
+        data.setdefault('webctl', None)
+        data.setdefault('assets', None)
+        return req, WebApi(req, None, data)
+
+
+class StaticFileTest(WebApiTestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.root = join(self.tmp.name, 'web')
+        mkdir(self.root)
+        with open(join(self.root, 'app.js'), 'w') as f:
+            f.write('var x = 1;\n' * 100)
+        with open(join(self.tmp.name, 'secret.txt'), 'w') as f:
+            f.write('secret')
+        self.assets = AssetCache(self.root)
+        self.asset = self.assets.get('app.js')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def get(self, filename='app.js', **headers):
+        req, api = self.api('/home/' + filename, headers, assets=self.assets)
+        return api.get_filename(req, filename)
+
+    def test_full_body(self):
+        res = self.get()
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(res.body, self.asset.body)
+        self.assertEqual(res.etag, self.asset.etag)
+        self.assertEqual(res.last_modified.timestamp(), self.asset.mtime)
+        self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+        self.assertIsNone(res.content_encoding)
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.get('missing.js').status_int, 404)
+        self.assertEqual(self.get('../secret.txt').status_int, 403)
+
+    def test_if_none_match(self):
+        res = self.get(**{'If-None-Match': '"%s"' % self.asset.etag})
+        self.assertEqual((res.status_int, res.body), (304, b''))
+        self.assertEqual(self.get(**{'If-None-Match': '"other"'}).status_int,
+                         200)
+        # the etag of the gzipped variant differs
+        res = self.get(**{'If-None-Match': '"%s"' % self.asset.etag,
+                          'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.status_int, 200)
+        res = self.get(**{'If-None-Match': '"%s-gz"' % self.asset.etag,
+                          'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.status_int, 304)
+
+    def test_if_modified_since(self):
+        mtime = self.asset.mtime
+        res = self.get(**{'If-Modified-Since': formatdate(mtime, usegmt=True)})
+        self.assertEqual(res.status_int, 304)
+        res = self.get(**{'If-Modified-Since': formatdate(mtime - 1,
+                                                          usegmt=True)})
+        self.assertEqual(res.status_int, 200)
+        # If-None-Match takes precedence
+        res = self.get(**{'If-Modified-Since': formatdate(mtime, usegmt=True),
+                          'If-None-Match': '"other"'})
+        self.assertEqual(res.status_int, 200)
+
+    def test_range(self):
+        size = len(self.asset.body)
+        res = self.get(Range='bytes=10-19', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(res.status_int, 206)
+        self.assertEqual(res.body, self.asset.body[10:20])
+        self.assertEqual(str(res.content_range), 'bytes 10-19/%d' % size)
+        self.assertIsNone(res.content_encoding)
+
+        res = self.get(Range='bytes=%d-' % (size + 10))
+        self.assertEqual(res.status_int, 416)
+        self.assertEqual(res.headers['Content-Range'], 'bytes */%d' % size)
+
+    def test_if_range(self):
+        res = self.get(Range='bytes=0-9',
+                       **{'If-Range': '"%s"' % self.asset.etag})
+        self.assertEqual(res.status_int, 206)
+        # the client's copy is outdated: whole file
+        res = self.get(Range='bytes=0-9', **{'If-Range': '"other"'})
+        self.assertEqual((res.status_int, res.body), (200, self.asset.body))
+
+    def test_gzip(self):
+        for accept in ('gzip', 'deflate, gzip;q=0.5', '*'):
+            res = self.get(**{'Accept-Encoding': accept})
+            self.assertEqual(res.content_encoding, 'gzip', accept)
+            self.assertEqual(gzip.decompress(res.body), self.asset.body)
+            self.assertEqual(res.etag, self.asset.etag + '-gz')
+        for accept in ('gzip;q=0', 'identity', 'deflate', '*;q=0'):
+            res = self.get(**{'Accept-Encoding': accept})
+            self.assertIsNone(res.content_encoding, accept)
+            self.assertEqual(res.body, self.asset.body)
+
+
+class HistoryTest(WebApiTestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.store = TimeSeriesStore(self.tmp.name)
+        self.store.append('delay', '1->2', [1, 2], [0.5, 0.25])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_query(self):
+        req, api = self.api('/history/delay?series=1->2', history=self.store)
+        res = api.get_history(req, 'delay')
+        self.assertEqual(res.json, {'timestamps': [1, 2],
+                                    'values': [0.5, 0.25]})
+
+    def test_names_stay_in_store(self):
+        for metric, series in (('..', '..'), ('delay', '..'), ('.', 'x'),
+                               ('..', 'delay')):
+            req, api = self.api('/history/x?series=' + series,
+                                history=self.store)
+            self.assertEqual(api.get_history(req, metric).status_int, 400)
+            req, api = self.api('/history/x?series=%s&step=1' % series,
+                                history=self.store)
+            self.assertEqual(api.get_history(req, metric).status_int, 400)
+
+
+if __name__ == '__main__':
+    main()